@@ -291,6 +291,7 @@ Cloud Formation stack deletion failed -- please see your AWS console for details
         yaml_config['aws_config']['scheduled_jobs_table'] = self.l_to_p_map["ScheduledJobs"]
         yaml_config['aws_config']['etl_records_table'] = self.l_to_p_map["ETLRecords"]
         yaml_config['aws_config']['redshift_clusters'] = self.l_to_p_map["RedshiftClusters"]
+        yaml_config['aws_config']['loaded_ranges_table'] = self.l_to_p_map["LoadedRanges"]
         yaml_config['run_local']['private'] = "/mycroft_config/private.yaml"
         yaml_config['run_local']['session_file'] = "/mycroft_config/session_file.txt"
         yaml_config['run_local']['mrjob_arg_template'] = "--runner=emr {0} --output-dir={1} --no-output --extractions {3} --column-delimiter={4} -c /mycroft_config/mrjob.conf"
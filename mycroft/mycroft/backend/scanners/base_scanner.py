@@ -6,8 +6,10 @@ import time
 from simplejson import loads
 
 import staticconf
-from mycroft.logic.cluster_actions import list_cluster_by_name
+from mycroft.logic.cluster_actions import list_cluster_by_name_cached
 from mycroft.logic.log_source_action import get_log_meta_data
+from mycroft.logic.log_source_action import prefetch_log_meta_data
+from mycroft.backend.scanners.job_index import JobIndex
 from mycroft.log_util import log
 from mycroft.log_util import log_exception
 from mycroft.models.aws_connections import TableConnection
@@ -18,6 +20,7 @@ from mycroft.models.scheduled_jobs import JOBS_ETL_STATUS_RUNNING
 from mycroft.models.scheduled_jobs import JOBS_ETL_STATUS_EMPTY
 from mycroft.models.scheduled_jobs import JOBS_ETL_STATUS_ERROR
 from mycroft.models.scheduled_jobs import JOBS_ETL_ACTIONS
+from mycroft.models.scheduled_jobs import ScheduledJobInvalidStatusUpdate
 
 from sherlock.common.schema import get_deep
 from sherlock.common.pipeline import get_base_args_parser
@@ -72,12 +75,26 @@ class BaseScanner(object):
         )
         self.msg_max_retention_sec += 3600  # give SQS enough time to delete the message
         self.emailer = emailer
+        self.batch_enqueue = staticconf.read_bool('scanner.batch_enqueue', False)
+        self._work_msgs = None
+        self.job_index = None
+        if staticconf.read_bool('scanner.use_job_index', False):
+            self.job_index = JobIndex(
+                self.db,
+                self._get_work_due_time,
+                staticconf.read_int('scanner.job_index_full_refresh_sec', 3600),
+                staticconf.read_int('scanner.job_index_refresh_overlap_sec', 300),
+            )
 
         log("scanner initialization")
         log(dict((k, str(v))for k, v in vars(self).iteritems()))
 
-    # TODO: Process each message instead of scan table every time.
     def run(self):
+        """ Process the jobs named by scanner queue messages as they arrive,
+        and sweep all jobs when no sweep has run for the timeout or a
+        message does not name a job.  Without a job index, the sweep reads
+        every job, so the messages still queued are dropped after it.
+        """
         timeout = self._get_timeout()
         last_run_time = self._get_utc_now() - timedelta(minutes=timeout)
         while(self._should_run):
@@ -93,14 +110,26 @@ class BaseScanner(object):
                 time.sleep(self.scanner_queue.get_wait_time())
 
             try:
-                if (len(msgs) > 0
+                hash_keys = get_job_hash_keys(msgs) if len(msgs) > 0 else []
+                if len(msgs) > 0:
+                    self.scanner_queue.delete_message_batch_from_queue(msgs)
+                if (hash_keys is None
                         or self._get_utc_now() - last_run_time >= timedelta(minutes=timeout)):
-                    if len(msgs) > 0:
-                        self.scanner_queue.delete_message_batch_from_queue(msgs)
                     self.run_maint()
                     self.run_scanner()
-                    self.scanner_queue.clear()
+                    if self.job_index is None:
+                        # the sweep handled whatever the queued messages are about
+                        self.scanner_queue.clear()
+                    else:
+                        # the index reads a new job back only on a full
+                        # refresh, so the jobs named are processed now and
+                        # the queued messages are left for the next fetches
+                        named_hash_keys = get_job_hash_keys(msgs, skip_unnamed=True)
+                        if named_hash_keys:
+                            self.run_for_jobs(named_hash_keys)
                     last_run_time = self._get_utc_now()
+                else:
+                    self.run_for_jobs(hash_keys)
             except Exception:
                 log_exception("Exception in running scanner")
 
@@ -111,19 +140,112 @@ class BaseScanner(object):
         """ Fetch relevant jobs from DB table and create ET or L work.
         Does not throw any exceptions out.
         """
-        jobs = self._fetch_jobs_for_work()
-        for job in jobs:
-            try:
-                if self._action_pending(job) or self._should_process_job(job):
-                    self._create_work_for_job(job)
-                else:
-                    log("Skipping job since there was no processing needed: {0}".format(
-                        job2log(job)
-                    ))
-            except Exception:
-                log_exception(
-                    "Caught an exception in processing a job. Ignoring"
-                    " entry: {0}".format(job2log(job)))
+        if self.job_index is not None:
+            jobs = self.job_index.pop_due_jobs(self._get_utc_now())
+            log("num jobs due from job index: {0}".format(len(jobs)))
+        else:
+            jobs = self._fetch_jobs_for_work()
+        prefetch_log_meta_data(
+            key for key in (self._get_log_key(job) for job in jobs) if key is not None
+        )
+        if self.batch_enqueue:
+            self._work_msgs = []
+        try:
+            for job in jobs:
+                self._process_job_for_work(job)
+        finally:
+            work_msgs, self._work_msgs = self._work_msgs, None
+            if work_msgs:
+                try:
+                    self.worker_queue.write_message_batch_to_queue(work_msgs)
+                except Exception:
+                    # the jobs stay scheduled until _maint_scheduled_jobs resets them
+                    log_exception("Exception in enqueuing {0} work items".format(
+                        len(work_msgs)))
+
+    def run_for_job(self, hash_key):
+        """ Run maintenance on a single job and create work for it if it
+        needs any, like run_maint and run_scanner do for all jobs.
+        Does not throw any exceptions out.
+
+        :param hash_key: hash key of the job
+        :type hash_key: string
+        """
+        try:
+            job = self.db.get(hash_key=hash_key)
+        except KeyError:
+            self._job_gone(hash_key)
+            return
+        except Exception:
+            log_exception("Caught an exception in fetching job: {0}".format(hash_key))
+            return
+        self._run_for_fetched_job(job)
+
+    def run_for_jobs(self, hash_keys):
+        """ Like run_for_job for each of hash_keys, with the jobs read in
+        batches.  Does not throw any exceptions out.
+
+        :param hash_keys: hash keys of the jobs, may repeat
+        :type hash_keys: list
+        """
+        try:
+            jobs = dict((job.get(hash_key=None)['hash_key'], job)
+                        for job in self.db.batch_get(hash_keys))
+        except Exception:
+            log_exception("Caught an exception in fetching jobs: {0}".format(hash_keys))
+            return
+        for hash_key in sorted(set(hash_keys), key=hash_keys.index):
+            job = jobs.get(hash_key)
+            if job is None:
+                self._job_gone(hash_key)
+            else:
+                self._run_for_fetched_job(job)
+
+    def _job_gone(self, hash_key):
+        log("Skipping job since it no longer exists: {0}".format(hash_key))
+        if self.job_index is not None:
+            self.job_index.remove(hash_key)
+
+    def _run_for_fetched_job(self, job):
+        self._job_changed(job)
+
+        try:
+            self._maint_job(job, self._get_utc_now())
+        except Exception:
+            log_exception(
+                "Caught an exception in maintaining a job. Ignoring"
+                " entry: {0}".format(job2log(job)))
+            return
+        if self._is_job_for_work(job):
+            self._process_job_for_work(job)
+
+    def _process_job_for_work(self, job):
+        try:
+            if self._action_pending(job) or self._should_process_job(job):
+                self._create_work_for_job(job)
+            else:
+                log("Skipping job since there was no processing needed: {0}".format(
+                    job2log(job)
+                ))
+        except Exception:
+            log_exception(
+                "Caught an exception in processing a job. Ignoring"
+                " entry: {0}".format(job2log(job)))
+        finally:
+            self._job_changed(job)
+
+    def _job_changed(self, job):
+        """ Reindex a job the scanner read or updated, if there's a job index """
+        if self.job_index is not None:
+            self.job_index.put(job)
+
+    def _get_jobs_with_et_status(self, et_status_value):
+        """ Get the jobs with the given et_status, from the job index if
+        there's one and from the DB otherwise
+        """
+        if self.job_index is not None:
+            return self.job_index.get_jobs_with_et_status(et_status_value)
+        return self.db.get_jobs_with_et_status(et_status_value)
 
     def stop(self):
         self._should_run = False
@@ -137,6 +259,31 @@ class BaseScanner(object):
         """
         raise NotImplementedError
 
+    def _is_job_for_work(self, job):
+        """ Check if a job qualifies for a given work type, i.e. if
+        _fetch_jobs_for_work would return it.
+        Implement this method in child classes for ET or Load work.
+
+        :param job: an entry from DynamoDB of type scheduled job
+        :type job: scheduled_job
+
+        :rtype: bool
+        """
+        raise NotImplementedError
+
+    def _get_work_due_time(self, job):
+        """ Get the time a job may next need work, used to order the job
+        index.  Implement this method in child classes for ET or Load work.
+
+        :param job: an entry from DynamoDB of type scheduled job
+        :type job: scheduled_job
+
+        :returns: UTC time, or None if the job needs no work until its
+            status changes
+        :rtype: datetime or None
+        """
+        raise NotImplementedError
+
     def _action_pending(self, job):
         """ Check if job has pending action
 
@@ -169,106 +316,141 @@ class BaseScanner(object):
 
     def _update_job_status(self, job, status_value):
         kwargs = {"et_status": status_value}
-        if job.update(**kwargs) is not True:
-            log("Could not update {0} for job {1}".format(kwargs, job2log(job)))
+        try:
+            if job.update(**kwargs) is not True:
+                log("Could not update {0} for job {1}".format(kwargs, job2log(job)))
+        except ScheduledJobInvalidStatusUpdate:
+            # the job was read before another writer changed or deleted it
+            log("Job changed since it was read, could not update {0} for job {1}".format(
+                kwargs, job2log(job)))
+            self._reread_job(job)
+            return
+        self._job_changed(job)
+
+    def _reread_job(self, job):
+        hash_key = job.get(hash_key=None)['hash_key']
+        try:
+            job = self.db.get(hash_key=hash_key)
+        except KeyError:
+            self._job_gone(hash_key)
+            return
+        self._job_changed(job)
 
     def _maint_scheduled_jobs(self, now):
-        status_ts_field = 'et_status_last_updated_at'
-        get_jobs = getattr(self.db, 'get_jobs_with_et_status')
+        for job in self._get_jobs_with_et_status(JOBS_ETL_STATUS_SCHEDULED):
+            self._maint_scheduled_job(job, now)
 
-        jobs = get_jobs(JOBS_ETL_STATUS_SCHEDULED)
-        for job in jobs:
-            kwargs = {status_ts_field: None}
-            status_ts_value = job.get(**kwargs).get(status_ts_field, False) or str(now)
+    def _maint_scheduled_job(self, job, now):
+        status_ts_field = 'et_status_last_updated_at'
+        kwargs = {status_ts_field: None}
+        status_ts_value = job.get(**kwargs).get(status_ts_field, False) or str(now)
 
-            last_update = datetime.strptime(status_ts_value, '%Y-%m-%d %H:%M:%S.%f')
-            if now - last_update > timedelta(seconds=self.msg_max_retention_sec):
-                log('found stuck scheduled job {0}, resetting...'.format(job2log(job)))
-                self._update_job_status(job, JOBS_ETL_STATUS_EMPTY)
+        last_update = datetime.strptime(status_ts_value, '%Y-%m-%d %H:%M:%S.%f')
+        if now - last_update > timedelta(seconds=self.msg_max_retention_sec):
+            log('found stuck scheduled job {0}, resetting...'.format(job2log(job)))
+            self._update_job_status(job, JOBS_ETL_STATUS_EMPTY)
 
     def _maint_paused_jobs(self, now):
+        for job in self._get_jobs_with_et_status(JOBS_ETL_STATUS_PAUSED):
+            self._maint_paused_job(job, now)
+
+    def _maint_paused_job(self, job, now):
         lsd_field = 'et_last_successful_date'
         kwargs = dict((action, None) for action in JOBS_ETL_ACTIONS)
         kwargs[lsd_field] = None
 
-        get_jobs = getattr(self.db, 'get_jobs_with_et_status')
-        jobs = get_jobs(JOBS_ETL_STATUS_PAUSED)
-        for job in jobs:
-            # if key is set to None or does not exist, assume it's set to 1
-            # to avoid resuming non-conforming jobs.
-            result_dict = job.get(**kwargs)
-            pause_requested = result_dict.get('pause_requested', 1)
-            cancel_requested = result_dict.get('cancel_requested', 1)
-            lsd = result_dict.get(lsd_field, None)
-
-            if cancel_requested != 0:
-                log('cancel requested for paused job {0}, resetting...'.format(job2log(job)))
-                self._update_job_status(job, JOBS_ETL_STATUS_EMPTY)
-            elif pause_requested == 0:
-                # job is paused but pause_requested is 0 => resume to IDLE,
-                # or SUCCESS if can't resume right away
-                ready_to_process = self._should_process_job(job)
-                new_job_status = JOBS_ETL_STATUS_EMPTY \
-                    if ready_to_process or lsd is None else JOBS_ETL_STATUS_SUCCESS
-                log('resetting paused job {0} to {1}'.format(job2log(job), new_job_status))
-                self._update_job_status(job, new_job_status)
-                if ready_to_process:
-                    additional_info = "Job will start immediately."
-                else:
-                    additional_info = "Job will start when new data is available."
-                job_dict = job.get(**self.DEFAULT_KEYS_TO_FETCH_FROM_JOB)
-                if job_dict['contact_emails'] is not None:
-                    job_dict['contact_emails'] = list(job_dict['contact_emails'])
-                try:
-                    self.emailer.mail_result(
-                        "resumed", job_dict, additional_info
-                    )
-                    log("Sent emails to: {0}".format(job_dict['contact_emails']))
-                except Exception:
-                    log_exception("Exception in sending emails of job:" +
-                                  str(job_dict))
+        # if key is set to None or does not exist, assume it's set to 1
+        # to avoid resuming non-conforming jobs.
+        result_dict = job.get(**kwargs)
+        pause_requested = result_dict.get('pause_requested', 1)
+        cancel_requested = result_dict.get('cancel_requested', 1)
+        lsd = result_dict.get(lsd_field, None)
+
+        if cancel_requested != 0:
+            log('cancel requested for paused job {0}, resetting...'.format(job2log(job)))
+            self._update_job_status(job, JOBS_ETL_STATUS_EMPTY)
+        elif pause_requested == 0:
+            # job is paused but pause_requested is 0 => resume to IDLE,
+            # or SUCCESS if can't resume right away
+            ready_to_process = self._should_process_job(job)
+            new_job_status = JOBS_ETL_STATUS_EMPTY \
+                if ready_to_process or lsd is None else JOBS_ETL_STATUS_SUCCESS
+            log('resetting paused job {0} to {1}'.format(job2log(job), new_job_status))
+            self._update_job_status(job, new_job_status)
+            if ready_to_process:
+                additional_info = "Job will start immediately."
+            else:
+                additional_info = "Job will start when new data is available."
+            job_dict = job.get(**self.DEFAULT_KEYS_TO_FETCH_FROM_JOB)
+            if job_dict['contact_emails'] is not None:
+                job_dict['contact_emails'] = list(job_dict['contact_emails'])
+            try:
+                self.emailer.mail_result(
+                    "resumed", job_dict, additional_info
+                )
+                log("Sent emails to: {0}".format(job_dict['contact_emails']))
+            except Exception:
+                log_exception("Exception in sending emails of job:" +
+                              str(job_dict))
 
     def _maint_running_jobs(self, now):
+        for job in self._get_jobs_with_et_status(JOBS_ETL_STATUS_RUNNING):
+            self._maint_running_job(job, now)
+
+    def _maint_running_job(self, job, now):
         status_ts_field = 'et_status_last_updated_at'
-        get_jobs = getattr(self.db, 'get_jobs_with_et_status')
-        jobs = get_jobs(JOBS_ETL_STATUS_RUNNING)
-        for job in jobs:
-            kwargs = {status_ts_field: None}
-            status_ts_value = job.get(**kwargs).get(status_ts_field, False) or str(now)
+        kwargs = {status_ts_field: None}
+        status_ts_value = job.get(**kwargs).get(status_ts_field, False) or str(now)
 
-            last_update = datetime.strptime(status_ts_value, '%Y-%m-%d %H:%M:%S.%f')
-            if now - last_update > timedelta(seconds=self.worker_keepalive_sec):
-                log('found stuck running job {0}, resetting...'.format(job2log(job)))
-                self._update_job_status(job, JOBS_ETL_STATUS_EMPTY)
+        last_update = datetime.strptime(status_ts_value, '%Y-%m-%d %H:%M:%S.%f')
+        if now - last_update > timedelta(seconds=self.worker_keepalive_sec):
+            log('found stuck running job {0}, resetting...'.format(job2log(job)))
+            self._update_job_status(job, JOBS_ETL_STATUS_EMPTY)
 
     def _maint_error_jobs(self, now):
+        for job in self._get_jobs_with_et_status(JOBS_ETL_STATUS_ERROR):
+            self._maint_error_job(job, now)
+
+    def _maint_error_job(self, job, now):
         retry_ts_field = 'et_next_error_retry_attempt'
         num_retries_field = 'et_num_error_retries'
-        get_jobs = getattr(self.db, 'get_jobs_with_et_status')
-        jobs = get_jobs(JOBS_ETL_STATUS_ERROR)
-        for job in jobs:
-            kwargs = {retry_ts_field: None, num_retries_field: None}
-            fields = job.get(**kwargs)
-
-            retry_ts_value = fields.get(retry_ts_field, False) or str(now)
-            num_retries = fields.get(num_retries_field, None)
-
-            # for legacy error jobs, set to max_error_retries to avoid auto-start
-            num_retries = int(num_retries) if num_retries is not None else self.max_error_retries
-
-            next_retry = datetime.strptime(retry_ts_value, '%Y-%m-%d %H:%M:%S.%f')
-            if next_retry <= now and num_retries < self.max_error_retries:
-                log('attempt {0}/{1} to re-run job {2}'.format(
-                    num_retries + 1, self.max_error_retries, job2log(job)
-                ))
-                self._update_job_status(job, JOBS_ETL_STATUS_EMPTY)
-
-            if self._action_pending(job):
-                # push job to worker for actions like cancel/pause/delete
-                self._update_job_status(job, JOBS_ETL_STATUS_EMPTY)
+        kwargs = {retry_ts_field: None, num_retries_field: None}
+        fields = job.get(**kwargs)
+
+        retry_ts_value = fields.get(retry_ts_field, False) or str(now)
+        num_retries = fields.get(num_retries_field, None)
+
+        # for legacy error jobs, set to max_error_retries to avoid auto-start
+        num_retries = int(num_retries) if num_retries is not None else self.max_error_retries
+
+        next_retry = datetime.strptime(retry_ts_value, '%Y-%m-%d %H:%M:%S.%f')
+        if next_retry <= now and num_retries < self.max_error_retries:
+            log('attempt {0}/{1} to re-run job {2}'.format(
+                num_retries + 1, self.max_error_retries, job2log(job)
+            ))
+            self._update_job_status(job, JOBS_ETL_STATUS_EMPTY)
+
+        if self._action_pending(job):
+            # push job to worker for actions like cancel/pause/delete
+            self._update_job_status(job, JOBS_ETL_STATUS_EMPTY)
+
+    def _maint_job(self, job, now):
+        """ Run the maintenance matching the status of a single job """
+        maint_by_status = {
+            JOBS_ETL_STATUS_SCHEDULED: self._maint_scheduled_job,
+            JOBS_ETL_STATUS_PAUSED: self._maint_paused_job,
+            JOBS_ETL_STATUS_RUNNING: self._maint_running_job,
+            JOBS_ETL_STATUS_ERROR: self._maint_error_job,
+        }
+        maint = maint_by_status.get(job.get(et_status=None)['et_status'])
+        if maint is not None:
+            maint(job, now)
 
     def run_maint(self):
         now = self._get_utc_now()
+        if self.job_index is not None:
+            self.job_index.refresh(now)
+            log("num jobs in job index: {0}".format(len(self.job_index)))
         self._maint_scheduled_jobs(now)
         self._maint_paused_jobs(now)
         self._maint_running_jobs(now)
@@ -363,20 +545,58 @@ class BaseScanner(object):
         """
         log_avail_time_dict = job.get(time_log_need_to_be_available=None)
         log_avail_time = log_avail_time_dict.get('time_log_need_to_be_available')
-        custom_avail_time_str = job.get(additional_arguments='{}')['additional_arguments']
-        custom_avail_time = loads(custom_avail_time_str).get('time_log_need_to_be_available')
+        if self.job_index is not None:
+            additional_arguments = self.job_index.get_additional_arguments(job)
+        else:
+            additional_arguments = loads(
+                job.get(additional_arguments='{}')['additional_arguments']
+            )
+        custom_avail_time = additional_arguments.get('time_log_need_to_be_available')
 
         return log_avail_time if custom_avail_time is None else custom_avail_time
 
-    def _get_max_complete_date(self, job):
-        """ Return the max_complete_date from aws
+    def _get_log_delay(self, job):
+        """ Return how long after the end of a day its log should be available
 
         :param job: instance of ScheduledJob
         :type job: ScheduledJob
+
+        :rtype: timedelta
+        """
+        time_log_need_to_be_available = self._get_time_log_need_to_be_available(job)
+        if time_log_need_to_be_available is None:
+            time_log_need_to_be_available = "48:00"
+        hh, mm = time_log_need_to_be_available.split(':')
+        return timedelta(hours=int(hh), minutes=int(mm))
+
+    def _get_data_available_time(self, job, date_str):
+        """ Return the UTC time from which _data_available_for_date is True
+        for date_str, or None if the log finder decides it
+
+        :param job: instance of ScheduledJob
+        :type job: ScheduledJob
+
+        :param date_str: string representation of a date (YYYY-MM-DD format)
+        :type date_str: string
+
+        :rtype: datetime or None
+        """
+        if job.get(s3_path=None)['s3_path'] is not None and \
+                not staticconf.read_bool('disable_logfinder_service', False):
+            return None
+        return datetime.strptime(date_str, '%Y-%m-%d') + self._get_log_delay(job)
+
+    def _get_log_key(self, job):
+        """ Return the bucket and log name the log finder knows the job's
+        log by, or None if the job has no s3_path
+
+        :param job: instance of ScheduledJob
+        :type job: ScheduledJob
+
+        :rtype: tuple or None
         """
-        job_dict = job.get(s3_path=None)
         # s3_path sample: s3://bucket_name/logs/log_name/
-        s3_path = job_dict.get('s3_path')
+        s3_path = job.get(s3_path=None)['s3_path']
         if s3_path is None:
             return None
         bucket_name, prefix = parse_s3_path(s3_path)
@@ -385,13 +605,24 @@ class BaseScanner(object):
             log_name = prefix_list[-1]
         else:
             log_name = prefix_list[-2]
+        return bucket_name, log_name
+
+    def _get_max_complete_date(self, job):
+        """ Return the max_complete_date from aws
+
+        :param job: instance of ScheduledJob
+        :type job: ScheduledJob
+        """
+        log_key = self._get_log_key(job)
+        if log_key is None:
+            return None
         try:
-            log_data = get_log_meta_data(bucket_name, log_name)
+            log_data = get_log_meta_data(*log_key)
             return get_deep(log_data, ['log', 'max_complete_date'], None)
         except Exception:
             log_exception(
                 "Exception in running scanner when getting max_complete_date in s3 path: "
-                + s3_path
+                + job.get(s3_path=None)['s3_path']
             )
         return None
 
@@ -409,12 +640,7 @@ class BaseScanner(object):
         if max_complete_date is not None:
             return max_complete_date
 
-        utcnow = self._get_utc_now()
-        time_log_need_to_be_available = self._get_time_log_need_to_be_available(job)
-        if time_log_need_to_be_available is None:
-            time_log_need_to_be_available = "48:00"
-        hh, mm = time_log_need_to_be_available.split(':')
-        max_available_date = utcnow - timedelta(hours=int(hh), minutes=int(mm))
+        max_available_date = self._get_utc_now() - self._get_log_delay(job)
         return max_available_date.strftime('%Y-%m-%d')
 
     def _get_utc_now(self):
@@ -431,7 +657,7 @@ class BaseScanner(object):
         :returns: a 2 tuple containing a redshift host name and redshift port
         :rtype: tuple
         """
-        cluster = list_cluster_by_name(
+        cluster = list_cluster_by_name_cached(
             TableConnection.get_connection('RedshiftClusters'),
             rs_id)
 
@@ -477,7 +703,11 @@ class BaseScanner(object):
             # set is not JSON serializable so convert this member to a list
             # should be fine since we are not going to edit this in the backend
             job_dict['contact_emails'] = list(job_dict['contact_emails'])
-        self.worker_queue.write_message_to_queue(job_dict)
+        if self._work_msgs is not None:
+            # run_scanner writes them in batches
+            self._work_msgs.append(job_dict)
+        else:
+            self.worker_queue.write_message_to_queue(job_dict)
 
     def _get_timeout(self):
         """ Return the timeout of the scanner
@@ -489,6 +719,31 @@ def job2log(job):
     return job._record._item._data['uuid']
 
 
+def get_job_hash_keys(msgs, skip_unnamed=False):
+    """ Get the hash keys of the jobs scanner queue messages are about
+
+    :param msgs: messages from the scanner queue
+    :type msgs: list of JSONMessage
+    :param skip_unnamed: skip the messages that don't name a job instead of
+        returning None
+    :type skip_unnamed: bool
+    :returns: a list of distinct hash keys in message order, or None if a
+        message does not name a job
+    :rtype: list or None
+    """
+    hash_keys = []
+    for msg in msgs:
+        body = msg.get_body()
+        hash_key = body.get('hash_key') if isinstance(body, dict) else None
+        if hash_key is None:
+            if skip_unnamed:
+                continue
+            return None
+        if hash_key not in hash_keys:
+            hash_keys.append(hash_key)
+    return hash_keys
+
+
 def parse_cmd_args(sys_argv):
     """ Parse cmd args for scanners
     :param sys_argv: argv from command line
@@ -9,6 +9,7 @@ from mycroft.log_util import log
 from mycroft.models.aws_connections import TableConnection
 from mycroft.models.scheduled_jobs import JOBS_ETL_STATUSES_SCHEDULABLE
 from mycroft.models.scheduled_jobs import JOBS_ETL_STATUS_SCHEDULED
+from mycroft.models.scheduled_jobs import ScheduledJobInvalidStatusUpdate
 from staticconf import read_string
 from staticconf import read_int
 from mycroft.backend.util import next_date_for_string
@@ -27,12 +28,31 @@ class ETScanner(BaseScanner):
         # query self.db and return jobs
         statuses = JOBS_ETL_STATUSES_SCHEDULABLE
         result = [
-            job for s in statuses for job in self.db.get_jobs_with_et_status(s)
+            job for s in statuses for job in self._get_jobs_with_et_status(s)
         ]
         log(
             "ET scanner: num jobs to process from DB:" + str(len(result)))
         return result
 
+    def _is_job_for_work(self, job):
+        return job.get(et_status=None)['et_status'] in JOBS_ETL_STATUSES_SCHEDULABLE
+
+    def _get_work_due_time(self, job):
+        if not self._is_job_for_work(job):
+            return None
+        now = self._get_utc_now()
+        if self._action_pending(job):
+            return now
+        job_dict = job.get(start_date=None, et_last_successful_date=None)
+        next_date = self._later_date(
+            job_dict['start_date'],
+            next_date_for_string(job_dict['et_last_successful_date'])
+        )
+        if next_date is None:
+            return now
+        due = self._get_data_available_time(job, next_date)
+        return now if due is None else due
+
     def _should_process_job(self, job):
         if not super(ETScanner, self)._should_process_job(job):
             return False
@@ -43,8 +63,11 @@ class ETScanner(BaseScanner):
         return True
 
     def _update_job_status_conditionally(self, job):
-        # TODO no conditional updates?
-        return job.update(et_status=JOBS_ETL_STATUS_SCHEDULED)
+        # fails if another scanner scheduled the job since it was read
+        try:
+            return job.update(et_status=JOBS_ETL_STATUS_SCHEDULED)
+        except ScheduledJobInvalidStatusUpdate:
+            return False
 
     def _create_work_for_job(self, job):
         # Update status = SCHEDULED
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+**backend.scanners.job_index**
+==============================
+
+JobIndex is the scanner's in-memory copy of the ScheduledJobs table.  Jobs
+are grouped by et_status, so maintenance does not query DynamoDB once per
+status, and kept in a priority queue by the time they may next need work,
+so a sweep only looks at the jobs that are due.
+
+refresh() reads back only the jobs whose et_status_last_updated_at moved
+since the previous refresh, with a full scan every full_refresh_sec to
+pick up changes that don't touch the status, like a new or deleted job
+whose scanner message was lost.
+"""
+import heapq
+from datetime import timedelta
+from simplejson import loads
+
+
+class JobIndex(object):
+
+    def __init__(self, db, get_due_time, full_refresh_sec, refresh_overlap_sec):
+        """
+        :param db: the scheduled jobs
+        :type db: ScheduledJobs
+
+        :param get_due_time: function returning the datetime a job may next
+            need work at, or None if it won't until its et_status changes
+        :type get_due_time: function
+
+        :param full_refresh_sec: how often to scan the whole table
+        :type full_refresh_sec: int
+
+        :param refresh_overlap_sec: how far behind the last refresh a delta
+            refresh starts, to allow for clock skew among status writers
+        :type refresh_overlap_sec: int
+        """
+        self.db = db
+        self._get_due_time = get_due_time
+        self.full_refresh_sec = full_refresh_sec
+        self.refresh_overlap_sec = refresh_overlap_sec
+        self._last_full_refresh = None
+        self._updated_after = None
+        self._clear()
+        self._additional_arguments = {}
+
+    def _clear(self):
+        self._jobs = {}         # hash_key -> ScheduledJob
+        self._status = {}       # hash_key -> et_status the job is indexed by
+        self._by_status = {}    # et_status -> set of hash_keys
+        self._due = {}          # hash_key -> datetime the job is due at
+        self._due_heap = []     # (due datetime, hash_key), stale ones skipped
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def refresh(self, now):
+        """ Read the jobs updated since the last refresh, or all jobs if a
+        full refresh is due.
+
+        :param now: current UTC time
+        :type now: datetime
+        """
+        updated_after = str(now - timedelta(seconds=self.refresh_overlap_sec))
+        if self._last_full_refresh is None or \
+                now - self._last_full_refresh >= timedelta(seconds=self.full_refresh_sec):
+            jobs = list(self.db)
+            self._clear()
+            self._additional_arguments = {}
+            self._last_full_refresh = now
+        else:
+            jobs = self.db.get_jobs_with_et_status_updated_after(self._updated_after)
+        for job in jobs:
+            self.put(job)
+        self._updated_after = updated_after
+
+    def put(self, job):
+        """ Add or replace a job, and index it by its current et_status and
+        due time.  A job read before the one held is ignored, as a scan may
+        return an item older than the one the scanner just updated.
+
+        :param job: the job
+        :type job: ScheduledJob
+        """
+        hash_key = job.get(hash_key=None)['hash_key']
+        held = self._jobs.get(hash_key)
+        if held is not None and held is not job and \
+                _status_updated_at(held) > _status_updated_at(job):
+            return
+        self._jobs[hash_key] = job
+
+        status = job.get(et_status=None)['et_status']
+        old_status = self._status.get(hash_key)
+        if old_status != status:
+            if old_status is not None:
+                self._by_status[old_status].discard(hash_key)
+            self._by_status.setdefault(status, set()).add(hash_key)
+            self._status[hash_key] = status
+
+        due = self._get_due_time(job)
+        if due is None:
+            self._due.pop(hash_key, None)
+        elif self._due.get(hash_key) != due:
+            self._due[hash_key] = due
+            heapq.heappush(self._due_heap, (due, hash_key))
+
+    def remove(self, hash_key):
+        """ Drop a job that no longer exists """
+        self._jobs.pop(hash_key, None)
+        self._due.pop(hash_key, None)
+        status = self._status.pop(hash_key, None)
+        if status is not None:
+            self._by_status[status].discard(hash_key)
+
+    def get_jobs_with_et_status(self, et_status_value):
+        """ Return a list of the jobs with the given et_status """
+        return [self._jobs[hash_key]
+                for hash_key in self._by_status.get(et_status_value, ())]
+
+    def pop_due_jobs(self, now):
+        """ Return the jobs due at or before now, earliest first.  A job is
+        due again only once put back.
+
+        :param now: current UTC time
+        :type now: datetime
+        :rtype: list
+        """
+        jobs = []
+        while self._due_heap and self._due_heap[0][0] <= now:
+            due, hash_key = heapq.heappop(self._due_heap)
+            if self._due.get(hash_key) == due:
+                del self._due[hash_key]
+                jobs.append(self._jobs[hash_key])
+        return jobs
+
+    def get_additional_arguments(self, job):
+        """ Return the additional_arguments of a job as a dict, parsing each
+        distinct value once.  Callers must not modify the dict.
+        """
+        value = job.get(additional_arguments='{}')['additional_arguments']
+        parsed = self._additional_arguments.get(value)
+        if parsed is None:
+            parsed = loads(value)
+            self._additional_arguments[value] = parsed
+        return parsed
+
+
+def _status_updated_at(job):
+    return job.get(et_status_last_updated_at=None)['et_status_last_updated_at'] or ''
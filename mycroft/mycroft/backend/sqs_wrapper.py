@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
+import time
+
 import staticconf
+from mycroft.log_util import log
 from mycroft.log_util import log_exception
 from mycroft.models import aws_connections
 from boto.sqs.jsonmessage import JSONMessage
@@ -7,6 +10,26 @@ from boto.sqs.jsonmessage import JSONMessage
 from boto.exception import BotoClientError
 from boto.exception import BotoServerError
 
+# SQS takes at most 10 entries per batch request
+MAX_BATCH_SIZE = 10
+
+BATCH_RETRY_SLEEP_SEC = 0.2
+
+
+class SQSBatchError(Exception):
+
+    """ Raised when entries of a batch request still fail after retries """
+
+    def __init__(self, errors):
+        super(SQSBatchError, self).__init__(
+            "{0} batch entries failed: {1}".format(len(errors), errors))
+        self.errors = errors
+
+
+def _chunks(items, size=MAX_BATCH_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
 
 class SQSWrapper(object):
 
@@ -22,6 +45,13 @@ class SQSWrapper(object):
         self._wait_time_secs = staticconf.get_int(
             'sqs.wait_time_secs', 10
         )
+        self._batch_max_retries = staticconf.read_int(
+            'sqs.batch_max_retries', 3
+        )
+        self._prefetch_buffer_size = staticconf.read_int(
+            'sqs.prefetch_buffer_size', 0
+        )
+        self._prefetched = []   # (receive time, msg), oldest first
         self._queue = self._get_queue(queue_name)
         if self._queue is None:
             raise ValueError(
@@ -30,17 +60,17 @@ class SQSWrapper(object):
         self._queue.set_message_class(self.msg_class)
         self.queue_name = queue_name
         self.attributes = self._queue.get_attributes()
+        # a prefetched message must be handed out well before it's visible
+        # to other consumers again
+        self._prefetch_max_age_sec = staticconf.read_int(
+            'sqs.prefetch_max_age_sec',
+            int(self.attributes.get('VisibilityTimeout', 30)) / 2
+        )
 
-    def get_messages_from_queue(self):
-        """ Fetches messages from the sqs queue of name passed in during this
-        object's construction.
-        Does not handle exceptions from Boto.
-
-        :rtype: a list of SQS message or None
-        """
+    def _receive_messages(self, num_messages):
         try:
             msgs = self._queue.get_messages(
-                num_messages=self._num_messages_to_fetch,
+                num_messages=num_messages,
                 wait_time_seconds=self._wait_time_secs)
             return msgs
         except (BotoClientError, BotoServerError):
@@ -49,6 +79,36 @@ class SQSWrapper(object):
                 + self._queue.id)
             raise
 
+    def get_messages_from_queue(self):
+        """ Fetches messages from the sqs queue of name passed in during this
+        object's construction.
+        With sqs.prefetch_buffer_size set, up to that many more messages are
+        received and handed out by later calls, without waiting on sqs.
+        Does not handle exceptions from Boto.
+
+        :rtype: a list of SQS message or None
+        """
+        if self._prefetch_buffer_size <= 0:
+            return self._receive_messages(self._num_messages_to_fetch)
+
+        oldest_fresh = time.time() - self._prefetch_max_age_sec
+        while self._prefetched and self._prefetched[0][0] < oldest_fresh:
+            stale_msg = self._prefetched.pop(0)[1]
+            log("dropping stale prefetched message {0} of queue {1}".format(
+                stale_msg.id, self.queue_name))
+
+        if not self._prefetched:
+            msgs = self._receive_messages(min(
+                MAX_BATCH_SIZE,
+                self._num_messages_to_fetch + self._prefetch_buffer_size
+            ))
+            received_at = time.time()
+            self._prefetched = [(received_at, msg) for msg in msgs or []]
+
+        msgs = [entry[1] for entry in self._prefetched[:self._num_messages_to_fetch]]
+        del self._prefetched[:self._num_messages_to_fetch]
+        return msgs
+
     def write_message_to_queue(self, msg):
         """ Write arbitrary data to sqs queue
 
@@ -58,6 +118,51 @@ class SQSWrapper(object):
         message.set_body(msg)
         self._queue.write(message)
 
+    def _run_batch(self, request, entries, get_id):
+        """ Run a batch request on entries, MAX_BATCH_SIZE at a time,
+        retrying the entries failing for reasons other than their content.
+
+        :param request: boto call taking a list of entries, returning
+            BatchResults
+        :param entries: the entries
+        :type entries: list
+        :param get_id: function returning the batch entry id of an entry
+
+        :raises SQSBatchError: if entries still fail after retries
+        """
+        failed = []
+        for chunk in _chunks(entries):
+            for attempt in range(self._batch_max_retries + 1):
+                if attempt > 0:
+                    time.sleep(BATCH_RETRY_SLEEP_SEC * 2 ** (attempt - 1))
+                entry_by_id = dict((get_id(entry), entry) for entry in chunk)
+                errors = request(chunk).errors
+                failed.extend(error for error in errors if error.get('sender_fault') == 'true')
+                retryable = [error for error in errors if error.get('sender_fault') != 'true']
+                chunk = [entry_by_id[error['id']] for error in retryable]
+                if not chunk:
+                    break
+                log("retrying {0} failed batch entries of queue {1}: {2}".format(
+                    len(chunk), self.queue_name, retryable))
+            else:
+                failed.extend(retryable)
+        if failed:
+            raise SQSBatchError(failed)
+
+    def write_message_batch_to_queue(self, msgs):
+        """ Write arbitrary data to sqs queue, up to MAX_BATCH_SIZE messages
+        per request.
+
+        :param msgs: list of data to write, one message each
+        :raises SQSBatchError: if some messages could not be written
+        """
+        entries = []
+        for i, msg in enumerate(msgs):
+            message = self.msg_class()
+            message.set_body(msg)
+            entries.append((str(i), message.get_body_encoded(), 0))
+        self._run_batch(self._queue.write_batch, entries, lambda entry: entry[0])
+
     def delete_message_from_queue(self, msg):
         """ Delete given message from sqs. Throws exceptions from sqs to
         the caller.
@@ -67,7 +172,28 @@ class SQSWrapper(object):
         self._queue.delete_message(msg)
 
     def delete_message_batch_from_queue(self, msgs):
-        self._queue.delete_message_batch(msgs)
+        """ Delete given messages from sqs, up to MAX_BATCH_SIZE messages
+        per request.
+
+        :param msgs: messages obtained from sqs
+        :raises SQSBatchError: if some messages could not be deleted
+        """
+        self._run_batch(self._queue.delete_message_batch, msgs, lambda msg: msg.id)
+
+    def change_message_visibility_batch(self, msgs, visibility_timeout):
+        """ Keep given messages invisible for visibility_timeout more
+        seconds, up to MAX_BATCH_SIZE messages per request.
+
+        :param msgs: messages obtained from sqs
+        :param visibility_timeout: seconds from now
+        :type visibility_timeout: int
+        :raises SQSBatchError: if the timeout of some messages did not change
+        """
+        self._run_batch(
+            self._queue.change_message_visibility_batch,
+            [(msg, visibility_timeout) for msg in msgs],
+            lambda entry: entry[0].id
+        )
 
     def clear(self):
         """Delete all messages from sqs
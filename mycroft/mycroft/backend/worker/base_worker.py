@@ -1,7 +1,12 @@
 # -*- coding: utf-8 -*-
 from collections import namedtuple, defaultdict
+from contextlib import contextmanager
+import ctypes
 from datetime import datetime
 from datetime import timedelta
+import functools
+import itertools
+import multiprocessing
 import os
 from multiprocessing.pool import Pool
 from multiprocessing.pool import worker as default_worker
@@ -18,6 +23,7 @@ from sherlock.common.config_util import load_default_config
 from mycroft import log_util
 from mycroft.backend.sqs_wrapper import SQSWrapper
 from mycroft.backend.worker.etl_status_helper import ETLStatusHelper
+from mycroft.backend.worker.msg_heartbeat import MsgHeartbeat
 from mycroft.log_util import log
 from mycroft.log_util import log_exception
 from mycroft.models.aws_connections import TableConnection
@@ -33,7 +39,87 @@ from mycroft.models.scheduled_jobs import JOBS_ETL_ACTIONS
 from mycroft.backend.util import parse_results
 
 
-def worker_extended(inqueue, outqueue, initializer=None, initargs=(), maxtasks=None):
+class UnexpectedJobStatus(ValueError):
+    """ Raised when the job of a message is not waiting for the message """
+    pass
+
+
+class TaggedTask(object):
+    """ A pool task of the job identified by tag """
+
+    def __init__(self, tag, func):
+        self.tag = tag
+        self.func = func
+
+
+class TaskSlots(object):
+    """ Shared by a pool and its children to tell which child runs a task of
+    which job.  Every child claims a slot for its pid and keeps the tag of
+    the task it is running, 0 when idle, in the slot.  The slot also counts
+    the tagged tasks the child started, so a task is told apart from the
+    tasks the same child ran before it.
+    """
+
+    def __init__(self, num_slots):
+        self._lock = multiprocessing.Lock()
+        self._pids = multiprocessing.RawArray(ctypes.c_long, num_slots)
+        self._tags = multiprocessing.RawArray(ctypes.c_long, num_slots)
+        self._task_nums = multiprocessing.RawArray(ctypes.c_long, num_slots)
+
+    def claim(self, pid):
+        """ Claim a slot for pid, reusing the slots of exited children
+
+        :returns: the slot index or None if all slots are taken
+        """
+        with self._lock:
+            for slot, slot_pid in enumerate(self._pids):
+                if slot_pid != 0 and _is_pid_alive(slot_pid):
+                    continue
+                self._pids[slot] = pid
+                self._tags[slot] = 0
+                self._task_nums[slot] = 0
+                return slot
+        return None
+
+    def set_tag(self, slot, tag):
+        with self._lock:
+            self._tags[slot] = tag
+            if tag != 0:
+                self._task_nums[slot] += 1
+
+    def signal_tag(self, tag, skip_tasks, signum):
+        """ Send signum to the children running a task tagged with tag
+
+        :param skip_tasks: (pid, task number) of the tasks not to signal again
+        :type skip_tasks: set
+        :returns: a list of (pid, task number) of the tasks signalled
+        """
+        signalled = []
+        # holding the lock a child can't finish its task and pick up a task
+        # of another job before it is signalled
+        with self._lock:
+            for slot, pid in enumerate(self._pids):
+                task = (pid, self._task_nums[slot])
+                if pid == 0 or self._tags[slot] != tag or task in skip_tasks:
+                    continue
+                try:
+                    os.kill(pid, signum)
+                    signalled.append(task)
+                except OSError:
+                    pass    # exited since, the pool will reap it
+        return signalled
+
+
+def _is_pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    return True
+
+
+def worker_extended(inqueue, outqueue, initializer=None, initargs=(), maxtasks=None,
+                    task_slots=None):
     """ This worker is mostly copy-and-paste from from multiprocessing.pool
 
     :param inqueue: input queue to fetch command to execute
@@ -46,6 +132,8 @@ def worker_extended(inqueue, outqueue, initializer=None, initargs=(), maxtasks=N
     :type initargs: list
     :param maxtasks: Not used, solely for 2.6, 2.7 compatablitiy
     :type maxtasks: int
+    :param task_slots: slots to record the tag of the running task in
+    :type task_slots: TaskSlots
     """
     put = outqueue.put
     get = inqueue.get
@@ -53,6 +141,15 @@ def worker_extended(inqueue, outqueue, initializer=None, initargs=(), maxtasks=N
         inqueue._writer.close()
         outqueue._reader.close()
 
+    slot = None
+    if task_slots is not None:
+        slot = task_slots.claim(os.getpid())
+        if slot is None:
+            log('no task slot for worker {0}, it cannot be cancelled'.format(os.getpid()))
+        else:
+            # SIGINT cancels a task, so an idle worker ignores it
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+
     if initializer is not None:
         initializer(*initargs)
 
@@ -70,33 +167,81 @@ def worker_extended(inqueue, outqueue, initializer=None, initargs=(), maxtasks=N
             break
 
         job, i, func, args, kwds = task
+        tag = 0
+        if isinstance(func, TaggedTask):
+            tag, func = func.tag, func.func
+        if slot is not None:
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            task_slots.set_tag(slot, tag)
         try:
             result = (True, func(*args, **kwds))
         except Exception, e:
             log_exception('exception in {0}({1}, {2})'.format(func, args, kwds))
             result = (False, e)
+        if slot is not None:
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            task_slots.set_tag(slot, 0)
         put((job, i, result))
 
 
 class ProcessExtended(Process):
-    def __init__(self, group=None, target=None, name=None, args=(), kwargs={}):
+    def __init__(self, group=None, target=None, name=None, args=(), kwargs={},
+                 task_slots=None):
         if target == default_worker:
             # override default worker process with our own to have more control
             target = worker_extended
+            kwargs = dict(kwargs, task_slots=task_slots)
         super(ProcessExtended, self).__init__(group, target, name, args, kwargs)
 
 
 class PoolExtended(Pool):
+    """ A pool whose tasks may be tagged with the job they belong to, so the
+    tasks of one job can be cancelled without disturbing the others.
+    """
     Process = ProcessExtended
 
-    def cancel(self):
+    def __init__(self, processes=None, initializer=None, initargs=()):
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        # children exiting are replaced, leave room for both while reaping
+        self._task_slots = TaskSlots(2 * processes)
+        self.Process = functools.partial(ProcessExtended, task_slots=self._task_slots)
+        super(PoolExtended, self).__init__(processes, initializer, initargs)
+
+    def apply_async(self, func, args=(), kwds={}, callback=None, tag=None):
+        """ See :func:`multiprocessing.pool.Pool.apply_async`
+
+        :param tag: a positive integer identifying the job of the task,
+            see :func:`cancel`
+        :type tag: int
+        """
+        if tag is not None:
+            func = TaggedTask(tag, func)
+        return super(PoolExtended, self).apply_async(func, args, kwds, callback)
+
+    def cancel(self, tag=None, skip_tasks=()):
+        """ Send SIGINT to the children running tasks tagged with tag, or to
+        all children if tag is None
+
+        :param skip_tasks: (pid, task number) of the tasks already cancelled,
+            as returned by earlier calls
+        :type skip_tasks: set
+        :returns: a list of (pid, task number) of the tasks signalled, the
+            task numbers are None if tag is None
+        """
+        if tag is not None:
+            return self._task_slots.signal_tag(tag, skip_tasks, signal.SIGINT)
+
+        signalled = []
         for worker in self._pool:
             # copied exception handling from multiprocessing.forking terminate()
             try:
                 os.kill(worker._popen.pid, signal.SIGINT)
+                signalled.append((worker._popen.pid, None))
             except OSError:
                 if worker._popen.wait(timeout=0.1) is None:
                     raise
+        return signalled
 
 
 class WorkerJob(object):
@@ -107,6 +252,7 @@ class WorkerJob(object):
     :func:`mycroft.backend.worker.base_worker.WorkerJob.run_complete'
     Subclasses may need to implement
     :func:`mycroft.backend.worker.base_worker.WorkerJob.has_incomplete_runs'
+    :func:`mycroft.backend.worker.base_worker.WorkerJob.can_schedule_next_run'
     methods.  For more details, see doc string for each method
     """
 
@@ -126,13 +272,19 @@ class WorkerJob(object):
         self.cancel_in_progress = False
         self.pause_in_progress = False
         self.last_keepalive_update_sec = 0
+        # tags the job's tasks in the worker's pool, see PoolExtended
+        self.pool_tag = None
+        # (pid, task number) of the tasks sent a cancel, see PoolExtended.cancel
+        self.cancelled_tasks = set()
 
     def update_action_requests(self):
         """  get the values of action requests from table """
 
         if self.cancel_in_progress and self.pause_in_progress:
             return
-        job = self.worker._get_scheduled_job(self.msg_dict['hash_key'])
+        job = self.worker._get_scheduled_job(
+            self.msg_dict['hash_key'], attributes=self.ACTION_REQUESTED_DICT.keys()
+        )
         result = job.get(**self.ACTION_REQUESTED_DICT)
         # convert the non-boolean value to boolean
         self.actions = dict((k, False if v in [0, None] else True) for k, v in result.items())
@@ -188,6 +340,16 @@ class WorkerJob(object):
         """
         raise NotImplementedError
 
+    def can_schedule_next_run(self):
+        """ checks if the next run may start now.  A job with more runs to
+        schedule may still have to wait, e.g. for its own runs in flight or
+        for a resource shared with other jobs.
+
+        returns: True if schedule_next_run may be called now, False otherwise
+        rtype: bool
+        """
+        return True
+
     def schedule_next_run(self):
         """ selects next run to execute
         returns: a run tuple(id, step, function, function_arguments)
@@ -221,7 +383,7 @@ class BaseMycroftWorker(object):
     """
 
     def __init__(self, config_loc, config_override_loc, emailer,
-                 num_processes=1, wait_timeout_sec=60):
+                 num_processes=1, wait_timeout_sec=60, max_concurrent_jobs=None):
         """
         :param config_loc: path of config.yaml
         :type config_loc: string
@@ -239,6 +401,11 @@ class BaseMycroftWorker(object):
             function.  If thread is woken up on timeout, do some maintenance work.
         :type wait_timeout_sec: int
 
+        :param max_concurrent_jobs: number of sqs requests processed at once,
+            read from worker.max_concurrent_jobs if None.  Runs of all of them
+            share worker.num_et_processes_per_host run slots.
+        :type max_concurrent_jobs: int
+
         """
         self._config_loc = config_loc
         self._config_override_loc = config_override_loc
@@ -252,6 +419,26 @@ class BaseMycroftWorker(object):
         self._cond = threading.Condition(threading.Lock())
         self._wait_timeout_sec = max(wait_timeout_sec, 60)
         self.emailer = emailer
+        if max_concurrent_jobs is None:
+            max_concurrent_jobs = staticconf.read_int(
+                'worker.max_concurrent_jobs', 1
+            )
+        self._max_concurrent_jobs = max(max_concurrent_jobs, 1)
+        self._max_runs_in_flight = max(staticconf.read_int(
+            'worker.num_et_processes_per_host', num_processes
+        ), 1)
+        # all below are protected by _cond
+        self._runs_in_flight = 0
+        self._active_jobs = []
+        self._msgs_in_progress = 0
+        self._et_pool = None
+        self._pool_tags = itertools.count(1)
+        # with a visibility timeout, messages are deleted once processed
+        # and a message of a dead worker is taken over by another
+        self._msg_visibility_timeout_sec = staticconf.read_int(
+            'worker.msg_visibility_timeout_sec', 0
+        )
+        self._msg_heartbeat = None
 
     def stop(self):
         """ Stop a running worker.
@@ -264,84 +451,35 @@ class BaseMycroftWorker(object):
     def run(self):
         """Main entry point for the worker. Queries an SQS queue for messages
         and performs the appropriate action on each message received.
-        Swallows all exceptions and logs them.
+        Up to max_concurrent_jobs messages are processed at once, each in
+        its own thread.  Swallows all exceptions and logs them.
         """
         queue_name = str(self._get_queue_name())
         sqs = self._get_sqs_wrapper(queue_name, JSONMessage)
 
         scanner_queue_name = str(self._get_scanner_queue_name())
         scanner_sqs = self._get_sqs_wrapper(scanner_queue_name, JSONMessage)
-        dummy_message = {"message": "dummy"}  # TODO: make this message meaningful
 
+        # fork before any message thread is running
+        self._get_et_pool()
+        self.etl_helper.start()
+        if self._msg_visibility_timeout_sec > 0:
+            self._msg_heartbeat = MsgHeartbeat(
+                sqs, self._msg_visibility_timeout_sec
+            ).start()
+        msg_threads = []
         while(not self._stop_requested):  # Loop forever while this variable is set.
             try:  # Main try-except
+                if not self._wait_for_free_msg_slot():
+                    continue
                 for msg in sqs.get_messages_from_queue():
-                    msg_body = msg.get_body()
-                    log({
-                        "status": "new message",
-                        "queue": queue_name,
-                        "msg": msg_body,
-                    })
-
-                    results = None
-                    final_status = JOBS_ETL_STATUS_ERROR
-                    lsd = None
-                    try:
-                        self._update_scheduled_jobs_on_etl_start(msg_body)
-                        # safe to delete message. if worker dies, scanner will resubmit
-                        sqs.delete_message_from_queue(msg)
-
-                        try:
-                            # Execute etl
-                            results, action_dict = self._process_msg(msg)
-
-                            # Parse results
-                            final_status, lsd, extra_info = \
-                                parse_results(results, msg_body['end_date'])
-                            if final_status != JOBS_ETL_STATUS_COMPLETE:
-                                if action_dict['delete_requested']:
-                                    final_status = JOBS_ETL_STATUS_DELETED
-                                elif action_dict['cancel_requested']:
-                                    final_status = JOBS_ETL_STATUS_CANCELLED
-                                elif action_dict['pause_requested']:
-                                    final_status = JOBS_ETL_STATUS_PAUSED
-
-                            log({
-                                "status": "processed message OK",
-                                "queue": queue_name,
-                                "msg": msg_body,
-                                "results": results,
-                                "job status": final_status,
-                                "last OK date": lsd,
-                            })
-                        except Exception:
-                            final_status = JOBS_ETL_STATUS_ERROR
-                            log_exception(
-                                "Exception in processing msg from queue: " +
-                                queue_name + " msg body:" + str(msg_body)
-                            )
-                        if final_status != JOBS_ETL_STATUS_DELETED:
-                            self._update_scheduled_jobs_on_etl_complete(
-                                msg_body, final_status, lsd
-                            )
-                        scanner_sqs.write_message_to_queue(dummy_message)
-                        try:
-                            self.emailer.mail_result(
-                                final_status, msg_body, additional_info=extra_info
-                            )
-                            log(
-                                "Sent emails to:" + str(msg_body['contact_emails'])
-                            )
-                        except Exception:
-                            log_exception(
-                                "Exception in sending emails of job:" +
-                                str(msg_body)
-                            )
-                    except Exception:
-                        log_exception(
-                            "Failed to update scheduled jobs on etl"
-                            " start/complete, msg body: " + str(msg_body)
-                        )
+                    # more messages may be fetched than there are free slots
+                    while not self._wait_for_free_msg_slot():
+                        pass
+                    msg_threads = [t for t in msg_threads if t.is_alive()]
+                    msg_threads.append(
+                        self._start_msg_thread(msg, sqs, scanner_sqs, queue_name)
+                    )
             except Exception:  # end of main try-except
                 log_exception(
                     "Exception in fetching messages from queue:"
@@ -352,22 +490,224 @@ class BaseMycroftWorker(object):
             if self._run_once:
                 break
 
+        for msg_thread in msg_threads:
+            msg_thread.join()
+        if self._msg_heartbeat is not None:
+            self._msg_heartbeat.stop()
+            self._msg_heartbeat = None
+        try:
+            self.etl_helper.stop()
+        except Exception:
+            log_exception("Exception in writing etl records on stop")
+        self._close_et_pool()
         self._stop_requested = False
 
+    def _get_et_pool(self):
+        """ Get the pool running the tasks of all jobs.  It is created once
+        and lives until run returns, so its children are forked a single
+        time, with the config and sherlock modules already loaded, and stay
+        warm across jobs.
+        """
+        self._cond.acquire()
+        try:
+            if self._et_pool is None:
+                self._et_pool = PoolExtended(processes=self._max_runs_in_flight)
+            return self._et_pool
+        finally:
+            self._cond.release()
+
+    def _close_et_pool(self):
+        self._cond.acquire()
+        try:
+            et_pool, self._et_pool = self._et_pool, None
+        finally:
+            self._cond.release()
+        if et_pool is not None:
+            et_pool.close()
+            et_pool.join()
+
+    def _wait_for_free_msg_slot(self):
+        """ Wait up to wait_timeout_sec for fewer than max_concurrent_jobs
+        messages to be in progress.
+
+        returns: True if a message can be started, False on timeout
+        rtype: bool
+        """
+        self._cond.acquire()
+        try:
+            if self._msgs_in_progress >= self._max_concurrent_jobs:
+                self._cond.wait(self._wait_timeout_sec)
+            return self._msgs_in_progress < self._max_concurrent_jobs
+        finally:
+            self._cond.release()
+
+    def _start_msg_thread(self, msg, sqs, scanner_sqs, queue_name):
+        self._cond.acquire()
+        try:
+            self._msgs_in_progress += 1
+        finally:
+            self._cond.release()
+
+        msg_thread = threading.Thread(
+            target=self._handle_msg_in_thread,
+            args=(msg, sqs, scanner_sqs, queue_name),
+        )
+        msg_thread.daemon = True
+        try:
+            msg_thread.start()
+        except Exception:
+            self._msg_done()
+            raise
+        return msg_thread
+
+    def _msg_done(self):
+        self._cond.acquire()
+        try:
+            self._msgs_in_progress -= 1
+            self._cond.notify_all()
+        finally:
+            self._cond.release()
+
+    def _handle_msg_in_thread(self, msg, sqs, scanner_sqs, queue_name):
+        try:
+            self._handle_msg(msg, sqs, scanner_sqs, queue_name)
+        except Exception:
+            log_exception("Exception in handling msg from queue: " + queue_name)
+        finally:
+            self._msg_done()
+
+    def _handle_msg(self, msg, sqs, scanner_sqs, queue_name):
+        """ Run the job of a single message to completion, then record its
+        final status, notify the scanner and email the job contacts.
+        """
+        msg_body = msg.get_body()
+        log({
+            "status": "new message",
+            "queue": queue_name,
+            "msg": msg_body,
+        })
+
+        results = None
+        final_status = JOBS_ETL_STATUS_ERROR
+        lsd = None
+        extra_info = None
+        heartbeat = self._msg_heartbeat
+        try:
+            try:
+                self._update_scheduled_jobs_on_etl_start(msg_body)
+            except (KeyError, UnexpectedJobStatus):
+                if heartbeat is not None:
+                    # the job is gone or has its message, this is a duplicate
+                    self._delete_msg(sqs, msg)
+                raise
+            if heartbeat is None:
+                # safe to delete message. if worker dies, scanner will resubmit
+                sqs.delete_message_from_queue(msg)
+            else:
+                heartbeat.add(msg)
+
+            try:
+                # Execute etl
+                results, action_dict = self._process_msg(msg)
+
+                # Parse results
+                final_status, lsd, extra_info = \
+                    parse_results(results, msg_body['end_date'])
+                if final_status != JOBS_ETL_STATUS_COMPLETE:
+                    if action_dict['delete_requested']:
+                        final_status = JOBS_ETL_STATUS_DELETED
+                    elif action_dict['cancel_requested']:
+                        final_status = JOBS_ETL_STATUS_CANCELLED
+                    elif action_dict['pause_requested']:
+                        final_status = JOBS_ETL_STATUS_PAUSED
+
+                log({
+                    "status": "processed message OK",
+                    "queue": queue_name,
+                    "msg": msg_body,
+                    "results": results,
+                    "job status": final_status,
+                    "last OK date": lsd,
+                })
+            except Exception:
+                final_status = JOBS_ETL_STATUS_ERROR
+                log_exception(
+                    "Exception in processing msg from queue: " +
+                    queue_name + " msg body:" + str(msg_body)
+                )
+            if final_status != JOBS_ETL_STATUS_DELETED:
+                # record the runs before the job is marked done; runs left
+                # unwritten are retried in the background
+                try:
+                    self.etl_helper.flush_job(msg_body['uuid'])
+                except Exception:
+                    log_exception("Exception in writing etl records of job:" + str(msg_body))
+                self._update_scheduled_jobs_on_etl_complete(
+                    msg_body, final_status, lsd
+                )
+            scanner_sqs.write_message_to_queue(
+                {"message": "job done", "hash_key": msg_body['hash_key']}
+            )
+            try:
+                self.emailer.mail_result(
+                    final_status, msg_body, additional_info=extra_info
+                )
+                log(
+                    "Sent emails to:" + str(msg_body['contact_emails'])
+                )
+            except Exception:
+                log_exception(
+                    "Exception in sending emails of job:" +
+                    str(msg_body)
+                )
+        except Exception:
+            log_exception(
+                "Failed to update scheduled jobs on etl"
+                " start/complete, msg body: " + str(msg_body)
+            )
+        finally:
+            if heartbeat is not None and heartbeat.remove(msg):
+                self._delete_msg(sqs, msg)
+
+    def _delete_msg(self, sqs, msg):
+        try:
+            sqs.delete_message_from_queue(msg)
+        except Exception:
+            log_exception("Exception in deleting msg: " + str(msg.get_body()))
+
+    def _is_abandoned(self, job):
+        """ Check if the worker running a job died, i.e. if its keepalive is
+        older than a visibility timeout.  The message of the job was visible
+        again only after that long without a heartbeat.
+        """
+        status_ts_value = job.get(et_status_last_updated_at=None)['et_status_last_updated_at']
+        if status_ts_value is None:
+            return True
+        last_update = datetime.strptime(status_ts_value, '%Y-%m-%d %H:%M:%S.%f')
+        return datetime.utcnow() - last_update >= \
+            timedelta(seconds=self._msg_visibility_timeout_sec)
+
     def _update_scheduled_jobs_on_etl_start(self, msg_dict):
-        """ Update scheduled jobs status from scheduled to running
+        """ Update scheduled jobs status from scheduled to running.  With a
+        msg heartbeat, a running job whose worker died is taken over.
         """
         new_kwargs = {"et_status": JOBS_ETL_STATUS_RUNNING}
 
-        job = self._get_scheduled_job(msg_dict['hash_key'])
-        job_status = job.get(**new_kwargs)['et_status']
-        if job_status == JOBS_ETL_STATUS_SCHEDULED:
-            self._update_scheduled_jobs(msg_dict['hash_key'], new_kwargs)
-            job_status = new_kwargs['et_status']
-        else:
-            raise ValueError(
-                "Unexpected job status {0} for job {1}".format(job_status, job.__dict__)
-            )
+        # the job is read once for the check and the update
+        with self.jobs_db.identity_map():
+            job = self._get_scheduled_job(msg_dict['hash_key'])
+            job_status = job.get(**new_kwargs)['et_status']
+            if job_status == JOBS_ETL_STATUS_SCHEDULED:
+                self._update_scheduled_jobs(msg_dict['hash_key'], new_kwargs)
+                job_status = new_kwargs['et_status']
+            elif job_status == JOBS_ETL_STATUS_RUNNING and \
+                    self._msg_heartbeat is not None and self._is_abandoned(job):
+                log("taking over job of a dead worker, msg body: " + str(msg_dict))
+                self._update_scheduled_jobs(msg_dict['hash_key'], new_kwargs)
+            else:
+                raise UnexpectedJobStatus(
+                    "Unexpected job status {0} for job {1}".format(job_status, job.__dict__)
+                )
         return job_status
 
     def _update_scheduled_jobs_on_etl_complete(
@@ -388,27 +728,28 @@ class BaseMycroftWorker(object):
         num_retries_field = 'et_num_error_retries'
         next_retry_field = 'et_next_error_retry_attempt'
 
-        if final_status == JOBS_ETL_STATUS_ERROR:
-            job = self.jobs_db.get(hash_key=msg_dict['hash_key'])
-            args = {num_retries_field: -1}
-            fields = job.get(**args)
-            num_retries = int(fields[num_retries_field]) + 1
-
-            if num_retries < self.max_error_retries:
-                # exponential backoff
-                next_retry = timedelta(seconds=(300 * (2 ** num_retries))) + now
-                new_kwargs[next_retry_field] = str(next_retry)
-            new_kwargs[num_retries_field] = num_retries
-        elif final_status == JOBS_ETL_STATUS_SUCCESS:
-            # If not reset, perpetual jobs will eventually reach max retries
-            # and auto-retry will stops working.  Delete by setting to None
-            new_kwargs[num_retries_field] = None
-            new_kwargs[next_retry_field] = None
-
-        self._update_scheduled_jobs(msg_dict['hash_key'], new_kwargs)
-
-    def _get_scheduled_job(self, hash_key):
-        job = self.jobs_db.get(hash_key=hash_key)
+        with self.jobs_db.identity_map():
+            if final_status == JOBS_ETL_STATUS_ERROR:
+                job = self.jobs_db.get(hash_key=msg_dict['hash_key'])
+                args = {num_retries_field: -1}
+                fields = job.get(**args)
+                num_retries = int(fields[num_retries_field]) + 1
+
+                if num_retries < self.max_error_retries:
+                    # exponential backoff
+                    next_retry = timedelta(seconds=(300 * (2 ** num_retries))) + now
+                    new_kwargs[next_retry_field] = str(next_retry)
+                new_kwargs[num_retries_field] = num_retries
+            elif final_status == JOBS_ETL_STATUS_SUCCESS:
+                # If not reset, perpetual jobs will eventually reach max retries
+                # and auto-retry will stops working.  Delete by setting to None
+                new_kwargs[num_retries_field] = None
+                new_kwargs[next_retry_field] = None
+
+            self._update_scheduled_jobs(msg_dict['hash_key'], new_kwargs)
+
+    def _get_scheduled_job(self, hash_key, attributes=None):
+        job = self.jobs_db.get(hash_key=hash_key, attributes=attributes)
         if job is None:
             raise ValueError(
                 "Could not find job entry for hash key {0}".format(hash_key)
@@ -416,14 +757,39 @@ class BaseMycroftWorker(object):
         return job
 
     def _update_scheduled_jobs(self, hash_key, new_kwargs):
-        job = self._get_scheduled_job(hash_key)
-        ret = job.update(**new_kwargs)
+        # a conditional write, no need to read the job first
+        ret = self.jobs_db.update(hash_key, **new_kwargs)
         if not ret:
             raise ValueError(
                 "Could not update scheduled jobs entry for etl start/finish,"
                 " hash key:" + hash_key + " return value: " + str(ret)
             )
 
+    @contextmanager
+    def _cond_released(self):
+        """ Release the lock the caller holds for the duration of the block,
+        so a slow DynamoDB call in it does not stall the other jobs and the
+        pool's callbacks
+        """
+        self._cond.release()
+        try:
+            yield
+        finally:
+            self._cond.acquire()
+
+    def _record_run_complete(self, job, run_id, step, result):
+        """ Write the status of a completed run.  Called without the lock.
+
+        :returns: True if the status was written
+        :rtype: bool
+        """
+        try:
+            self.etl_helper.etl_step_complete(job.msg_dict, run_id, step, result)
+            return True
+        except Exception:
+            log_exception('_run_complete_callback')
+            return False
+
     def _run_complete_callback(self, job, run_id, step, results):
         """ Callback invoked when a single run is done
 
@@ -436,26 +802,35 @@ class BaseMycroftWorker(object):
         :param results: run results
         :type: list
         """
-        self._cond.acquire()
         try:
             if len(results) != 1:
                 raise ValueError("len(results) != 1, {0}".format(results))
             log("done: {0}, {1}, {2}".format(run_id, step, results[0]['status']))
+        except Exception:
+            # if callback dies, et_pool stops working
+            log_exception('_run_complete_callback')
+            return
+        # written before the run is counted done, so the job can't finish
+        # before its runs are recorded
+        recorded = self._record_run_complete(job, run_id, step, results[0])
 
+        self._cond.acquire()
+        try:
             job.all_results[run_id].extend(results)
             job.runs_done += 1
             job.runs_in_flight -= 1
+            self._runs_in_flight -= 1
 
             if job.runs_in_flight < 0:
                 raise ValueError("runs_in_flight < 0 \
     ({0} < 0)".format(job.runs_in_flight))
 
-            if job.is_waiting is True:
-                self._cond.notify(n=1)
+            # a freed run slot may go to any waiting job, not only this one
+            self._cond.notify_all()
 
-            self.etl_helper.etl_step_complete(job.msg_dict, run_id, step, results[0])
-            job.run_complete(run_id, step, results)
-        except:
+            if recorded:
+                job.run_complete(run_id, step, results)
+        except Exception:
             # if callback dies, et_pool stops working
             log_exception('_run_complete_callback')
         finally:
@@ -466,6 +841,35 @@ class BaseMycroftWorker(object):
             job, run_id, step, results
         )
 
+    def _can_take_run_slot_lk(self, job):
+        """ Checks if job could start a run now, ignoring other jobs.
+        suffix '_lk' means caller must already hold lock.
+        """
+        return (not job.cancel_in_progress and
+                job.runs_in_flight < job.max_runs_in_flight and
+                self._has_more_runs_to_schedule(job) and
+                job.can_schedule_next_run())
+
+    def _may_schedule_run_lk(self, job):
+        """ Checks if job may start a run now.  Run slots are shared by all
+        active jobs; a slot goes to the job with the fewest runs in flight so
+        a long job cannot starve the jobs that arrived after it.
+        suffix '_lk' means caller must already hold lock.
+
+        :param job: current job
+        :type: WorkerJob
+        """
+        if self._runs_in_flight >= self._max_runs_in_flight:
+            return False
+        if not self._can_take_run_slot_lk(job):
+            return False
+        for other in self._active_jobs:
+            if other is not job and \
+                    other.runs_in_flight < job.runs_in_flight and \
+                    self._can_take_run_slot_lk(other):
+                return False
+        return True
+
     def _schedule_runs_lk(self, et_pool, job):
         """ Schedule runs to execute up to max possible parallelism
         suffix '_lk' means caller must already hold lock.
@@ -475,8 +879,8 @@ class BaseMycroftWorker(object):
         :param job: current job
         :type: WorkerJob
         """
-        while (self._has_more_runs_to_schedule(job) and
-               job.runs_in_flight < job.max_runs_in_flight):
+        scheduled = False
+        while self._may_schedule_run_lk(job):
             run = job.schedule_next_run()
             if run.id is None:
                 raise ValueError("Unexpected end of runs")
@@ -488,15 +892,24 @@ class BaseMycroftWorker(object):
                 run.func,
                 args=run.args,
                 callback=self._create_run_complete_callback(job, run.id, run.step),
+                tag=job.pool_tag,
             )
             job.runs_in_flight += 1
+            self._runs_in_flight += 1
+            scheduled = True
+        if scheduled:
+            # let jobs with fewer runs in flight take the next free slot
+            self._cond.notify_all()
 
     def _handle_job_delete(self, job):
         """ Delete job. Start by deleting runs first.  If we die during deletion
-        we can resume deletion until entry is deleted from jobs table
+        we can resume deletion until entry is deleted from jobs table.
+        Called without the lock.
         """
         jobid = job.msg_dict['uuid']
 
+        # runs not written yet would come back after the delete
+        self.etl_helper.discard_job(jobid)
         result = self.runs_db.delete_job_runs(jobid)
         if not result:
             raise Exception("failed to delete all runs for job {0}".format(jobid))
@@ -506,17 +919,22 @@ class BaseMycroftWorker(object):
             raise Exception("failed to delete job {0}".format(jobid))
 
     def _handle_cancel_request_lk(self, job, et_pool):
-        """ Cancel currently executing job.  Send SIGINT to all children,
-        ignore SIGINT in parent to prevent killing it.
+        """ Cancel currently executing job.  Send SIGINT to the children
+        running its tasks; children running tasks of other jobs are left
+        alone.  Called again while the cancel is in progress, as a task
+        queued before the cancel may start running after it.
 
         Note: suffix '_lk' means caller must already hold lock.
 
         :param job: current job
         """
-        log("cancel detected, terminating")
+        if not job.cancel_in_progress:
+            log("cancel detected, terminating")
         if job.runs_in_flight != 0:
-            log("sending cancel request")
-            et_pool.cancel()
+            tasks = et_pool.cancel(job.pool_tag, job.cancelled_tasks)
+            if tasks:
+                log("sent cancel request to {0}".format([pid for pid, _ in tasks]))
+                job.cancelled_tasks.update(tasks)
 
     def _has_more_runs_to_schedule(self, job):
         if job.has_incomplete_runs():
@@ -541,17 +959,23 @@ class BaseMycroftWorker(object):
         msg_dict = etl_msg.get_body()
 
         job = self.create_worker_job(msg_dict)
-        et_pool = PoolExtended(processes=self._num_processes)
+        et_pool = self._get_et_pool()
         self._cond.acquire()
+        job.pool_tag = next(self._pool_tags)
+        self._active_jobs.append(job)
         try:
             while True:
-                job.update_action_requests()
-
-                if job.actions['delete_requested'] is True:
-                    self._handle_job_delete(job)
+                # DynamoDB is read and written without the lock, the job's
+                # state is only changed with it
+                with self._cond_released():
+                    job.update_action_requests()
+                    delete_requested = job.actions['delete_requested'] is True
+                    if delete_requested:
+                        self._handle_job_delete(job)
+                if delete_requested:
                     break
 
-                if not job.cancel_in_progress and job.actions['cancel_requested'] is True:
+                if job.actions['cancel_requested'] is True:
                     self._handle_cancel_request_lk(job, et_pool)
                     job.cancel_in_progress = True
 
@@ -567,12 +991,17 @@ class BaseMycroftWorker(object):
                     self._schedule_runs_lk(et_pool, job)
                 job.is_waiting = True
                 self._cond.wait(self._wait_timeout_sec)
-                job.update_keepalive()
                 job.is_waiting = False
+                with self._cond_released():
+                    job.update_keepalive()
         finally:
+            # the pool outlives the job, wait for runs left behind by a
+            # delete or an error as closing a per job pool used to
+            while job.runs_in_flight > 0:
+                self._cond.wait(self._wait_timeout_sec)
+            self._active_jobs.remove(job)
+            self._cond.notify_all()
             self._cond.release()
-            et_pool.close()
-            et_pool.join()
         return job.all_results, job.actions
 
     def _get_queue_name(self):
@@ -2,6 +2,7 @@
 import copy
 import os
 import sys
+from simplejson import loads
 import staticconf
 
 from mycroft.backend.email import Mailer
@@ -10,7 +11,6 @@ from mycroft.backend.worker.base_worker import setup_config
 from mycroft.backend.worker.base_worker import WorkerJob
 from mycroft.backend.worker.log_format_dict import FORMAT_TO_MRJOB
 from mycroft.backend.util import date_string_generator
-from mycroft.backend.util import next_date_for_string
 from mycroft.log_util import log
 
 from sherlock.common.pipeline import get_base_args_parser
@@ -38,23 +38,55 @@ def parse_cmd_args(sys_argv):
     return args
 
 
+def get_additional_arguments(msg_dict):
+    """ additional_arguments of a job, a json string in the jobs table and a
+    dict in sqs messages
+    """
+    args_dict = msg_dict.get('additional_arguments') or {}
+    if isinstance(args_dict, basestring):
+        args_dict = loads(args_dict)
+    return args_dict
+
+
 class ImdWorkerJob(WorkerJob):
-    def __init__(self, worker, msg_dict, max_runs_in_flight):
+    """ Runs the et and load steps of every date of a job.
+
+    Steps form a DAG: the load of a date needs the et of the date and the
+    load of the date before it, so data becomes available in date order and
+    et_last_successful_date only moves forward.  Up to et_parallelism ets
+    run at once, at most et_lookahead dates ahead of the next load (0 for
+    no limit).  Once a date fails no more ets are started.  Loads of jobs
+    writing to the same redshift schema wait for each other, see
+    :func:`ImdWorker.get_load_target`.
+    """
+
+    def __init__(self, worker, msg_dict, et_parallelism, et_lookahead=0):
+        # one more run than ets so a load never waits for an et to finish
         super(ImdWorkerJob, self).__init__(
-            worker, msg_dict, max_runs_in_flight
+            worker, msg_dict, et_parallelism + 1
         )
         self.start = self.msg_dict['script_start_date_arg']
         self.end = self.msg_dict['script_end_date_arg']
         self.step = 1
-        self.et_date_gen = date_string_generator(self.start, self.end, self.step)
-        self.load_date_gen = date_string_generator(self.start, self.end, self.step)
-        self.scheduled_et_date = None
-        self.scheduled_load_date = None
+        self.dates = list(date_string_generator(self.start, self.end, self.step))
+        self.et_parallelism = et_parallelism
+        self.et_lookahead = et_lookahead
+        self.next_et_index = 0
+        self.next_load_index = 0
+        self.et_runs_in_flight = 0
         self.load_runs_in_flight = 0
         self.stop_load_due_to_failure = False
+        self.load_target = self.worker.get_load_target(msg_dict)
+
+    @property
+    def scheduled_load_date(self):
+        if self.next_load_index == 0:
+            return None
+        return self.dates[self.next_load_index - 1]
 
     def run_complete(self, run_date, step, results):
         if step == 'load':
+            self.worker.release_load_target(self.load_target)
             if results[0]['status'] != 'success':
                 if self.stop_load_due_to_failure:
                     raise ValueError("Unexpected 2nd failure: {0}".format(run_date))
@@ -74,8 +106,10 @@ class ImdWorkerJob(WorkerJob):
                 kwargs = {'et_last_successful_date': run_date}
                 self.worker._update_scheduled_jobs(self.msg_dict['hash_key'], kwargs)
 
-        elif step != 'et':
-            ValueError("Unexpected '{0}'".format(step))
+        elif step == 'et':
+            self.et_runs_in_flight -= 1
+        else:
+            raise ValueError("Unexpected '{0}'".format(step))
 
     def _is_ready_for_load_step(self, run_date):
         run_results = self.all_results.get(run_date)
@@ -84,25 +118,44 @@ class ImdWorkerJob(WorkerJob):
 
         return run_results[-1].get('status', 'unknown') == 'success'
 
+    def _is_load_blocked(self):
+        """ True once no more dates can be loaded: a load failed or the et
+        of the next date to load did
+        """
+        if self.stop_load_due_to_failure:
+            return True
+        if self.next_load_index == len(self.dates):
+            return False
+        next_load_date = self.dates[self.next_load_index]
+        return next_load_date in self.all_results and \
+            not self._is_ready_for_load_step(next_load_date)
+
     def _has_more_load_runs_to_schedule(self):
         if self.stop_load_due_to_failure:
             return False
 
         if self.load_runs_in_flight != 0:
-            return False    # only single load run in flight is possible for redshift
-
-        if self.scheduled_load_date is None:
-            return self._is_ready_for_load_step(self.start)
+            return False    # loads of a job are done in date order
 
-        if self.scheduled_load_date == self.end:
+        if self.next_load_index == len(self.dates):
             return False
 
-        return self._is_ready_for_load_step(
-            next_date_for_string(self.scheduled_load_date, self.step)
-        )
+        return self._is_ready_for_load_step(self.dates[self.next_load_index])
 
     def _has_more_et_runs_to_schedule(self):
-        return self.scheduled_et_date is None or self.scheduled_et_date != self.end
+        return self.next_et_index != len(self.dates) and not self._is_load_blocked()
+
+    def _can_schedule_load_run(self):
+        return self._has_more_load_runs_to_schedule() and \
+            self.worker.is_load_target_free(self.load_target)
+
+    def _can_schedule_et_run(self):
+        if self.pause_in_progress or not self._has_more_et_runs_to_schedule():
+            return False
+        if self.et_runs_in_flight >= self.et_parallelism:
+            return False
+        return self.et_lookahead == 0 or \
+            self.next_et_index - self.next_load_index < self.et_lookahead
 
     def has_incomplete_runs(self):
         return self._has_more_load_runs_to_schedule()
@@ -110,6 +163,9 @@ class ImdWorkerJob(WorkerJob):
     def has_more_runs_to_schedule(self):
         return self._has_more_et_runs_to_schedule()
 
+    def can_schedule_next_run(self):
+        return self._can_schedule_load_run() or self._can_schedule_et_run()
+
     def schedule_next_run(self):
         """ Schedule next run to execute.
         First check if we can do load to make data available ASAP.
@@ -118,12 +174,16 @@ class ImdWorkerJob(WorkerJob):
         """
         step = None
 
-        if self._has_more_load_runs_to_schedule():
-            date_string = self.scheduled_load_date = self.load_date_gen.next()
+        if self._can_schedule_load_run():
+            date_string = self.dates[self.next_load_index]
+            self.next_load_index += 1
             self.load_runs_in_flight += 1
+            self.worker.acquire_load_target(self.load_target)
             step = 'load'
-        elif self._has_more_et_runs_to_schedule():
-            date_string = self.scheduled_et_date = self.et_date_gen.next()
+        elif self._can_schedule_et_run():
+            date_string = self.dates[self.next_et_index]
+            self.next_et_index += 1
+            self.et_runs_in_flight += 1
             step = 'et'
         else:
             raise ValueError("Unexpected call to schedule next run for job: {0}".format(self))
@@ -166,8 +226,11 @@ class ImdWorker(BaseMycroftWorker):
             config_loc,
             config_override_loc,
             emailer,
-            num_processes=3,
+            num_processes=staticconf.read_int('worker.et_parallelism', 3),
         )
+        self.et_lookahead = staticconf.read_int('worker.et_lookahead', 0)
+        # load targets with a load in flight, protected by _cond
+        self._load_targets_in_use = set()
         for key in self.KEYS_TO_LOAD:
             self.__setattr__(key, staticconf.read_string(key))
         if dummy_run:
@@ -185,10 +248,40 @@ class ImdWorker(BaseMycroftWorker):
         log(dict((k, str(v))for k, v in vars(self).iteritems()))
 
     def create_worker_job(self, job_request):
+        """ Create a job running ets with the et_parallelism and et_lookahead
+        of its additional_arguments, defaulting to the worker's
+        """
+        args_dict = get_additional_arguments(job_request)
+        et_parallelism = int(args_dict.get('et_parallelism', self._num_processes))
+        et_lookahead = int(args_dict.get('et_lookahead', self.et_lookahead))
         return ImdWorkerJob(
             self,
             job_request,
-            self._num_processes)
+            max(1, min(et_parallelism, self._max_runs_in_flight)),
+            max(0, et_lookahead))
+
+    def get_load_target(self, msg_dict):
+        """ Loads into the same redshift schema are serialized, loads into
+        different clusters or schemas may run at once
+        """
+        args_dict = get_additional_arguments(msg_dict)
+        return (
+            msg_dict.get('redshift_host'),
+            msg_dict.get('redshift_port'),
+            args_dict.get('redshift_database', 'dev'),
+            msg_dict.get('redshift_schema'),
+        )
+
+    def is_load_target_free(self, load_target):
+        return load_target not in self._load_targets_in_use
+
+    def acquire_load_target(self, load_target):
+        if load_target in self._load_targets_in_use:
+            raise ValueError("Load target in use: {0}".format(load_target))
+        self._load_targets_in_use.add(load_target)
+
+    def release_load_target(self, load_target):
+        self._load_targets_in_use.discard(load_target)
 
     def _get_default_args_list(self):
         """ Return the base list of args for sherlock that remains unchanged
@@ -2,21 +2,178 @@
 from datetime import datetime
 import os
 import socket
+import threading
+
+import staticconf
 
 from mycroft.log_util import log_debug
+from mycroft.log_util import log_exception
+from mycroft.logic.run_actions import ETL_RECORD_ARGS
 from mycroft.models.aws_connections import TableConnection
 
+# items per BatchWriteItem request
+WRITE_BATCH_SIZE = 25
+
+
+def _runtime_secs(start_time_str, end_time_str):
+    start_time = datetime.strptime(start_time_str, '%Y-%m-%d %H:%M:%S.%f')
+    end_time = datetime.strptime(end_time_str, '%Y-%m-%d %H:%M:%S.%f')
+    td = end_time - start_time
+    return td.days * 86400 + td.seconds + td.microseconds / 1000000.0
+
 
 class ETLStatusHelper(object):
 
     """ A helper to record etl status into ETLRecords dynamodb table.
     Constructs appropriate entries from a given SQS message dict and inserts
     into the table.
+
+    With write_behind, the run records are kept in memory and only the
+    latest state of each is written, in batches, from a thread started by
+    start() every flush_interval_sec or once a batch is full.  A run record
+    is read back once, before its first write, so a put keeps the fields of
+    the other step.  flush_job writes the runs of a job synchronously.
     """
 
-    def __init__(self):
+    def __init__(self, write_behind=None, flush_interval_sec=None):
+        """
+        :param write_behind: batch the writes, read from
+            worker.etl_status_write_behind if None
+        :type write_behind: bool
+
+        :param flush_interval_sec: most time a write is delayed, read from
+            worker.etl_status_flush_interval_sec if None
+        :type flush_interval_sec: int
+        """
         self.etl_db = TableConnection.get_connection('ETLRecords')
         self.worker_id = '{0}:{1}'.format(socket.gethostname(), os.getpid())
+        if write_behind is None:
+            write_behind = staticconf.read_bool('worker.etl_status_write_behind', False)
+        self.write_behind = write_behind
+        if flush_interval_sec is None:
+            flush_interval_sec = staticconf.read_int('worker.etl_status_flush_interval_sec', 5)
+        self.flush_interval_sec = max(flush_interval_sec, 1)
+        # held while writing runs, so a discarded job is not written after
+        self._flush_lock = threading.Lock()
+        self._cond = threading.Condition(threading.Lock())
+        # all below are protected by _cond
+        self._runs = {}         # (job_id, run_id) -> fields of the run record
+        self._loaded = set()    # runs whose fields include the stored record
+        self._dirty = set()     # runs with fields not written yet
+        self._flush_now = False
+        self._stop_requested = False
+        self._thread = None
+
+    def start(self):
+        """ Start writing runs in the background, if write_behind """
+        with self._cond:
+            self._stop_requested = False
+        if self.write_behind:
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """ Stop the background writes, and write the runs left """
+        with self._cond:
+            self._stop_requested = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._flush_now and not self._stop_requested:
+                    self._cond.wait(self.flush_interval_sec)
+                if self._stop_requested:
+                    return
+                self._flush_now = False
+                if not self._dirty:
+                    continue
+            try:
+                self.flush()
+            except Exception:
+                # the runs stay dirty and are retried on the next flush
+                log_exception("Exception in writing etl records")
+
+    def _write_behind(self, new_args):
+        key = (new_args['job_id'], new_args['data_date'])
+        with self._cond:
+            self._runs.setdefault(key, {}).update(new_args)
+            self._dirty.add(key)
+            if len(self._dirty) >= WRITE_BATCH_SIZE:
+                self._flush_now = True
+                self._cond.notify_all()
+
+    def flush(self, job_id=None):
+        """ Write the runs not written yet in batches
+
+        :param job_id: only write the runs of this job, all runs if None
+        :type job_id: string
+        """
+        with self._flush_lock:
+            with self._cond:
+                keys = [key for key in self._dirty if job_id is None or key[0] == job_id]
+                unloaded = [key for key in keys if key not in self._loaded]
+            if not keys:
+                return
+
+            stored = {}
+            if unloaded:
+                for run in self.etl_db.batch_get(
+                    [{'hash_key': key[0], 'data_date': key[1]} for key in unloaded]
+                ):
+                    fields = run.get(**ETL_RECORD_ARGS)
+                    stored[(fields['hash_key'], fields['data_date'])] = fields
+
+            with self._cond:
+                for key in unloaded:
+                    fields = stored.get(key, {})
+                    fields.update(self._runs[key])
+                    self._runs[key] = fields
+                    self._loaded.add(key)
+                items = [dict(self._runs[key]) for key in keys]
+                self._dirty.difference_update(keys)
+            try:
+                self.etl_db.batch_put(items)
+            except Exception:
+                with self._cond:
+                    self._dirty.update(keys)
+                raise
+            log_debug("Wrote {0} etl records".format(len(items)))
+
+    def flush_job(self, job_id):
+        """ Write the runs of a job, and forget them once written
+
+        :param job_id: uuid of the job
+        :type job_id: string
+        """
+        self.flush(job_id)
+        with self._flush_lock:
+            with self._cond:
+                self._forget_job_lk(job_id, dirty_too=False)
+
+    def discard_job(self, job_id):
+        """ Forget the runs of a job without writing them, e.g. before
+        deleting them
+
+        :param job_id: uuid of the job
+        :type job_id: string
+        """
+        with self._flush_lock:
+            with self._cond:
+                self._forget_job_lk(job_id, dirty_too=True)
+
+    def _forget_job_lk(self, job_id, dirty_too):
+        for key in [key for key in self._runs if key[0] == job_id]:
+            if dirty_too or key not in self._dirty:
+                del self._runs[key]
+                self._loaded.discard(key)
+                self._dirty.discard(key)
 
     def _init_args_from_msg_dict(self, msg_dict, status=None):
         return {
@@ -46,6 +203,11 @@ class ETLStatusHelper(object):
         new_args['{0}_starttime'.format(step)] = new_args['updated_at']
         new_args['data_date'] = run_id
 
+        # a run without an id fails below, as it always has
+        if self.write_behind and run_id is not None:
+            self._write_behind(new_args)
+            return
+
         existing_run = [
             run for run in self.etl_db.get_runs_with_job_id(
                 msg_dict['uuid'], run_id
@@ -84,35 +246,43 @@ class ETLStatusHelper(object):
         new_args = self._init_args_from_msg_dict(msg_dict)
         etl_err = str(result.get('error_info')) if result['status'] != 'success' else None
 
-        # Add or update an entry in etl records table
-        existing_run = [
-            run for run in self.etl_db.get_runs_with_job_id(
-                msg_dict['uuid'], run_id
-            )
-        ]
-
         # Update fields from the record
         new_args.update({
             'etl_status': step + '_' + result['status'],
             'data_date': run_id,
             'etl_error': etl_err,
         })
+        end_time_str = new_args['updated_at']
+
+        if self.write_behind:
+            with self._cond:
+                fields = self._runs.get((msg_dict['uuid'], run_id))
+                start_time_str = None if fields is None else fields.get(step + '_starttime')
+            # a run started by this helper is in memory, others are rare
+            # enough to be read and written right away
+            if fields is not None:
+                runtime_secs = _runtime_secs(start_time_str or end_time_str, end_time_str)
+                new_args.update({step + '_runtime': str(runtime_secs)})
+                self._write_behind(new_args)
+                return
+
+        # Add or update an entry in etl records table
+        existing_run = [
+            run for run in self.etl_db.get_runs_with_job_id(
+                msg_dict['uuid'], run_id
+            )
+        ]
 
         if len(existing_run) > 1:
             raise ValueError("Expected 0 or 1 entries in runs")
 
         if len(existing_run) == 1:
             existing_run = existing_run[0]
-            end_time_str = new_args['updated_at']
 
             kwargs = {step + '_starttime': None}
             start_time_str = existing_run.get(**kwargs).get(step + '_starttime', end_time_str)
 
-            start_time = datetime.strptime(start_time_str, '%Y-%m-%d %H:%M:%S.%f')
-            end_time = datetime.strptime(end_time_str, '%Y-%m-%d %H:%M:%S.%f')
-
-            td = end_time - start_time
-            runtime_secs = td.days * 86400 + td.seconds + td.microseconds / 1000000.0
+            runtime_secs = _runtime_secs(start_time_str, end_time_str)
             new_args.update({step + '_runtime': str(runtime_secs)})
             ret = existing_run.update(**new_args)
         else:
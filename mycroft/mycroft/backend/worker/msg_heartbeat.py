@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+**backend.worker.msg_heartbeat**
+================================
+
+MsgHeartbeat keeps the sqs messages a worker is processing invisible to
+other workers, by extending their visibility timeout from a single thread
+every interval_sec.  If the worker dies, its messages become visible again
+within visibility_timeout_sec and another worker picks them up.
+"""
+import threading
+
+from mycroft.log_util import log_exception
+
+
+class MsgHeartbeat(object):
+
+    def __init__(self, sqs, visibility_timeout_sec, interval_sec=None):
+        """
+        :param sqs: the queue the messages were received from
+        :type sqs: SQSWrapper
+
+        :param visibility_timeout_sec: how long a beat keeps messages invisible
+        :type visibility_timeout_sec: int
+
+        :param interval_sec: time between beats, a third of
+            visibility_timeout_sec if None
+        :type interval_sec: int
+        """
+        self.sqs = sqs
+        self.visibility_timeout_sec = visibility_timeout_sec
+        self.interval_sec = interval_sec or max(visibility_timeout_sec / 3, 1)
+        self._cond = threading.Condition(threading.Lock())
+        # all below are protected by _cond
+        self._msgs = {}     # msg id -> msg
+        self._beat_now = False
+        self._stop_requested = False
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._cond:
+            self._stop_requested = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def add(self, msg):
+        """ Keep msg invisible until it is removed, starting with a beat
+        right away, since the queue's default timeout may be shorter than
+        the interval
+        """
+        with self._cond:
+            self._msgs[msg.id] = msg
+            self._beat_now = True
+            self._cond.notify_all()
+
+    def remove(self, msg):
+        """ Stop extending the visibility of msg
+
+        returns: True if msg was added and not removed yet
+        rtype: bool
+        """
+        with self._cond:
+            return self._msgs.pop(msg.id, None) is not None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._beat_now and not self._stop_requested:
+                    self._cond.wait(self.interval_sec)
+                if self._stop_requested:
+                    return
+                self._beat_now = False
+                msgs = self._msgs.values()
+            if not msgs:
+                continue
+            try:
+                self.sqs.change_message_visibility_batch(msgs, self.visibility_timeout_sec)
+            except Exception:
+                # a message deleted during the beat fails, the others are
+                # retried on the next beat
+                log_exception("Exception in extending the visibility of messages")
@@ -7,6 +7,7 @@ option is used, the cluster will be upserted.
 Recommended Usage:
     docker run -i -t mycroft python -m mycroft.batch.add_cluster --help
 """
+from mycroft.logic.cluster_actions import invalidate_clusters
 from mycroft.models.aws_connections import TableConnection
 from sherlock.common.config_util import load_default_config
 
@@ -93,6 +94,7 @@ class AddClusterBatch(object):
             self._upsert_cluster()
         else:
             self._add_cluster()
+        invalidate_clusters(self.args.cluster_name)
         self._display_cluster_info()
 
     def _configure_mycroft(self):
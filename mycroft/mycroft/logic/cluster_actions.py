@@ -5,10 +5,19 @@
 
 A collection of functions to handle actions relating to clusters
 in the mycroft service.  The C part of MVC for mycroft/clusters
+
+list_cluster_by_name_cached keeps clusters for cluster_cache_ttl_sec.
+Anything writing clusters must call invalidate_clusters; a process can
+only invalidate its own cache, others see the change within the ttl.
 """
 
+from copy import deepcopy
 import simplejson
 import re
+import threading
+import time
+
+import staticconf
 
 from sherlock.common.redshift_psql import DEFAULT_NAMESPACE
 
@@ -20,6 +29,10 @@ REQUIRED_POST_ARGS = frozenset([
     "host",
 ])
 
+# cluster_name -> (expiry time, cluster dict)
+_clusters = {}
+_clusters_lock = threading.Lock()
+
 CLUSTER_KWARGS = {
     'redshift_id': None,
     'port': None,
@@ -125,6 +138,48 @@ def list_cluster_by_name(redshift_clusters_object, cluster_name):
     return _construct_cluster_dict(cluster)
 
 
+def list_cluster_by_name_cached(redshift_clusters_object, cluster_name):
+    """
+    list_cluster_by_name, reading the backing store only if the cluster
+    isn't cached.  Clusters that don't exist are not cached.
+
+    :param redshift_clusters_object: the RedshiftClusters from which we read clusters
+    :type redshift_clusters_object: an instance of RedshiftClusters
+    :param cluster_name: name of the redshift cluster (e.g., cluster)
+    :type cluster_name: string
+
+    :returns: a cluster dict, like list_cluster_by_name
+    :rtype: dict
+    """
+    ttl_sec = staticconf.read_int('cluster_cache_ttl_sec', 0)
+    if ttl_sec <= 0:
+        return list_cluster_by_name(redshift_clusters_object, cluster_name)
+
+    with _clusters_lock:
+        cached = _clusters.get(cluster_name)
+    if cached is not None and cached[0] > time.time():
+        return deepcopy(cached[1])
+
+    cluster = list_cluster_by_name(redshift_clusters_object, cluster_name)
+    with _clusters_lock:
+        _clusters[cluster_name] = (time.time() + ttl_sec, deepcopy(cluster))
+    return cluster
+
+
+def invalidate_clusters(cluster_name=None):
+    """
+    invalidate_clusters drops a cluster from the cache of this process
+
+    :param cluster_name: name of the redshift cluster, or None for all
+    :type cluster_name: string
+    """
+    with _clusters_lock:
+        if cluster_name is None:
+            _clusters.clear()
+        else:
+            _clusters.pop(cluster_name, None)
+
+
 def _check_required_args(param_dict):
     """
     :param param_dict: parameters to enter into the backing store
@@ -184,4 +239,7 @@ def post_cluster(redshift_clusters_object, request_body_str):
 
     _check_required_args(request_body_dict)
 
-    return {'post_accepted': redshift_clusters_object.put(**request_body_dict)}
+    try:
+        return {'post_accepted': redshift_clusters_object.put(**request_body_dict)}
+    finally:
+        invalidate_clusters(request_body_dict['redshift_id'])
@@ -13,7 +13,12 @@ import uuid
 import datetime
 
 from mycroft.models.abstract_records import PrimaryKeyError
-from mycroft.logic.cluster_actions import list_cluster_by_name
+from mycroft.logic.cluster_actions import list_cluster_by_name_cached
+from mycroft.logic.pagination import decode_page_token
+from mycroft.logic.pagination import encode_page_token
+from mycroft.logic.pagination import parse_date
+from mycroft.logic.pagination import parse_fields
+from mycroft.logic.pagination import parse_limit
 from mycroft.models.aws_connections import TableConnection
 from mycroft.models.scheduled_jobs import JOBS_ETL_STATUSES_FINAL
 from mycroft.models.scheduled_jobs import JOBS_ETL_ACTIONS
@@ -57,7 +62,6 @@ SCHEDULED_JOB_KWARGS = {
     'additional_arguments': None,
 }
 
-UUID_TRIES = 2  # times to obtain a non-conflicting UUID
 NULL = "null"  # used for initialization of job status
 
 
@@ -89,14 +93,18 @@ def _parse_jobs(query_result):
     :rtype: dict
 
     """
-    def construct_job_dict(job_object):
-        job_dict = job_object.get(**SCHEDULED_JOB_KWARGS)
-        contact_emails = job_dict.get('contact_emails', None)
-        if contact_emails:
-            job_dict['contact_emails'] = list(contact_emails)
-        return job_dict
+    return {'jobs': [_construct_job_dict(job) for job in query_result]}
+
 
-    return {'jobs': [construct_job_dict(job) for job in query_result]}
+def _construct_job_dict(job_object, fields=None):
+    if fields is None:
+        job_dict = job_object.get(**SCHEDULED_JOB_KWARGS)
+    else:
+        job_dict = job_object.get(**dict.fromkeys(fields))
+    contact_emails = job_dict.get('contact_emails', None)
+    if contact_emails:
+        job_dict['contact_emails'] = list(contact_emails)
+    return job_dict
 
 
 def list_all_jobs(scheduled_jobs_object):
@@ -128,6 +136,63 @@ def list_all_jobs(scheduled_jobs_object):
     return _parse_jobs(all_jobs)
 
 
+def list_jobs_page(scheduled_jobs_object, limit=None, page_token=None, et_status=None,
+                   redshift_id=None, from_date=None, to_date=None, fields=None):
+    """
+    lists a page of jobs, filtered by the store rather than after reading
+    the whole table
+
+    *Each job returned in the list is of the form of list_all_jobs, with only
+    the fields requested*
+
+    :param scheduled_jobs_object: the ScheduledJobs from which we read jobs
+    :type scheduled_jobs_object: an instance of ScheduledJobs
+    :param limit: most jobs in the page, see parse_limit
+    :type limit: string or None
+    :param page_token: next_page_token of the previous page, None for the
+        first page
+    :type page_token: string or None
+    :param et_status: only jobs with this et_status
+    :type et_status: string or None
+    :param redshift_id: only jobs of this cluster
+    :type redshift_id: string or None
+    :param from_date: only jobs starting on or after this YYYY-MM-DD
+    :type from_date: string or None
+    :param to_date: only jobs starting on or before this YYYY-MM-DD
+    :type to_date: string or None
+    :param fields: comma separated fields to return, None for all of them
+    :type fields: string or None
+
+    :returns: A dict of \{'jobs': [job1, job2, ...], 'next_page_token': token\},
+        next_page_token being None after the last page
+    :rtype: dict
+
+    :raises ValueError: for an invalid parameter
+    """
+    limit = parse_limit(limit)
+    page_key = decode_page_token(page_token)
+    fields = parse_fields(fields, SCHEDULED_JOB_KWARGS.keys())
+    from_date = parse_date(from_date, 'from_date')
+    to_date = parse_date(to_date, 'to_date')
+
+    filters = {}
+    if redshift_id is not None:
+        filters['redshift_id__eq'] = redshift_id
+    if from_date is not None and to_date is not None:
+        filters['start_date__between'] = (from_date, to_date)
+    elif from_date is not None:
+        filters['start_date__gte'] = from_date
+    elif to_date is not None:
+        filters['start_date__lte'] = to_date
+
+    jobs, page_key = scheduled_jobs_object.get_jobs_page(
+        limit, page_key=page_key, attributes=fields, et_status=et_status, **filters)
+    return {
+        'jobs': [_construct_job_dict(job, fields) for job in jobs],
+        'next_page_token': encode_page_token(page_key),
+    }
+
+
 def list_jobs_by_name(log_name, scheduled_jobs_object):
     """
     lists all jobs for a particular log_name
@@ -198,16 +263,6 @@ def list_jobs_by_name_version(log_name, log_version, scheduled_jobs_object):
     return _parse_jobs(filtered_jobs)
 
 
-def _get_uuid(scheduled_jobs_object):
-    current_jobs = list_all_jobs(scheduled_jobs_object)
-    current_job_uuids = [job.get('uuid', None) for job in current_jobs['jobs']]
-    trial_uuids = [uuid.uuid4().hex for i in range(UUID_TRIES)]
-    for trial_uuid in trial_uuids:
-        if trial_uuid not in current_job_uuids:
-            return trial_uuid
-    raise ValueError("all uuid's {0} conflicted with existing records".format(trial_uuids))
-
-
 def _create_hash_key(param_dict):
     """
     :param param_dict: parameters to enter into the backing store
@@ -308,18 +363,24 @@ def post_job(scheduled_jobs_object, et_scanner_sqs, request_body_str):
     request_body_dict['additional_arguments'] = _validate_additional_args(request_body_dict)
 
     # check that redshift cluster exists, throws ItemNotFound
-    list_cluster_by_name(
+    list_cluster_by_name_cached(
         TableConnection.get_connection('RedshiftClusters'),
         request_body_dict['redshift_id']
     )
 
     request_body_dict['hash_key'] = _create_hash_key(request_body_dict)
-    request_body_dict['uuid'] = _get_uuid(scheduled_jobs_object)
+    # a random uuid4 won't collide, and the put fails rather than replace
+    # a job with the same hash_key
+    request_body_dict['uuid'] = uuid.uuid4().hex
     request_body_dict['et_status'] = NULL
+    # a scanner job index reads back jobs by the time of their status
+    request_body_dict['et_status_last_updated_at'] = str(datetime.datetime.utcnow())
     ret = scheduled_jobs_object.put(**request_body_dict)
     if ret:
-        dummy_message = {'message': 'dummy'}  # TODO: use meaningful message instead of dummy
-        et_scanner_sqs.write_message_to_queue(dummy_message)
+        # the scanner creates work for the job named by hash_key right away
+        notification_message = {'message': 'job post request',
+                                'hash_key': request_body_dict['hash_key']}
+        et_scanner_sqs.write_message_to_queue(notification_message)
     return {'post_accepted': {'result': ret, 'uuid': request_body_dict['uuid']}}
 
 
@@ -377,7 +438,7 @@ def put_job(scheduled_jobs_object, et_scanner_sqs, request_body_str):
 
     ret = job.update(**request_body_dict)
     if ret:
-        notification_message = {'message': 'job put request'}
+        notification_message = {'message': 'job put request', 'hash_key': hash_key}
         et_scanner_sqs.write_message_to_queue(notification_message)
 
     return {'put_accepted': ret}
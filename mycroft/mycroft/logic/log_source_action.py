@@ -5,10 +5,35 @@
 
 A collection of functions to handle actions relating to source logs
 in the mycroft service.  The C part of MVC for mycroft/log_source
+
+Log meta data from the log finder is cached for log_finder_cache_ttl_sec,
+and concurrent lookups of the same log share a single request.
 """
+import Queue
+import sys
+import threading
+import time
+
 import requests
 import staticconf
 
+from mycroft.log_util import log_exception
+
+# (bucket_name, log_name) -> (expiry time, log meta data)
+_log_meta_data = {}
+# (bucket_name, log_name) -> _Fetch of the request in flight
+_log_meta_data_fetches = {}
+_log_meta_data_lock = threading.Lock()
+
+
+class _Fetch(object):
+    """ A log finder request other threads can wait for """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.exc_info = None
+
 
 def search_log_source_by_keyword(request_body):
     disabled_logfinder = staticconf.read_bool('disable_logfinder_service')
@@ -26,19 +51,114 @@ def search_log_source_by_keyword(request_body):
     return content
 
 
-def get_log_meta_data(bucket_name, log_name):
-    if bucket_name is None or log_name is None:
-        return None
-
+def _fetch_log_meta_data(bucket_name, log_name):
     if staticconf.read_bool('disable_logfinder_service'):
         return None
 
     # send HTTP request
     endpoint = staticconf.read_string('log_finder_buckets_end_point') \
         + '/' + bucket_name + '/' + log_name
-    response = requests.get(endpoint)
+    response = requests.get(
+        endpoint,
+        timeout=staticconf.read_float('log_finder_timeout_sec', None)
+    )
 
     # if we get a bad HTTP status, raise an exception
     response.raise_for_status()
 
     return response.json()
+
+
+def get_log_meta_data(bucket_name, log_name):
+    """
+    get_log_meta_data gets the log finder's meta data of a log, from the
+    cache if it's there; a failed request is not cached
+
+    Args:
+    bucket_name -- the s3 bucket of the log
+    log_name -- the name of the log
+
+    Returns:
+    the decoded json response, or None
+    """
+    if bucket_name is None or log_name is None:
+        return None
+
+    ttl_sec = staticconf.read_int('log_finder_cache_ttl_sec', 0)
+    if ttl_sec <= 0:
+        return _fetch_log_meta_data(bucket_name, log_name)
+
+    key = (bucket_name, log_name)
+    with _log_meta_data_lock:
+        cached = _log_meta_data.get(key)
+        if cached is not None and cached[0] > time.time():
+            return cached[1]
+        fetch = _log_meta_data_fetches.get(key)
+        is_fetcher = fetch is None
+        if is_fetcher:
+            fetch = _Fetch()
+            _log_meta_data_fetches[key] = fetch
+
+    if not is_fetcher:
+        fetch.done.wait()
+        if fetch.exc_info is not None:
+            raise fetch.exc_info[0], fetch.exc_info[1], fetch.exc_info[2]
+        return fetch.result
+
+    try:
+        fetch.result = _fetch_log_meta_data(bucket_name, log_name)
+        with _log_meta_data_lock:
+            _log_meta_data[key] = (time.time() + ttl_sec, fetch.result)
+        return fetch.result
+    except Exception:
+        fetch.exc_info = sys.exc_info()
+        raise
+    finally:
+        with _log_meta_data_lock:
+            del _log_meta_data_fetches[key]
+        fetch.done.set()
+
+
+def prefetch_log_meta_data(keys):
+    """
+    prefetch_log_meta_data fills the cache with the meta data of many logs,
+    with at most log_finder_prefetch_threads requests at a time.  Failures
+    are logged and left for get_log_meta_data to retry.
+
+    Args:
+    keys -- (bucket_name, log_name) tuples
+    """
+    num_threads = staticconf.read_int('log_finder_prefetch_threads', 0)
+    if num_threads <= 0 or staticconf.read_int('log_finder_cache_ttl_sec', 0) <= 0 \
+            or staticconf.read_bool('disable_logfinder_service', False):
+        return
+
+    pending = Queue.Queue()
+    for key in set(keys):
+        pending.put(key)
+
+    def prefetch():
+        while True:
+            try:
+                bucket_name, log_name = pending.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                get_log_meta_data(bucket_name, log_name)
+            except Exception:
+                log_exception("Exception in prefetching log meta data of: {0}".format(
+                    (bucket_name, log_name)))
+
+    threads = [threading.Thread(target=prefetch)
+               for _ in range(min(num_threads, pending.qsize()))]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def clear_log_meta_data_cache():
+    """ Drop every cached log meta data """
+    with _log_meta_data_lock:
+        _log_meta_data.clear()
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+**logic.pagination**
+====================
+
+Helpers for the paged list endpoints of the mycroft service.
+
+A page token is the DynamoDB key the previous page stopped at, as url safe
+base64 of its json, so clients treat it as opaque and send it back as is.
+"""
+
+import base64
+import binascii
+import datetime
+from decimal import Decimal
+
+import simplejson
+
+DEFAULT_PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 1000
+DATE_FORMAT = "%Y-%m-%d"
+
+# types of the values of a DynamoDB key, as decoded by boto
+KEY_VALUE_TYPES = (basestring, int, long, Decimal)
+
+
+def encode_page_token(page_key):
+    """
+    encode_page_token returns the token of the page starting after
+    page_key, or None if there's no next page
+
+    :param page_key: the last key of the page, from the backing store
+    :type page_key: dict or None
+
+    :rtype: string or None
+    """
+    if page_key is None:
+        return None
+    token = base64.urlsafe_b64encode(simplejson.dumps(page_key, sort_keys=True))
+    return token.rstrip('=')
+
+
+def decode_page_token(page_token):
+    """
+    decode_page_token returns the key a page token was made of, or None
+    for no token
+
+    :param page_token: a token from encode_page_token
+    :type page_token: string or None
+
+    :rtype: dict or None
+
+    :raises ValueError: for a token not made by encode_page_token
+    """
+    if not page_token:
+        return None
+    try:
+        padded = str(page_token) + '=' * (-len(page_token) % 4)
+        page_key = simplejson.loads(base64.urlsafe_b64decode(padded), use_decimal=True)
+    except (TypeError, ValueError, UnicodeError, binascii.Error):
+        raise ValueError("invalid page_token")
+    if not isinstance(page_key, dict) or not page_key or \
+            not all(isinstance(value, KEY_VALUE_TYPES) for value in page_key.itervalues()):
+        raise ValueError("invalid page_token")
+    return page_key
+
+
+def get_page_params(params, allowed_params):
+    """
+    get_page_params returns the query parameters of a paged request as
+    keyword arguments
+
+    :param params: the query parameters
+    :type params: dict or webob MultiDict
+    :param allowed_params: the parameters the endpoint takes
+    :type allowed_params: frozenset
+
+    :rtype: dict
+
+    :raises ValueError: for an unknown parameter
+    """
+    unknown = set(params.keys()) - allowed_params
+    if unknown:
+        raise ValueError("unknown parameters {0}".format(sorted(unknown)))
+    return dict((str(key), value) for key, value in params.items())
+
+
+def parse_limit(limit):
+    """
+    parse_limit returns the number of items a page holds
+
+    :param limit: requested page size, DEFAULT_PAGE_LIMIT if None
+    :type limit: string, int or None
+
+    :rtype: int
+
+    :raises ValueError: if limit is not an int from 1 to MAX_PAGE_LIMIT
+    """
+    if limit is None:
+        return DEFAULT_PAGE_LIMIT
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise ValueError("invalid limit {0}".format(limit))
+    if limit < 1 or limit > MAX_PAGE_LIMIT:
+        raise ValueError("limit must be between 1 and {0}".format(MAX_PAGE_LIMIT))
+    return limit
+
+
+def parse_fields(fields, allowed_fields):
+    """
+    parse_fields returns the fields listed in a comma separated string
+
+    :param fields: comma separated field names, None for all fields
+    :type fields: string or None
+    :param allowed_fields: the fields that may be selected
+    :type allowed_fields: iterable
+
+    :returns: the selected fields, or None for all of them
+    :rtype: list or None
+
+    :raises ValueError: for an unknown or empty list of fields
+    """
+    if fields is None:
+        return None
+    selected = [field.strip() for field in fields.split(',') if field.strip()]
+    if not selected:
+        raise ValueError("no fields selected")
+    unknown = set(selected) - set(allowed_fields)
+    if unknown:
+        raise ValueError("unknown fields {0}".format(sorted(unknown)))
+    return sorted(set(selected))
+
+
+def parse_date(date, name):
+    """
+    parse_date checks a date filter is a YYYY-MM-DD string
+
+    :param date: the date, or None for no filter
+    :type date: string or None
+    :param name: name of the filter, for the error message
+    :type name: string
+
+    :rtype: string or None
+
+    :raises ValueError: if date is not YYYY-MM-DD
+    """
+    if date is None:
+        return None
+    try:
+        datetime.datetime.strptime(date, DATE_FORMAT)
+    except (TypeError, ValueError):
+        raise ValueError("invalid {0} {1}".format(name, date))
+    return date
@@ -9,6 +9,12 @@ in the mycroft service.  The C part of MVC for mycroft/runs
 
 import re
 
+from mycroft.logic.pagination import decode_page_token
+from mycroft.logic.pagination import encode_page_token
+from mycroft.logic.pagination import parse_date
+from mycroft.logic.pagination import parse_fields
+from mycroft.logic.pagination import parse_limit
+
 HEX_STRING = re.compile("[a-f0-9]+$")
 
 ETL_RECORD_ARGS = {
@@ -100,3 +106,59 @@ def list_runs_by_job_id(job_id, etl_records_object):
 
     filtered_runs = etl_records_object.get_runs_with_job_id(job_id)
     return _parse_runs(filtered_runs)
+
+
+def list_runs_page(job_id, etl_records_object, limit=None, page_token=None,
+                   etl_status=None, from_date=None, to_date=None, fields=None):
+    """
+    lists a page of runs for a particular job_id, in data_date order,
+    filtered by the store rather than after reading every run
+
+    *Each run returned in the list is of the form of list_runs_by_job_id,
+    with only the fields requested*
+
+    :param job_id: uuid of the job
+    :type job_id: string of a hexadecimal number
+    :param etl_records_object: the ETLRecords object from which we read jobs
+    :type etl_records_object: an instance of ETLRecords
+    :param limit: most runs in the page, see parse_limit
+    :type limit: string or None
+    :param page_token: next_page_token of the previous page, None for the
+        first page
+    :type page_token: string or None
+    :param etl_status: only runs with this etl_status
+    :type etl_status: string or None
+    :param from_date: only runs with a data_date on or after this YYYY-MM-DD
+    :type from_date: string or None
+    :param to_date: only runs with a data_date on or before this YYYY-MM-DD
+    :type to_date: string or None
+    :param fields: comma separated fields to return, None for all of them
+    :type fields: string or None
+
+    :returns: a dict of {'runs': [run1, run2, ...], 'next_page_token': token},
+        next_page_token being None after the last page
+    :rtype: dict
+
+    :raises ValueError: for invalid job_id or another invalid parameter
+    """
+    if job_id is None or HEX_STRING.match(job_id) is None:
+        raise ValueError("invalid job_id {0}".format(job_id))
+    limit = parse_limit(limit)
+    page_key = decode_page_token(page_token)
+    fields = parse_fields(fields, ETL_RECORD_ARGS.keys())
+    from_date = parse_date(from_date, 'from_date')
+    to_date = parse_date(to_date, 'to_date')
+
+    runs, page_key = etl_records_object.get_runs_page(
+        job_id,
+        limit,
+        page_key=page_key,
+        attributes=fields,
+        from_date=from_date,
+        to_date=to_date,
+        etl_status=etl_status)
+    run_args = ETL_RECORD_ARGS if fields is None else dict.fromkeys(fields)
+    return {
+        'runs': [etl_record.get(**run_args) for etl_record in runs],
+        'next_page_token': encode_page_token(page_key),
+    }
@@ -3,11 +3,23 @@
 mycroft.models.abstract_records abstracts the implementation between an object
 binding with its underlying persistance mechanism.
 
-Records implements iterable protocol.
+Records implements iterable protocol.  A scan may read the table in
+parallel segments, see aws_config.scan_segments.
+
+Within a Records.identity_map() block, a record is read from the table once
+per thread and later gets of the same key return the same Record, which
+sees the updates made through it.
 '''
+from contextlib import contextmanager
+import Queue
+import sys
+import threading
+
+from boto.dynamodb.types import Dynamizer
 from boto.dynamodb2.exceptions import ValidationException
 from boto.dynamodb2.exceptions import ConditionalCheckFailedException
 from boto.dynamodb2.exceptions import ItemNotFound
+from staticconf import read_int
 
 
 def _verify_kwargs(kwargs, known_keys):
@@ -21,6 +33,143 @@ def _verify_kwargs(kwargs, known_keys):
 
 MAX_PAGE_SIZE = 50
 
+# items a parallel scan reads ahead of its consumer
+SCAN_QUEUE_SIZE = 1000
+
+
+def _iter_parallel_scan(scan_segment, total_segments):
+    '''
+    Yields the items of every segment in order of arrival, with a thread
+    per segment.  Closing the generator stops the threads.
+
+    :param scan_segment: function returning an iterable of the items of
+        a segment
+    :param total_segments: number of segments
+    '''
+    results = Queue.Queue(maxsize=SCAN_QUEUE_SIZE)
+    stop = threading.Event()
+
+    def put(result):
+        while not stop.is_set():
+            try:
+                results.put(result, timeout=0.1)
+                return True
+            except Queue.Full:
+                pass
+        return False
+
+    def run(segment):
+        try:
+            for item in scan_segment(segment):
+                if not put((True, item)):
+                    return
+        except Exception:
+            put((False, sys.exc_info()))
+        else:
+            put((False, None))
+
+    for segment in range(total_segments):
+        thread = threading.Thread(target=run, args=(segment,))
+        thread.daemon = True
+        thread.start()
+
+    try:
+        segments_left = total_segments
+        while segments_left > 0:
+            is_item, value = results.get()
+            if is_item:
+                yield value
+                continue
+            segments_left -= 1
+            if value is not None:
+                raise value[0], value[1], value[2]
+    finally:
+        stop.set()
+
+
+def _dedup_keys(keys):
+    seen = set()
+    unique_keys = []
+    for key in keys:
+        map_key = _map_key(key)
+        if map_key not in seen:
+            seen.add(map_key)
+            unique_keys.append(key)
+    return unique_keys
+
+
+def _map_key(kwargs):
+    return tuple(sorted(kwargs.iteritems()))
+
+
+def _is_storable(value):
+    # like boto Item, None and empty values delete the attribute
+    return bool(value) or value in (0, 0.0, False)
+
+
+def _update_item_if(table, key, field, expected_values, kwargs):
+    '''
+    Updates the item of key with kwargs in a single UpdateItem, iff the item
+    exists and, unless field is None, the value of field is one of
+    expected_values.  Returns the kwargs written, without key attributes.
+    '''
+    dynamizer = Dynamizer()
+    names = {}
+    values = {}
+
+    def name(attribute):
+        placeholder = '#n{0}'.format(len(names))
+        names[placeholder] = attribute
+        return placeholder
+
+    def value(attribute_value):
+        placeholder = ':v{0}'.format(len(values))
+        values[placeholder] = dynamizer.encode(attribute_value)
+        return placeholder
+
+    updates = dict((k, v) for k, v in kwargs.iteritems() if k not in key)
+    sets = ['{0} = {1}'.format(name(k), value(v))
+            for k, v in sorted(updates.iteritems()) if _is_storable(v)]
+    removes = [name(k) for k, v in sorted(updates.iteritems()) if not _is_storable(v)]
+    clauses = []
+    if sets:
+        clauses.append('SET ' + ', '.join(sets))
+    if removes:
+        clauses.append('REMOVE ' + ', '.join(removes))
+
+    conditions = ['attribute_exists({0})'.format(name(k)) for k in sorted(key)]
+    if field is not None:
+        conditions.append('{0} IN ({1})'.format(
+            name(field), ', '.join(value(v) for v in expected_values)))
+
+    try:
+        table.connection.update_item(
+            table.table_name,
+            dict((k, dynamizer.encode(v)) for k, v in key.iteritems()),
+            update_expression=' '.join(clauses),
+            condition_expression=' AND '.join(conditions),
+            expression_attribute_names=names,
+            expression_attribute_values=values)
+    except ConditionalCheckFailedException as e:
+        raise ConditionFailedError(repr(e))
+    except ValidationException as e:
+        raise PrimaryKeyError(repr(e))
+    return updates
+
+
+def _apply_updates(item, updates):
+    for key, value in updates.iteritems():
+        item[key] = value
+    # written already, partial_save has nothing left to send
+    item.mark_clean()
+
+
+def _projection(attributes, key_names):
+    # keys are always fetched, the item can't be saved without them
+    if attributes is None:
+        return None
+    return tuple(sorted(set(attributes) | set(key_names)))
+
 
 class Records(object):
 
@@ -40,11 +189,44 @@ class Records(object):
         self._known_keys = frozenset((field.name
                                       for field
                                       in self._avro_schema_object.fields))
+        self._local = threading.local()
 
-    def get(self, **kwargs):
+    def _get_identity_map(self):
+        return getattr(self._local, 'identity_map', None)
+
+    def _make_record(self, item, attributes=None):
+        return Record(item=item, known_keys=self._known_keys, avro_fields=self._avro_fields,
+                      attributes=attributes)
+
+    @contextmanager
+    def identity_map(self):
+        '''
+        Serve repeated gets from memory in the block, on the calling thread.
+        Blocks may nest, the outermost one sets the lifetime of the records.
+
+        Example::
+            >>> with records.identity_map():
+                    record = records.get(hash_key='1')
+                    records.get(hash_key='1') is record
+            True
+        '''
+        if self._get_identity_map() is not None:
+            yield
+            return
+        self._local.identity_map = {}
+        try:
+            yield
+        finally:
+            self._local.identity_map = None
+
+    def get(self, attributes=None, **kwargs):
         '''
         Returns an Record
 
+        :param attributes: the only keys to fetch besides the kwargs, or None
+            for all of them; getting any other key from the record raises
+            ValueError
+        :type attributes: list
         :param kwargs: all kwarg are used together to get the record. It's
             required to pass in at least one valid kwarg; an unknown kwarg, or
             no kwargs, will result in ValueError
@@ -71,16 +253,86 @@ class Records(object):
 
         '''
         _verify_kwargs(kwargs, self._known_keys)
+        attributes = _projection(attributes, kwargs)
+        if attributes is not None:
+            _verify_kwargs(dict.fromkeys(attributes), self._known_keys)
+
+        identity_map = self._get_identity_map()
+        map_key = _map_key(kwargs)
+        if identity_map is not None and map_key in identity_map:
+            record = identity_map[map_key]
+            if record.deleted:
+                raise KeyError(repr(kwargs))
+            return record
 
         try:
             item = self._persistence_object.get_item(
                 consistent=True,
+                attributes=attributes,
                 **kwargs)
-            return Record(item=item, known_keys=self._known_keys, avro_fields=self._avro_fields)
         except ValidationException as e:
             raise PrimaryKeyError(repr(e))
         except ItemNotFound as e:
             raise KeyError(repr(e))
+        record = self._make_record(item, attributes)
+        if identity_map is not None and attributes is None:
+            identity_map[map_key] = record
+        return record
+
+    def batch_get(self, keys, attributes=None):
+        '''
+        Returns the Records of many keys, read with BatchGetItem
+
+        :param keys: the primary key kwargs of each record, see get
+        :type keys: list of dict
+        :param attributes: the only keys to fetch besides the primary keys,
+            or None for all of them
+        :type attributes: list
+        :returns: the Records found, in no particular order; keys with no
+            record are skipped
+        :rtype: list of :class:`.Record`
+        :raises ValueError: if a key has an unknown kwarg
+
+        Example::
+            >>> records.batch_get([{'hash_key': '1'}, {'hash_key': '2'}])
+            [<Record hash_key='2'>, <Record hash_key='1'>]
+        '''
+        keys = _dedup_keys(keys)
+        key_names = set()
+        for key in keys:
+            _verify_kwargs(key, self._known_keys)
+            key_names.update(key)
+        attributes = _projection(attributes, key_names)
+        if attributes is not None:
+            _verify_kwargs(dict.fromkeys(attributes), self._known_keys)
+
+        records = []
+        identity_map = self._get_identity_map()
+        if identity_map is not None:
+            keys_to_get = []
+            for key in keys:
+                record = identity_map.get(_map_key(key))
+                if record is None:
+                    keys_to_get.append(key)
+                elif not record.deleted:
+                    records.append(record)
+            keys = keys_to_get
+        if len(keys) == 0:
+            return records
+
+        try:
+            items = list(self._persistence_object.batch_get(
+                keys=keys,
+                consistent=True,
+                attributes=attributes))
+        except ValidationException as e:
+            raise PrimaryKeyError(repr(e))
+        for item in items:
+            record = self._make_record(item, attributes)
+            if identity_map is not None and attributes is None:
+                identity_map[_map_key(dict((k, item[k]) for k in key_names))] = record
+            records.append(record)
+        return records
 
     def put(self, **kwargs):
         '''
@@ -116,6 +368,8 @@ class Records(object):
             ValueError
         '''
         _verify_kwargs(kwargs, self._known_keys)
+        if self._get_identity_map() is not None:
+            self._local.identity_map.clear()
         try:
             return self._persistence_object.put_item(kwargs)
         except ConditionalCheckFailedException as e:
@@ -123,12 +377,44 @@ class Records(object):
         except ValidationException as e:
             raise PrimaryKeyError(repr(e))
 
-    def query_by_index(self, index=None, **kwargs):
+    def batch_put(self, items):
+        '''
+        Puts many Records with BatchWriteItem, 25 per request.  Unlike put,
+        an existing record is replaced.
+
+        :param items: the kwargs of each record, see put
+        :type items: list of dict
+        :returns: None
+        :raises ValueError: if an item has an unknown kwarg
+        :raises PrimaryKeyError: if an item does not have a conforming
+            primary key
+
+        Example::
+            >>> records.batch_put([
+                    {'hash_key': '1', 'data_date': '2014-07-26'},
+                    {'hash_key': '1', 'data_date': '2014-07-27'},
+                ])
+        '''
+        for kwargs in items:
+            _verify_kwargs(kwargs, self._known_keys)
+        if self._get_identity_map() is not None:
+            self._local.identity_map.clear()
+        try:
+            with self._persistence_object.batch_write() as batch:
+                for kwargs in items:
+                    batch.put_item(data=kwargs)
+        except ValidationException as e:
+            raise PrimaryKeyError(repr(e))
+
+    def query_by_index(self, index=None, attributes=None, **kwargs):
         '''
         Unstable API. Use at your own risk.
 
         :param index: name of index to be used for searching
         :type index: string
+        :param attributes: the only keys to fetch, or None for all of them;
+            include the primary key to update the records
+        :type attributes: list
         :param **kwargs: each kwarg should be a component of the index
         :returns: An iterable of record
         :raises ValueError: if kwargs contains more than 2 components
@@ -138,6 +424,9 @@ class Records(object):
             # a hash key and a range key. So if it's more than 2, raise an
             # Error
             raise ValueError('index does not support more than 2 components: {0}'.format(kwargs))
+        if attributes is not None:
+            attributes = tuple(attributes)
+            _verify_kwargs(dict.fromkeys(attributes), self._known_keys)
 
         # When the needs arrives, we can add option to control what
         # type of query operator to use.
@@ -148,7 +437,7 @@ class Records(object):
             index=index,
             reverse=False,
             consistent=False,  # GSI does not support consistent read
-            attributes=None,
+            attributes=attributes,
             max_page_size=MAX_PAGE_SIZE,
             query_filter=None,
             conditional_operator=None,
@@ -156,11 +445,43 @@ class Records(object):
 
         def iter_record():
             for result in result_set:
-                yield Record(
-                    item=result, known_keys=self._known_keys, avro_fields=self._avro_fields
-                )
+                yield self._make_record(result, attributes)
         return iter_record()
 
+    def update_if(self, key, field, expected_values, **kwargs):
+        '''
+        Updates the record of key without reading it, in a single atomic
+        write, iff the value of field is one of expected_values
+
+        :param key: the primary key kwargs of the record, see get
+        :type key: dict
+        :param field: the key to check, or None to only check that the
+            record exists
+        :type field: string
+        :param expected_values: values field may have, ignored if field is None
+        :type expected_values: list
+        :param kwargs: keys to update, None deletes the key
+        :returns: True
+        :raises ValueError: if unknown kwarg is given
+        :raises ConditionFailedError: if there's no record of key, or field
+            has another value
+
+        Example::
+            >>> records.update_if({'hash_key': '1'}, 'et_status', ['null'],
+                    et_status='scheduled')
+            True
+        '''
+        _verify_kwargs(kwargs, self._known_keys)
+        _verify_kwargs(key, self._known_keys)
+        updates = _update_item_if(
+            self._persistence_object, key, field, expected_values, kwargs
+        )
+        identity_map = self._get_identity_map()
+        record = identity_map.get(_map_key(key)) if identity_map is not None else None
+        if record is not None:
+            _apply_updates(record._item, updates)
+        return True
+
     def batch_delete(self, items, **kwargs):
         '''
         delete desired items in a batch
@@ -170,32 +491,166 @@ class Records(object):
         :param **kwargs: each kwarg should be a component of the primary key
         :returns: None
         '''
+        if self._get_identity_map() is not None:
+            self._local.identity_map.clear()
         with self._persistence_object.batch_write() as batch:
             for item in items:
                 primary_key_kwargs = item.get(**kwargs)
                 batch.delete_item(**primary_key_kwargs)
 
-    def __iter__(self):
+    def scan(self, total_segments=None, max_page_size=None, **kwargs):
+        '''
+        Unstable API. Use at your own risk.
 
-        def iter_table():
-            result_set = self._persistence_object.scan(
+        :param total_segments: segments to scan in parallel, records come
+            in no particular order if more than 1; aws_config.scan_segments
+            if None
+        :type total_segments: int
+        :param max_page_size: records read per request,
+            aws_config.scan_page_size if None
+        :type max_page_size: int
+        :param **kwargs: filters in the boto query syntax, e.g.
+            updated_at__gt='2014-08-01'; no kwargs scans every record
+        :returns: An iterable of record
+        :raises ValueError: if a filter is on an unknown key
+        '''
+        self._verify_filter_kwargs(kwargs)
+
+        if total_segments is None:
+            total_segments = read_int('aws_config.scan_segments', 1)
+        if max_page_size is None:
+            max_page_size = read_int('aws_config.scan_page_size', MAX_PAGE_SIZE)
+
+        def scan_segment(segment):
+            return self._persistence_object.scan(
                 limit=None,
-                segment=None,
-                total_segments=None,
-                max_page_size=MAX_PAGE_SIZE,
+                segment=segment,
+                total_segments=total_segments if segment is not None else None,
+                max_page_size=max_page_size,
                 attributes=None,
-                conditional_operator=None)
+                conditional_operator=None,
+                **kwargs)
+
+        def iter_table():
+            if total_segments > 1:
+                result_set = _iter_parallel_scan(scan_segment, total_segments)
+            else:
+                result_set = scan_segment(None)
             for result in result_set:
-                yield Record(
-                    item=result, known_keys=self._known_keys, avro_fields=self._avro_fields
-                )
+                yield self._make_record(result)
 
         return iter_table()
 
+    def __iter__(self):
+        return self.scan()
+
+    def scan_page(self, limit, start_key=None, attributes=None, **kwargs):
+        '''
+        Unstable API. Use at your own risk.
+
+        Reads one page of a scan, resuming after start_key
+
+        :param limit: most records to return, None for all of them
+        :type limit: int
+        :param start_key: the last_key of the previous page, None to start
+            at the beginning of the table
+        :type start_key: dict
+        :param attributes: the only keys to fetch, or None for all of them
+        :type attributes: list
+        :param **kwargs: filters in the boto query syntax, see scan
+        :returns: a tuple of a list of record and the last_key to read the
+            next page with, None after the last page
+        :raises ValueError: if a filter is on an unknown key, or start_key
+            is not a key of the table
+        '''
+        self._verify_filter_kwargs(kwargs)
+        attributes = self._verify_attributes(attributes)
+
+        def read(page_limit, exclusive_start_key):
+            return self._persistence_object._scan(
+                limit=page_limit,
+                exclusive_start_key=exclusive_start_key,
+                attributes=attributes,
+                **kwargs)
+
+        return self._get_page(read, limit, start_key, attributes)
+
+    def query_page(self, limit, index=None, start_key=None, attributes=None,
+                   query_filter=None, **kwargs):
+        '''
+        Unstable API. Use at your own risk.
+
+        Reads one page of a query, resuming after start_key
+
+        :param limit: most records to return, None for all of them
+        :type limit: int
+        :param index: name of index to be used for searching
+        :type index: string
+        :param start_key: the last_key of the previous page, None to start
+            at the first record
+        :type start_key: dict
+        :param attributes: the only keys to fetch, or None for all of them
+        :type attributes: list
+        :param query_filter: filters on non key attributes in the boto query
+            syntax, e.g. {'etl_status__eq': 'load_success'}
+        :type query_filter: dict
+        :param **kwargs: conditions on the key components of the index in the
+            boto query syntax, e.g. job_id__eq='1', data_date__gte='2014-08-01'
+        :returns: a tuple of a list of record and the last_key to read the
+            next page with, None after the last page
+        :raises ValueError: if a condition is on an unknown key, or start_key
+            is not a key of the index
+        '''
+        self._verify_filter_kwargs(kwargs)
+        self._verify_filter_kwargs(query_filter or {})
+        attributes = self._verify_attributes(attributes)
+
+        def read(page_limit, exclusive_start_key):
+            return self._persistence_object._query(
+                limit=page_limit,
+                index=index,
+                consistent=False,  # GSI does not support consistent read
+                exclusive_start_key=exclusive_start_key,
+                select='SPECIFIC_ATTRIBUTES' if attributes is not None else None,
+                attributes_to_get=attributes,
+                query_filter=query_filter,
+                **kwargs)
+
+        return self._get_page(read, limit, start_key, attributes)
+
+    def _verify_filter_kwargs(self, kwargs):
+        filter_keys = set(key.rsplit('__', 1)[0] for key in kwargs.iterkeys())
+        if not filter_keys.issubset(self._known_keys):
+            raise ValueError("Unknown keys: {0}".format(
+                filter_keys - self._known_keys))
+
+    def _verify_attributes(self, attributes):
+        if attributes is None:
+            return None
+        attributes = tuple(attributes)
+        _verify_kwargs(dict.fromkeys(attributes), self._known_keys)
+        return attributes
+
+    def _get_page(self, read, limit, start_key, attributes):
+        # a filtered request may return fewer items than its limit, so keep
+        # reading until the page is full or the table ends
+        records = []
+        last_key = start_key
+        while True:
+            page_limit = None if limit is None else limit - len(records)
+            try:
+                result = read(page_limit, last_key)
+            except ValidationException as e:
+                raise ValueError(repr(e))
+            records.extend(self._make_record(item, attributes) for item in result['results'])
+            last_key = result['last_key']
+            if last_key is None or (limit is not None and len(records) >= limit):
+                return records, last_key
+
 
 class Record(object):
 
-    def __init__(self, item=None, known_keys=None, avro_fields=None):
+    def __init__(self, item=None, known_keys=None, avro_fields=None, attributes=None):
         '''
         Unstable API. Use at your own risk.
 
@@ -203,10 +658,14 @@ class Record(object):
         :type item: boto.dynamodb2.item.Item
         :param known_keys: set of known keys
         :type known_keys: frozenset
+        :param attributes: the keys fetched into item, or None if all were
+        :type attributes: tuple
         '''
         self._item = item
         self._known_keys = known_keys
         self._avro_fields = avro_fields
+        self._fetched_keys = known_keys if attributes is None else frozenset(attributes)
+        self.deleted = False
 
     def update(self, **kwargs):
         '''
@@ -231,6 +690,34 @@ class Record(object):
             self._item[key] = value
         return self._item.partial_save()
 
+    def update_if(self, field, expected_values, **kwargs):
+        '''
+        Updates the record in a single atomic write, iff the stored value of
+        field is one of expected_values
+
+        :param field: the key to check
+        :type field: string
+        :param expected_values: values field may have
+        :type expected_values: list
+        :param kwargs: keys to update, None deletes the key
+        :returns: True
+        :raises ValueError: if there is no kwargs
+        :raises ConditionFailedError: if field has another value, or the
+            record was deleted
+
+        Example::
+            >>> record.update_if('et_status', ['null'], et_status='scheduled')
+            True
+            >>> record.update_if('et_status', ['null'], et_status='scheduled')
+            ConditionFailedError
+        '''
+        _verify_kwargs(kwargs, self._known_keys)
+        updates = _update_item_if(
+            self._item.table, self._item.get_keys(), field, expected_values, kwargs
+        )
+        _apply_updates(self._item, updates)
+        return True
+
     def delete(self, user, reason):
         '''
         Deletes the record
@@ -255,7 +742,8 @@ class Record(object):
             raise ValueError('You need a valid user argument')
         if reason is None or '' == reason.strip():
             raise ValueError('You need a valid reason argument')
-        return self._item.delete()
+        self.deleted = self._item.delete()
+        return self.deleted
 
     def _get(self, key, default):
         if default is None:
@@ -287,6 +775,10 @@ class Record(object):
 
         '''
         _verify_kwargs(kwargs, self._known_keys)
+        if self._fetched_keys is not self._known_keys:
+            unfetched_keys = set(kwargs) - self._fetched_keys
+            if unfetched_keys:
+                raise ValueError("Keys not fetched: {0}".format(unfetched_keys))
         return dict((key, self._get(key, default))
                     for key, default in kwargs.iteritems())
 
@@ -295,3 +787,9 @@ class PrimaryKeyError(Exception):
     '''This is raised when the given record does not have conforming
     primary key'''
     pass
+
+
+class ConditionFailedError(ValueError):
+    '''This is raised when a conditional update finds no record, or finds
+    the record in another state'''
+    pass
@@ -128,6 +128,35 @@ class ETLRecords(object):
         '''
         return self._records.put(**kwargs)
 
+    def batch_get(self, keys):
+        '''
+        Get the ETLRecords of many primary keys, read in batches
+
+        :param keys: hash_key and data_date of each run
+        :type keys: list of dict
+        :returns: the runs found, in no particular order
+        :rtype: list of :class:`.ETLRecord`
+
+        Example::
+            >>> runs = etl_records.batch_get([
+                    {'hash_key': '1af2', 'data_date': '2014-07-01'},
+                    {'hash_key': '1af2', 'data_date': '2014-07-02'},
+                ])
+        '''
+        return [ETLRecord(record=record) for record in self._records.batch_get(keys)]
+
+    def batch_put(self, items):
+        '''
+        Puts many ETLRecords in batches, replacing existing ones
+
+        :param items: the kwargs of each run, see put
+        :type items: list of dict
+        :raises ValueError: if unknown kwarg is given
+        :raises PrimaryKeyError: if a run does not have a conforming
+            primary key
+        '''
+        self._records.batch_put(items)
+
     def get_runs_with_job_id(self, job_id, data_date=None):
         '''
         Get ETLRecord matching given job_id
@@ -153,6 +182,56 @@ class ETLRecords(object):
 
         return iter_record()
 
+    def get_runs_page(self, job_id, limit, page_key=None, attributes=None,
+                      from_date=None, to_date=None, etl_status=None):
+        '''
+        Get a page of ETLRecord matching given job_id, in data_date order
+
+        :param job_id: id of the job
+        :type job_id: string
+        :param limit: most runs to return, None for all of them
+        :type limit: int
+        :param page_key: the key returned with the previous page, None for
+            the first page
+        :type page_key: dict
+        :param attributes: the only keys to fetch, or None for all of them
+        :type attributes: list
+        :param from_date: earliest data_date, inclusive
+        :type from_date: string
+        :param to_date: latest data_date, inclusive
+        :type to_date: string
+        :param etl_status: value of etl_status
+        :type etl_status: string
+        :returns: a tuple of a list of ETLRecord and the page_key of the
+            next page, None after the last page
+        :raises ValueError: if page_key is not a key of the index
+
+        Example::
+            >>> runs, page_key = etl_records.get_runs_page(
+                    '1af2', 1, from_date='2014-07-02')
+            >>> [run.get(data_date=None) for run in runs]
+            [{'data_date': '2014-07-02'}]
+        '''
+        conditions = {'job_id__eq': job_id}
+        if from_date is not None and to_date is not None:
+            conditions['data_date__between'] = (from_date, to_date)
+        elif from_date is not None:
+            conditions['data_date__gte'] = from_date
+        elif to_date is not None:
+            conditions['data_date__lte'] = to_date
+        query_filter = None
+        if etl_status is not None:
+            query_filter = {'etl_status__eq': etl_status}
+
+        records, page_key = self._records.query_page(
+            limit,
+            index=self.INDEX_JOB_ID_AND_DATA_DATE,
+            start_key=page_key,
+            attributes=attributes,
+            query_filter=query_filter,
+            **conditions)
+        return [ETLRecord(record=record) for record in records], page_key
+
     def delete_job_runs(self, job_id):
         '''
         Attempt to delete all runs for a job id
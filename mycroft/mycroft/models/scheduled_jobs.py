@@ -34,6 +34,7 @@ Example::
     <ScheduledJob #some_other_id>
 
 '''
+from mycroft.models.abstract_records import ConditionFailedError
 from mycroft.models.abstract_records import Records
 import datetime
 import os
@@ -94,6 +95,16 @@ JOBS_ETL_STATUS_TRANSITION_TABLE = {
     ],
 }
 
+# the transition table compiled into the statuses a job may move to a
+# status from, for the condition of a status update
+JOBS_ETL_STATUS_PREDECESSORS = dict(
+    (new_status, sorted(cur_status
+                        for cur_status, new_statuses
+                        in JOBS_ETL_STATUS_TRANSITION_TABLE.iteritems()
+                        if new_status in new_statuses))
+    for new_status in set().union(*JOBS_ETL_STATUS_TRANSITION_TABLE.values())
+)
+
 
 JOBS_ETL_ACTIONS = ['cancel_requested', 'pause_requested', 'delete_requested']
 
@@ -125,7 +136,8 @@ class ScheduledJobs(object):
 
         :param kwargs: all kwarg are used together to get the job. It's
             required to pass in at least one valid kwarg; an unknown kwarg, or
-            no kwargs, will result in ValueError
+            no kwargs, will result in ValueError.  An attributes kwarg lists
+            the only keys to fetch, see Records.get
         :returns: ScheduledJob that matches given keys
         :rtype: :class:`.ScheduledJob`
         :raises KeyError: if request record is not found
@@ -147,6 +159,75 @@ class ScheduledJobs(object):
         '''
         return ScheduledJob(self._records.get(**kwargs))
 
+    def update(self, hash_key, **kwargs):
+        '''
+        Updates a job without reading it first.  An et_status update is
+        applied only if the job's current et_status may change to it, see
+        ScheduledJob.update
+
+        :param hash_key: hash key of the job
+        :type hash_key: string
+        :param kwargs: keys to update, None deletes the key
+        :returns: True if ScheduledJob successfully update
+        :rtype: boolean
+        :raises KeyError: if the job does not exist
+        :raises ScheduledJobInvalidStatusUpdate: if the job's et_status can't
+            change to the new et_status
+
+        Example::
+            >>> scheduled_jobs.update('1', et_status='running')
+            True
+        '''
+        field, expected_values = _status_condition(kwargs)
+        try:
+            return self._records.update_if(
+                {'hash_key': hash_key}, field, expected_values, **kwargs
+            )
+        except ConditionFailedError:
+            # read only on failure, to tell a missing job from a bad status
+            job = self.get(hash_key=hash_key, attributes=['et_status'])
+            raise ScheduledJobInvalidStatusUpdate(
+                "hash_key={0}, cur_status={1}, new_status={2}".format(
+                    hash_key, job.get(et_status=None)['et_status'], kwargs.get(field)
+                )
+            )
+
+    def batch_get(self, hash_keys, attributes=None):
+        '''
+        Returns the ScheduledJobs of many hash keys, read in batches
+
+        :param hash_keys: hash keys of the jobs
+        :type hash_keys: list of string
+        :param attributes: the only keys to fetch besides hash_key, or None
+            for all of them
+        :type attributes: list
+        :returns: the jobs found, in no particular order
+        :rtype: list of :class:`.ScheduledJob`
+
+        Example::
+            >>> jobs = scheduled_jobs.batch_get(['1', '2', 'gone'])
+            >>> sorted(job.get(hash_key=None)['hash_key'] for job in jobs)
+            ['1', '2']
+        '''
+        records = self._records.batch_get(
+            [{'hash_key': hash_key} for hash_key in hash_keys],
+            attributes=attributes)
+        return [ScheduledJob(record=record) for record in records]
+
+    def identity_map(self):
+        '''
+        Returns a context manager in which repeated gets of a job on the
+        calling thread are read from the table once, see Records.identity_map
+
+        Example::
+            >>> with scheduled_jobs.identity_map():
+                    job = scheduled_jobs.get(hash_key='1')
+                    job.update(et_status='running')
+                    scheduled_jobs.get(hash_key='1').get(et_status=None)
+            {'et_status': 'running'}
+        '''
+        return self._records.identity_map()
+
     def put(self, **kwargs):
         '''
         Puts an ScheduledJob
@@ -225,6 +306,30 @@ class ScheduledJobs(object):
 
         return iter_record()
 
+    def get_jobs_with_et_status_updated_after(self, timestamp):
+        '''
+        Get ScheduledJob whose et_status changed after given timestamp.
+        This scans the whole table, but only returns the matching jobs.
+
+        :param timestamp: a str(datetime) in UTC, like et_status_last_updated_at
+        :type timestamp: string
+        :returns: An iterable of ScheduledJob updated after timestamp
+
+        Example::
+            >>> jobs = scheduled_jobs.get_jobs_with_et_status_updated_after(
+                    '2014-08-01 10:00:00.000000')
+            >>> for job in jobs:
+                  print job.get(hash_key=None, et_status_last_updated_at=None)
+            {'hash_key': '1', 'et_status_last_updated_at': '2014-08-01 10:05:12.394810'}
+        '''
+        records = self._records.scan(et_status_last_updated_at__gt=timestamp)
+
+        def iter_record():
+            for record in records:
+                yield ScheduledJob(record=record)
+
+        return iter_record()
+
     def get_jobs_with_log_name(self, log_name, log_schema_version=None):
         '''
         Get ScheduledJob matching given log_name and optional log_schema_version
@@ -254,6 +359,48 @@ class ScheduledJobs(object):
 
         return iter_record()
 
+    def get_jobs_page(self, limit, page_key=None, attributes=None, et_status=None, **kwargs):
+        '''
+        Get a page of ScheduledJob, queried by et_status if given and
+        scanned otherwise
+
+        :param limit: most jobs to return, None for all of them
+        :type limit: int
+        :param page_key: the key returned with the previous page, None for
+            the first page
+        :type page_key: dict
+        :param attributes: the only keys to fetch, or None for all of them
+        :type attributes: list
+        :param et_status: value of et_status
+        :type et_status: string
+        :param kwargs: filters in the boto query syntax, e.g.
+            redshift_id__eq='rs1'
+        :returns: a tuple of a list of ScheduledJob and the page_key of the
+            next page, None after the last page
+        :raises ValueError: if a filter is on an unknown key, or page_key
+            is not a key of the table
+
+        Example::
+            >>> jobs, page_key = scheduled_jobs.get_jobs_page(
+                    2, et_status='running', redshift_id__eq='rs1')
+            >>> [job.get(hash_key=None)['hash_key'] for job in jobs]
+            ['1', '2']
+            >>> jobs, page_key = scheduled_jobs.get_jobs_page(
+                    2, page_key=page_key, et_status='running', redshift_id__eq='rs1')
+        '''
+        if et_status is not None:
+            records, page_key = self._records.query_page(
+                limit,
+                index=self.INDEX_ET_STATUS,
+                start_key=page_key,
+                attributes=attributes,
+                query_filter=kwargs or None,
+                et_status__eq=et_status)
+        else:
+            records, page_key = self._records.scan_page(
+                limit, start_key=page_key, attributes=attributes, **kwargs)
+        return [ScheduledJob(record=record) for record in records], page_key
+
     def __iter__(self):
 
         def iter_records():
@@ -267,6 +414,22 @@ class ScheduledJobInvalidStatusUpdate(Exception):
     pass
 
 
+def _status_condition(kwargs):
+    '''
+    Returns the field and values to condition an update on, (None, None)
+    unless it updates et_status.  Adds the et_status timestamp to kwargs.
+    '''
+    field = 'et_status'
+    timestamp_field = field + '_last_updated_at'
+    if field not in kwargs:
+        return None, None
+    if kwargs[field] not in JOBS_ETL_STATUS_PREDECESSORS:
+        raise ScheduledJobInvalidStatusUpdate("new_status={0}".format(kwargs[field]))
+    if timestamp_field not in kwargs:
+        kwargs[timestamp_field] = str(datetime.datetime.utcnow())
+    return field, JOBS_ETL_STATUS_PREDECESSORS[kwargs[field]]
+
+
 class ScheduledJob(object):
 
     def __init__(self, record=None):
@@ -278,27 +441,18 @@ class ScheduledJob(object):
         '''
         self._record = record
 
-    def _validate_status_update(self, status_field, new_status):
-
-        if status_field not in ['et_status']:
-            raise ValueError("Invalid status field: {0}".format(status_field))
-
-        kwargs = {status_field: None}
-        cur_kwargs = self.get(**kwargs)
-        cur_status = cur_kwargs[status_field]
-
-        if new_status not in JOBS_ETL_STATUS_TRANSITION_TABLE[cur_status]:
-            raise ScheduledJobInvalidStatusUpdate(
-                "cur_status={0}, new_status={1}".format(cur_status, new_status)
-            )
-
     def update(self, **kwargs):
         '''
-        Updates the job
+        Updates the job.  An et_status update is a single conditional write,
+        applied only if the stored et_status may change to the new one in
+        JOBS_ETL_STATUS_TRANSITION_TABLE, so concurrent updates can't both
+        make the same transition.
 
         :returns: True if ScheduledJob successfully update
         :rtype: boolean
         :raises ValueError: if there is no kwargs
+        :raises ScheduledJobInvalidStatusUpdate: if the stored et_status
+            can't change to the new et_status
 
         Example::
             >>> scheduled_job.get(s3_path=None)
@@ -312,14 +466,17 @@ class ScheduledJob(object):
         '''
 
         # take special care for status field
-        field = 'et_status'
-        timestamp_field = field + '_last_updated_at'
-        if field in kwargs:
-            self._validate_status_update(field, kwargs[field])
-            if timestamp_field not in kwargs:
-                kwargs[timestamp_field] = str(datetime.datetime.utcnow())
-
-        return self._record.update(**kwargs)
+        field, expected_values = _status_condition(kwargs)
+        if field is None:
+            return self._record.update(**kwargs)
+        try:
+            return self._record.update_if(field, expected_values, **kwargs)
+        except ConditionFailedError as e:
+            raise ScheduledJobInvalidStatusUpdate(
+                "cur_status={0}, new_status={1}: {2}".format(
+                    self.get(**{field: None})[field], kwargs[field], e
+                )
+            )
 
     def delete(self, user, reason):
         '''
@@ -24,15 +24,40 @@
     // We'll preserve any errors we get when trying to list jobs
     $scope.listJobsError = false;
 
+    // Jobs are listed a page at a time, the table shows once the first
+    // page is in and grows as the rest arrive
+    var JOBS_PAGE_LIMIT = 500;
+    $scope.parsedJobs = [];
+    $scope.listMoreJobs = false;
+
+    /**
+     * Get a page of jobs, and the pages after it.
+     *
+     * @param  {string} pageToken - next_page_token of the previous page,
+     *  null for the first page
+     */
+    function listJobsPage(pageToken) {
+      var params = {'limit': JOBS_PAGE_LIMIT};
+      if (pageToken) {
+        params['page_token'] = pageToken;
+      }
+      return $http.get('/v1/jobs', {'params': params}).success(function (data) {
+        $scope.parsedJobs = $scope.parsedJobs.concat(parseJobListResponse(data));
+        $scope.listJobsPromise = null;
+        $scope.listJobsError = false;
+        $scope.listMoreJobs = !!data.next_page_token;
+        if (data.next_page_token) {
+          listJobsPage(data.next_page_token);
+        }
+      }).error(function (errorData) {
+        $scope.listJobsPromise = null;
+        $scope.listMoreJobs = false;
+        $scope.listJobsError = errorData;
+      });
+    }
+
     // Initiate a promise for the list of jobs
-    $scope.listJobsPromise = $http.get('/v1/jobs').success(function (data) {
-      $scope.parsedJobs = parseJobListResponse(data);
-      $scope.listJobsPromise = null;
-      $scope.listJobsError = false;
-    }).error(function (errorData) {
-      $scope.listJobsPromise = null;
-      $scope.listJobsError = errorData;
-    });
+    $scope.listJobsPromise = listJobsPage(null);
 
     function getRunsEndpoint (){
       return '/v1/runs/';
@@ -14,14 +14,26 @@ from pyramid.view import view_config
 from mycroft.logic.job_actions import list_all_jobs
 from mycroft.logic.job_actions import list_jobs_by_name
 from mycroft.logic.job_actions import list_jobs_by_name_version
+from mycroft.logic.job_actions import list_jobs_page
 from mycroft.logic.job_actions import post_job
 from mycroft.logic.job_actions import put_job
+from mycroft.logic.pagination import get_page_params
 
 from mycroft.models.aws_connections import TableConnection
 from mycroft.models.abstract_records import PrimaryKeyError
 
 from mycroft.backend.sqs_wrapper import SQSWrapper
 
+JOBS_PAGE_PARAMS = frozenset([
+    'limit',
+    'page_token',
+    'et_status',
+    'redshift_id',
+    'from_date',
+    'to_date',
+    'fields',
+])
+
 
 def get_scanner_queue(etl_type):
     """
@@ -44,6 +56,32 @@ def jobs(request):
 
     Example: ``/v1/jobs/``
 
+    Without query parameters all jobs are returned.  With any of them a page
+    of jobs is returned instead, see *Paged Response*.
+
+    **Query Parameters:**
+
+    * **limit** - most jobs in the page, 1 to 1000, 100 by default
+    * **page_token** - next_page_token of the previous page
+    * **et_status** - only jobs with this et_status
+    * **redshift_id** - only jobs of this cluster
+    * **from_date** - only jobs starting on or after this YYYY-MM-DD
+    * **to_date** - only jobs starting on or before this YYYY-MM-DD
+    * **fields** - comma separated fields to return, e.g. ``uuid,et_status``
+
+    Example: ``/v1/jobs?et_status=running&limit=2&fields=uuid,et_status``
+
+    *Paged Response* ::
+
+        {'jobs': [
+            {'uuid': '723edc9dac96437094ea420f2f9aee70', 'et_status': 'running'},
+            {'uuid': '4c03c69b2b6c4cf8a1742fa55de02244', 'et_status': 'running'}
+         ],
+         'next_page_token': 'eyJoYXNoX2tleSI6ICIxIn0'
+        }
+
+    next_page_token is null after the last page.
+
     *Example Response* ::
 
         [
@@ -81,6 +119,7 @@ def jobs(request):
     Status Code  Description
     ============ ===========
     **200**      Success
+    **404**      invalid query parameters
     **500**      unknown exception
     ============ ===========
 
@@ -125,7 +164,10 @@ def jobs(request):
                                  get_scanner_queue('et'),
                                  request.body)
         elif request.method == "GET":
-            return 200, list_all_jobs(TableConnection.get_connection('ScheduledJobs'))
+            if not request.params:
+                return 200, list_all_jobs(TableConnection.get_connection('ScheduledJobs'))
+            return 200, list_jobs_page(TableConnection.get_connection('ScheduledJobs'),
+                                       **get_page_params(request.params, JOBS_PAGE_PARAMS))
     except PrimaryKeyError as e:
         return 400, {'error': 'bad hash_key'}
     except ValueError as e:
@@ -8,10 +8,21 @@ endpoint of the mycroft service.
 """
 from pyramid.view import view_config
 
+from mycroft.logic.pagination import get_page_params
 from mycroft.logic.run_actions import list_runs_by_job_id
+from mycroft.logic.run_actions import list_runs_page
 
 from mycroft.models.aws_connections import TableConnection
 
+RUNS_PAGE_PARAMS = frozenset([
+    'limit',
+    'page_token',
+    'etl_status',
+    'from_date',
+    'to_date',
+    'fields',
+])
+
 
 @view_config(route_name='api.runs_job_id', request_method='GET', renderer='json_with_status')
 def runs_filtered(request):
@@ -27,6 +38,27 @@ def runs_filtered(request):
 
     Example: ``/v1/runs/234332104332``
 
+    Without other query parameters all runs are returned.  With any of them
+    a page of runs, in data_date order, is returned instead, see *Paged
+    Response*.
+
+    * **limit** - most runs in the page, 1 to 1000, 100 by default
+    * **page_token** - next_page_token of the previous page
+    * **etl_status** - only runs with this etl_status
+    * **from_date** - only runs with a data_date on or after this YYYY-MM-DD
+    * **to_date** - only runs with a data_date on or before this YYYY-MM-DD
+    * **fields** - comma separated fields to return, e.g. ``data_date,etl_status``
+
+    Example: ``/v1/runs/234332104332?from_date=2014-05-01&limit=1&fields=data_date``
+
+    *Paged Response* ::
+
+        {'runs': [{'data_date': '2014-05-01'}],
+         'next_page_token': 'eyJkYXRhX2RhdGUiOiAiMjAxNC0wNS0wMSJ9'
+        }
+
+    next_page_token is null after the last page.
+
     *Example Response* ::
 
         [
@@ -52,7 +84,7 @@ def runs_filtered(request):
     Status Code  Description
     ============ ===========
     **200**      Success
-    **404**      Invalid job_id
+    **404**      Invalid job_id or query parameters
     **500**      unknown exception
     ============ ===========
 
@@ -61,7 +93,11 @@ def runs_filtered(request):
     job_id = request.matchdict.get('job_id', None)
 
     try:
-        return 200, list_runs_by_job_id(job_id, TableConnection.get_connection('ETLRecords'))
+        if not request.params:
+            return 200, list_runs_by_job_id(job_id,
+                                            TableConnection.get_connection('ETLRecords'))
+        return 200, list_runs_page(job_id, TableConnection.get_connection('ETLRecords'),
+                                   **get_page_params(request.params, RUNS_PAGE_PARAMS))
     except ValueError as e:
         return 404, {'error': repr(e)}
     except Exception as unknown_exception:
@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+"""
+local_et_runner.py runs an ET mr job's mapper on the local machine, without
+EMR, for days small enough that job flow startup dominates the run time
+
+The input keys matching the input glob are sharded across a multiprocessing
+pool.  Every worker creates the job through the same 'mrjob_create' entry
+point s3_to_psv uses, feeds the lines of its key to the mapper, and writes
+one gzipped part per table:
+
+    <output_dir>/<table_name>/part-<shard>.gz
+
+_SUCCESS is written to <output_dir> once every shard is done, which is the
+layout s3_to_redshift loads from after an EMR run.
+
+Select it with 'pipeline.et_step.engine: local'.  Setting
+'pipeline.et_step.local_s3_root' maps s3://bucket/key to
+<local_s3_root>/bucket/key, which stands in for S3 on a dev box or in tests.
+"""
+
+import errno
+import fnmatch
+import gzip
+from multiprocessing import Pool
+import os
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+import zlib
+
+from boto.s3.connection import S3Connection
+
+from sherlock.common.aws import get_boto_creds
+from sherlock.common.util import parse_s3_path
+
+
+GLOB_CHARS = '*?['
+
+READ_CHUNK_BYTES = 1024 * 1024
+
+
+class S3Storage(object):
+    """Reads and writes s3:// paths with boto"""
+
+    def __init__(self, local):
+        self.local = local
+        self._conn = None
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            if self.local:
+                self._conn = S3Connection(**get_boto_creds())
+            else:
+                self._conn = S3Connection()
+        return self._conn
+
+    def list_paths(self, prefix):
+        bucket_name, key_prefix = parse_s3_path(prefix)
+        bucket = self.conn.get_bucket(bucket_name, validate=False)
+        return ['s3://{0}/{1}'.format(bucket_name, key.name)
+                for key in bucket.list(prefix=key_prefix)]
+
+    def iter_chunks(self, path):
+        bucket_name, key_name = parse_s3_path(path)
+        key = self.conn.get_bucket(bucket_name, validate=False).get_key(
+            key_name
+        )
+        if key is None:
+            raise IOError("{0}: no such key".format(path))
+        while True:
+            chunk = key.read(READ_CHUNK_BYTES)
+            if not chunk:
+                break
+            yield chunk
+        key.close()
+
+    def put_file(self, path, local_file):
+        bucket_name, key_name = parse_s3_path(path)
+        key = self.conn.get_bucket(bucket_name, validate=False).new_key(
+            key_name
+        )
+        key.set_contents_from_filename(local_file)
+
+    def put_string(self, path, data):
+        bucket_name, key_name = parse_s3_path(path)
+        key = self.conn.get_bucket(bucket_name, validate=False).new_key(
+            key_name
+        )
+        key.set_contents_from_string(data)
+
+
+class LocalStorage(object):
+    """Stands in for S3, keeping s3://bucket/key in root/bucket/key"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def local_path(self, path):
+        bucket_name, key_name = parse_s3_path(path)
+        return os.path.join(self.root, bucket_name, key_name)
+
+    def path_exists(self, path):
+        return os.path.isfile(self.local_path(path))
+
+    def list_paths(self, prefix):
+        bucket_name, key_prefix = parse_s3_path(prefix)
+        bucket_dir = os.path.join(self.root, bucket_name)
+        paths = []
+        for dirpath, _, filenames in os.walk(bucket_dir):
+            for filename in filenames:
+                key_name = os.path.relpath(
+                    os.path.join(dirpath, filename), bucket_dir
+                )
+                if key_name.startswith(key_prefix):
+                    paths.append('s3://{0}/{1}'.format(bucket_name, key_name))
+        return sorted(paths)
+
+    def iter_chunks(self, path):
+        with open(self.local_path(path), 'rb') as f:
+            while True:
+                chunk = f.read(READ_CHUNK_BYTES)
+                if not chunk:
+                    break
+                yield chunk
+
+    def _make_dirs(self, path):
+        try:
+            os.makedirs(os.path.dirname(self.local_path(path)))
+        except OSError, e:
+            # another worker may have made it first
+            if e.errno != errno.EEXIST:
+                raise
+
+    def put_file(self, path, local_file):
+        self._make_dirs(path)
+        shutil.copyfile(local_file, self.local_path(path))
+
+    def put_string(self, path, data):
+        self._make_dirs(path)
+        with open(self.local_path(path), 'wb') as f:
+            f.write(data)
+
+
+def get_storage(local, local_s3_root=None):
+    if local_s3_root:
+        return LocalStorage(local_s3_root)
+    return S3Storage(local)
+
+
+def list_input_paths(storage, input_glob):
+    """Returns the paths matching input_glob, e.g. s3://b/logs/part-*.gz"""
+    glob_starts = [input_glob.find(c) for c in GLOB_CHARS if c in input_glob]
+    prefix = input_glob[:min(glob_starts)] if glob_starts else input_glob
+    return sorted(path for path in storage.list_paths(prefix)
+                  if fnmatch.fnmatchcase(path, input_glob))
+
+
+def iter_lines(chunks, is_gzip):
+    """Yields the lines of a stream of chunks, gunzipping it if is_gzip
+
+    Concatenated gzip members, as written by log appenders, are read in turn
+    """
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if is_gzip \
+        else None
+    pending = ''
+    for chunk in chunks:
+        if decompressor is not None:
+            data = decompressor.decompress(chunk)
+            while decompressor.unused_data:
+                unused_data = decompressor.unused_data
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                data += decompressor.decompress(unused_data)
+            chunk = data
+        lines = (pending + chunk).split('\n')
+        pending = lines.pop()
+        for line in lines:
+            yield line
+    if pending:
+        yield pending
+
+
+def _run_shard(shard):
+    """Runs the mapper over one input path, in a pool worker
+
+    Returns a dict of table name to the number of rows written
+    """
+    mrjob_path, job_args, input_path, output_dir, part_number, \
+        local, local_s3_root = shard
+
+    module_name, entry_point = mrjob_path.rsplit('.', 1)
+    module = __import__(module_name, globals(), locals(), [entry_point])
+    mr_job = getattr(module, entry_point)(args=job_args)
+    read = mr_job.input_protocol().read
+    write = mr_job.output_protocol().write
+
+    # derive_filename reads it like it does on hadoop
+    os.environ['map_input_file'] = input_path
+    storage = get_storage(local, local_s3_root)
+    tmp_dir = tempfile.mkdtemp(prefix='local_et')
+    table_to_file = {}
+    table_to_rows = {}
+
+    def write_output(outputs):
+        for k, v in outputs or ():
+            # split batched output into one record per row
+            for record in write(k, v).split('\n'):
+                table_name, row = record.split('\t', 1)
+                out = table_to_file.get(table_name)
+                if out is None:
+                    out = gzip.open(os.path.join(
+                        tmp_dir, '{0}.gz'.format(len(table_to_file))
+                    ), 'wb')
+                    table_to_file[table_name] = out
+                    table_to_rows[table_name] = 0
+                out.write(row)
+                out.write('\n')
+                table_to_rows[table_name] += 1
+
+    try:
+        mr_job.mapper_init()
+        for line in iter_lines(storage.iter_chunks(input_path),
+                               input_path.endswith('.gz')):
+            key, value = read(line.rstrip('\r'))
+            write_output(mr_job.mapper(key, value))
+        write_output(mr_job.mapper_final())
+
+        for table_name, out in table_to_file.iteritems():
+            out.close()
+            storage.put_file(
+                os.path.join(output_dir, table_name,
+                             'part-{0:05d}.gz'.format(part_number)),
+                out.name
+            )
+    finally:
+        for out in table_to_file.itervalues():
+            out.close()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return table_to_rows
+
+
+def run_local_et(mrjob_path, input_glob, output_dir, extractions, delimiter,
+                 processes, local, logstream, local_s3_root=None):
+    """
+    Runs the mapper of the mrjob created by mrjob_path on every input path
+    matching input_glob, with a pool of processes
+
+    Args:
+        mrjob_path -- module.entry_point string used to create the mrjob
+        input_glob -- glob of the input paths
+        output_dir -- the prefix under which tables and _SUCCESS are written
+        extractions -- the schema file the mrjob extracts tables with
+        delimiter -- column delimiter for the output
+        processes -- the number of worker processes
+        local -- True if we're running locally (i.e., devc)
+        logstream -- a PipelineStreamLogger
+        local_s3_root -- a directory standing in for S3, if any
+
+    Returns:
+        True / False -- for success / failure of the execution
+        reason -- a reason for failure if any
+    """
+    start_epoch = time.time()
+    logstream.write_msg("start")
+    pool = None
+    try:
+        storage = get_storage(local, local_s3_root)
+        input_paths = list_input_paths(storage, input_glob)
+        if not input_paths:
+            raise IOError("no input matches {0}".format(input_glob))
+        logstream.write_msg(
+            "running",
+            extra_msg="{0} on {1} inputs with {2} processes".format(
+                mrjob_path, len(input_paths), processes
+            )
+        )
+
+        job_args = ['--extractions', extractions,
+                    '--column-delimiter', delimiter]
+        shards = [
+            (mrjob_path, job_args, input_path, output_dir, part_number,
+             local, local_s3_root)
+            for part_number, input_path in enumerate(input_paths)
+        ]
+        pool = Pool(processes=max(1, min(processes, len(shards))))
+        table_to_rows = {}
+        for shard_rows in pool.imap_unordered(_run_shard, shards):
+            for table_name, rows in shard_rows.iteritems():
+                table_to_rows[table_name] = \
+                    table_to_rows.get(table_name, 0) + rows
+        pool.close()
+
+        storage.put_string(os.path.join(output_dir, '_SUCCESS'), '')
+        logstream.write_msg(
+            "finished",
+            job_start_secs=start_epoch,
+            extra_msg="rows: {0}".format(table_to_rows)
+        )
+    except KeyboardInterrupt:
+        raise
+    except Exception:
+        exc_type, exc_value, exc_tb = sys.exc_info()
+        error_info = {
+            'crash_tb': ''.join(traceback.format_tb(exc_tb)),
+            'crash_exc': traceback.format_exception_only(
+                exc_type, exc_value
+            )[0].strip(),
+        }
+        logstream.write_msg(
+            "error",
+            job_start_secs=start_epoch,
+            error_msg=error_info
+        )
+        return (False, "see logs; local et, snippet: {0}".format(
+            error_info['crash_exc']))
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    return (True, None)
@@ -14,6 +14,8 @@ import simplejson
 
 from sherlock.batch.mr_redshift_etl import derive_filename
 from sherlock.batch.mr_redshift_etl import MRRedshiftETL
+from sherlock.common.json_decoder import DECODER_NAMES
+from sherlock.common.json_decoder import get_json_decoder
 
 
 class MRJsonETL(MRRedshiftETL):
@@ -22,6 +24,21 @@ class MRJsonETL(MRRedshiftETL):
         '__source_filename__': derive_filename,
     }
 
+    def configure_options(self):
+        super(MRJsonETL, self).configure_options()
+        self.add_passthrough_option(
+            "--json-decoder", type='choice', choices=DECODER_NAMES,
+            default='simplejson',
+            help="json decoder (default: %default). ujson is faster but "
+            "lossy: a few invalid lines, like an object with a trailing "
+            "comma, become rows instead of error rows, and lone surrogates "
+            "are dropped",
+        )
+
+    def mapper_init(self):
+        super(MRJsonETL, self).mapper_init()
+        self.json_decoder = get_json_decoder(self.options.json_decoder)
+
     def derive_metric(self,
                       name_to_object=None, metric_name=None, context=None):
         return self.METRIC_NAME_TO_EVAL_FUNC[metric_name](name_to_object,
@@ -33,11 +50,13 @@ class MRJsonETL(MRRedshiftETL):
         It then emits the key, value based on the YAML schema
         """
         try:
-            single_entry_dict = simplejson.loads(value)
-            for k, v in self.emit_rows_for_tables(single_entry_dict):
-                yield k, v
+            single_entry_dict = self.json_decoder.decode(value)
         except simplejson.JSONDecodeError:
             yield self.emit_exception_row(value)
+            return
+
+        for k, v in self.emit_rows_for_tables(single_entry_dict):
+            yield k, v
 
 
 def mrjob_create(args=None):
@@ -36,6 +36,12 @@ class MRRedshiftETL(MRJob):
             "--column-delimiter", type='string', default='|',
             help="column delimiter",
         )
+        self.add_passthrough_option(
+            "--emit-batch-size", type='int', default=0,
+            help="extract and emit rows for this many input lines at a "
+            "time, one output record per table per batch; 0 emits rows as "
+            "each line is read (default: %default)",
+        )
 
     def mapper_init(self):
         """ mrjob initialization.
@@ -63,15 +69,27 @@ class MRRedshiftETL(MRJob):
                 [column.name for column in columns if not column.is_noop])
             for table_name, columns in self.table_name_to_columns.iteritems()
         )
+        self.table_plans = [
+            (table_name, table.compile())
+            for table_name, table in self.table_name_to_table.iteritems()
+        ]
         self.redshift_export = RedshiftExportProtocol(
             delimiter=self.options.column_delimiter
         )
+        self.pending_batch = []
 
         error_table_name, error_table = self.schema.get_error_table()
         self.error_tbl_name = error_table_name
         self.error_tbl_output_order = [c['log_key'] for c in error_table['columns']]
 
     def mapper_final(self):
+        """ mrjob finalization.
+        Should you decide to override, you should yield everything this
+        method yields, as it emits the rows of the last batch.
+        """
+        for k, v in self.flush_rows_for_tables():
+            yield k, v
+
         for table_name in self.table_name_to_table:
             table = self.table_name_to_table[table_name]
             if len(table.truncated_columns):
@@ -132,8 +150,9 @@ class MRRedshiftETL(MRJob):
             'error_reason': error_msg['crash_exc'],     # error summary
             'error_detail': error_msg                   # error detail
         }
-        self.redshift_export.given_output_order = self.error_tbl_output_order
-        return self.error_tbl_name, self.redshift_export.write(None, row)
+        return self.error_tbl_name, self.redshift_export.write_row(
+            [row[name] for name in self.error_tbl_output_order]
+        )
 
     def emit_rows_for_tables(self, name_to_object):
         """Use this inside your mapper function to generate
@@ -141,10 +160,41 @@ class MRRedshiftETL(MRJob):
 
         name_to_object: a dictionary with keys that may be
            referenced by your schema
+
+        With --emit-batch-size set, name_to_object is queued instead and
+        the rows of the whole batch are yielded once it is full.
+        """
+        if self.options.emit_batch_size > 0:
+            self.pending_batch.append(name_to_object)
+            if len(self.pending_batch) >= self.options.emit_batch_size:
+                for k, v in self.flush_rows_for_tables():
+                    yield k, v
+            return
+
+        write_row = self.redshift_export.write_row
+        for table_name, plan in self.table_plans:
+            for row in plan.row_iterator(name_to_object,
+                                         derive_metric=self.derive_metric):
+                yield table_name, write_row(row)
+
+    def flush_rows_for_tables(self):
+        """Emits the rows of every queued object, one record per table
+
+        The columns of each table are extracted for the whole batch and
+        serialized in bulk. Hadoop streaming splits map output on newlines,
+        so the rows of a table are joined with a newline followed by the
+        table name and a tab: the single record written here reads back as
+        one (table_name, row) record per row.
         """
-        for table_name, table in self.table_name_to_table.iteritems():
-            for row in table.value_iterator(name_to_object=name_to_object,
-                                            derive_metric=self.derive_metric):
-                self.redshift_export.given_output_order = \
-                    self.table_name_to_output_order[table_name]
-                yield table_name, self.redshift_export.write(None, row)
+        batch, self.pending_batch = self.pending_batch, []
+        if not batch:
+            return
+
+        for table_name, plan in self.table_plans:
+            columns = plan.extract_columns(batch,
+                                           derive_metric=self.derive_metric)
+            if not columns or not columns[0]:
+                continue
+            yield table_name, self.redshift_export.write_columns(
+                columns, row_separator='\n{0}\t'.format(table_name)
+            )
@@ -17,6 +17,9 @@ sherlock/batch/s3_to_psv.py --date 2003-11-01 --private /path/to/private.yaml \
 --io_yaml pipeline_io.yaml --run-local true \
 --config=config.yaml --config-override=config-dev.yaml
 
+Setting 'pipeline.et_step.engine' to 'local' runs the mr job's mapper with
+local processes instead of EMR (see local_et_runner.py).
+
 IMPORTANT:
 s3_to_psv.py discovers which mr job code to run by reading config key
 'pipeline.et_step.mrjob' from pipeline YAML file (--io_yaml switch) or
@@ -29,6 +32,7 @@ def mrjob_create(args=None):
 
 """
 
+from multiprocessing import cpu_count
 import os
 import re
 import sys
@@ -41,6 +45,8 @@ from staticconf import read_list
 from staticconf import read_string
 from staticconf import YamlConfiguration
 
+from sherlock.batch.local_et_runner import LocalStorage
+from sherlock.batch.local_et_runner import run_local_et
 from sherlock.common.redshift_psql import RedshiftPostgres
 from sherlock.common.redshift_status import RedshiftStatusTable
 from sherlock.common.dynamodb_status import DynamoDbStatusTable
@@ -95,6 +101,40 @@ def create_emr_args(date_with_slashes, cores, infile_prefix, local):
     )
 
 
+def __run_local_et(mrjob_path, date_with_slashes, infile_prefix, local,
+                   logstream):
+    """
+    Runs the ET with local processes instead of EMR, reading and writing
+    the same S3 locations as the mr job created by create_emr_args
+
+    Args:
+        mrjob_path -- module.entry_point string which is
+            used to create the mrjob object
+        date_with_slashes -- a date string of the form 'YYYY/MM/DD'
+        infile_prefix -- the prefix to the search bucket
+        local -- True if we're running locally (i.e., devc)
+        logstream -- a PipelineStreamLogger
+
+    Returns:
+        True / False -- for success / failure of the execution
+        reason -- a reason for failure if any
+    """
+    input_glob = infile_prefix + date_with_slashes +\
+        read_string('pipeline.et_step.s3_input_suffix')
+    output_dir = os.path.join(get_s3_output_user_prefix(), date_with_slashes)
+    return run_local_et(
+        mrjob_path,
+        input_glob,
+        output_dir,
+        pipeline_yaml_schema_file_path(),
+        read_string('redshift_column_delimiter'),
+        read_int('pipeline.et_step.local_processes', cpu_count()),
+        local,
+        logstream,
+        local_s3_root=read_string('pipeline.et_step.local_s3_root', None)
+    )
+
+
 def __run_mr_job(mrjob_path, mrjob_arg_str, logstream):
     """
     Extracts mrjob_file (i.e. mr code to run) and
@@ -191,6 +231,11 @@ def data_available(prefix, input_date, local, done_file_name='COMPLETE', force_e
     bucket, prefix_s3 = parse_s3_path(prefix)
     key = prefix_s3 + os.sep + input_date + os.sep + done_file_name
     key = re.sub(os.sep + '+', os.sep, key)  # remove extra slashes if any
+    local_s3_root = read_string('pipeline.et_step.local_s3_root', None)
+    if local_s3_root:
+        return LocalStorage(local_s3_root).path_exists(
+            's3://{0}/{1}'.format(bucket, key)
+        )
     return bucket_key_exists(bucket, key, local)
 
 
@@ -325,15 +370,22 @@ def __load_data_from_s3(
         return
 
     jobtime = time.time()
-    mrjob_args = create_emr_args(
-        date_with_slashes,
-        read_int('pipeline.et_step.cores'),
-        prefix_for_this_data, local
-    )
-    status_helper.insert_et(conditions, db_name)
-    logstream.write_msg("running", extra_msg=mrjob_args)
+    if read_string('pipeline.et_step.engine', 'emr') == 'local':
+        status_helper.insert_et(conditions, db_name)
+        result, err_reason = __run_local_et(
+            mrjob_path, date_with_slashes, prefix_for_this_data, local,
+            logstream
+        )
+    else:
+        mrjob_args = create_emr_args(
+            date_with_slashes,
+            read_int('pipeline.et_step.cores'),
+            prefix_for_this_data, local
+        )
+        status_helper.insert_et(conditions, db_name)
+        logstream.write_msg("running", extra_msg=mrjob_args)
 
-    result, err_reason = __run_mr_job(mrjob_path, mrjob_args, logstream)
+        result, err_reason = __run_mr_job(mrjob_path, mrjob_args, logstream)
     failed = not result
 
     jobtime = time.time() - start_time
@@ -13,17 +13,30 @@ import os
 import re
 import sys
 import string
+import threading
 import time
 import traceback
 from datetime import datetime
 from datetime import timedelta
+from itertools import izip
+from multiprocessing.pool import ThreadPool
 from os.path import join
 from yaml import safe_load
 
+import simplejson
+
+from staticconf import read_bool
 from staticconf import read_int
 from staticconf import read_string
 from staticconf import YamlConfiguration
 
+from sherlock.batch.local_et_runner import get_storage
+from sherlock.common.redshift_catalog import get_loaded_schema_hash
+from sherlock.common.redshift_catalog import get_schema_hash
+from sherlock.common.redshift_catalog import get_schema_table_defs
+from sherlock.common.redshift_catalog import get_tables_key
+from sherlock.common.redshift_catalog import invalidate_table_defs
+from sherlock.common.redshift_catalog import record_loaded_schema_hash
 from sherlock.common.redshift_psql import get_namespaced_tablename
 from sherlock.common.redshift_psql import get_redshift_schema
 from sherlock.common.redshift_psql import RedshiftPostgres
@@ -45,6 +58,9 @@ from sherlock.common.config_util import load_package_config
 
 ERROR_MSG_COL_SIZE = 256
 
+# redshift runs one vacuum at a time, concurrent copies take turns
+VACUUM_LOCK = threading.Lock()
+
 #
 # queries requiring the redshift search_path to include the schema
 # note: we have to set this prior to running these queries otherwise
@@ -72,6 +88,19 @@ delimiter '%s' \
 ESCAPE gzip TRUNCATECOLUMNS TIMEFORMAT as 'epochmillisecs' \
 NULL AS '\\0' STATUPDATE ON;"""
 
+#
+# LOAD_FROM_MANIFEST gets a table_name, manifest path, aws_key, and
+# aws_secret
+#
+LOAD_FROM_MANIFEST = """\
+copy %s from '%s' \
+CREDENTIALS \
+'aws_access_key_id=%%s;aws_secret_access_key=%%s;token=%%s' \
+MANIFEST \
+delimiter '%s' \
+ESCAPE gzip TRUNCATECOLUMNS TIMEFORMAT as 'epochmillisecs' \
+NULL AS '\\0' STATUPDATE ON;"""
+
 QUERY_GET_MIN_MAX_DATE = """SELECT min({1}), max({1}) from {0}"""
 
 QUERY_DELETE_ROWS_BY_DATE = """DELETE from {0} \
@@ -80,6 +109,18 @@ where {1} < %(new_min_date)s"""
 QUERY_ADD_COLUMN = """alter table {0} \
 add column {1} {2} encode {3} {4} default {5}"""
 
+QUERY_CREATE_PARTITION = "create table {0} (like {1})"
+
+QUERY_DROP_TABLE = "drop table {0}"
+
+QUERY_DROP_VIEW = "drop view if exists {0}"
+
+QUERY_CREATE_VIEW = "create view {0} as {1}"
+
+PARTITION_DATE_FORMAT = "%Y%m%d"
+
+RETENTION_MODES = ['delete', 'partition']
+
 
 def get_create_commands(input_file, add_error_table=True):
     """
@@ -122,6 +163,16 @@ def get_create_commands(input_file, add_error_table=True):
     return table_create_tuples
 
 
+def get_create_tuples_key(create_tuples):
+    """
+    get_create_tuples_key returns the tables key (see get_tables_key) of the
+    tables in the tuples of get_create_commands
+    """
+    return get_tables_key(
+        table.strip() for (table, _) in create_tuples if table is not None
+    )
+
+
 def get_current_tables(rs_psql, database):
     """
     get_current_tables gets a list of current tables
@@ -271,19 +322,11 @@ def get_timestamp_column_name(psql, db_name, table):
     Return: column name
     Throw: ValueError
     """
-    rs_schema = get_redshift_schema()
-    params = {
-        'tablename': table,
-        'schemaname': rs_schema,
-    }
-    result = psql.run_sql(
-        QUERY_GET_SORT_COLUMN,
-        db_name,
-        "find sort column",
-        params=params,
-        output=True,
-        schema=rs_schema
-    )
+    result = [
+        (row[PgTableDef.Column], row[PgTableDef.Type])
+        for row in get_cached_table_def(psql, db_name, table)
+        if row[PgTableDef.SortKey] == 1
+    ]
     column = get_sortkey_column(result, 'timestamp')
     if len(column) == 0:
         column = get_sortkey_column(result, 'date')
@@ -322,7 +365,95 @@ def get_min_max_date(psql, db_name, table, column):
     return result[0][0], result[0][1]
 
 
-def delete_old_data(psql, db_name, table, ttl_days):
+def get_ttl_cutoff(dt_min_date, dt_max_date, ttl_days):
+    """
+    Find the day before which data goes to keep ttl_days days of data
+    before the newest.  Round-down min_date, max_date to 00:00:00 UTC
+    for cutoff calculation.
+
+    Return: the cutoff datetime, or None if nothing is past the TTL
+    """
+    # cutoff is always YYYY-MM-DD 00:00:00
+    dt_min = datetime(dt_min_date.year, dt_min_date.month, dt_min_date.day)
+    dt_max = datetime(dt_max_date.year, dt_max_date.month, dt_max_date.day)
+
+    num_days = (dt_max - dt_min).days
+    if ttl_days is None or num_days <= ttl_days:
+        return None
+    return dt_min + timedelta(days=num_days - ttl_days)
+
+
+def get_loaded_range(psql, status_helper, db_name, table, column):
+    """
+    Determine the oldest, freshest day of data in a table from the ranges
+    the status store tracks.  Tables it has no range for are scanned with
+    get_min_max_date, and the range found is recorded.
+
+    Args:
+    psql -- handle to talk to redshift
+    status_helper -- the status store, None to always scan
+    db -- redshift database containing table
+    table -- table name
+    column -- timestamp column name found via get_timestamp_column_name
+
+    Return: min_date, max_date, scanned -- scanned is True if the dates
+    come from scanning the table
+    """
+    namespaced_table_name = get_namespaced_tablename(table)
+    if status_helper is not None:
+        loaded_range = status_helper.get_loaded_range(
+            db_name, namespaced_table_name
+        )
+        if loaded_range is not None:
+            return loaded_range[0], loaded_range[1], False
+
+    dt_min_date, dt_max_date = get_min_max_date(psql, db_name, table, column)
+    if status_helper is not None and \
+            dt_min_date is not None and dt_max_date is not None:
+        status_helper.set_loaded_range(
+            db_name, namespaced_table_name, dt_min_date, dt_max_date
+        )
+    return dt_min_date, dt_max_date, True
+
+
+def record_loaded_day(status_helper, db_name, table, ddate, ttl_days):
+    """
+    Record in the status store that a day was loaded into a table, and that
+    days past the TTL were deleted by delete_old_data.  Call it once the
+    load is committed.
+
+    Args:
+    status_helper -- the status store
+    db -- redshift database containing table
+    table -- table name
+    ddate -- the date string of the data loaded formatted YYYY/MM/DD
+    ttl_days -- max TTL of data in a table, as given to copy_table
+
+    Return: None
+    """
+    if ttl_days is None:
+        # nothing is deleted, so no range is needed
+        return
+    namespaced_table_name = get_namespaced_tablename(table)
+    day = datetime.strptime(ddate, "%Y/%m/%d")
+    loaded_range = status_helper.get_loaded_range(
+        db_name, namespaced_table_name
+    )
+    if loaded_range is None:
+        min_date, max_date = day, day
+    else:
+        min_date, max_date = loaded_range
+        cutoff = get_ttl_cutoff(min_date, max_date, ttl_days - 1)
+        if cutoff is not None:
+            min_date = cutoff
+        min_date = min(min_date, day)
+        max_date = max(max_date, day)
+    status_helper.set_loaded_range(
+        db_name, namespaced_table_name, min_date, max_date
+    )
+
+
+def delete_old_data(psql, db_name, table, ttl_days, status_helper=None):
     """
     Delete data older than TTL.  Round-down min_date, max_date to 00:00:00 UTC
     for cutoff calculation.
@@ -332,24 +463,22 @@ def delete_old_data(psql, db_name, table, ttl_days):
     db -- redshift database containing table
     table -- table name
     ttl_days -- max TTL of data in a table
+    status_helper -- a status store tracking the days loaded into tables,
+                     which saves scanning the table for its min and max
 
     Return: None
     """
     cname = get_timestamp_column_name(psql, db_name, table)
     if cname is None:
         return 0
-    dt_min_date, dt_max_date = get_min_max_date(psql, db_name, table, cname)
+    dt_min_date, dt_max_date, scanned = \
+        get_loaded_range(psql, status_helper, db_name, table, cname)
     if dt_min_date is None or dt_max_date is None:
         return 0
 
-    # cutoff is always YYYY-MM-DD 00:00:00
-    dt_min = datetime(dt_min_date.year, dt_min_date.month, dt_min_date.day)
-    dt_max = datetime(dt_max_date.year, dt_max_date.month, dt_max_date.day)
-
-    num_days = (dt_max - dt_min).days
+    dt_new_min_date = get_ttl_cutoff(dt_min_date, dt_max_date, ttl_days)
     num_deleted = 0
-    if ttl_days is not None and num_days > ttl_days:
-        dt_new_min_date = dt_min + timedelta(days=num_days - ttl_days)
+    if dt_new_min_date is not None:
         new_min_date = datetime.strftime(dt_new_min_date, "%Y-%m-%d %H:%M:%S")
         query = QUERY_DELETE_ROWS_BY_DATE.format(
             get_namespaced_tablename(table),
@@ -361,7 +490,8 @@ def delete_old_data(psql, db_name, table, ttl_days):
             match = re.search(r"^DELETE\s+(?P<num_deleted>\d+)$",
                               result.get('status', ''))
             num_deleted = int(match.group('num_deleted')) if match else 0
-        if num_deleted <= 0:
+        # a tracked range is by data date, rows may be off by a day
+        if num_deleted <= 0 and scanned:
             raise ValueError("nothing to delete for {0}".format(table))
     return num_deleted
 
@@ -397,6 +527,24 @@ def get_table_def(psql, db, tablename):
     return results
 
 
+def get_cached_table_def(psql, db, tablename, schema_version=None):
+    """ Like get_table_def, but from the table defs of the whole schema,
+    which are fetched once and cached (see redshift_catalog.py)
+
+    schema_version -- refetch the cached defs unless they are for this
+                      version, usually the hash of the schema yaml
+    """
+    rs_schema = get_redshift_schema()
+    table_defs = get_schema_table_defs(psql, db, rs_schema, schema_version)
+    if tablename not in table_defs:
+        # the table may have been created since the defs were cached
+        invalidate_table_defs(psql, db, rs_schema)
+        table_defs = get_schema_table_defs(
+            psql, db, rs_schema, schema_version
+        )
+    return table_defs.get(tablename, [])
+
+
 def has_table_def(table_def):
     """ Check if table is defined in the database.
     """
@@ -463,17 +611,25 @@ or distkey".format(table, row[PgTableDef.Column]))
         # copy data into tmp_tbl_name in order to detect encoding
         copy_table(psql, db, ddate, tbl_tuple, MAX_TTL_DAYS, logstream)
         tmp_tbl_def = get_table_def(psql, db, tmp_tbl_name)
+        # partitions must keep the columns of the table for its view
+        tables_to_alter = [table]
+        if get_retention_mode() == 'partition':
+            tables_to_alter.extend(
+                name for _, name in get_partitions(psql, db, table)
+            )
         for row in tmp_tbl_def[len(tmp_tbl_def) - len(to_add):]:
             encoding = row[PgTableDef.Encoding]
-            query = QUERY_ADD_COLUMN.format(
-                get_namespaced_tablename(table),
-                row[PgTableDef.Column],
-                row[PgTableDef.Type],
-                "raw" if encoding == "none" else encoding,
-                "not null" if row[PgTableDef.NotNull] else "null",
-                defaults[row[PgTableDef.Column]]
-            )
-            psql.run_sql(query, db, query)
+            for tbl_name in tables_to_alter:
+                query = QUERY_ADD_COLUMN.format(
+                    get_namespaced_tablename(tbl_name),
+                    row[PgTableDef.Column],
+                    row[PgTableDef.Type],
+                    "raw" if encoding == "none" else encoding,
+                    "not null" if row[PgTableDef.NotNull] else "null",
+                    defaults[row[PgTableDef.Column]]
+                )
+                psql.run_sql(query, db, query)
+        invalidate_table_defs(psql, db, get_redshift_schema())
 
 
 def get_column_defaults(table):
@@ -506,6 +662,7 @@ def create_tables(psql, db, create_tuples):
     for table, create in create_tuples:
         if table not in current_tables:
             psql.run_sql(create, db, " creating table: {0}".format(table))
+            invalidate_table_defs(psql, db, get_redshift_schema())
 
 
 def update_database_schema(psql, db, ddate, s3_logdir, schema_file, logstream):
@@ -515,6 +672,10 @@ def update_database_schema(psql, db, ddate, s3_logdir, schema_file, logstream):
         2.  compare table definitions
         3.  add new columns
 
+    Steps 2 and 3 are skipped if the schema yaml hasn't changed since the
+    last successful load of its tables, see record_loaded_schema_hash,
+    unless pipeline.load_step.skip_unchanged_schema is false.
+
     Args:
     psql -- handle to talk to redshift
     db -- redshift database containing table
@@ -537,6 +698,14 @@ def update_database_schema(psql, db, ddate, s3_logdir, schema_file, logstream):
     create_tuples = get_table_creates(schema_file, logstream)
     create_tables(psql, db, create_tuples)
 
+    schema_hash = get_schema_hash(fname)
+    if read_bool('pipeline.load_step.skip_unchanged_schema', True) and \
+            get_loaded_schema_hash(psql, db, get_redshift_schema(),
+                                   get_create_tuples_key(create_tuples)) == \
+            schema_hash:
+        logstream.write_msg('running', extra_msg="schema unchanged")
+        return
+
     # check for schema changes
     for table in tables.keys():
         tmp_tbl_name = "tmp_{0}".format(table)
@@ -548,7 +717,7 @@ def update_database_schema(psql, db, ddate, s3_logdir, schema_file, logstream):
 
         try:
             # fetch table definition
-            cur_tbl_def = get_table_def(psql, db, table)
+            cur_tbl_def = get_cached_table_def(psql, db, table, schema_hash)
             tmp_tbl_def = get_table_def(psql, db, tmp_tbl_name)
             compare_table_defs(psql, db, table, cur_tbl_def, tmp_tbl_def)
 
@@ -563,7 +732,58 @@ def update_database_schema(psql, db, ddate, s3_logdir, schema_file, logstream):
                 psql.run_sql(delete_table_cmd, db, delete_table_cmd)
 
 
-def copy_table(psql_helper, db_name, ddate, log_tuple, ttl_days, logstream):
+def write_manifest(storage, s3_log):
+    """
+    write_manifest lists the part files ET wrote for a table and saves them
+    as a redshift COPY manifest next to the table's directory
+
+    Args:
+    storage -- an S3Storage or LocalStorage (see local_et_runner.py)
+    s3_log -- path to the table in PSV format
+
+    Returns:
+    the manifest path, <s3_log>.manifest, or None if there are no parts
+    """
+    parts = storage.list_paths(join(s3_log, 'part'))
+    if not parts:
+        return None
+    manifest_path = s3_log.rstrip('/') + '.manifest'
+    storage.put_string(manifest_path, simplejson.dumps({
+        'entries': [{'url': part, 'mandatory': True} for part in parts]
+    }))
+    return manifest_path
+
+
+def get_copy_delimiter():
+    delimiter = read_string('redshift_column_delimiter')
+    delimiter = delimiter.decode("string_escape")
+    if delimiter not in string.printable:
+        delimiter = '\\' + oct(ord(delimiter))
+    return delimiter
+
+
+def copy_table(psql_helper, db_name, ddate, log_tuple, ttl_days, logstream,
+               manifest=None, compact=True, status_helper=None):
+    """
+    copy_table removes data older than ttl_days from a table and copies the
+    day's data into it
+
+    Args:
+    psql_helper -- a RedshiftPostgres (or RedshiftTransaction) to copy with
+    db_name -- the name of the db to which we're copying
+    ddate -- the date string of the data to be copied formatted YYYY/MM/DD
+    log_tuple -- a (log, table) pair
+    ttl_days -- how many days to retain loaded data
+    logstream -- a PipelineStreamLogger
+    manifest -- path of a manifest listing the log's part files, if any,
+                to copy from instead of the log prefix
+    compact -- False to leave vacuuming to the caller, which it must do
+               outside of any transaction
+    status_helper -- the status store, passed to delete_old_data
+
+    Returns:
+    the run_sql result of the copy
+    """
     s3_log, rs_table = log_tuple
     namespaced_table_name = get_namespaced_tablename(rs_table)
     table_start = time.time()
@@ -573,8 +793,10 @@ def copy_table(psql_helper, db_name, ddate, log_tuple, ttl_days, logstream):
     # about to load new day, remove oldest
     rows_deleted = None
     if ttl_days is not None:
-        rows_deleted = \
-            delete_old_data(psql_helper, db_name, rs_table, ttl_days - 1)
+        rows_deleted = delete_old_data(
+            psql_helper, db_name, rs_table, ttl_days - 1,
+            status_helper=status_helper
+        )
     if rows_deleted:
         logstream.write_msg('delete_ok',
                             extra_msg="{0} rows".format(rows_deleted))
@@ -584,15 +806,17 @@ def copy_table(psql_helper, db_name, ddate, log_tuple, ttl_days, logstream):
     # scenario where rows were deleted but compact failed. Then on retry
     # there will be nothing to delete but since space is not reclaimed
     # there may not be enough for a new load, resulting in failure forever.
-    if ttl_days is not None:
-        compact_table(psql_helper, db_name, namespaced_table_name)
+    if ttl_days is not None and compact:
+        with VACUUM_LOCK:
+            compact_table(psql_helper, db_name, namespaced_table_name)
 
-    delimiter = read_string('redshift_column_delimiter')
-    delimiter = delimiter.decode("string_escape")
-    if delimiter not in string.printable:
-        delimiter = '\\' + oct(ord(delimiter))
-
-    copy_sql = LOAD % (namespaced_table_name, s3_log, delimiter)
+    delimiter = get_copy_delimiter()
+    if manifest is None:
+        copy_sql = LOAD % (namespaced_table_name, s3_log, delimiter)
+    else:
+        copy_sql = LOAD_FROM_MANIFEST % (
+            namespaced_table_name, manifest, delimiter
+        )
     result = psql_helper.run_sql(
         copy_sql,
         db_name, " copying from " + s3_log,
@@ -605,12 +829,247 @@ def copy_table(psql_helper, db_name, ddate, log_tuple, ttl_days, logstream):
     return result
 
 
+def get_retention_mode():
+    """
+    get_retention_mode returns pipeline.load_step.retention_mode:
+        delete -- tables hold every day, copy_table deletes expired rows
+        partition -- each day goes into its own table, see
+                     copy_table_partition
+    """
+    retention_mode = read_string('pipeline.load_step.retention_mode',
+                                 'delete')
+    if retention_mode not in RETENTION_MODES:
+        raise ValueError(
+            "unknown retention mode: {0}".format(retention_mode)
+        )
+    return retention_mode
+
+
+def get_partition_name(table, ddate):
+    """ <table>_<YYYYMMDD>, the partition holding a day of a table
+    """
+    return "{0}_{1}".format(table, ddate.replace('/', ''))
+
+
+def get_partition_view_name(table):
+    """ <table>_all, the view over a table and its partitions
+    """
+    return "{0}_all".format(table)
+
+
+def get_partitions(psql, db, table):
+    """
+    get_partitions finds the partitions of a table
+
+    Returns:
+    a list of (day datetime, partition name) tuples, oldest first
+    """
+    regex = re.compile(r'^{0}_(?P<day>\d{{8}})$'.format(re.escape(table)))
+    partitions = []
+    for tbl_name in get_current_tables(psql, db):
+        match = regex.match(tbl_name)
+        if match:
+            day = datetime.strptime(match.group('day'), PARTITION_DATE_FORMAT)
+            partitions.append((day, tbl_name))
+    return sorted(partitions)
+
+
+def copy_table_partition(psql_helper, db_name, ddate, log_tuple, ttl_days,
+                         logstream, manifest=None):
+    """
+    copy_table_partition copies the day's data into its own partition,
+    <table>_<YYYYMMDD>, created like the table.  Partitions past the TTL
+    are dropped rather than deleted from, which needs no vacuum.  The
+    <table>_all view is a union all of the table and its partitions, and is
+    what queries should read.
+
+    Args:
+    psql_helper -- a RedshiftPostgres (or RedshiftTransaction) to copy with
+    db_name -- the name of the db to which we're copying
+    ddate -- the date string of the data to be copied formatted YYYY/MM/DD
+    log_tuple -- a (log, table) pair
+    ttl_days -- how many days to retain loaded data
+    logstream -- a PipelineStreamLogger
+    manifest -- path of a manifest listing the log's part files, if any
+
+    Returns:
+    the run_sql result of the copy
+    """
+    s3_log, rs_table = log_tuple
+    partition = get_partition_name(rs_table, ddate)
+    namespaced_partition = get_namespaced_tablename(partition)
+    namespaced_view = get_namespaced_tablename(
+        get_partition_view_name(rs_table)
+    )
+    partitions = get_partitions(psql_helper, db_name, rs_table)
+
+    with psql_helper.transaction(db_name) as txn:
+        if partition in [name for _, name in partitions]:
+            # reloading a day replaces its partition
+            txn.run_sql(QUERY_DROP_VIEW.format(namespaced_view),
+                        db_name, "dropping view")
+            txn.run_sql(QUERY_DROP_TABLE.format(namespaced_partition),
+                        db_name, "dropping partition")
+        else:
+            partitions.append(
+                (datetime.strptime(ddate, "%Y/%m/%d"), partition)
+            )
+        txn.run_sql(
+            QUERY_CREATE_PARTITION.format(
+                namespaced_partition, get_namespaced_tablename(rs_table)
+            ),
+            db_name, "creating partition"
+        )
+        result = copy_table(txn, db_name, ddate, (s3_log, partition),
+                            None, logstream, manifest=manifest)
+
+    partitions.sort()
+    cutoff = get_ttl_cutoff(partitions[0][0], partitions[-1][0], ttl_days)
+    expired = [name for day, name in partitions
+               if cutoff is not None and day < cutoff]
+    with psql_helper.transaction(db_name) as txn:
+        txn.run_sql(QUERY_DROP_VIEW.format(namespaced_view),
+                    db_name, "dropping view")
+        txn.run_sql(
+            QUERY_CREATE_VIEW.format(namespaced_view, " union all ".join(
+                "select * from {0}".format(get_namespaced_tablename(name))
+                for name in [rs_table] + [name for _, name in partitions
+                                          if name not in expired]
+            )),
+            db_name, "creating view"
+        )
+        for name in expired:
+            txn.run_sql(
+                QUERY_DROP_TABLE.format(get_namespaced_tablename(name)),
+                db_name, "dropping expired partition"
+            )
+    if expired:
+        logstream.write_msg('delete_ok', extra_msg="dropped {0}".format(
+            ", ".join(expired)
+        ))
+    return result
+
+
+def load_table(psql_helper, status_helper, db_name, ddate, log_tuple,
+               ttl_days, logstream, manifest=None, compact=True):
+    """
+    load_table copies the day's data into a table with copy_table, or
+    copy_table_partition in partition retention mode.  See copy_table for
+    the arguments.
+    """
+    if get_retention_mode() == 'partition':
+        return copy_table_partition(psql_helper, db_name, ddate, log_tuple,
+                                    ttl_days, logstream, manifest=manifest)
+    return copy_table(psql_helper, db_name, ddate, log_tuple, ttl_days,
+                      logstream, manifest=manifest, compact=compact,
+                      status_helper=status_helper)
+
+
+def record_loaded_days(status_helper, db_name, ddate, log_tuples, ttl_days,
+                       logstream):
+    """
+    record_loaded_days runs record_loaded_day for each loaded table in
+    delete retention mode.  The data is already loaded, so a failure is
+    logged rather than failing the load; the next TTL delete then keeps a
+    little more data than it needs to.
+    """
+    if get_retention_mode() != 'delete':
+        return
+    for _, rs_table in log_tuples:
+        try:
+            record_loaded_day(status_helper, db_name, rs_table, ddate,
+                              ttl_days)
+        except Exception as e:
+            logstream.write_msg(
+                'error', error_msg=repr(e),
+                extra_msg="recording loaded day for {0}".format(rs_table)
+            )
+
+
+def try_copy_table(psql_helper, status_helper, db_name, ddate, log_tuple,
+                   ttl_days, logstream):
+    """
+    try_copy_table runs load_table, turning a failure into an error message
+
+    Returns:
+    a (result, error_msg) tuple; result is False for a failed copy and None
+    for a copy into the error table that was skipped because there were no
+    errors to load
+    """
+    err_tbl_name, _ = RedShiftLogSchema().get_error_table()
+    result = False
+    error_msg = None
+    try:
+        result = load_table(psql_helper, status_helper, db_name, ddate,
+                            log_tuple, ttl_days, logstream)
+    except Exception:
+        exc_type, exc_value, exc_tb = sys.exc_info()
+        error_msg = "{0}".format({
+            'crash_tb': ''.join(traceback.format_tb(exc_tb)),
+            'crash_exc': traceback.format_exception_only(
+                exc_type, exc_value
+            )[0].strip()
+        })
+
+        # ignore copy error if error table does not exist
+        s3_log, rs_table = log_tuple
+        if rs_table == err_tbl_name and \
+           exc_value.args[0].find('The specified S3 prefix') != -1 and \
+           exc_value.args[0].find('does not exist') != -1:
+            result = None
+    if result:
+        record_loaded_days(status_helper, db_name, ddate, [log_tuple],
+                           ttl_days, logstream)
+    return result, error_msg
+
+
+def copy_tables_concurrently(psql_helper, status_helper, db_name, ddate,
+                             log_tuples, ttl_days, logstream, parallelism):
+    """
+    copy_tables_concurrently runs try_copy_table for up to parallelism
+    tables at a time, each on its own redshift session.  Once a copy fails
+    the tables not yet started are skipped.
+
+    Returns:
+    a list of try_copy_table results in log_tuples order, with (None, None)
+    for skipped tables
+    """
+    failed = threading.Event()
+
+    def copy_one(log_tuple):
+        if failed.is_set():
+            return None, None
+        result, error_msg = try_copy_table(
+            psql_helper, status_helper, db_name, ddate, log_tuple,
+            ttl_days, logstream
+        )
+        if result is False:
+            failed.set()
+        return result, error_msg
+
+    pool = ThreadPool(processes=min(parallelism, len(log_tuples)))
+    try:
+        # a timeout keeps the wait interruptible with ctrl-c
+        return pool.map_async(copy_one, log_tuples, chunksize=1).get(
+            sys.maxint
+        )
+    finally:
+        failed.set()
+        pool.close()
+        pool.join()
+
+
 def copy_tables(psql_helper, status_helper,
                 db_name, ddate, log_tuples, ttl_days, logstream):
     """
     copy_tables takes a list of input log, table pairs and copies each
     input log to its corresponding input table
 
+    Tables are copied one after another unless
+    pipeline.load_step.copy_parallelism is more than 1, in which case that
+    many copies run against the cluster at once.  Either way the status is
+    set to error for the first failed table, in log_tuples order.
+
     Args:
     psql_helper -- a RedshiftPostgres object to help perform the copy
     status_helper -- An object handle to interact with status table
@@ -626,43 +1085,100 @@ def copy_tables(psql_helper, status_helper,
     start = time.time()
     yaml_versions = get_yaml_table_versions(pipeline_yaml_schema_file_path())
     status_helper.update_status(db_name, ddate, yaml_versions, "running")
-    err_tbl_name, _ = RedShiftLogSchema().get_error_table()
-    for log_tuple in log_tuples:
-        result = False
-        error_msg = None
-        try:
-            result = copy_table(psql_helper, db_name, ddate,
-                                log_tuple, ttl_days, logstream)
-        except KeyboardInterrupt:
-            result = None
-            raise
-        except Exception:
-            exc_type, exc_value, exc_tb = sys.exc_info()
-            error_msg = "{0}".format({
-                'crash_tb': ''.join(traceback.format_tb(exc_tb)),
-                'crash_exc': traceback.format_exception_only(
-                    exc_type, exc_value
-                )[0].strip()
-            })
-
-            # ignore copy error if error table does not exist
-            s3_log, rs_table = log_tuple
-            if rs_table == err_tbl_name and \
-               exc_value.args[0].find('The specified S3 prefix') != -1 and \
-               exc_value.args[0].find('does not exist') != -1:
-                result = None
-        finally:
-            if result is False:
-                _, rs_table = log_tuple
-                if error_msg is None:
-                    error_msg = "failed copy {0} for date: {1}".format(
-                        get_namespaced_tablename(rs_table), ddate
-                    )
-                status_helper.update_status(
-                    db_name, ddate, yaml_versions,
-                    "error", start_time_secs=start, error_msg=error_msg
+    parallelism = read_int('pipeline.load_step.copy_parallelism', 1)
+    if parallelism > 1 and len(log_tuples) > 1:
+        results = copy_tables_concurrently(
+            psql_helper, status_helper, db_name, ddate, log_tuples,
+            ttl_days, logstream, parallelism
+        )
+    else:
+        # lazily, so that nothing is copied after a failure
+        results = (
+            try_copy_table(psql_helper, status_helper, db_name, ddate,
+                           log_tuple, ttl_days, logstream)
+            for log_tuple in log_tuples
+        )
+    for log_tuple, (result, error_msg) in izip(log_tuples, results):
+        if result is False:
+            _, rs_table = log_tuple
+            if error_msg is None:
+                error_msg = "failed copy {0} for date: {1}".format(
+                    get_namespaced_tablename(rs_table), ddate
                 )
-                handle_error(error_msg, logstream)
+            status_helper.update_status(
+                db_name, ddate, yaml_versions,
+                "error", start_time_secs=start, error_msg=error_msg
+            )
+            handle_error(error_msg, logstream)
+    status_helper.update_status(
+        db_name, ddate, yaml_versions, "complete", start_time_secs=start
+    )
+
+
+def copy_tables_in_transaction(psql_helper, status_helper, db_name, ddate,
+                               log_tuples, ttl_days, logstream, storage):
+    """
+    copy_tables_in_transaction loads a day like copy_tables, but runs every
+    table's TTL delete and copy in one transaction, so a failure leaves none
+    of the day loaded.  Each table is copied from a manifest of its part
+    files rather than its prefix, and tables are compacted before the
+    transaction since vacuum can't run in one.
+
+    Args:
+    psql_helper -- a RedshiftPostgres object to help perform the copy
+    status_helper -- An object handle to interact with status table
+    db_name -- the name of the db to which we're copying
+    ddate -- the date string of the data to be copied formatted YYYY/MM/DD
+    log_tuples -- a list of (log, table) pairs
+    ttl_days -- how many days to retain loaded data
+    logstream -- a PipelineStreamLogger
+    storage -- an S3Storage or LocalStorage to list part files and write
+               manifests with
+
+    Returns:
+    ---
+    """
+    start = time.time()
+    yaml_versions = get_yaml_table_versions(pipeline_yaml_schema_file_path())
+    status_helper.update_status(db_name, ddate, yaml_versions, "running")
+    err_tbl_name, _ = RedShiftLogSchema().get_error_table()
+    try:
+        manifests = []
+        for s3_log, rs_table in log_tuples:
+            manifest = write_manifest(storage, s3_log)
+            if manifest is None and rs_table != err_tbl_name:
+                raise IOError("no part files in {0}".format(s3_log))
+            # no manifest for the error table means there were no errors
+            manifests.append(manifest)
+
+        if ttl_days is not None and get_retention_mode() == 'delete':
+            for _, rs_table in log_tuples:
+                compact_table(psql_helper, db_name,
+                              get_namespaced_tablename(rs_table))
+
+        loaded = []
+        with psql_helper.transaction(db_name) as txn:
+            for log_tuple, manifest in izip(log_tuples, manifests):
+                if manifest is not None:
+                    load_table(txn, status_helper, db_name, ddate, log_tuple,
+                               ttl_days, logstream, manifest=manifest,
+                               compact=False)
+                    loaded.append(log_tuple)
+    except Exception:
+        exc_type, exc_value, exc_tb = sys.exc_info()
+        error_msg = "{0}".format({
+            'crash_tb': ''.join(traceback.format_tb(exc_tb)),
+            'crash_exc': traceback.format_exception_only(
+                exc_type, exc_value
+            )[0].strip()
+        })
+        status_helper.update_status(
+            db_name, ddate, yaml_versions,
+            "error", start_time_secs=start, error_msg=error_msg
+        )
+        handle_error(error_msg, logstream)
+    record_loaded_days(status_helper, db_name, ddate, loaded, ttl_days,
+                       logstream)
     status_helper.update_status(
         db_name, ddate, yaml_versions, "complete", start_time_secs=start
     )
@@ -714,7 +1230,8 @@ def s3_to_redshift_main(args):
 
     if args.skip_progress_in_redshift:
         status_table = DynamoDbStatusTable(
-            LOG_STREAM, run_local=args.run_local
+            LOG_STREAM, run_local=args.run_local,
+            cluster=(loader_psql.host, loader_psql.port)
         )
     else:
         status_table = RedshiftStatusTable(loader_psql)
@@ -751,6 +1268,7 @@ def s3_to_redshift_main(args):
         raise IOError("{0} data is either already loaded \
 or has not yet completed ET step".format(args.date))
 
+    load_mode = read_string('pipeline.load_step.load_mode', 'per_table')
     logs_to_copy = []
     for input_date in data_candidates:
         LOG_STREAM = PipelineStreamLogger(
@@ -764,8 +1282,22 @@ or has not yet completed ET step".format(args.date))
             (join(s3_log_prefix, input_date, table), table)
             for (table, _) in create_tuples
         ]
-        copy_tables(loader_psql, status_table, db, input_date, logs_to_copy,
-                    args.ttl_days, LOG_STREAM)
+        if load_mode == 'day_transaction':
+            copy_tables_in_transaction(
+                loader_psql, status_table, db, input_date, logs_to_copy,
+                args.ttl_days, LOG_STREAM, get_storage(args.run_local)
+            )
+        else:
+            copy_tables(loader_psql, status_table, db, input_date,
+                        logs_to_copy, args.ttl_days, LOG_STREAM)
+
+    if data_candidates:
+        # lets the next load skip checking the tables against the schema
+        record_loaded_schema_hash(
+            loader_psql, db, get_redshift_schema(),
+            get_create_tuples_key(create_tuples),
+            get_schema_hash(args.db_file.replace('.sql', '.yaml'))
+        )
 
 if __name__ == '__main__':
 
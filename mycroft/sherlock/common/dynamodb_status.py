@@ -2,19 +2,66 @@
 """
 dynamodb_status.py is a dynamodb implementation of status table
 
-At present these methods are intended to be a no-op.
+At present the job status methods are intended to be a no-op.
 We expect actual logging to be done externally
 
+The days of data each table holds are kept in the dynamodb table named by
+aws_config.loaded_ranges_table, one item per cluster, database and table,
+as clusters often share database and table names.  Without that table, or
+the cluster, the ranges aren't tracked.
+
 """
 
 from datetime import datetime, timedelta
 
+import boto.dynamodb2
+from boto.dynamodb2.exceptions import ItemNotFound
+from boto.dynamodb2.table import Table
+import staticconf
+
+from sherlock.common.aws import get_boto_creds
 from sherlock.common.status import StatusTableBase
 
+LOADED_RANGE_DATE_FORMAT = "%Y-%m-%d"
+
 
 class DynamoDbStatusTable(StatusTableBase):
-    def __init__(self, logstatus, run_local=True):
-        pass
+    def __init__(self, logstatus, run_local=True, cluster=None,
+                 ranges_table=None):
+        """
+        Args:
+        logstatus -- unused
+        run_local -- unused
+        cluster -- (host, port) of the Redshift cluster the tables are in
+        ranges_table -- a boto dynamodb2 Table holding the loaded ranges,
+            connected to aws_config.loaded_ranges_table if None
+        """
+        self._cluster = cluster
+        self._ranges_table = ranges_table
+
+    def _get_range_key(self, db, table):
+        return {
+            'cluster_db': '{0}:{1}:{2}'.format(
+                self._cluster[0], self._cluster[1], db
+            ),
+            'tablename': table,
+        }
+
+    def _get_ranges_table(self):
+        if self._cluster is None:
+            return None
+        if self._ranges_table is None:
+            table_name = staticconf.read_string(
+                'aws_config.loaded_ranges_table', None
+            )
+            if table_name is None:
+                return None
+            connection = boto.dynamodb2.connect_to_region(
+                staticconf.read_string('aws_config.region'),
+                **get_boto_creds()
+            )
+            self._ranges_table = Table(table_name, connection=connection)
+        return self._ranges_table
 
     def log_status_result(self, conditions, work_time_secs,
                           database, failed=False, err_msg=None):
@@ -121,3 +168,56 @@ class DynamoDbStatusTable(StatusTableBase):
 
         # noop
         return
+
+    def get_loaded_range(self, db, table):
+        """
+        get_loaded_range gets the days of data a table holds, as recorded by
+        set_loaded_range
+
+        Args:
+        db -- the Redshift database containing the table
+        table -- the namespaced table name
+
+        Returns:
+        a (min_date, max_date) tuple of datetimes, or None if the range of
+        the table isn't known
+        """
+
+        ranges_table = self._get_ranges_table()
+        if ranges_table is None:
+            # ranges aren't tracked, callers scan the table instead
+            return None
+        try:
+            item = ranges_table.get_item(
+                consistent=True, **self._get_range_key(db, table)
+            )
+        except ItemNotFound:
+            return None
+        return (
+            datetime.strptime(item['min_date'], LOADED_RANGE_DATE_FORMAT),
+            datetime.strptime(item['max_date'], LOADED_RANGE_DATE_FORMAT),
+        )
+
+    def set_loaded_range(self, db, table, min_date, max_date):
+        """
+        set_loaded_range records the days of data a table holds
+
+        Args:
+        db -- the Redshift database containing the table
+        table -- the namespaced table name
+        min_date -- the datetime of the oldest day of data in the table
+        max_date -- the datetime of the newest day of data in the table
+
+        Returns:
+        ---
+        """
+        ranges_table = self._get_ranges_table()
+        if ranges_table is None:
+            return
+        data = self._get_range_key(db, table)
+        data.update({
+            'min_date': min_date.strftime(LOADED_RANGE_DATE_FORMAT),
+            'max_date': max_date.strftime(LOADED_RANGE_DATE_FORMAT),
+            'updated_at': str(datetime.utcnow()),
+        })
+        ranges_table.put_item(data=data, overwrite=True)
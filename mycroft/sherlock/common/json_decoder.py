@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+Pluggable JSON decoding for the ET mappers
+
+JsonDecoder          simplejson.loads
+UJsonDecoder         ujson, a faster C decoder, when it is installed; lossy
+
+Both decoders raise simplejson.JSONDecodeError for the lines they can't
+decode, but UJsonDecoder decodes some lines simplejson rejects, so only
+JsonDecoder turns every invalid line into an error.
+"""
+import simplejson
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+DECODER_NAMES = ['simplejson', 'ujson']
+
+
+class JsonDecoder(object):
+
+    def decode(self, line):
+        return simplejson.loads(line)
+
+
+class UJsonDecoder(JsonDecoder):
+    """Decodes with ujson, handing the lines it rejects to simplejson
+
+    Lines only simplejson accepts (NaN, numbers beyond 64 bits) decode as
+    before.  This decoder is lossy: ujson accepts a few lines simplejson
+    rejects (a trailing comma in an object, leading zeros), which then
+    decode instead of raising, and drops lone surrogates.
+    """
+
+    def __init__(self):
+        if ujson is None:
+            raise ValueError("ujson is not installed")
+
+    def decode(self, line):
+        try:
+            # precise_float makes floats identical to simplejson's
+            return ujson.loads(line, precise_float=True)
+        except ValueError:
+            return simplejson.loads(line)
+
+
+def get_json_decoder(name='simplejson'):
+    """Returns a decoder instance
+
+    name: one of DECODER_NAMES
+    """
+    if name not in DECODER_NAMES:
+        raise ValueError("'{0}': unknown json decoder".format(name))
+    if name == 'ujson':
+        return UJsonDecoder()
+    return JsonDecoder()
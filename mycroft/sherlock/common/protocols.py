@@ -12,10 +12,18 @@ RedshiftExportProtocol
         PIPE                |
         BACKSLASH           \
 """
-from cStringIO import StringIO
+from itertools import izip
+import re
 
 VALID_DELIMITERS = ['|', '\x1e']
 
+# escape sequences for every character except the delimiter
+ESCAPE_SEQUENCES = {
+    '\\': '\\\\',
+    '\n': '\\n',
+    '\r': '\\r',
+}
+
 
 class RedshiftExportProtocol(object):
 
@@ -25,42 +33,67 @@ class RedshiftExportProtocol(object):
         if self.delimiter not in VALID_DELIMITERS:
             raise ValueError("'{0}': invalid delimiter".format(self.delimiter))
 
+        self._encoded_delimiter = self.delimiter.encode('utf-8')
+        escape_sequences = dict(ESCAPE_SEQUENCES)
+        escape_sequences[self.delimiter] = '\\' + self.delimiter
+        escape_regex = re.compile('[{0}]'.format(
+            ''.join(re.escape(char) for char in escape_sequences)
+        ))
+        self._escape_search = escape_regex.search
+        self._escape_sub = escape_regex.sub
+        self._escape_match = lambda match: escape_sequences[match.group()]
+
     def _sorted_keys(self, keys):
         return sorted(keys)
 
     def write(self, _, row):
-        row = dict(
-            (k, v.encode('utf-8'))
-            if isinstance(v, basestring) else (k, v)
-            for k, v in row.iteritems())
-
-        io = StringIO()
-
         output_order = self.given_output_order \
             if self.given_output_order else self._sorted_keys(row.keys())
+        return self.write_row([row[key] for key in output_order])
 
-        for key in output_order:
-            output = row[key]
-            if output is None:
-                pass
-            elif isinstance(output, basestring):
-                output = self.escape_value(output)
-            else:
-                output = unicode(output).encode('utf-8')
+    def write_row(self, values):
+        """Serializes one row given as a sequence of values in output order
 
-            if output is not None:
-                io.write(output)
+        This is write without the row dict: strings are utf-8 encoded and
+        escaped, None becomes an empty field and anything else is written
+        as its unicode representation.
+        """
+        escape_value = self.escape_value
+        return self._encoded_delimiter.join([
+            '' if value is None else
+            escape_value(value.encode('utf-8'))
+            if isinstance(value, basestring) else
+            unicode(value).encode('utf-8')
+            for value in values
+        ])
 
-            io.write(self.delimiter.encode('utf-8'))
-        return io.getvalue()[:-1]
+    def serialize_value(self, value):
+        """Returns the PSV field for a single value, as write_row does"""
+        if value is None:
+            return ''
+        elif isinstance(value, basestring):
+            return self.escape_value(value.encode('utf-8'))
+        return unicode(value).encode('utf-8')
 
-    def escape_value(self, value):
-        return value.replace(
-            '\\', '\\\\'
-        ).replace(
-            '\n', '\\n'
-        ).replace(
-            '\r', '\\r'
-        ).replace(
-            self.delimiter, '\\' + self.delimiter
+    def write_columns(self, columns, row_separator='\n'):
+        """Serializes column-oriented values into PSV rows
+
+        columns: a list of equally long value lists, one per column, in
+           output order
+        row_separator: the string joining the serialized rows
+
+        Each column is serialized in one pass and the rows are joined in
+        bulk; every row is the same as write would produce for it.
+        """
+        serialized = [
+            [self.serialize_value(value) for value in column]
+            for column in columns
+        ]
+        return row_separator.join(
+            self._encoded_delimiter.join(row) for row in izip(*serialized)
         )
+
+    def escape_value(self, value):
+        if self._escape_search(value) is None:
+            return value
+        return self._escape_sub(self._escape_match, value)
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+redshift_catalog.py caches what the load step reads from the redshift
+catalog, which is slow to query on big clusters
+
+pg_table_def is read for a whole schema at once and kept per cluster,
+database, schema name and schema version (a hash of the schema yaml).
+Anything changing table definitions must call invalidate_table_defs.
+
+The hash of the schema yaml last loaded into a schema is kept in the
+sdw_schema_hashes table, so the load step can tell when the tables already
+match the yaml.  Several yamls may load into a schema, so the hash is kept
+per schema name and tables key, a hash of the names of the yaml's tables.
+"""
+
+import hashlib
+import threading
+
+from sherlock.common.util import load_from_file
+
+#
+# queries requiring the redshift search_path to include the schema,
+# see s3_to_redshift.py
+#
+QUERY_SCHEMA_TABLE_DEFS = '''SELECT SchemaName, TableName, "Column", Type, \
+Encoding, DistKey, SortKey, "NotNull" from pg_table_def \
+where schemaname=%(schemaname)s'''
+
+CREATE_SCHEMA_HASHES = """CREATE TABLE IF NOT EXISTS sdw_schema_hashes \
+(schemaname varchar(128), tables_key char(40), schema_hash char(40), \
+updated_at timestamp)"""
+
+QUERY_SCHEMA_HASH = """SELECT schema_hash FROM sdw_schema_hashes \
+WHERE schemaname = %(schemaname)s AND tables_key = %(tables_key)s"""
+
+DELETE_SCHEMA_HASH = """DELETE FROM sdw_schema_hashes \
+WHERE schemaname = %(schemaname)s AND tables_key = %(tables_key)s"""
+
+INSERT_SCHEMA_HASH = """INSERT INTO sdw_schema_hashes \
+(schemaname, tables_key, schema_hash, updated_at) \
+VALUES (%(schemaname)s, %(tables_key)s, %(schema_hash)s, getdate())"""
+
+# (host, port, database, schemaname) -> (schema_version, table defs)
+_table_defs = {}
+_table_defs_lock = threading.Lock()
+
+# (host, port, database) of the clusters sdw_schema_hashes was created in
+_schema_hashes_created = set()
+_schema_hashes_lock = threading.Lock()
+
+
+def get_schema_hash(yaml_file):
+    """
+    get_schema_hash returns the sha1 hex digest of a schema yaml file
+    """
+    return hashlib.sha1(load_from_file(yaml_file)).hexdigest()
+
+
+def get_tables_key(table_names):
+    """
+    get_tables_key returns the sha1 hex digest of a set of table names, to
+    tell apart the schema yamls loading into one schema
+    """
+    return hashlib.sha1('\n'.join(sorted(table_names))).hexdigest()
+
+
+def _catalog_key(psql, db, schemaname):
+    return (psql.host, psql.port, db, schemaname)
+
+
+def get_schema_table_defs(psql, db, schemaname, schema_version=None):
+    """
+    get_schema_table_defs gets the pg_table_def rows of every table in a
+    schema, querying redshift only if they aren't cached
+
+    Args:
+    psql -- handle to talk to redshift
+    db -- redshift database containing the schema
+    schemaname -- the schema, lower case
+    schema_version -- refetch unless the cached defs are for this version;
+        None takes the cached defs of any version
+
+    Returns:
+    a dict of table name to the list of its pg_table_def rows, in column
+    order, like get_table_def in s3_to_redshift.py
+    """
+    key = _catalog_key(psql, db, schemaname)
+    with _table_defs_lock:
+        cached = _table_defs.get(key)
+    if cached is not None and schema_version in (None, cached[0]):
+        return cached[1]
+
+    rows = psql.run_sql(
+        QUERY_SCHEMA_TABLE_DEFS,
+        db,
+        "getting schema table defs",
+        params={'schemaname': schemaname},
+        output=True,
+        schema=schemaname
+    )
+    table_defs = {}
+    for row in rows:
+        table_defs.setdefault(row[1], []).append(row)
+    with _table_defs_lock:
+        _table_defs[key] = (schema_version, table_defs)
+    return table_defs
+
+
+def invalidate_table_defs(psql, db, schemaname):
+    """
+    invalidate_table_defs drops the cached defs of a schema
+    """
+    with _table_defs_lock:
+        _table_defs.pop(_catalog_key(psql, db, schemaname), None)
+
+
+def _create_schema_hashes(psql, db):
+    key = (psql.host, psql.port, db)
+    with _schema_hashes_lock:
+        if key in _schema_hashes_created:
+            return
+    psql.run_sql(CREATE_SCHEMA_HASHES, db, "creating sdw_schema_hashes")
+    with _schema_hashes_lock:
+        _schema_hashes_created.add(key)
+
+
+def get_loaded_schema_hash(psql, db, schemaname, tables_key):
+    """
+    get_loaded_schema_hash returns the schema hash recorded by the last
+    successful load of the tables of tables_key into schemaname, or None
+    """
+    _create_schema_hashes(psql, db)
+    result = psql.run_sql(
+        QUERY_SCHEMA_HASH,
+        db,
+        "getting schema hash",
+        params={'schemaname': schemaname, 'tables_key': tables_key},
+        output=True
+    )
+    return result[0][0] if result else None
+
+
+def record_loaded_schema_hash(psql, db, schemaname, tables_key, schema_hash):
+    """
+    record_loaded_schema_hash saves the schema hash of a successful load of
+    the tables of tables_key into schemaname
+    """
+    params = {
+        'schemaname': schemaname,
+        'tables_key': tables_key,
+        'schema_hash': schema_hash,
+    }
+    _create_schema_hashes(psql, db)
+    with psql.transaction(db) as txn:
+        txn.run_sql(DELETE_SCHEMA_HASH, db, "clearing schema hash",
+                    params=params)
+        txn.run_sql(INSERT_SCHEMA_HASH, db, "recording schema hash",
+                    params=params)
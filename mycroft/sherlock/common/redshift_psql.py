@@ -10,22 +10,27 @@ Example Instantiation:
 
 """
 
+import os
 import socket
+import threading
 import time
+from contextlib import contextmanager
 from datetime import datetime
 
 import boto
 import staticconf
 from dateutil.parser import parse as parsedate
+from staticconf import read_int
 from staticconf import read_string
 from staticconf import YamlConfiguration
 
 import psycopg2
-from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 from psycopg2.extensions import QueryCanceledError
 from sherlock.common.aws import get_aws_creds
 
 ADD_SCHEMA_PATH = "SET search_path TO '$user', public, %(schema_path)s"
+RESET_SCHEMA_PATH = "RESET search_path"
+HEALTH_CHECK = "SELECT 1"
 DEFAULT_NAMESPACE = "public"
 
 # Copied from http://initd.org/psycopg/articles/2014/07/20/cancelling-postgresql-statements-python/
@@ -68,6 +73,125 @@ def get_redshift_schema():
     return read_string('redshift_schema', DEFAULT_NAMESPACE).lower()
 
 
+class PooledConnection(object):
+    """
+    A psycopg2 connection kept open between statements, along with the
+    session state run_sql_ex needs to know about
+    """
+
+    def __init__(self, conn, key):
+        self.conn = conn
+        self.key = key
+        self.pid = os.getpid()
+        # None until a SET search_path has been run on the session
+        self.search_path = None
+        self.last_used = time.time()
+
+
+class ConnectionPool(object):
+    """
+    Keeps idle redshift sessions keyed by (host, port, user, database) so
+    consecutive statements skip the SSL handshake.  Every RedshiftPostgres
+    in a process shares the module level pool, REDSHIFT_POOL.
+
+    Config:
+    redshift_pool.max_idle_connections -- idle sessions kept per key,
+        0 turns pooling off
+    redshift_pool.health_check_after_secs -- a session idle for longer is
+        checked with a SELECT 1 before it is handed out
+    redshift_pool.max_idle_secs -- a session idle for longer is closed
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._idle = {}
+        self._pid = os.getpid()
+        # connections inherited across a fork; the parent still owns their
+        # sockets, so they must not be closed (or garbage collected) here
+        self._inherited = []
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            for entries in self._idle.itervalues():
+                self._inherited.extend(entries)
+            self._idle = {}
+            self._pid = os.getpid()
+
+    def _is_healthy(self, pooled):
+        if pooled.conn.closed:
+            return False
+        idle_secs = time.time() - pooled.last_used
+        if idle_secs > read_int('redshift_pool.max_idle_secs', 600):
+            return False
+        if idle_secs <= read_int('redshift_pool.health_check_after_secs', 30):
+            return True
+        try:
+            cur = pooled.conn.cursor()
+            cur.execute(HEALTH_CHECK)
+            cur.fetchall()
+            cur.close()
+            pooled.conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def acquire(self, key, connect):
+        """
+        returns an idle PooledConnection for key, or one wrapping connect()
+
+        Args:
+            key -- (host, port, user, database)
+            connect -- a callable returning a new psycopg2 connection
+        """
+        while True:
+            with self._lock:
+                self._check_pid()
+                entries = self._idle.get(key)
+                pooled = entries.pop() if entries else None
+            if pooled is None:
+                return PooledConnection(connect(), key)
+            if self._is_healthy(pooled):
+                return pooled
+            self.discard(pooled)
+
+    def release(self, pooled):
+        """
+        returns a connection with no open transaction to the pool
+        """
+        if pooled.pid != os.getpid() or pooled.conn.closed:
+            return
+        pooled.last_used = time.time()
+        with self._lock:
+            self._check_pid()
+            entries = self._idle.setdefault(pooled.key, [])
+            if len(entries) < read_int('redshift_pool.max_idle_connections', 4):
+                entries.append(pooled)
+                return
+        self.discard(pooled)
+
+    def discard(self, pooled):
+        """
+        closes a connection that must not be reused
+        """
+        if pooled.pid != os.getpid():
+            return
+        try:
+            pooled.conn.close()
+        except psycopg2.Error:
+            pass
+
+    def close_all(self):
+        with self._lock:
+            self._check_pid()
+            idle, self._idle = self._idle, {}
+        for entries in idle.itervalues():
+            for pooled in entries:
+                self.discard(pooled)
+
+
+REDSHIFT_POOL = ConnectionPool()
+
+
 class RedshiftPostgres(object):
     """
     This class simplifies running queries on redshift.  The current purpose is
@@ -167,6 +291,74 @@ class RedshiftPostgres(object):
 
         return conn
 
+    def acquire_connection(self, database):
+        """
+        gets a PooledConnection to a psql database, reusing an idle session
+        to the same host, port, user and database when there is one.  Pass
+        it back with REDSHIFT_POOL.release once no transaction is open, or
+        REDSHIFT_POOL.discard if something went wrong.
+        """
+        key = (self.host, self.port, self.user, database)
+        return REDSHIFT_POOL.acquire(
+            key, lambda: self.get_connection(database)
+        )
+
+    def _set_search_path(self, pooled, cur, schema):
+        """
+        adds schema to the session's search_path unless the session already
+        has it, and drops a schema a previous statement added
+        """
+        if schema != DEFAULT_NAMESPACE:
+            if pooled.search_path != schema:
+                cur.execute(ADD_SCHEMA_PATH, {'schema_path': schema})
+                pooled.search_path = schema
+        elif pooled.search_path is not None:
+            cur.execute(RESET_SCHEMA_PATH)
+            pooled.search_path = None
+
+    def _execute(self, pooled, sql, params, output, schema):
+        """
+        runs sql on a pooled session
+
+        Returns:
+            a (statusmessage, rows) tuple, rows is None unless output
+        """
+        rows = None
+        cur = pooled.conn.cursor()
+        self._set_search_path(pooled, cur, schema)
+        if params:
+            cur.execute(sql, params)
+        else:
+            cur.execute(sql)
+        if output:
+            rows = cur.fetchall()
+        status = cur.statusmessage
+        cur.close()
+        return status, rows
+
+    @contextmanager
+    def transaction(self, database):
+        """
+        transaction runs every command given the RedshiftTransaction it
+        yields in one transaction, committed when the block exits and rolled
+        back if it raises.  Commands needing autocommit, like vacuum, can't
+        be part of it.
+
+        Example:
+            with psql.transaction(db) as txn:
+                txn.run_sql(delete_cmd, db, "delete")
+                txn.run_sql(copy_cmd, db, "copy", s3_needed=True)
+        """
+        pooled = self.acquire_connection(database)
+        try:
+            pooled.conn.autocommit = False
+            with pooled.conn:
+                yield RedshiftTransaction(self, database, pooled)
+        except BaseException:
+            REDSHIFT_POOL.discard(pooled)
+            raise
+        REDSHIFT_POOL.release(pooled)
+
     def cleanse_sql(self, command):
         """
         cleanses a psql command of any auth information
@@ -185,7 +377,7 @@ class RedshiftPostgres(object):
 
     def run_sql_ex(self, sql, database, log_msg, s3_needed=False, params=None,
                    output=False, time_est_secs=10, need_commit=True,
-                   schema=DEFAULT_NAMESPACE):
+                   schema=DEFAULT_NAMESPACE, transaction=None):
         """
         run_sql takes a command and executes using the connection found
         in get_conection.
@@ -208,9 +400,11 @@ class RedshiftPostgres(object):
             schema -- the schema in the database on which the command is run
                       anything other than the default namespace must have the
                       schemaname added in the search_path. This ephemeral so
-                      must be done on a per-session basis, and since we close
-                      the cursor and connecion after each query we'll check
-                      every time.
+                      must be done on a per-session basis; pooled sessions
+                      remember their search_path so it is only set when it
+                      changes.
+            transaction -- a RedshiftTransaction to run the command in,
+                      instead of committing it on its own
         Returns:
             if there's a return value, it is the results of the query
         """
@@ -234,21 +428,33 @@ class RedshiftPostgres(object):
 
         try:
             result = dict()
-            with self.get_connection(database) as conn:
+            if transaction is not None:
                 if need_commit is False:
-                    conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
-                cur = conn.cursor()
-                if schema != DEFAULT_NAMESPACE:
-                    schema_params = {'schema_path': schema}
-                    cur.execute(ADD_SCHEMA_PATH, schema_params)
-                if params:
-                    cur.execute(sql, params)
-                else:
-                    cur.execute(sql)
-                if output:
-                    rows = cur.fetchall()
-                result['status'] = cur.statusmessage
-                cur.close()
+                    raise ValueError(
+                        "{0}: can't run in a transaction".format(log_msg)
+                    )
+                if database != transaction.database:
+                    raise ValueError("transaction is on {0}, not {1}".format(
+                        transaction.database, database
+                    ))
+                result['status'], rows = self._execute(
+                    transaction.pooled, sql, params, output, schema
+                )
+            else:
+                pooled = self.acquire_connection(database)
+                try:
+                    conn = pooled.conn
+                    # a pooled session may have run without a transaction
+                    conn.autocommit = need_commit is False
+                    with conn:
+                        result['status'], rows = self._execute(
+                            pooled, sql, params, output, schema
+                        )
+                except BaseException:
+                    # the session state is unknown, don't hand it out again
+                    REDSHIFT_POOL.discard(pooled)
+                    raise
+                REDSHIFT_POOL.release(pooled)
 
             self.log_stream.write_msg(
                 'finished', job_start_secs=start_time, extra_msg=log_msg
@@ -271,10 +477,43 @@ class RedshiftPostgres(object):
 
     def run_sql(self, sql, database, log_msg, s3_needed=False, params=None,
                 output=False, time_est_secs=10, need_commit=True,
-                schema=DEFAULT_NAMESPACE):
+                schema=DEFAULT_NAMESPACE, transaction=None):
         result = self.run_sql_ex(
             sql, database, log_msg, s3_needed, params,
-            output, time_est_secs, need_commit, schema=schema)
+            output, time_est_secs, need_commit, schema=schema,
+            transaction=transaction)
         if result is False:
             return False
         return result['output'] if output is True else True
+
+
+class RedshiftTransaction(object):
+    """
+    RedshiftTransaction has the run_sql interface of RedshiftPostgres but
+    runs commands in the open transaction of RedshiftPostgres.transaction,
+    so helpers taking a psql handle can take one too
+    """
+
+    def __init__(self, psql, database, pooled):
+        self.psql = psql
+        self.host = psql.host
+        self.port = psql.port
+        self.database = database
+        self.pooled = pooled
+
+    def run_sql_ex(self, *args, **kwargs):
+        return self.psql.run_sql_ex(*args, transaction=self, **kwargs)
+
+    def run_sql(self, *args, **kwargs):
+        return self.psql.run_sql(*args, transaction=self, **kwargs)
+
+    @contextmanager
+    def transaction(self, database):
+        """
+        a transaction started within this one is part of it
+        """
+        if database != self.database:
+            raise ValueError("transaction is on {0}, not {1}".format(
+                self.database, database
+            ))
+        yield self
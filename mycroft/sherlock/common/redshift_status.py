@@ -34,6 +34,20 @@ AND et_status = 'complete' \
 AND table_versions = %(table_versions)s \
 ORDER BY data_date ASC"""
 
+CREATE_LOADED_RANGES = """CREATE TABLE IF NOT EXISTS sdw_loaded_ranges \
+(tablename varchar(256), min_date timestamp, max_date timestamp, \
+updated_at timestamp)"""
+
+READ_LOADED_RANGE = """SELECT min_date, max_date FROM sdw_loaded_ranges \
+WHERE tablename = %(tablename)s"""
+
+DELETE_LOADED_RANGE = """DELETE FROM sdw_loaded_ranges \
+WHERE tablename = %(tablename)s"""
+
+INSERT_LOADED_RANGE = """INSERT INTO sdw_loaded_ranges \
+(tablename, min_date, max_date, updated_at) \
+VALUES (%(tablename)s, %(min_date)s, %(max_date)s, %(updated_at)s)"""
+
 
 def get_update_string(clause):
         """
@@ -63,6 +77,7 @@ class RedshiftStatusTable(StatusTableBase):
     def __init__(self, psql):
         super(RedshiftStatusTable, self).__init__()
         self.psql = psql
+        self._loaded_ranges_created = False
 
     def log_status_result(self, conditions, work_time_secs,
                           database, failed=False, err_msg=None):
@@ -214,3 +229,56 @@ class RedshiftStatusTable(StatusTableBase):
             'insert',
             params=insert_record.minimized_record()
         )
+
+    def _create_loaded_ranges(self, db):
+        if not self._loaded_ranges_created:
+            self.psql.run_sql(
+                CREATE_LOADED_RANGES, db, 'create sdw_loaded_ranges'
+            )
+            self._loaded_ranges_created = True
+
+    def get_loaded_range(self, db, table):
+        """
+        get_loaded_range gets the days of data a table holds, as recorded by
+        set_loaded_range
+
+        Args:
+        db -- the Redshift database containing the table
+        table -- the namespaced table name
+
+        Returns:
+        a (min_date, max_date) tuple of datetimes, or None if the range of
+        the table isn't known
+        """
+        self._create_loaded_ranges(db)
+        query_results = self.psql.run_sql(
+            READ_LOADED_RANGE, db, 'select loaded range',
+            params={'tablename': table}, output=True
+        )
+        return tuple(query_results[0]) if query_results else None
+
+    def set_loaded_range(self, db, table, min_date, max_date):
+        """
+        set_loaded_range records the days of data a table holds
+
+        Args:
+        db -- the Redshift database containing the table
+        table -- the namespaced table name
+        min_date -- the datetime of the oldest day of data in the table
+        max_date -- the datetime of the newest day of data in the table
+
+        Returns:
+        ---
+        """
+        self._create_loaded_ranges(db)
+        params = {
+            'tablename': table,
+            'min_date': min_date,
+            'max_date': max_date,
+            'updated_at': datetime.utcnow(),
+        }
+        with self.psql.transaction(db) as txn:
+            txn.run_sql(DELETE_LOADED_RANGE, db, 'clear loaded range',
+                        params=params)
+            txn.run_sql(INSERT_LOADED_RANGE, db, 'update loaded range',
+                        params=params)
@@ -110,6 +110,78 @@ class Table(object):
         else:
             raise ValueError("unknown type")
 
+    def compile(self):
+        return ExtractionPlan(self)
+
+
+class ExtractionPlan(object):
+    '''A Table compiled for repeated extraction
+
+    Source paths are split, noop columns dropped and the derived / json /
+    timestamp handling of every column resolved once, so extracting a row is
+    a walk over a tuple of getters.  row_iterator yields exactly the values
+    Table.value_iterator would produce, as lists ordered by output_order.
+    '''
+
+    def __init__(self, table):
+        if table.source_type not in (SourceType.LIST, SourceType.DICT):
+            raise ValueError("unknown type")
+        self.table = table
+        self.is_list = table.source_type == SourceType.LIST
+        self.source_path = \
+            tuple(table.source.split('.')) if self.is_list else None
+        columns = [column for column in table.columns if not column.is_noop]
+        self.output_order = [column.name for column in columns]
+        self.getters = tuple(column.compile() for column in columns)
+        self.char_columns = tuple(
+            (position, column) for position, column in enumerate(columns)
+            if column.is_char
+        )
+
+    def row_iterator(self, name_to_object, derive_metric=None):
+        getters = self.getters
+        char_columns = self.char_columns
+        check_for_truncation = self.table.check_for_truncation
+        if self.is_list:
+            log_value = walk_keys(name_to_object, self.source_path)
+            indexes = xrange(len(log_value))
+        else:
+            indexes = (None,)
+
+        for index in indexes:
+            row = [getter(name_to_object, index, derive_metric)
+                   for getter in getters]
+            for position, column in char_columns:
+                check_for_truncation(column, row[position])
+            yield row
+
+    def extract_columns(self, documents, derive_metric=None):
+        '''Extracts the rows of every document at once, column by column
+
+        Returns one list of values per column in output_order; the rows are
+        the ones row_iterator would yield for each document in turn.
+        '''
+        if self.is_list:
+            positions = [
+                (document, index) for document in documents
+                for index in xrange(
+                    len(walk_keys(document, self.source_path))
+                )
+            ]
+        else:
+            positions = [(document, None) for document in documents]
+
+        columns = [
+            [getter(document, index, derive_metric)
+             for document, index in positions]
+            for getter in self.getters
+        ]
+        check_for_truncation = self.table.check_for_truncation
+        for position, column in self.char_columns:
+            for value in columns[position]:
+                check_for_truncation(column, value)
+        return columns
+
 
 class Position(int):
     '''Represents a position of an list element
@@ -217,6 +289,84 @@ class Column(object):
     def is_derived(self):
         return self.extraction_type == ColumnType.DERIVED
 
+    def _missing_value_error(self, path_list):
+        return RequiredFieldMissingException('Required key: {path} is \
+                        missing'.format(path=path_list))
+
+    def _compile_lookup(self):
+        '''Returns lookup(document, index) equivalent to
+        get_deep(document, self.full_path({'position': index}), MISSING_VALUE)
+        '''
+        if self.is_foreign or self.source is None or self.source == '':
+            keys = tuple(self.log_key.split('.'))
+            return lambda document, index: walk_keys(document, keys)
+
+        source_keys = tuple(self.source.split('.'))
+        if self.source_type != SourceType.LIST:
+            keys = source_keys + tuple(self.log_key.split('.'))
+            return lambda document, index: walk_keys(document, keys)
+
+        if self.log_key == 'index':
+            def lookup_position(document, index):
+                x = walk_keys(document, source_keys)
+                if x is None or x is MISSING_VALUE:
+                    return x
+                return index
+            return lookup_position
+
+        log_keys = tuple(self.log_key.split('.'))
+
+        def lookup_element(document, index):
+            x = walk_keys(document, source_keys)
+            if x is None or x is MISSING_VALUE:
+                return x
+            return walk_keys(x[index], log_keys)
+        return lookup_element
+
+    def compile(self):
+        '''Returns getter(document, index, derive_metric) equivalent to
+        extract_value, with the path and value handling resolved up front
+        '''
+        if self.is_derived is True:
+            name = self.name
+
+            def derive(document, index, derive_metric):
+                return derive_metric(
+                    name_to_object=document,
+                    metric_name=name,
+                    context={'self': self, 'index': index},
+                )
+            return derive
+
+        lookup = self._compile_lookup()
+        is_mandatory = self.is_mandatory is True
+        is_json = self.is_json is True
+        is_timestamp = self.sql_attr is not None and \
+            self.sql_attr.startswith('TIMESTAMP')
+
+        if not (is_mandatory or is_json or is_timestamp):
+            def extract_plain(document, index, derive_metric):
+                log_value = lookup(document, index)
+                return None if log_value is MISSING_VALUE else log_value
+            return extract_plain
+
+        def extract(document, index, derive_metric):
+            log_value = lookup(document, index)
+            if log_value is MISSING_VALUE:
+                if is_mandatory:
+                    raise self._missing_value_error(
+                        self.full_path({'position': index})
+                    )
+                log_value = None
+            if is_json:
+                log_value = simplejson.dumps(log_value)
+                if len(log_value) > 65535:
+                    log_value = None
+            if is_timestamp and log_value is not None:
+                log_value = long(log_value) * 1000
+            return log_value
+        return extract
+
     def extract_value(self, document, index=None, derive_metric=None):
 
         if self.is_derived is True:
@@ -231,8 +381,7 @@ class Column(object):
 
         if log_value is MISSING_VALUE:
             if self.is_mandatory is True:
-                raise RequiredFieldMissingException('Required key: {path} is \
-                        missing'.format(path=path_list))
+                raise self._missing_value_error(path_list)
             else:
                 log_value = None
 
@@ -293,3 +442,20 @@ def get_deep(x, path_list, default_value):
         if x is default_value:
             return x
     return x
+
+
+def walk_keys(x, keys):
+    '''get_deep for a path made of plain keys, with MISSING_VALUE as the
+    default value.  This is the inner loop of compiled extraction plans.
+    '''
+    for key in keys:
+        if x is None:
+            return x
+        elif isinstance(x, dict):
+            x = x.get(key, MISSING_VALUE)
+        else:
+            x = getattr(x, key, MISSING_VALUE)
+
+        if x is MISSING_VALUE:
+            return x
+    return x
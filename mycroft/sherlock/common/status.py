@@ -157,3 +157,33 @@ class StatusTableBase(object):
         Boolean of whether the insert worked
         """
         raise NotImplementedError
+
+    def get_loaded_range(self, db, table):
+        """
+        get_loaded_range gets the days of data a table holds, as recorded by
+        set_loaded_range
+
+        Args:
+        db -- the Redshift database containing the table
+        table -- the namespaced table name
+
+        Returns:
+        a (min_date, max_date) tuple of datetimes, or None if the range of
+        the table isn't known
+        """
+        raise NotImplementedError
+
+    def set_loaded_range(self, db, table, min_date, max_date):
+        """
+        set_loaded_range records the days of data a table holds
+
+        Args:
+        db -- the Redshift database containing the table
+        table -- the namespaced table name
+        min_date -- the datetime of the oldest day of data in the table
+        max_date -- the datetime of the newest day of data in the table
+
+        Returns:
+        ---
+        """
+        raise NotImplementedError
@@ -0,0 +1,487 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Microbenchmarks for the extract/transform hot path
+
+Synthetic JSON logs are generated from a schema in the example_schema.yaml
+format and pushed through each stage of the mapper on their own:
+
+    json_decode      simplejson.loads of every line
+    get_deep         get_deep of every extracted column path
+    value_iterator   Table.value_iterator for every table
+    extraction_plan  ExtractionPlan.row_iterator for every table
+    protocol_write   RedshiftExportProtocol.write of every row dict
+    write_row        RedshiftExportProtocol.write_row of every row
+    mapper           MRJsonETL.mapper of every line
+    inline           a whole MRJsonETL job with mrjob's inline runner
+
+Every stage runs in a fresh process and reports lines/sec, rows/sec,
+bytes/sec and its peak RSS. Nothing talks to AWS.
+
+Example:
+
+python -m sherlock.tools.et_benchmark --lines 20000 --depth 3 --fanout 10 \
+    --save-baseline /tmp/et_baseline.json
+
+python -m sherlock.tools.et_benchmark --lines 20000 --depth 3 --fanout 10 \
+    --compare-baseline /tmp/et_baseline.json
+"""
+
+import argparse
+from multiprocessing import Pool
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+import simplejson
+import yaml
+
+from sherlock.batch.mr_json import mrjob_create
+from sherlock.common.protocols import RedshiftExportProtocol
+from sherlock.common.redshift_schema import RedShiftLogSchema
+from sherlock.common.schema import Column
+from sherlock.common.schema import get_deep
+from sherlock.common.schema import MISSING_VALUE
+from sherlock.common.schema import Table
+
+
+STAGES = [
+    'json_decode',
+    'get_deep',
+    'value_iterator',
+    'extraction_plan',
+    'protocol_write',
+    'write_row',
+    'mapper',
+    'inline',
+]
+
+METRICS = ['lines_per_sec', 'rows_per_sec', 'bytes_per_sec']
+
+SOURCE_FILENAME = 's3://benchmark/et_benchmark.json'
+
+
+def get_cmd_line_args(args=None):
+    parser = argparse.ArgumentParser(
+        prog='PROG',
+        description="""Benchmark the sherlock extract/transform hot path""",
+    )
+    parser.add_argument(
+        "--lines", type=int, default=20000,
+        help="number of synthetic log lines (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--depth", type=int, default=2,
+        help="nesting depth of extracted keys (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--fanout", type=int, default=10,
+        help="elements in the 'src_type: list' source (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--columns", type=int, default=20,
+        help="columns per table (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--json-columns", type=int, default=2,
+        help="is_json columns per table (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0,
+        help="random seed for the synthetic logs (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--stage", action='append', choices=STAGES, dest='stages',
+        help="stage to run, can be repeated (default: all stages)"
+    )
+    parser.add_argument(
+        "--save-baseline",
+        help="write the results as a json baseline to this file"
+    )
+    parser.add_argument(
+        "--compare-baseline",
+        help="compare the results against the json baseline in this file"
+    )
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2,
+        help="allowed relative throughput drop against the baseline "
+        "(default: %(default)s)"
+    )
+    parser.add_argument(
+        "--dump-schema",
+        help="write the generated schema yaml to this file"
+    )
+    return parser.parse_args(args)
+
+
+def get_params(options):
+    return {
+        'lines': options.lines,
+        'depth': options.depth,
+        'fanout': options.fanout,
+        'columns': options.columns,
+        'json_columns': options.json_columns,
+        'seed': options.seed,
+    }
+
+
+def nested_key(depth, name):
+    """ Returns a dotted key with depth - 1 levels above name """
+    return '.'.join(['level{0}'.format(i) for i in xrange(1, depth)] + [name])
+
+
+def make_schema(params):
+    """ Creates an example_schema.yaml style schema with a dict table
+    and a list table, each with params['columns'] columns
+    """
+    num_json = min(params['json_columns'], params['columns'])
+    num_plain = params['columns'] - num_json
+
+    def table_columns(prefix):
+        columns = [{
+            'log_key': nested_key(params['depth'], 'start_time'),
+            'name': '{0}_start_time'.format(prefix),
+            'sql_attr': 'TIMESTAMP not null',
+        }]
+        for i in xrange(num_plain - 1):
+            columns.append({
+                'log_key': nested_key(params['depth'], 'field{0}'.format(i)),
+                'name': '{0}_field{1}'.format(prefix, i),
+                'sql_attr': 'varchar(64)' if i % 2 else 'int8',
+            })
+        for i in xrange(num_json):
+            columns.append({
+                'log_key': nested_key(params['depth'], 'blob{0}'.format(i)),
+                'name': '{0}_blob{1}'.format(prefix, i),
+                'sql_attr': 'varchar(65535)',
+                'is_json': True,
+            })
+        return columns
+
+    item_columns = table_columns('item')
+    item_columns[:0] = [
+        {'log_key': 'index', 'sql_attr': 'smallint not null'},
+        {'log_key': 'event.request_id', 'name': 'event_request_id',
+         'sql_attr': 'varchar(16) distkey', 'is_foreign': True},
+    ]
+    event_columns = table_columns('event')
+    event_columns.append({
+        'name': '__source_filename__',
+        'sql_attr': 'varchar(4096)',
+        'is_derived': True,
+    })
+    return {
+        'version': 1,
+        'tables': {
+            'bench_events': {
+                'src': 'event',
+                'src_type': 'dict',
+                'columns': event_columns,
+                'sortkey_attr': ['event_start_time'],
+            },
+            'bench_items': {
+                'src': 'event.items',
+                'src_type': 'list',
+                'columns': item_columns,
+                'sortkey_attr': ['item_start_time'],
+            },
+        },
+    }
+
+
+def make_record(rnd, params):
+    """ Creates the leaf of one dict / list row: the extracted values plus
+    an unreferenced 'extra' subtree of the same size
+    """
+    record = {'start_time': 1400000000 + rnd.randint(0, 86400)}
+    for i in xrange(params['columns']):
+        if i % 2:
+            record['field{0}'.format(i)] = 'value|{0}\n'.format(
+                rnd.randint(0, 10 ** 6)
+            )
+        else:
+            record['field{0}'.format(i)] = rnd.randint(0, 10 ** 9)
+    for i in xrange(params['json_columns']):
+        record['blob{0}'.format(i)] = {
+            'tags': [rnd.randint(0, 100) for _ in xrange(5)],
+            'name': u'caf\xe9 {0}'.format(i),
+        }
+    record['extra'] = dict(
+        ('unused{0}'.format(i), rnd.random())
+        for i in xrange(params['columns'])
+    )
+    return record
+
+
+def nest(depth, record):
+    for i in xrange(depth - 1, 0, -1):
+        record = {'level{0}'.format(i): record}
+    return record
+
+
+def make_lines(params):
+    """ Returns the synthetic log lines for params """
+    rnd = random.Random(params['seed'])
+    lines = []
+    for line_number in xrange(params['lines']):
+        event = nest(params['depth'], make_record(rnd, params))
+        event['request_id'] = '{0:016x}'.format(line_number)
+        event['items'] = [
+            nest(params['depth'], make_record(rnd, params))
+            for _ in xrange(params['fanout'])
+        ]
+        lines.append(simplejson.dumps({'event': event}))
+    return lines
+
+
+def get_tables(yaml_schema):
+    schema = RedShiftLogSchema(yaml_schema)
+    return dict(
+        (table_name,
+         Table.create(table, columns=[
+             Column.create_from_table(table, column)
+             for column in table['columns']
+         ]))
+        for table_name, table in schema.tables().iteritems()
+    )
+
+
+def derive_metric(name_to_object=None, metric_name=None, context=None):
+    return SOURCE_FILENAME
+
+
+def table_rows(tables, objects):
+    return [(table, row)
+            for obj in objects
+            for table in tables.itervalues()
+            for row in table.value_iterator(obj, derive_metric)]
+
+
+def run_json_decode(env):
+    for line in env['lines']:
+        simplejson.loads(line)
+
+
+def run_get_deep(env):
+    paths = []
+    for table in env['tables'].itervalues():
+        for column in table.columns:
+            if column.is_derived:
+                continue
+            paths.append(column.full_path({'position': 0}))
+    for obj in env['objects']:
+        for path in paths:
+            get_deep(obj, path, MISSING_VALUE)
+
+
+def run_value_iterator(env):
+    tables = env['tables'].values()
+    for obj in env['objects']:
+        for table in tables:
+            for _ in table.value_iterator(obj, derive_metric):
+                pass
+
+
+def run_extraction_plan(env):
+    plans = [table.compile() for table in env['tables'].itervalues()]
+    for obj in env['objects']:
+        for plan in plans:
+            for _ in plan.row_iterator(obj, derive_metric):
+                pass
+
+
+def run_protocol_write(env):
+    export = RedshiftExportProtocol()
+    for table, row in env['rows']:
+        export.given_output_order = [
+            column.name for column in table.columns if not column.is_noop
+        ]
+        export.write(None, row)
+
+
+def run_write_row(env):
+    export = RedshiftExportProtocol()
+    for table, row in env['rows']:
+        export.write_row([
+            row[column.name] for column in table.columns if not column.is_noop
+        ])
+
+
+def run_mapper(env):
+    job = mrjob_create(args=['--extractions', env['schema_file']])
+    job.mapper_init()
+    for line in env['lines']:
+        for _ in job.mapper(None, line):
+            pass
+    for _ in job.mapper_final():
+        pass
+
+
+def run_inline(env):
+    input_file = os.path.join(env['tmp_dir'], 'input.json')
+    with open(input_file, 'w') as f:
+        for line in env['lines']:
+            f.write(line + '\n')
+    job = mrjob_create(args=[
+        '--runner', 'inline', '--no-conf',
+        '--extractions', env['schema_file'],
+        input_file,
+    ])
+    with job.make_runner() as runner:
+        runner.run()
+        for _ in runner.stream_output():
+            pass
+
+
+STAGE_TO_FUNC = {
+    'json_decode': run_json_decode,
+    'get_deep': run_get_deep,
+    'value_iterator': run_value_iterator,
+    'extraction_plan': run_extraction_plan,
+    'protocol_write': run_protocol_write,
+    'write_row': run_write_row,
+    'mapper': run_mapper,
+    'inline': run_inline,
+}
+
+
+def peak_rss_kb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_stage(stage, params):
+    """ Runs a single stage and returns its measurements
+
+    This is meant to run in a fresh process: the synthetic input is built
+    first, so peak_rss_kb minus input_rss_kb is what the stage itself used
+    """
+    yaml_schema = make_schema(params)
+    tmp_dir = tempfile.mkdtemp(prefix='et_benchmark')
+    try:
+        schema_file = os.path.join(tmp_dir, 'schema.yaml')
+        with open(schema_file, 'w') as f:
+            yaml.safe_dump(yaml_schema, f)
+        os.environ['map_input_file'] = SOURCE_FILENAME
+
+        env = {
+            'lines': make_lines(params),
+            'tables': get_tables(yaml_schema),
+            'schema_file': schema_file,
+            'tmp_dir': tmp_dir,
+        }
+        if stage in ('get_deep', 'value_iterator', 'extraction_plan',
+                     'protocol_write', 'write_row'):
+            env['objects'] = [simplejson.loads(line) for line in env['lines']]
+        if stage in ('protocol_write', 'write_row'):
+            env['rows'] = table_rows(env['tables'], env['objects'])
+        num_rows = sum(
+            len(get_deep(simplejson.loads(line), ['event', 'items'], []))
+            for line in env['lines']
+        ) + len(env['lines'])
+        num_bytes = sum(len(line) + 1 for line in env['lines'])
+
+        input_rss_kb = peak_rss_kb()
+        start = time.time()
+        STAGE_TO_FUNC[stage](env)
+        seconds = max(time.time() - start, 1e-6)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return {
+        'seconds': seconds,
+        'lines_per_sec': len(env['lines']) / seconds,
+        'rows_per_sec': num_rows / seconds,
+        'bytes_per_sec': num_bytes / seconds,
+        'input_rss_kb': input_rss_kb,
+        'peak_rss_kb': peak_rss_kb(),
+    }
+
+
+def run_stage_in_subprocess(stage, params):
+    pool = Pool(processes=1)
+    try:
+        return pool.apply(run_stage, (stage, params))
+    finally:
+        pool.close()
+        pool.join()
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """ Returns a list of (stage, metric, baseline, current) for every
+    throughput that dropped by more than tolerance
+    """
+    regressions = []
+    for stage, result in sorted(results.iteritems()):
+        baseline_result = baseline['stages'].get(stage)
+        if baseline_result is None:
+            continue
+        for metric in METRICS:
+            if result[metric] < baseline_result[metric] * (1 - tolerance):
+                regressions.append(
+                    (stage, metric, baseline_result[metric], result[metric])
+                )
+    return regressions
+
+
+def format_results(results, stages):
+    lines = ['{0:<16} {1:>10} {2:>14} {3:>14} {4:>14} {5:>12}'.format(
+        'stage', 'seconds', 'lines/sec', 'rows/sec', 'bytes/sec',
+        'peak RSS kB'
+    )]
+    for stage in stages:
+        result = results[stage]
+        lines.append(
+            '{0:<16} {1:>10.3f} {2:>14.0f} {3:>14.0f} {4:>14.0f} '
+            '{5:>12}'.format(stage, result['seconds'],
+                             result['lines_per_sec'], result['rows_per_sec'],
+                             result['bytes_per_sec'], result['peak_rss_kb'])
+        )
+    return '\n'.join(lines)
+
+
+def et_benchmark_main(args=None):
+    options = get_cmd_line_args(args)
+    params = get_params(options)
+    stages = options.stages or STAGES
+
+    if options.dump_schema:
+        with open(options.dump_schema, 'w') as f:
+            yaml.safe_dump(make_schema(params), f, default_flow_style=False)
+
+    results = dict(
+        (stage, run_stage_in_subprocess(stage, params)) for stage in stages
+    )
+    print format_results(results, stages)
+
+    if options.save_baseline:
+        with open(options.save_baseline, 'w') as f:
+            simplejson.dump({'params': params, 'stages': results}, f,
+                            indent=2, sort_keys=True)
+
+    if options.compare_baseline:
+        with open(options.compare_baseline) as f:
+            baseline = simplejson.load(f)
+        if baseline['params'] != params:
+            print "baseline was taken with different parameters: {0}".format(
+                baseline['params']
+            )
+            return 1
+        regressions = compare_to_baseline(results, baseline,
+                                          options.tolerance)
+        for stage, metric, expected, actual in regressions:
+            print "REGRESSION {0} {1}: {2:.0f} -> {3:.0f}".format(
+                stage, metric, expected, actual
+            )
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(et_benchmark_main())
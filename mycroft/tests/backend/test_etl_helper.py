@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
+import time
+
 import pytest
 from tests.models.test_etl_record import etl_records  # noqa
+from tests.models.test_etl_record import FakeETLRecord
 from tests.models.test_abstract_records import dynamodb_connection  # noqa
 from mycroft.backend.worker.etl_status_helper import ETLStatusHelper
 import mock
@@ -85,3 +88,110 @@ class TestETLStatusHelper(object):
 
         with pytest.raises(ValueError):
             etl.etl_step_complete(MSG, None, 'et', RECORDS[0])
+
+
+class TestETLStatusHelperWriteBehind(object):
+
+    @pytest.yield_fixture
+    def etl(self):
+        with mock.patch(
+                'mycroft.models.aws_connections.TableConnection.get_connection'
+                ) as mocked_etl:
+            mocked_etl.return_value.batch_get.return_value = []
+            helper = ETLStatusHelper(write_behind=True, flush_interval_sec=1)
+            yield helper
+            helper.stop()
+
+    def written(self, etl):
+        items = {}
+        for call in etl.etl_db.batch_put.call_args_list:
+            for item in call[0][0]:
+                items[item['data_date']] = item
+        return items
+
+    def test_runs_coalesced_until_job_end(self, etl):
+        for r in RECORDS:
+            etl.etl_step_started(MSG, r['date'], 'et')
+            etl.etl_step_complete(MSG, r['date'], 'et', r)
+        assert not etl.etl_db.batch_put.called
+
+        etl.flush_job(MSG['uuid'])
+        etl.etl_db.batch_put.assert_called_once_with(mock.ANY)
+        items = self.written(etl)
+        assert sorted(items) == [r['date'] for r in RECORDS]
+        assert items['2014-09-01']['etl_status'] == 'et_error'
+        assert items['2014-09-01']['etl_error'] == str(RECORDS[0]['error_info'])
+        assert items['2014-09-02']['etl_status'] == 'et_success'
+        assert float(items['2014-09-02']['et_runtime']) >= 0
+        assert items['2014-09-02']['et_starttime'] is not None
+        assert not etl.etl_db.get_runs_with_job_id.called
+        assert not etl.etl_db.put.called
+        assert etl._runs == {}
+
+        # nothing left to write
+        etl.flush()
+        assert etl.etl_db.batch_put.call_count == 1
+
+    def test_stored_fields_kept(self, etl):
+        etl.etl_db.batch_get.return_value = [FakeETLRecord({
+            'hash_key': MSG['uuid'],
+            'data_date': '2014-09-01',
+            'etl_status': 'et_success',
+            'et_starttime': '2014-09-02 00:00:00.000000',
+            'et_runtime': '60.0',
+        })]
+        etl.etl_step_started(MSG, '2014-09-01', 'load')
+        etl.flush()
+        etl.etl_db.batch_get.assert_called_once_with(
+            [{'hash_key': MSG['uuid'], 'data_date': '2014-09-01'}]
+        )
+        item = self.written(etl)['2014-09-01']
+        assert item['etl_status'] == 'load_started'
+        assert item['et_runtime'] == '60.0'
+        assert item['load_starttime'] == item['updated_at']
+
+        # read back once
+        etl.etl_step_complete(MSG, '2014-09-01', 'load', RECORDS[1])
+        etl.flush()
+        assert etl.etl_db.batch_get.call_count == 1
+        assert self.written(etl)['2014-09-01']['et_runtime'] == '60.0'
+
+    def test_failed_write_retried(self, etl):
+        etl.etl_db.batch_put.side_effect = IOError("test")
+        etl.etl_step_started(MSG, '2014-09-01', 'et')
+        with pytest.raises(IOError):
+            etl.flush_job(MSG['uuid'])
+        assert etl._dirty == set([(MSG['uuid'], '2014-09-01')])
+
+        etl.etl_db.batch_put.side_effect = None
+        etl.flush_job(MSG['uuid'])
+        assert etl._dirty == set()
+        assert etl._runs == {}
+
+    def test_full_batch_written_in_background(self, etl):
+        etl.start()
+        for day in range(1, 26):
+            etl.etl_step_started(MSG, '2014-09-{0:02d}'.format(day), 'et')
+        for _ in range(50):
+            if etl.etl_db.batch_put.called:
+                break
+            time.sleep(0.1)
+        assert len(self.written(etl)) == 25
+
+    def test_discard_job(self, etl):
+        etl.etl_step_started(MSG, '2014-09-01', 'et')
+        etl.discard_job(MSG['uuid'])
+        etl.flush()
+        assert not etl.etl_db.batch_put.called
+
+    def test_complete_without_start_written_now(self, etl):
+        etl.etl_db.get_runs_with_job_id.return_value = []
+        etl.etl_step_complete(MSG, '2014-09-01', 'et', RECORDS[1])
+        assert etl.etl_db.put.call_count == 1
+        assert etl.etl_db.put.call_args[1]['et_runtime'] == 0
+        assert etl._runs == {}
+
+    def test_start_without_run_id(self, etl):
+        etl.etl_db.get_runs_with_job_id.return_value = [mock.Mock(), mock.Mock()]
+        with pytest.raises(ValueError):
+            etl.etl_step_started(MSG, None, 'et')
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime
+from datetime import timedelta
+import mock
+import pytest
+
+from mycroft.backend.scanners.job_index import JobIndex
+from mycroft.models.scheduled_jobs import JOBS_ETL_STATUS_EMPTY
+from mycroft.models.scheduled_jobs import JOBS_ETL_STATUS_RUNNING
+from mycroft.models.scheduled_jobs import JOBS_ETL_STATUS_SCHEDULED
+from tests.models.test_scheduled_jobs import FakeScheduledJob
+
+
+NOW = datetime(2014, 9, 1, 12)
+
+
+def fake_job(hash_key, et_status, updated_at=NOW, due_in_sec=None, **kwargs):
+    row = {
+        'hash_key': hash_key,
+        'et_status': et_status,
+        'et_status_last_updated_at': str(updated_at),
+        'due_in_sec': due_in_sec,
+    }
+    row.update(kwargs)
+    return FakeScheduledJob(row)
+
+
+def get_due_time(job):
+    due_in_sec = job.get(due_in_sec=None)['due_in_sec']
+    if due_in_sec is None:
+        return None
+    return NOW + timedelta(seconds=due_in_sec)
+
+
+@pytest.fixture
+def job_index():
+    return JobIndex(mock.MagicMock(), get_due_time, 3600, 300)
+
+
+def hash_keys(jobs):
+    return sorted(job.get(hash_key=None)['hash_key'] for job in jobs)
+
+
+class TestJobIndex(object):
+
+    def test_full_refresh_indexes_by_status(self, job_index):
+        job_index.db.__iter__.return_value = iter([
+            fake_job('a', JOBS_ETL_STATUS_RUNNING),
+            fake_job('b', JOBS_ETL_STATUS_RUNNING),
+            fake_job('c', JOBS_ETL_STATUS_EMPTY),
+        ])
+        job_index.refresh(NOW)
+        assert len(job_index) == 3
+        assert hash_keys(job_index.get_jobs_with_et_status(JOBS_ETL_STATUS_RUNNING)) == ['a', 'b']
+        assert hash_keys(job_index.get_jobs_with_et_status(JOBS_ETL_STATUS_EMPTY)) == ['c']
+        assert job_index.get_jobs_with_et_status(JOBS_ETL_STATUS_SCHEDULED) == []
+
+    def test_delta_refresh_reads_jobs_updated_since_last_refresh(self, job_index):
+        job_index.db.__iter__.return_value = iter([
+            fake_job('a', JOBS_ETL_STATUS_EMPTY),
+        ])
+        job_index.refresh(NOW)
+        job_index.db.get_jobs_with_et_status_updated_after.return_value = [
+            fake_job('a', JOBS_ETL_STATUS_SCHEDULED, updated_at=NOW + timedelta(seconds=1)),
+        ]
+        job_index.refresh(NOW + timedelta(seconds=60))
+        job_index.db.get_jobs_with_et_status_updated_after.assert_called_once_with(
+            str(NOW - timedelta(seconds=300))
+        )
+        assert job_index.get_jobs_with_et_status(JOBS_ETL_STATUS_EMPTY) == []
+        assert hash_keys(job_index.get_jobs_with_et_status(JOBS_ETL_STATUS_SCHEDULED)) == ['a']
+        assert job_index.db.__iter__.call_count == 1
+
+        # a full refresh drops the jobs that are gone
+        job_index.db.__iter__.return_value = iter([])
+        job_index.refresh(NOW + timedelta(seconds=3600))
+        assert len(job_index) == 0
+
+    def test_put_ignores_older_job(self, job_index):
+        job_index.put(fake_job('a', JOBS_ETL_STATUS_SCHEDULED))
+        job_index.put(
+            fake_job('a', JOBS_ETL_STATUS_EMPTY, updated_at=NOW - timedelta(seconds=1))
+        )
+        assert hash_keys(job_index.get_jobs_with_et_status(JOBS_ETL_STATUS_SCHEDULED)) == ['a']
+
+    def test_pop_due_jobs(self, job_index):
+        job_index.put(fake_job('later', JOBS_ETL_STATUS_EMPTY, due_in_sec=60))
+        job_index.put(fake_job('now', JOBS_ETL_STATUS_EMPTY, due_in_sec=0))
+        job_index.put(fake_job('never', JOBS_ETL_STATUS_RUNNING))
+        job_index.put(fake_job('earlier', JOBS_ETL_STATUS_EMPTY, due_in_sec=-60))
+        assert hash_keys(job_index.pop_due_jobs(NOW)) == ['earlier', 'now']
+        assert job_index.pop_due_jobs(NOW) == []
+        assert hash_keys(job_index.pop_due_jobs(NOW + timedelta(days=1))) == ['later']
+
+    def test_pop_due_jobs_after_due_time_change(self, job_index):
+        job = fake_job('a', JOBS_ETL_STATUS_EMPTY, due_in_sec=0)
+        job_index.put(job)
+        job.update(due_in_sec=60)
+        job_index.put(job)
+        assert job_index.pop_due_jobs(NOW) == []
+        job_index.remove('a')
+        assert job_index.pop_due_jobs(NOW + timedelta(days=1)) == []
+
+    def test_get_additional_arguments_parses_once(self, job_index):
+        job = fake_job('a', JOBS_ETL_STATUS_EMPTY, additional_arguments='{"x": 1}')
+        with mock.patch(
+            'mycroft.backend.scanners.job_index.loads', return_value={'x': 1}
+        ) as mock_loads:
+            assert job_index.get_additional_arguments(job) == {'x': 1}
+            assert job_index.get_additional_arguments(job) == {'x': 1}
+        assert mock_loads.call_count == 1
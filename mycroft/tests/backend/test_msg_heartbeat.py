@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+import threading
+
+import mock
+import pytest
+from boto.sqs.jsonmessage import JSONMessage
+
+from mycroft.backend.worker.msg_heartbeat import MsgHeartbeat
+
+
+def make_msg(msg_id):
+    msg = JSONMessage(body={})
+    msg.id = msg_id
+    return msg
+
+
+class BeatRecorder(object):
+    """ Records the msg ids of each beat and signals it """
+
+    def __init__(self):
+        self.beats = []
+        self.beat = threading.Event()
+
+    def change_message_visibility_batch(self, msgs, visibility_timeout):
+        assert visibility_timeout == 90
+        self.beats.append(sorted(msg.id for msg in msgs))
+        self.beat.set()
+
+
+@pytest.yield_fixture
+def heartbeat():
+    heartbeat = MsgHeartbeat(BeatRecorder(), 90, interval_sec=0.05).start()
+    yield heartbeat
+    heartbeat.stop()
+
+
+def wait_for_beat(heartbeat):
+    heartbeat.sqs.beat.clear()
+    assert heartbeat.sqs.beat.wait(5)
+    return heartbeat.sqs.beats[-1]
+
+
+class TestMsgHeartbeat(object):
+
+    def test_default_interval(self):
+        assert MsgHeartbeat(mock.Mock(), 90).interval_sec == 30
+
+    def test_beats_msgs_until_removed(self, heartbeat):
+        first = make_msg('first')
+        second = make_msg('second')
+        heartbeat.add(first)
+        heartbeat.add(second)
+        assert wait_for_beat(heartbeat) == ['first', 'second']
+        assert heartbeat.remove(first)
+        assert not heartbeat.remove(first)
+        assert wait_for_beat(heartbeat) == ['second']
+
+    def test_no_beat_without_msgs(self, heartbeat):
+        heartbeat.add(make_msg('a'))
+        wait_for_beat(heartbeat)
+        heartbeat.remove(make_msg('a'))
+        heartbeat.sqs.beat.clear()
+        assert not heartbeat.sqs.beat.wait(0.3)
+
+    def test_beat_errors_are_not_fatal(self, heartbeat):
+        failing = [True]
+        change_visibility = heartbeat.sqs.change_message_visibility_batch
+
+        def fail_once(msgs, visibility_timeout):
+            if failing.pop() if failing else False:
+                raise ValueError("test")
+            change_visibility(msgs, visibility_timeout)
+
+        heartbeat.sqs.change_message_visibility_batch = fail_once
+        heartbeat.add(make_msg('a'))
+        assert wait_for_beat(heartbeat) == ['a']
+
+    def test_stop(self):
+        heartbeat = MsgHeartbeat(BeatRecorder(), 90).start()
+        heartbeat.stop()
+        assert heartbeat._thread is None
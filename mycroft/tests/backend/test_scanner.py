@@ -4,11 +4,13 @@ from copy import copy
 from datetime import timedelta
 import mock
 import pytest
+from boto.sqs.jsonmessage import JSONMessage
 from simplejson import dumps
 import staticconf
 
 from mycroft.backend.email import Mailer
 from mycroft.backend.scanners.base_scanner import BaseScanner
+from mycroft.backend.scanners.base_scanner import get_job_hash_keys
 from mycroft.backend.scanners.et_scanner import ETScanner
 from tests.data.mock_config import MOCK_CONFIG
 from mycroft.models.scheduled_jobs import JOBS_ETL_STATUS_SCHEDULED
@@ -17,6 +19,7 @@ from mycroft.models.scheduled_jobs import JOBS_ETL_STATUS_SUCCESS
 from mycroft.models.scheduled_jobs import JOBS_ETL_STATUS_EMPTY
 from mycroft.models.scheduled_jobs import JOBS_ETL_STATUS_PAUSED
 from mycroft.models.scheduled_jobs import JOBS_ETL_STATUS_ERROR
+from mycroft.models.scheduled_jobs import ScheduledJobInvalidStatusUpdate
 from tests.backend.test_worker import FakeSQS
 from tests.data.scheduled_job import SCHEDULED_JOB_INPUT_DICT
 from tests.data.scheduled_job import SCHEDULED_JOB_WITH_FUTURE_START_DATE
@@ -499,3 +502,289 @@ class TestETScanner(object):
         scanner = get_base_scanner
         entry = FakeScheduledJob(SCHEDULED_JOB_INPUT_DICT_CUSTOM_TIME_LOG_AVAIL)
         assert scanner._get_time_log_need_to_be_available(entry) == '12:30'
+
+
+@pytest.yield_fixture
+def et_scanner_mock_db():
+    with staticconf.testing.MockConfiguration(MOCK_CONFIG):
+        scanner = ETScanner(mock.Mock(), FakeSQS(), FakeSQS(), Mailer(True))
+        with mock.patch(
+            'mycroft.backend.scanners.base_scanner.job2log',
+            autospec=True,
+            return_value='uuid'
+        ):
+            yield scanner
+
+
+def scanner_msg(body):
+    msg = JSONMessage()
+    msg.set_body(body)
+    return msg
+
+
+class TestEventDrivenScanner(object):
+
+    @pytest.mark.parametrize("bodies, result", [
+        ([], []),
+        ([{'message': 'job done', 'hash_key': 'a'}], ['a']),
+        ([{'hash_key': 'b'}, {'hash_key': 'a'}, {'hash_key': 'b'}], ['b', 'a']),
+        ([{'hash_key': 'a'}, {'message': 'dummy'}], None),
+    ])
+    def test_get_job_hash_keys(self, bodies, result):
+        assert get_job_hash_keys([scanner_msg(b) for b in bodies]) == result
+
+    def test_get_job_hash_keys_skip_unnamed(self):
+        msgs = [scanner_msg(b) for b in [{'hash_key': 'a'}, {'message': 'dummy'}]]
+        assert get_job_hash_keys(msgs, skip_unnamed=True) == ['a']
+
+    def run_scanner_loop(self, scanner, msgs_per_fetch):
+        """ run the scanner until it fetched every list in msgs_per_fetch """
+        fetches = iter(msgs_per_fetch)
+
+        def get_messages():
+            msgs = next(fetches, None)
+            if msgs is None:
+                scanner.stop()
+                return []
+            return msgs
+
+        with mock.patch.object(scanner, '_get_timeout', return_value=60), \
+                mock.patch.object(scanner.scanner_queue, 'get_messages_from_queue',
+                                  side_effect=get_messages), \
+                mock.patch.object(scanner.scanner_queue, 'delete_message_batch_from_queue'), \
+                mock.patch.object(scanner.scanner_queue, 'clear') as mock_clear, \
+                mock.patch.object(scanner, 'run_maint') as mock_maint, \
+                mock.patch.object(scanner, 'run_scanner') as mock_scanner, \
+                mock.patch.object(scanner, 'run_for_jobs') as mock_run_for_jobs:
+            scanner.run()
+        assert mock_maint.call_count == mock_scanner.call_count == mock_clear.call_count
+        return mock_maint.call_count, [
+            hash_key for c in mock_run_for_jobs.call_args_list for hash_key in c[0][0]
+        ]
+
+    def test_run_processes_jobs_of_messages(self, et_scanner_mock_db):
+        scanner = et_scanner_mock_db
+        num_sweeps, hash_keys = self.run_scanner_loop(scanner, [
+            [],
+            [scanner_msg({'message': 'job done', 'hash_key': 'a'})],
+            [scanner_msg({'hash_key': 'b'}), scanner_msg({'hash_key': 'a'})],
+        ])
+        # only the sweep at startup
+        assert num_sweeps == 1
+        assert hash_keys == ['a', 'b', 'a']
+
+    def test_run_sweeps_for_message_without_job(self, et_scanner_mock_db):
+        scanner = et_scanner_mock_db
+        num_sweeps, hash_keys = self.run_scanner_loop(scanner, [
+            [],
+            [scanner_msg({'message': 'dummy'}), scanner_msg({'hash_key': 'a'})],
+        ])
+        assert num_sweeps == 2
+        assert hash_keys == []
+
+    @pytest.mark.parametrize("et_status, status_age_sec, expected_status, work_created", [
+        (JOBS_ETL_STATUS_EMPTY, 0, JOBS_ETL_STATUS_SCHEDULED, True),
+        (JOBS_ETL_STATUS_RUNNING, 1, JOBS_ETL_STATUS_RUNNING, False),
+        # a stuck job is reset and scheduled again at once
+        (JOBS_ETL_STATUS_RUNNING, 10 * 60, JOBS_ETL_STATUS_SCHEDULED, True),
+    ])
+    def test_run_for_job(self, et_scanner_mock_db, et_status, status_age_sec,
+                         expected_status, work_created):
+        scanner = et_scanner_mock_db
+        row = copy(SCHEDULED_JOB_INPUT_DICT)
+        row['hash_key'] = 'run_for_job'
+        row['start_date'] = '2014-09-01'
+        row['et_status'] = et_status
+        row['et_status_last_updated_at'] = str(
+            datetime.datetime.utcnow() - timedelta(seconds=status_age_sec)
+        )
+        job = FakeScheduledJob(row)
+        scanner.db.get.return_value = job
+        with mock.patch.object(
+            scanner, '_get_redshift_cluster_details',
+            return_value=('some-host', 1234, 'mycroft_namespace')
+        ):
+            scanner.run_for_job(row['hash_key'])
+        scanner.db.get.assert_called_once_with(hash_key=row['hash_key'])
+        assert job.get(et_status=None)['et_status'] == expected_status
+        assert (scanner.worker_queue._published_msg is not None) == work_created
+
+    def test_update_job_status_conditionally_fails(self, et_scanner_mock_db):
+        job = mock.Mock()
+        job.update.side_effect = ScheduledJobInvalidStatusUpdate()
+        assert et_scanner_mock_db._update_job_status_conditionally(job) is False
+
+    def test_run_for_jobs_reads_jobs_in_batch(self, et_scanner_mock_db):
+        scanner = et_scanner_mock_db
+        jobs = []
+        for hash_key in ['a', 'b']:
+            row = copy(SCHEDULED_JOB_INPUT_DICT)
+            row['hash_key'] = hash_key
+            jobs.append(FakeScheduledJob(row))
+        scanner.db.batch_get.return_value = jobs[::-1]
+        with mock.patch.object(scanner, '_run_for_fetched_job') as mock_run, \
+                mock.patch.object(scanner, '_job_gone') as mock_gone:
+            scanner.run_for_jobs(['a', 'gone', 'b', 'a'])
+        scanner.db.batch_get.assert_called_once_with(['a', 'gone', 'b', 'a'])
+        assert [c[0][0] for c in mock_run.call_args_list] == jobs
+        mock_gone.assert_called_once_with('gone')
+        assert not scanner.db.get.called
+
+    def test_run_scanner_prefetches_log_meta_data(self, et_scanner_mock_db):
+        scanner = et_scanner_mock_db
+        rows = [copy(SCHEDULED_JOB_INPUT_DICT) for _ in range(3)]
+        rows[1]['s3_path'] = 's3://bucket/logs/log_name/'
+        rows[2]['s3_path'] = None
+        scanner.db.get_jobs_with_et_status.side_effect = [
+            [FakeScheduledJob(row) for row in rows], []
+        ]
+        with mock.patch(
+            'mycroft.backend.scanners.base_scanner.prefetch_log_meta_data',
+            autospec=True
+        ) as mock_prefetch, mock.patch.object(scanner, '_process_job_for_work'):
+            scanner.run_scanner()
+        assert list(mock_prefetch.call_args[0][0]) == [
+            ('backet', 'kay'), ('bucket', 'log_name')
+        ]
+
+    def test_run_scanner_batch_enqueue(self, et_scanner_mock_db):
+        scanner = et_scanner_mock_db
+        scanner.batch_enqueue = True
+        jobs = []
+        for i in range(3):
+            row = copy(SCHEDULED_JOB_INPUT_DICT)
+            row['hash_key'] = str(i)
+            row['et_status'] = JOBS_ETL_STATUS_EMPTY
+            jobs.append(FakeScheduledJob(row))
+        scanner.db.get_jobs_with_et_status.side_effect = [jobs, []]
+        with mock.patch.object(
+            scanner, '_get_redshift_cluster_details',
+            return_value=('some-host', 1234, 'mycroft_namespace')
+        ), mock.patch.object(scanner, '_get_max_complete_date', return_value=None):
+            scanner.run_scanner()
+        assert scanner.worker_queue._published_msg is None
+        assert [[msg['hash_key'] for msg in msgs]
+                for msgs in scanner.worker_queue._published_msgs] == [['0', '1', '2']]
+
+    def test_run_for_deleted_job(self, et_scanner_mock_db):
+        scanner = et_scanner_mock_db
+        scanner.db.get.side_effect = KeyError()
+        scanner.run_for_job('gone')
+        assert scanner.worker_queue._published_msg is None
+
+
+@pytest.yield_fixture
+def et_scanner_job_index():
+    config = copy(MOCK_CONFIG)
+    config['scanner'] = dict(MOCK_CONFIG['scanner'], use_job_index=True)
+    config['disable_logfinder_service'] = True
+    with staticconf.testing.MockConfiguration(config):
+        scanner = ETScanner(mock.MagicMock(), FakeSQS(), FakeSQS(), Mailer(True))
+        with mock.patch(
+            'mycroft.backend.scanners.base_scanner.job2log',
+            autospec=True,
+            return_value='uuid'
+        ), mock.patch.object(
+            scanner, '_get_redshift_cluster_details',
+            return_value=('some-host', 1234, 'mycroft_namespace')
+        ):
+            yield scanner
+
+
+class TestScannerJobIndex(object):
+
+    def make_job(self, hash_key, et_status, et_lsd):
+        row = copy(SCHEDULED_JOB_INPUT_DICT)
+        row['hash_key'] = hash_key
+        row['et_status'] = et_status
+        row['et_last_successful_date'] = et_lsd
+        row['et_status_last_updated_at'] = str(datetime.datetime.utcnow())
+        return FakeScheduledJob(row)
+
+    def test_sweep_processes_due_jobs_only(self, et_scanner_job_index):
+        scanner = et_scanner_job_index
+        # data of a day is available 48 hours after its start
+        three_days_ago = (datetime.datetime.utcnow() - timedelta(days=3)).strftime("%Y-%m-%d")
+        due = self.make_job('due', JOBS_ETL_STATUS_SUCCESS, three_days_ago)
+        not_due = self.make_job('not_due', JOBS_ETL_STATUS_SUCCESS, TWODAYSAGO)
+        scanner.db.__iter__.return_value = iter([due, not_due])
+        scanner.db.get_jobs_with_et_status_updated_after.return_value = []
+
+        scanner.run_maint()
+        scanner.run_scanner()
+        assert due.get(et_status=None)['et_status'] == JOBS_ETL_STATUS_SCHEDULED
+        assert not_due.get(et_status=None)['et_status'] == JOBS_ETL_STATUS_SUCCESS
+        assert scanner.worker_queue._published_msg is not None
+        assert scanner.job_index.get_jobs_with_et_status(JOBS_ETL_STATUS_SCHEDULED) == [due]
+
+        # the next sweep reads back updated jobs only and has nothing to do
+        scanner.worker_queue._published_msg = None
+        scanner.run_maint()
+        scanner.run_scanner()
+        assert scanner.worker_queue._published_msg is None
+        assert scanner.db.__iter__.call_count == 1
+        assert scanner.db.get_jobs_with_et_status_updated_after.call_count == 1
+        assert not scanner.db.get_jobs_with_et_status.called
+
+    def test_run_for_job_updates_index(self, et_scanner_job_index):
+        scanner = et_scanner_job_index
+        scanner.db.__iter__.return_value = iter([])
+        scanner.run_maint()
+        job = self.make_job('new', JOBS_ETL_STATUS_EMPTY, None)
+        scanner.db.get.return_value = job
+        scanner.run_for_job('new')
+        assert scanner.job_index.get_jobs_with_et_status(JOBS_ETL_STATUS_SCHEDULED) == [job]
+
+        scanner.db.get.side_effect = KeyError()
+        scanner.run_for_job('new')
+        assert len(scanner.job_index) == 0
+
+    def test_maint_with_stale_jobs(self, et_scanner_job_index):
+        scanner = et_scanner_job_index
+        ten_min_ago = str(datetime.datetime.utcnow() - timedelta(minutes=10))
+        jobs = {}
+        for hash_key in ['changed', 'deleted', 'stuck']:
+            job = self.make_job(hash_key, JOBS_ETL_STATUS_RUNNING, None)
+            job._fake_record['et_status_last_updated_at'] = ten_min_ago
+            jobs[hash_key] = job
+        for hash_key in ['changed', 'deleted']:
+            jobs[hash_key].update = mock.Mock(side_effect=ScheduledJobInvalidStatusUpdate(
+                "cur_status=running, new_status=null"
+            ))
+        fresh = self.make_job('changed', JOBS_ETL_STATUS_SUCCESS, None)
+
+        def get(hash_key):
+            if hash_key == 'deleted':
+                raise KeyError(hash_key)
+            return fresh
+
+        scanner.db.__iter__.return_value = iter(jobs.values())
+        scanner.db.get.side_effect = get
+        scanner.run_maint()
+
+        assert jobs['stuck'].get(et_status=None)['et_status'] == JOBS_ETL_STATUS_EMPTY
+        assert scanner.job_index.get_jobs_with_et_status(JOBS_ETL_STATUS_SUCCESS) == [fresh]
+        assert scanner.job_index.get_jobs_with_et_status(JOBS_ETL_STATUS_RUNNING) == []
+        assert len(scanner.job_index) == 2
+
+    def test_sweep_keeps_queued_messages(self, et_scanner_job_index):
+        scanner = et_scanner_job_index
+        scanner._run_once = True
+        new_job = self.make_job('new', JOBS_ETL_STATUS_EMPTY, None)
+        new_job._fake_record['start_date'] = '2014-09-01'
+        del new_job._fake_record['et_status_last_updated_at']
+        scanner.db.batch_get.return_value = [new_job]
+        msgs = [scanner_msg({'message': 'dummy'}), scanner_msg({'hash_key': 'new'})]
+        with mock.patch.object(scanner, '_get_timeout', return_value=60), \
+                mock.patch.object(scanner.scanner_queue, 'get_messages_from_queue',
+                                  return_value=msgs), \
+                mock.patch.object(scanner.scanner_queue, 'delete_message_batch_from_queue'), \
+                mock.patch.object(scanner.scanner_queue, 'clear') as mock_clear:
+            scanner.run()
+        # the new job is not in the index until a full refresh, so the
+        # sweep leaves its message to be processed
+        assert not mock_clear.called
+        scanner.db.batch_get.assert_called_once_with(['new'])
+        assert new_job.get(et_status=None)['et_status'] == JOBS_ETL_STATUS_SCHEDULED
+        assert scanner.worker_queue._published_msg['hash_key'] == 'new'
+        assert scanner.job_index.get_jobs_with_et_status(JOBS_ETL_STATUS_SCHEDULED) == [new_job]
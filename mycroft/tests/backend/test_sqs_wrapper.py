@@ -1,10 +1,15 @@
 # -*- coding: utf-8 -*-
+import time
+
 import mock
 import pytest
 import staticconf.testing
 
 from boto.exception import BotoServerError
+from boto.sqs.batchresults import BatchResults
+from boto.sqs.jsonmessage import JSONMessage
 
+from mycroft.backend.sqs_wrapper import SQSBatchError
 from mycroft.backend.sqs_wrapper import SQSWrapper
 from mycroft.models.aws_connections import get_boto_creds
 
@@ -42,7 +47,7 @@ class FakeQueue(object):
     def get_messages(self, num_messages, wait_time_seconds):
         if self.exception:
             raise BotoServerError(503, "test")
-        return [] if self.msgs is None else self.msgs
+        return [] if self.msgs is None else self.msgs[:num_messages]
 
     def set_message_class(self, class_type):
         self.class_type = class_type
@@ -52,6 +57,7 @@ class FakeQueue(object):
 
     def delete_message_batch(self, msgs):
         self.deleted_msgs = msgs
+        return BatchResults(None)
 
     def clear(self):
         self.msgs = None
@@ -159,7 +165,7 @@ def test_delete_msg_batch(get_mock_boto):
     mock_obj = get_mock_boto
     mock_obj.return_value = fake_conn
     sqs = SQSWrapper("some-queue")
-    test_msgs = [object()]
+    test_msgs = make_msgs(1)
     sqs.delete_message_batch_from_queue(test_msgs)
     mock_obj.assert_called_once_with('us-west-2', **get_test_creds())
     assert fake_queue.deleted_msgs == test_msgs
@@ -187,3 +193,116 @@ def test_clear(get_mock_boto):
     sqs = SQSWrapper("some-queue")
     sqs.clear()
     assert fake_queue.msgs is None
+
+
+class FakeBatchQueue(FakeQueue):
+    """ Fails the batch entries whose ids are in fail_ids, once for each
+    time they appear there; sender_fault_ids always fail
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.fail_ids = []
+        self.sender_fault_ids = set()
+
+    def _run_batch(self, entries, get_id):
+        self.requests.append(entries)
+        assert len(entries) <= 10
+        results = BatchResults(None)
+        for entry in entries:
+            entry_id = get_id(entry)
+            if entry_id in self.sender_fault_ids:
+                results.errors.append({'id': entry_id, 'sender_fault': 'true'})
+            elif entry_id in self.fail_ids:
+                self.fail_ids.remove(entry_id)
+                results.errors.append({'id': entry_id, 'sender_fault': 'false'})
+            else:
+                results.results.append({'id': entry_id})
+        return results
+
+    def write_batch(self, entries):
+        return self._run_batch(entries, lambda entry: entry[0])
+
+    def delete_message_batch(self, msgs):
+        return self._run_batch(msgs, lambda msg: msg.id)
+
+    def change_message_visibility_batch(self, entries):
+        return self._run_batch(entries, lambda entry: entry[0].id)
+
+
+def make_msgs(num_msgs):
+    msgs = []
+    for i in range(num_msgs):
+        msg = JSONMessage(body={'i': i})
+        msg.id = 'msg{0}'.format(i)
+        msgs.append(msg)
+    return msgs
+
+
+@pytest.yield_fixture
+def batch_sqs(get_mock_boto):
+    fake_conn = FakeConn()
+    fake_conn.set_queue(FakeBatchQueue())
+    get_mock_boto.return_value = fake_conn
+    with mock.patch('mycroft.backend.sqs_wrapper.time.sleep'):
+        yield SQSWrapper("some-queue")
+
+
+def test_write_msg_batch_in_chunks(batch_sqs):
+    batch_sqs.write_message_batch_to_queue([{'i': i} for i in range(23)])
+    requests = batch_sqs._queue.requests
+    assert [len(entries) for entries in requests] == [10, 10, 3]
+    assert JSONMessage().decode(requests[2][0][1]) == {'i': 20}
+
+
+def test_write_msg_batch_retries_failed_entries(batch_sqs):
+    batch_sqs._queue.fail_ids = ['3', '3', '5']
+    batch_sqs.write_message_batch_to_queue([{'i': i} for i in range(10)])
+    assert [[entry[0] for entry in entries] for entries in batch_sqs._queue.requests[1:]] == \
+        [['3', '5'], ['3']]
+
+
+def test_write_msg_batch_raises_on_failures(batch_sqs):
+    batch_sqs._queue.fail_ids = ['1'] * 10
+    batch_sqs._queue.sender_fault_ids = set(['2'])
+    with pytest.raises(SQSBatchError) as e:
+        batch_sqs.write_message_batch_to_queue([{'i': i} for i in range(3)])
+    assert sorted(error['id'] for error in e.value.errors) == ['1', '2']
+    # 1 request and 3 retries of the retryable entry
+    assert len(batch_sqs._queue.requests) == 4
+
+
+def test_delete_msg_batch_in_chunks(batch_sqs):
+    msgs = make_msgs(12)
+    batch_sqs._queue.fail_ids = ['msg11']
+    batch_sqs.delete_message_batch_from_queue(msgs)
+    assert batch_sqs._queue.requests == [msgs[:10], msgs[10:], msgs[11:]]
+
+
+def test_change_message_visibility_batch(batch_sqs):
+    msgs = make_msgs(2)
+    batch_sqs.change_message_visibility_batch(msgs, 60)
+    assert batch_sqs._queue.requests == [[(msgs[0], 60), (msgs[1], 60)]]
+
+
+def test_get_messages_prefetches(get_mock_boto):
+    fake_conn = FakeConn()
+    fake_queue = FakeQueue()
+    fake_conn.set_queue(fake_queue)
+    get_mock_boto.return_value = fake_conn
+    msgs = make_msgs(5)
+    fake_queue.set_messages(msgs)
+    config = dict(MOCK_CONFIG, sqs=dict(MOCK_CONFIG['sqs'], prefetch_buffer_size=2))
+    with staticconf.testing.MockConfiguration(config), mock.patch.object(
+        fake_queue, 'get_messages', wraps=fake_queue.get_messages
+    ) as mock_get_messages:
+        sqs = SQSWrapper("some-queue")
+        assert sqs.get_messages_from_queue() == msgs[:2]
+        assert sqs.get_messages_from_queue() == msgs[2:4]
+        mock_get_messages.assert_called_once_with(num_messages=4, wait_time_seconds=20)
+
+        # stale prefetched messages are dropped
+        with mock.patch('mycroft.backend.sqs_wrapper.time.time',
+                        return_value=time.time() + 16):
+            assert sqs.get_messages_from_queue() == msgs[:2]
+        assert mock_get_messages.call_count == 2
@@ -1,6 +1,10 @@
 # -*- coding: utf-8 -*-
 import os
+import threading
+import time
 from copy import copy
+from datetime import datetime
+from datetime import timedelta
 
 import mock
 import pytest
@@ -13,7 +17,10 @@ from mycroft.backend.worker.base_worker import setup_config
 from mycroft.backend.worker.et_worker import parse_cmd_args
 from mycroft.backend.worker.base_worker import WorkerJob
 from mycroft.backend.worker.base_worker import BaseMycroftWorker
+from mycroft.backend.worker.base_worker import PoolExtended
+from mycroft.backend.worker.base_worker import UnexpectedJobStatus
 from mycroft.backend.worker.et_worker import ImdWorker
+from mycroft.backend.worker.et_worker import ImdWorkerJob
 from mycroft.backend.util import datetime_to_date_string
 from mycroft.backend.util import date_string_total_items
 from mycroft.models.scheduled_jobs import JOBS_ETL_STATUS_RUNNING
@@ -24,6 +31,7 @@ from tests.data.scheduled_job import SAMPLE_RECORD_ET_STATUS_RUNNING_1
 from tests.data.scheduled_job import SAMPLE_RECORD_ET_STATUS_SCHEDULED
 from tests.models.test_abstract_records import dynamodb_connection  # noqa
 from tests.models.test_etl_record import etl_records  # noqa
+from tests.models.test_scheduled_jobs import FakeScheduledJob
 from tests.models.test_scheduled_jobs import scheduled_jobs  # noqa
 
 
@@ -31,6 +39,7 @@ class FakeSQS(SQSWrapper):
 
     def __init__(self, msg_list=None):
         self._published_msg = None
+        self._published_msgs = []
         self.msgs = msg_list
 
     def get_messages_from_queue(self):
@@ -39,6 +48,9 @@ class FakeSQS(SQSWrapper):
     def write_message_to_queue(self, msg):
         self._published_msg = msg
 
+    def write_message_batch_to_queue(self, msgs):
+        self._published_msgs.append(msgs)
+
     def delete_message_from_queue(self, msg):
         pass
 
@@ -97,6 +109,419 @@ def get_worker(request, scheduled_jobs, etl_records):
             yield workers[request.param]
 
 
+@pytest.yield_fixture(params=[1, 2])
+def concurrent_worker(request):
+    config = dict(MOCK_CONFIG, worker={
+        'num_et_processes_per_host': 3,
+        'max_concurrent_jobs': request.param,
+    })
+    with staticconf.testing.MockConfiguration(config):
+        with mock.patch(
+                'mycroft.models.aws_connections.TableConnection.get_connection'
+                ):
+            worker = ImdWorker(CONFIG_LOC, CONFIG_OVERRIDE_LOC, True, Mailer(True))
+            worker._run_once = True
+            yield worker
+
+
+class CountingJob(WorkerJob):
+    """ A job of num_runs single step runs """
+
+    def __init__(self, worker, num_runs, max_runs_in_flight):
+        super(CountingJob, self).__init__(worker, {}, max_runs_in_flight)
+        self.num_runs = num_runs
+        self.runs_scheduled = 0
+
+    def has_more_runs_to_schedule(self):
+        return self.runs_scheduled < self.num_runs
+
+    def schedule_next_run(self):
+        self.runs_scheduled += 1
+        return WorkerJob.RunTuple(self.runs_scheduled, 'et', None, [])
+
+    def run_complete(self, run_id, step, results):
+        pass
+
+
+def interruptible_sleep(secs):
+    try:
+        time.sleep(secs)
+        return 'done'
+    except KeyboardInterrupt:
+        return 'cancelled'
+
+
+def cancel_when_running(pool, tag, skip_tasks=()):
+    tasks = []
+    deadline = time.time() + 10
+    while not tasks and time.time() < deadline:
+        # the task may not have reached a child yet
+        tasks = pool.cancel(tag, skip_tasks)
+        time.sleep(0.05)
+    return tasks
+
+
+def test_pool_cancel_interrupts_later_task_in_same_child():
+    pool = PoolExtended(processes=1)
+    try:
+        first = pool.apply_async(interruptible_sleep, args=(10,), tag=1)
+        cancelled_tasks = set(cancel_when_running(pool, 1))
+        assert first.get(10) == 'cancelled'
+        # the child cancelled above runs the next task of the same job
+        second = pool.apply_async(interruptible_sleep, args=(10,), tag=1)
+        tasks = cancel_when_running(pool, 1, cancelled_tasks)
+        assert len(tasks) == 1
+        assert tasks[0][0] == list(cancelled_tasks)[0][0]
+        assert second.get(10) == 'cancelled'
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def test_pool_cancel_only_interrupts_tasks_of_tag():
+    pool = PoolExtended(processes=3)
+    try:
+        cancelled = pool.apply_async(interruptible_sleep, args=(10,), tag=1)
+        other = pool.apply_async(interruptible_sleep, args=(2,), tag=2)
+        untagged = pool.apply_async(interruptible_sleep, args=(2,))
+        tasks = cancel_when_running(pool, 1)
+        assert len(tasks) == 1
+        assert pool.cancel(1, set(tasks)) == []
+        assert cancelled.get(10) == 'cancelled'
+        assert other.get(10) == 'done'
+        assert untagged.get(10) == 'done'
+        # children live on after a cancel
+        assert pool.apply_async(interruptible_sleep, args=(0,)).get(10) == 'done'
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+class TestConcurrentWorker(object):
+
+    def test_schedule_runs_shares_slots_fairly(self, concurrent_worker):
+        worker = concurrent_worker
+        et_pool = mock.Mock()
+        first = CountingJob(worker, 10, 3)
+        second = CountingJob(worker, 10, 3)
+        worker._active_jobs.extend([first, second])
+        with mock.patch.object(worker, 'etl_helper', autospec=True):
+            with worker._cond:
+                worker._schedule_runs_lk(et_pool, first)
+                # second job has fewer runs in flight and gets the next slot
+                assert first.runs_in_flight == 1
+                worker._schedule_runs_lk(et_pool, second)
+                assert second.runs_in_flight == 2
+
+                # all 3 host slots are taken
+                worker._schedule_runs_lk(et_pool, first)
+                assert first.runs_in_flight == 1
+                assert worker._runs_in_flight == 3
+
+            worker._run_complete_callback(second, 1, 'et', [SUCCESS_RECORD])
+            with worker._cond:
+                worker._schedule_runs_lk(et_pool, first)
+            assert first.runs_in_flight == 2
+            assert worker._runs_in_flight == 3
+        assert len(et_pool.apply_async.mock_calls) == 4
+
+    @pytest.mark.parametrize("delete_requested", [False, True])
+    def test_process_msg_reads_actions_without_lock(self, concurrent_worker,
+                                                    delete_requested):
+        worker = concurrent_worker
+        in_dynamodb = threading.Event()
+        resume = threading.Event()
+        lock_free = []
+
+        def wait_in_dynamodb():
+            # another thread takes the lock while this job talks to DynamoDB
+            in_dynamodb.set()
+            assert resume.wait(10)
+
+        class SlowJob(CountingJob):
+            def update_action_requests(self):
+                if not delete_requested:
+                    wait_in_dynamodb()
+                self.actions = {'cancel_requested': False, 'pause_requested': False,
+                                'delete_requested': delete_requested}
+
+        job = SlowJob(worker, 0, 1)
+        with mock.patch.object(worker, 'create_worker_job', return_value=job), \
+                mock.patch.object(worker, '_get_et_pool'), \
+                mock.patch.object(worker, '_handle_job_delete',
+                                  side_effect=lambda job: wait_in_dynamodb()):
+            thread = threading.Thread(target=worker._process_msg, args=(SAMPLE_JSON_SQS_MSG,))
+            thread.start()
+            try:
+                assert in_dynamodb.wait(10)
+                lock_free.append(worker._cond.acquire(False))
+                if lock_free[0]:
+                    worker._cond.release()
+            finally:
+                resume.set()
+                thread.join(10)
+        assert lock_free == [True]
+        assert not thread.is_alive()
+        assert worker._active_jobs == []
+
+    def test_run_complete_recorded_without_lock(self, concurrent_worker):
+        worker = concurrent_worker
+        job = CountingJob(worker, 1, 1)
+        job.runs_in_flight = 1
+        worker._runs_in_flight = 1
+        lock_free = []
+
+        def etl_step_complete(*args):
+            lock_free.append(worker._cond.acquire(False))
+            if lock_free[0]:
+                worker._cond.release()
+
+        with mock.patch.object(worker, 'etl_helper', autospec=True) as etl_helper:
+            etl_helper.etl_step_complete.side_effect = etl_step_complete
+            worker._run_complete_callback(job, 1, 'et', [SUCCESS_RECORD])
+        assert lock_free == [True]
+        assert job.runs_in_flight == 0
+        assert worker._runs_in_flight == 0
+
+    def test_run_processes_msgs_concurrently(self, concurrent_worker):
+        worker = concurrent_worker
+        sqs = FakeSQS([SAMPLE_JSON_SQS_MSG] * 4)
+        lock = threading.Lock()
+        in_progress = [0]
+        max_in_progress = [0]
+        both_started = threading.Event()
+
+        def process_msg(msg):
+            with lock:
+                in_progress[0] += 1
+                max_in_progress[0] = max(max_in_progress[0], in_progress[0])
+                if in_progress[0] == 2:
+                    both_started.set()
+            if worker._max_concurrent_jobs > 1:
+                assert both_started.wait(10)
+            with lock:
+                in_progress[0] -= 1
+            return (
+                {'2014-02-06': [{'date': '2014-02-06', 'status': 'success'}]},
+                {'cancel_requested': False, 'pause_requested': False,
+                 'delete_requested': False}
+            )
+
+        with mock.patch.object(worker, '_get_sqs_wrapper', return_value=sqs), \
+                mock.patch.object(worker, '_update_scheduled_jobs_on_etl_start'), \
+                mock.patch.object(worker, '_update_scheduled_jobs_on_etl_complete') \
+                as mock_complete, \
+                mock.patch.object(worker, '_process_msg', side_effect=process_msg), \
+                mock.patch.object(worker.emailer, 'mail_result'):
+            worker.run()
+        assert max_in_progress[0] == worker._max_concurrent_jobs
+        assert mock_complete.call_count == 4
+        assert worker._msgs_in_progress == 0
+
+
+class TestMsgHeartbeatWorker(object):
+
+    @pytest.yield_fixture
+    def worker(self, concurrent_worker):
+        concurrent_worker._msg_visibility_timeout_sec = 150
+        concurrent_worker._msg_heartbeat = mock.Mock()
+        concurrent_worker._msg_heartbeat.remove.return_value = True
+        yield concurrent_worker
+
+    def make_msg(self):
+        msg = JSONMessage(body=SAMPLE_JSON_SQS_MSG.get_body())
+        msg.id = 'msg-id'
+        return msg
+
+    def fake_job(self, et_status, updated_sec_ago):
+        updated_at = datetime.utcnow() - timedelta(seconds=updated_sec_ago)
+        return FakeScheduledJob({
+            'et_status': et_status,
+            'et_status_last_updated_at': str(updated_at),
+        })
+
+    def handle_msg(self, worker, msg, sqs):
+        worker._handle_msg(msg, sqs, FakeSQS(), 'queue')
+
+    def test_msg_deleted_after_job_completes(self, worker):
+        msg = self.make_msg()
+        sqs = mock.Mock()
+        calls = mock.Mock()
+        sqs.delete_message_from_queue = calls.delete
+        with mock.patch.object(worker, '_update_scheduled_jobs_on_etl_start'), \
+                mock.patch.object(worker, '_update_scheduled_jobs_on_etl_complete',
+                                  side_effect=calls.complete), \
+                mock.patch.object(worker, '_process_msg', side_effect=calls.process), \
+                mock.patch.object(worker.emailer, 'mail_result'):
+            self.handle_msg(worker, msg, sqs)
+        worker._msg_heartbeat.add.assert_called_once_with(msg)
+        worker._msg_heartbeat.remove.assert_called_once_with(msg)
+        assert [c[0] for c in calls.mock_calls] == ['process', 'complete', 'delete']
+
+    def test_runs_written_before_job_completes(self, worker):
+        msg = self.make_msg()
+        calls = mock.Mock()
+        with mock.patch.object(worker, '_update_scheduled_jobs_on_etl_start'), \
+                mock.patch.object(worker, '_update_scheduled_jobs_on_etl_complete',
+                                  side_effect=calls.complete), \
+                mock.patch.object(worker, '_process_msg', side_effect=calls.process), \
+                mock.patch.object(worker, 'etl_helper', calls.etl_helper), \
+                mock.patch.object(worker.emailer, 'mail_result'):
+            self.handle_msg(worker, msg, mock.Mock())
+        assert [c[0] for c in calls.mock_calls] == \
+            ['process', 'etl_helper.flush_job', 'complete']
+        calls.etl_helper.flush_job.assert_called_once_with(msg.get_body()['uuid'])
+
+    def test_duplicate_msg_deleted_without_processing(self, worker):
+        msg = self.make_msg()
+        sqs = mock.Mock()
+        worker._msg_heartbeat.remove.return_value = False
+        with mock.patch.object(worker, '_get_scheduled_job', return_value=self.fake_job(
+            JOBS_ETL_STATUS_RUNNING, 10
+        )), mock.patch.object(worker, '_process_msg') as mock_process:
+            self.handle_msg(worker, msg, sqs)
+        assert mock_process.call_count == 0
+        assert worker._msg_heartbeat.add.call_count == 0
+        sqs.delete_message_from_queue.assert_called_once_with(msg)
+
+    def test_msg_kept_on_start_failure(self, worker):
+        msg = self.make_msg()
+        sqs = mock.Mock()
+        worker._msg_heartbeat.remove.return_value = False
+        with mock.patch.object(worker, '_get_scheduled_job', side_effect=IOError()):
+            self.handle_msg(worker, msg, sqs)
+        assert sqs.delete_message_from_queue.call_count == 0
+
+    @pytest.mark.parametrize("updated_sec_ago, taken_over", [
+        (10, False),
+        (300, True),
+    ])
+    def test_running_job_taken_over_only_if_abandoned(self, worker, updated_sec_ago,
+                                                      taken_over):
+        msg_dict = SAMPLE_JSON_SQS_MSG.get_body()
+        with mock.patch.object(worker, '_get_scheduled_job', return_value=self.fake_job(
+            JOBS_ETL_STATUS_RUNNING, updated_sec_ago
+        )), mock.patch.object(worker, '_update_scheduled_jobs') as mock_update:
+            if taken_over:
+                worker._update_scheduled_jobs_on_etl_start(msg_dict)
+                mock_update.assert_called_once_with(
+                    msg_dict['hash_key'], {'et_status': JOBS_ETL_STATUS_RUNNING}
+                )
+            else:
+                with pytest.raises(UnexpectedJobStatus):
+                    worker._update_scheduled_jobs_on_etl_start(msg_dict)
+                assert mock_update.call_count == 0
+
+    def test_running_job_not_taken_over_without_heartbeat(self, worker):
+        worker._msg_heartbeat = None
+        with mock.patch.object(worker, '_get_scheduled_job', return_value=self.fake_job(
+            JOBS_ETL_STATUS_RUNNING, 300
+        )):
+            with pytest.raises(UnexpectedJobStatus):
+                worker._update_scheduled_jobs_on_etl_start(SAMPLE_JSON_SQS_MSG.get_body())
+
+
+class TestImdWorkerJob(object):
+
+    @pytest.yield_fixture
+    def worker(self, concurrent_worker):
+        with mock.patch.object(concurrent_worker, 'etl_helper', autospec=True), \
+                mock.patch.object(concurrent_worker, '_update_scheduled_jobs'), \
+                mock.patch.object(ImdWorkerJob, 'get_args_for_step'):
+            yield concurrent_worker
+
+    def make_job(self, worker, et_parallelism=3, et_lookahead=0, **kwargs):
+        msg_dict = dict(SAMPLE_JSON_SQS_MSG.get_body(), **kwargs)
+        job = ImdWorkerJob(worker, msg_dict, et_parallelism, et_lookahead)
+        worker._active_jobs.append(job)
+        return job
+
+    def schedule(self, worker, job):
+        with worker._cond:
+            worker._schedule_runs_lk(mock.Mock(), job)
+
+    def complete(self, worker, job, date, step, status='success'):
+        worker._run_complete_callback(
+            job, date, step, [dict(SUCCESS_RECORD, date=date, status=status)]
+        )
+
+    def test_et_lookahead(self, worker):
+        job = self.make_job(worker, et_lookahead=2)
+        self.schedule(worker, job)
+        assert job.et_runs_in_flight == 2
+        assert job.next_et_index == 2
+
+        self.complete(worker, job, '2014-02-02', 'et')
+        self.schedule(worker, job)
+        # the load of the first date moves the window by one date
+        assert job.load_runs_in_flight == 1
+        assert job.next_et_index == 3
+
+        self.complete(worker, job, '2014-02-02', 'load')
+        self.schedule(worker, job)
+        assert job.et_runs_in_flight == 2
+        assert job.next_et_index == 3
+
+    def test_loads_in_date_order(self, worker):
+        job = self.make_job(worker)
+        self.schedule(worker, job)
+        assert job.et_runs_in_flight == 3
+
+        # the second date can't be loaded before the first
+        self.complete(worker, job, '2014-02-03', 'et')
+        self.schedule(worker, job)
+        assert job.load_runs_in_flight == 0
+        assert job.scheduled_load_date is None
+
+        self.complete(worker, job, '2014-02-02', 'et')
+        self.schedule(worker, job)
+        assert job.load_runs_in_flight == 1
+        assert job.scheduled_load_date == '2014-02-02'
+
+    def test_failed_et_stops_ets(self, worker):
+        job = self.make_job(worker, et_parallelism=1)
+        self.schedule(worker, job)
+        self.complete(worker, job, '2014-02-02', 'et', status='error')
+        self.schedule(worker, job)
+        assert job.et_runs_in_flight == 0
+        assert job.is_done()
+
+    def test_load_target_shared_by_jobs(self, worker):
+        worker._max_runs_in_flight = 10
+        first = self.make_job(worker, et_parallelism=1)
+        same_schema = self.make_job(worker, et_parallelism=1)
+        other_schema = self.make_job(worker, et_parallelism=1, redshift_schema='other')
+        for job in (first, same_schema, other_schema):
+            self.schedule(worker, job)
+            self.complete(worker, job, '2014-02-02', 'et')
+        for job in (first, same_schema, other_schema):
+            self.schedule(worker, job)
+        assert first.load_runs_in_flight == 1
+        assert same_schema.load_runs_in_flight == 0
+        assert not same_schema.is_done()
+        assert other_schema.load_runs_in_flight == 1
+
+        self.complete(worker, first, '2014-02-02', 'load')
+        for job in (first, same_schema):
+            self.schedule(worker, job)
+        assert same_schema.load_runs_in_flight == 1
+
+    @pytest.mark.parametrize("additional_arguments, et_parallelism, et_lookahead", [
+        ({}, 3, 0),
+        ({'et_parallelism': 2, 'et_lookahead': 4}, 2, 4),
+        ('{"et_parallelism": "1"}', 1, 0),
+        ({'et_parallelism': 100}, 3, 0),
+    ])
+    def test_create_worker_job(self, concurrent_worker, additional_arguments,
+                               et_parallelism, et_lookahead):
+        msg_dict = dict(SAMPLE_JSON_SQS_MSG.get_body(),
+                        additional_arguments=additional_arguments)
+        job = concurrent_worker.create_worker_job(msg_dict)
+        assert job.et_parallelism == et_parallelism
+        assert job.et_lookahead == et_lookahead
+        assert job.max_runs_in_flight == et_parallelism + 1
+
+
 class TestMycroftWorker(object):
 
     def setup_run_test(self, get_worker):
@@ -286,6 +711,9 @@ class TestMycroftWorker(object):
                     assert action_results['cancel_requested'] == action_req['cancel_requested']
                     assert action_results['pause_requested'] == action_req['pause_requested']
 
+            # both messages ran in the same pool
+            assert mock_pool.call_count == 1
+
     def test_setup_config_no_exceptions(self):
         args = argparse.Namespace(
             config=None, config_override=None, run_local=False
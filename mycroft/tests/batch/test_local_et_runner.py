@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+import gzip
+import os
+import shutil
+import tempfile
+import zlib
+
+import mock
+import pytest
+import simplejson
+
+from sherlock.batch.local_et_runner import iter_lines
+from sherlock.batch.local_et_runner import list_input_paths
+from sherlock.batch.local_et_runner import LocalStorage
+from sherlock.batch.local_et_runner import run_local_et
+
+
+MRJOB_PATH = 'sherlock.batch.mr_json.mrjob_create'
+
+
+@pytest.yield_fixture
+def s3_root():
+    root = tempfile.mkdtemp()
+    yield root
+    shutil.rmtree(root)
+
+
+def gzip_bytes(data):
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def log_line(request_id, num_items):
+    return simplejson.dumps({
+        'foo': {'request_id': request_id, 'start_time': 1400000000,
+                'list': range(num_items)},
+        'bar': {'client': 'iphone'},
+    })
+
+
+def put_input(storage, path, lines):
+    storage.put_string(path, gzip_bytes('\n'.join(lines) + '\n'))
+
+
+def read_output(root, path):
+    with gzip.open(LocalStorage(root).local_path(path)) as f:
+        return f.read().splitlines()
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1000])
+def test_iter_lines(chunk_size):
+    data = gzip_bytes('a\nbc\n') + gzip_bytes('d\n\ne')
+    chunks = [data[i:i + chunk_size] for i in xrange(0, len(data), chunk_size)]
+    assert list(iter_lines(chunks, True)) == ['a', 'bc', 'd', '', 'e']
+    assert list(iter_lines(['a\nb', 'c\n'], False)) == ['a', 'bc']
+
+
+def test_list_input_paths(s3_root):
+    storage = LocalStorage(s3_root)
+    for key in ['logs/2014/01/01/part-0.gz', 'logs/2014/01/01/part-1.gz',
+                'logs/2014/01/01/COMPLETE', 'logs/2014/01/02/part-0.gz']:
+        storage.put_string('s3://bucket/' + key, '')
+    assert list_input_paths(storage, 's3://bucket/logs/2014/01/01/part-*.gz') \
+        == ['s3://bucket/logs/2014/01/01/part-0.gz',
+            's3://bucket/logs/2014/01/01/part-1.gz']
+    assert list_input_paths(storage, 's3://bucket/nothing/*') == []
+
+
+def test_run_local_et(s3_root):
+    storage = LocalStorage(s3_root)
+    put_input(storage, 's3://bucket/logs/2014/01/01/part-0.gz',
+              [log_line('a', 2), '{"bad', log_line('b', 0)])
+    put_input(storage, 's3://bucket/logs/2014/01/01/part-1.gz',
+              [log_line('c', 1)])
+    output_dir = 's3://bucket/out/2014/01/01'
+
+    result = run_local_et(
+        MRJOB_PATH, 's3://bucket/logs/2014/01/01/part-*.gz', output_dir,
+        'schema/db.yaml', '|', 2, True, mock.Mock(), local_s3_root=s3_root
+    )
+
+    assert result == (True, None)
+    assert storage.path_exists(output_dir + '/_SUCCESS')
+    assert read_output(s3_root, output_dir + '/table_2/part-00000.gz') == \
+        ['0|a|1400000000000', '1|a|1400000000000']
+    assert read_output(s3_root, output_dir + '/table_2/part-00001.gz') == \
+        ['0|c|1400000000000']
+    assert read_output(s3_root, output_dir + '/table_1/part-00001.gz') == \
+        ['iphone|null|1400000000000|s3://bucket/logs/2014/01/01/part-1.gz']
+    errors = read_output(s3_root, output_dir + '/pipeline_errors/part-00000.gz')
+    assert len(errors) == 1
+    assert errors[0].endswith('|{"bad')
+
+
+def test_run_local_et_failure(s3_root):
+    storage = LocalStorage(s3_root)
+    put_input(storage, 's3://bucket/logs/part-0.gz', [log_line('a', 1)])
+    logstream = mock.Mock()
+
+    result, reason = run_local_et(
+        MRJOB_PATH, 's3://bucket/logs/part-*.gz', 's3://bucket/out',
+        'schema/missing.yaml', '|', 1, True, logstream, local_s3_root=s3_root
+    )
+
+    assert result is False
+    assert 'IOError' in reason
+    assert not storage.path_exists('s3://bucket/out/_SUCCESS')
+    assert logstream.write_msg.call_args[0][0] == 'error'
+
+
+def test_run_local_et_no_input(s3_root):
+    result, reason = run_local_et(
+        MRJOB_PATH, 's3://bucket/logs/part-*.gz', 's3://bucket/out',
+        'schema/db.yaml', '|', 1, True, mock.Mock(), local_s3_root=s3_root
+    )
+    assert result is False
+    assert 'no input matches' in reason
+    assert not os.path.exists(os.path.join(s3_root, 'bucket', 'out'))
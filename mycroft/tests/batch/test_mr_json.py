@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+import mock
+import pytest
+import simplejson
+
+from sherlock.batch.mr_json import mrjob_create
+
+
+@pytest.fixture
+def mr_job():
+    job = mrjob_create(args=['--extractions', 'schema/db.yaml'])
+    job.mapper_init()
+    return job
+
+
+def legacy_rows_for_tables(job, name_to_object):
+    for table_name, table in job.table_name_to_table.iteritems():
+        for row in table.value_iterator(name_to_object=name_to_object,
+                                        derive_metric=job.derive_metric):
+            job.redshift_export.given_output_order = \
+                job.table_name_to_output_order[table_name]
+            yield table_name, job.redshift_export.write(None, row)
+
+
+LOG_LINES = [
+    {'foo': {'request_id': 'abc|def', 'start_time': 1400000000,
+             'list': [1, 2, 3]},
+     'bar': {'client': u'iph\xf6ne\n', 'experiments': {'a': [1, None]}}},
+    {'foo': {'request_id': None, 'start_time': 1400000001, 'list': []},
+     'bar': {}},
+]
+
+
+@pytest.mark.parametrize("name_to_object", LOG_LINES)
+def test_emit_rows_for_tables(name_to_object, mr_job):
+    with mock.patch.dict('os.environ', {'map_input_file': 's3://b/k.gz'}):
+        expected = list(legacy_rows_for_tables(mr_job, name_to_object))
+        assert list(mr_job.emit_rows_for_tables(name_to_object)) == expected
+
+
+def test_mapper(mr_job):
+    with mock.patch.dict('os.environ', {'map_input_file': 's3://b/k.gz'}):
+        output = list(mr_job.mapper(None, simplejson.dumps(LOG_LINES[0])))
+    assert sorted(table for table, _ in output) == \
+        ['table_1', 'table_2', 'table_2', 'table_2']
+    assert ('table_2', '2|abc\\|def|1400000000000') in output
+
+
+def test_mapper_bad_json(mr_job):
+    with mock.patch.dict('os.environ', {'map_input_file': 's3://b/k.gz'}):
+        output = list(mr_job.mapper(None, '{"foo":'))
+    assert len(output) == 1
+    assert output[0][0] == 'pipeline_errors'
+
+
+def test_mapper_batched():
+    job = mrjob_create(args=['--extractions', 'schema/db.yaml',
+                             '--emit-batch-size', '2'])
+    job.mapper_init()
+    lines = [simplejson.dumps(line) for line in LOG_LINES * 2 + LOG_LINES[:1]]
+    lines.append('{')
+    with mock.patch.dict('os.environ', {'map_input_file': 's3://b/k.gz'}):
+        expected = [output for line in lines if line != '{'
+                    for output in legacy_rows_for_tables(
+                        job, simplejson.loads(line))]
+        output = [record for line in lines
+                  for record in job.mapper(None, line)]
+        assert len(job.pending_batch) == 1
+        output.extend(job.mapper_final())
+    assert job.pending_batch == []
+
+    records = [tuple(line.split('\t', 1)) for table_name, value in output
+               if table_name != 'pipeline_errors'
+               for line in '{0}\t{1}'.format(table_name, value).split('\n')]
+    assert sorted(records) == sorted(expected)
+    assert len([1 for table_name, _ in output
+                if table_name == 'pipeline_errors']) == 1
+
+
+def test_mapper_json_decoder(mr_job):
+    pytest.importorskip('ujson')
+    ujson_job = mrjob_create(args=['--extractions', 'schema/db.yaml',
+                                   '--json-decoder', 'ujson'])
+    ujson_job.mapper_init()
+    lines = [simplejson.dumps(line) for line in LOG_LINES]
+    lines.append('{"foo": {"list": [1, 2], "request_id": }}')
+    with mock.patch.dict('os.environ', {'map_input_file': 's3://b/k.gz'}):
+        for line in lines:
+            expected = list(mr_job.mapper(None, line))
+            output = list(ujson_job.mapper(None, line))
+            if expected[0][0] == 'pipeline_errors':
+                assert [k for k, _ in output] == ['pipeline_errors']
+            else:
+                assert output == expected
@@ -13,6 +13,7 @@ import os
 from staticconf import read_list
 from staticconf import read_string
 from staticconf import YamlConfiguration
+from staticconf.testing import MockConfiguration
 
 
 @pytest.mark.parametrize(
@@ -156,3 +157,14 @@ def test_data_available_force_et(bucket_key_exists_rv, force_et, expected_result
             force_et=force_et
         )
         assert actual_result == expected_result
+
+
+def test_data_available_local_s3_root(tmpdir):
+    done_file = tmpdir.join('bucket', 'key', '1999', '12', '31', '_SUCCESS')
+    config = {'pipeline.et_step.local_s3_root': str(tmpdir)}
+    with MockConfiguration(config):
+        assert not data_available("s3://bucket/key/", "1999/12/31", True,
+                                  done_file_name='_SUCCESS')
+        done_file.write('', ensure=True)
+        assert data_available("s3://bucket/key/", "1999/12/31", True,
+                              done_file_name='_SUCCESS')
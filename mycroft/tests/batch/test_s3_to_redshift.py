@@ -1,10 +1,23 @@
 # -*- coding: utf-8 -*-
 from datetime import datetime
 import mock
+from boto.dynamodb2.exceptions import ItemNotFound
+import simplejson
 import pytest
 import staticconf.testing
 
+from sherlock.batch.local_et_runner import LocalStorage
+from sherlock.batch.s3_to_redshift import copy_tables
+from sherlock.batch.s3_to_redshift import copy_tables_in_transaction
+from sherlock.batch.s3_to_redshift import write_manifest
+from sherlock.batch.s3_to_redshift import copy_table_partition
+from sherlock.batch.s3_to_redshift import delete_old_data
 from sherlock.batch.s3_to_redshift import get_create_commands
+from sherlock.batch.s3_to_redshift import get_partitions
+from sherlock.batch.s3_to_redshift import get_ttl_cutoff
+from sherlock.batch.s3_to_redshift import record_loaded_day
+from sherlock.batch.s3_to_redshift import get_timestamp_column_name
+from sherlock.batch.s3_to_redshift import update_database_schema
 from sherlock.batch.s3_to_redshift import get_column_defaults
 from sherlock.batch.s3_to_redshift import handle_error
 from sherlock.batch.s3_to_redshift import one_day_greater
@@ -16,7 +29,11 @@ from sherlock.batch.s3_to_redshift import QUERY_GET_SORT_COLUMN
 from sherlock.batch.s3_to_redshift import QUERY_GET_MIN_MAX_DATE
 from sherlock.batch.s3_to_redshift import QUERY_DELETE_ROWS_BY_DATE
 from sherlock.batch.s3_to_redshift import QUERY_TABLE_DEF
+from sherlock.common.redshift_catalog import get_schema_hash
+from sherlock.common.redshift_catalog import get_tables_key
+from sherlock.common.redshift_catalog import invalidate_table_defs
 from sherlock.common.redshift_status import RedshiftStatusTable
+from sherlock.common.dynamodb_status import DynamoDbStatusTable
 from sherlock.common.redshift_status import QUERY_COMPLETE_JOB
 from sherlock.common.redshift_status import QUERY_COMPLETE_JOBS
 from sherlock.common.loggers import PipelineStreamLogger
@@ -262,3 +279,378 @@ def test_dates_from_rs_status(
                 single_date)
             assert len(result) == len(expected_out)
             assert set(result) == set(expected_out)
+
+
+LOG_TUPLES = [
+    ('s3://bucket/2014/07/01/table_{0}'.format(i), 'table_{0}'.format(i))
+    for i in range(6)
+] + [('s3://bucket/2014/07/01/pipeline_errors', 'pipeline_errors')]
+
+
+def run_copy_tables(parallelism, copy_table, status_helper):
+    config = {'pipeline.load_step.copy_parallelism': parallelism,
+              'pipeline.yaml_schema_file': 'schema/db.yaml'}
+    with mock.patch.dict('os.environ', {'YELPCODE': '.'}):
+        with staticconf.testing.MockConfiguration(config):
+            with mock.patch('sherlock.batch.s3_to_redshift.copy_table',
+                            side_effect=copy_table):
+                copy_tables(None, status_helper, 'dev', '2014/07/01',
+                            LOG_TUPLES, 2, MockLogger())
+
+
+def statuses(status_helper):
+    return [c[0][3] for c in status_helper.update_status.call_args_list]
+
+
+@pytest.mark.parametrize("parallelism", [1, 3])
+def test_copy_tables(parallelism):
+    copied = []
+
+    def copy_table(psql, db, ddate, log_tuple, ttl_days, logstream,
+                   **kwargs):
+        copied.append(log_tuple[1])
+        if log_tuple[1] == 'pipeline_errors':
+            raise Exception('The specified S3 prefix x does not exist')
+        return True
+
+    status_helper = mock.Mock()
+    status_helper.get_loaded_range.return_value = None
+    run_copy_tables(parallelism, copy_table, status_helper)
+    assert sorted(copied) == sorted(table for _, table in LOG_TUPLES)
+    assert statuses(status_helper) == ['running', 'complete']
+
+
+@pytest.mark.parametrize("parallelism", [1, 3])
+def test_copy_tables_error(parallelism):
+    copied = []
+
+    def copy_table(psql, db, ddate, log_tuple, ttl_days, logstream,
+                   **kwargs):
+        copied.append(log_tuple[1])
+        if log_tuple[1] in ('table_2', 'table_3'):
+            raise ValueError('failed ' + log_tuple[1])
+        return True
+
+    status_helper = mock.Mock()
+    status_helper.get_loaded_range.return_value = None
+    with pytest.raises(Exception) as e:
+        run_copy_tables(parallelism, copy_table, status_helper)
+    assert "ValueError: failed table_" in str(e.value)
+    assert statuses(status_helper) == ['running', 'error']
+    if parallelism == 1:
+        assert copied == ['table_0', 'table_1', 'table_2']
+
+
+def make_et_output(tmpdir, tables):
+    storage = LocalStorage(str(tmpdir))
+    for table in tables:
+        for part in range(2):
+            storage.put_string(
+                's3://bucket/2014/07/01/{0}/part-{1:05d}.gz'.format(
+                    table, part
+                ), ''
+            )
+    return storage
+
+
+def test_write_manifest(tmpdir):
+    storage = make_et_output(tmpdir, ['table_0'])
+    manifest = write_manifest(storage, 's3://bucket/2014/07/01/table_0')
+    assert manifest == 's3://bucket/2014/07/01/table_0.manifest'
+    with open(storage.local_path(manifest)) as f:
+        assert simplejson.load(f) == {'entries': [
+            {'url': 's3://bucket/2014/07/01/table_0/part-00000.gz',
+             'mandatory': True},
+            {'url': 's3://bucket/2014/07/01/table_0/part-00001.gz',
+             'mandatory': True},
+        ]}
+    assert write_manifest(storage, 's3://bucket/2014/07/01/table_1') is None
+
+
+def run_copy_tables_in_transaction(storage, copy_table, status_helper):
+    psql = mock.Mock()
+    psql.transaction.return_value = mock.MagicMock()
+    config = {'pipeline.yaml_schema_file': 'schema/db.yaml'}
+    with mock.patch.dict('os.environ', {'YELPCODE': '.'}):
+        with staticconf.testing.MockConfiguration(config):
+            with mock.patch('sherlock.batch.s3_to_redshift.copy_table',
+                            side_effect=copy_table), \
+                    mock.patch('sherlock.batch.s3_to_redshift.compact_table'):
+                copy_tables_in_transaction(
+                    psql, status_helper, 'dev', '2014/07/01',
+                    LOG_TUPLES, 2, MockLogger(), storage
+                )
+    return psql.transaction.return_value
+
+
+def test_copy_tables_in_transaction(tmpdir):
+    tables = [table for _, table in LOG_TUPLES[:-1]]
+    storage = make_et_output(tmpdir, tables)
+    copied = []
+
+    def copy_table(psql, db, ddate, log_tuple, ttl_days, logstream,
+                   manifest=None, compact=True, status_helper=None):
+        copied.append((log_tuple[1], manifest, compact))
+        return True
+
+    status_helper = mock.Mock()
+    status_helper.get_loaded_range.return_value = None
+    transaction = run_copy_tables_in_transaction(
+        storage, copy_table, status_helper
+    )
+    # there were no errors, so no error table
+    assert copied == [
+        (table, 's3://bucket/2014/07/01/{0}.manifest'.format(table), False)
+        for table in tables
+    ]
+    assert transaction.__exit__.call_args[0][0] is None
+    assert statuses(status_helper) == ['running', 'complete']
+
+
+def test_copy_tables_in_transaction_error(tmpdir):
+    storage = make_et_output(tmpdir, [table for _, table in LOG_TUPLES])
+
+    def copy_table(psql, db, ddate, log_tuple, ttl_days, logstream,
+                   manifest=None, compact=True, status_helper=None):
+        if log_tuple[1] == 'table_3':
+            raise ValueError('failed table_3')
+        return True
+
+    status_helper = mock.Mock()
+    status_helper.get_loaded_range.return_value = None
+    with pytest.raises(Exception) as e:
+        run_copy_tables_in_transaction(storage, copy_table, status_helper)
+    assert "ValueError: failed table_3" in str(e.value)
+    assert statuses(status_helper) == ['running', 'error']
+
+
+def test_copy_tables_in_transaction_missing_parts(tmpdir):
+    storage = make_et_output(tmpdir, ['table_0'])
+    status_helper = mock.Mock()
+    status_helper.get_loaded_range.return_value = None
+    with pytest.raises(Exception) as e:
+        run_copy_tables_in_transaction(storage, None, status_helper)
+    assert "no part files in s3://bucket/2014/07/01/table_1" in str(e.value)
+    assert statuses(status_helper) == ['running', 'error']
+
+
+@pytest.mark.parametrize("table, expected_column", [
+    ('tbl_a', 'time'),
+    ('tbl_b', None),
+    ('tbl_c', None),
+])
+def test_get_timestamp_column_name(table, expected_column):
+    psql = mock.Mock(host='host', port=1234)
+    psql.run_sql.return_value = [
+        ('public', 'tbl_a', 'time', 'timestamp without time zone',
+         'none', False, 1, True),
+        ('public', 'tbl_a', 'name', 'varchar(10)', 'lzo', False, 0, False),
+        ('public', 'tbl_b', 'id', 'integer', 'lzo', True, 1, True),
+    ]
+    with staticconf.testing.MockConfiguration({}):
+        try:
+            assert get_timestamp_column_name(psql, 'db', table) == \
+                expected_column
+            get_timestamp_column_name(psql, 'db', 'tbl_a')
+        finally:
+            invalidate_table_defs(psql, 'db', 'public')
+    # a table missing from the cached defs is looked up again
+    assert psql.run_sql.call_count == (2 if table == 'tbl_c' else 1)
+
+
+@pytest.mark.parametrize("loaded_hash, expect_check", [
+    (get_schema_hash('schema/db.yaml'), False),
+    ('another hash', True),
+    (None, True),
+])
+def test_update_database_schema_unchanged(loaded_hash, expect_check):
+    psql = mock.Mock(host='host', port=1234)
+    with staticconf.testing.MockConfiguration({}):
+        with mock.patch('sherlock.batch.s3_to_redshift.create_tables'), \
+                mock.patch('sherlock.batch.s3_to_redshift.'
+                           'get_loaded_schema_hash',
+                           return_value=loaded_hash) as get_hash, \
+                mock.patch('sherlock.batch.s3_to_redshift.'
+                           'get_cached_table_def',
+                           side_effect=ValueError('checking')) as get_def:
+            if expect_check:
+                with pytest.raises(ValueError):
+                    update_database_schema(psql, 'db', '2014/07/01',
+                                           's3://bucket', 'schema/db.yaml',
+                                           MockLogger())
+            else:
+                update_database_schema(psql, 'db', '2014/07/01',
+                                       's3://bucket', 'schema/db.yaml',
+                                       MockLogger())
+    assert get_def.called == expect_check
+    # the hash is looked up for the tables of the yaml
+    tables = [table for (table, _) in get_create_commands('schema/db.yaml')]
+    assert 'table_1' in tables
+    assert get_hash.call_args[0][3] == get_tables_key(tables)
+
+
+@pytest.mark.parametrize("min_date, max_date, ttl_days, expected", [
+    (datetime(2014, 7, 1, 5), datetime(2014, 7, 10, 23), 9, None),
+    (datetime(2014, 7, 1, 5), datetime(2014, 7, 10, 23), 5,
+     datetime(2014, 7, 5)),
+    (datetime(2014, 7, 1), datetime(2014, 7, 10), None, None),
+])
+def test_get_ttl_cutoff(min_date, max_date, ttl_days, expected):
+    assert get_ttl_cutoff(min_date, max_date, ttl_days) == expected
+
+
+def run_delete_old_data(loaded_range, delete_status='DELETE 0'):
+    psql = mock.Mock()
+    psql.run_sql.return_value = [(datetime(2014, 6, 1), datetime(2014, 7, 10))]
+    psql.run_sql_ex.return_value = {'status': delete_status}
+    status_helper = mock.Mock()
+    status_helper.get_loaded_range.return_value = loaded_range
+    with staticconf.testing.MockConfiguration({}):
+        with mock.patch('sherlock.batch.s3_to_redshift.'
+                        'get_timestamp_column_name', return_value='time'):
+            num_deleted = delete_old_data(psql, 'db', 'tbl', 5,
+                                          status_helper=status_helper)
+    return num_deleted, psql, status_helper
+
+
+def test_delete_old_data_loaded_range():
+    num_deleted, psql, status_helper = run_delete_old_data(
+        (datetime(2014, 7, 1), datetime(2014, 7, 10)), 'DELETE 12'
+    )
+    assert num_deleted == 12
+    # no min/max scan
+    assert not psql.run_sql.called
+    assert psql.run_sql_ex.call_args[1]['params'] == \
+        {'new_min_date': '2014-07-05 00:00:00'}
+    assert not status_helper.set_loaded_range.called
+
+    # the range is by day, so nothing may be deleted
+    num_deleted, _, _ = run_delete_old_data(
+        (datetime(2014, 7, 1), datetime(2014, 7, 10))
+    )
+    assert num_deleted == 0
+
+
+def test_delete_old_data_scan():
+    with pytest.raises(ValueError):
+        run_delete_old_data(None)
+    num_deleted, psql, status_helper = run_delete_old_data(None, 'DELETE 3')
+    assert num_deleted == 3
+    assert psql.run_sql.call_count == 1
+    status_helper.set_loaded_range.assert_called_once_with(
+        'db', 'tbl', datetime(2014, 6, 1), datetime(2014, 7, 10)
+    )
+
+
+def test_delete_old_data_dynamodb_range():
+    ranges_table = mock.Mock()
+    ranges_table.get_item.side_effect = ItemNotFound
+    status_helper = DynamoDbStatusTable(
+        None, cluster=('host', 5439), ranges_table=ranges_table
+    )
+    psql = mock.Mock()
+    psql.run_sql.return_value = [(datetime(2014, 6, 1), datetime(2014, 7, 10))]
+    psql.run_sql_ex.return_value = {'status': 'DELETE 3'}
+    with staticconf.testing.MockConfiguration({}):
+        with mock.patch('sherlock.batch.s3_to_redshift.'
+                        'get_timestamp_column_name', return_value='time'):
+            delete_old_data(psql, 'db', 'tbl', 5, status_helper=status_helper)
+            # the first delete scans the table and stores its range
+            assert psql.run_sql.call_count == 1
+            data = ranges_table.put_item.call_args[1]['data']
+            assert (data['cluster_db'], data['tablename']) == \
+                ('host:5439:db', 'tbl')
+            assert (data['min_date'], data['max_date']) == \
+                ('2014-06-01', '2014-07-10')
+
+            ranges_table.get_item.side_effect = None
+            ranges_table.get_item.return_value = data
+            delete_old_data(psql, 'db', 'tbl', 5, status_helper=status_helper)
+            # the next one reads the stored range instead
+            assert psql.run_sql.call_count == 1
+            assert psql.run_sql_ex.call_args[1]['params'] == \
+                {'new_min_date': '2014-07-05 00:00:00'}
+
+
+@pytest.mark.parametrize("loaded_range, ddate, expected_range", [
+    (None, '2014/07/11', (datetime(2014, 7, 11), datetime(2014, 7, 11))),
+    ((datetime(2014, 7, 1), datetime(2014, 7, 10)), '2014/07/11',
+     (datetime(2014, 7, 6), datetime(2014, 7, 11))),
+    ((datetime(2014, 7, 8), datetime(2014, 7, 10)), '2014/07/11',
+     (datetime(2014, 7, 8), datetime(2014, 7, 11))),
+    ((datetime(2014, 7, 8), datetime(2014, 7, 10)), '2014/07/07',
+     (datetime(2014, 7, 7), datetime(2014, 7, 10))),
+])
+def test_record_loaded_day(loaded_range, ddate, expected_range):
+    status_helper = mock.Mock()
+    status_helper.get_loaded_range.return_value = loaded_range
+    with staticconf.testing.MockConfiguration({}):
+        record_loaded_day(status_helper, 'db', 'tbl', ddate, 5)
+    status_helper.set_loaded_range.assert_called_once_with(
+        'db', 'tbl', *expected_range
+    )
+
+
+def partition_psql(tables):
+    psql = mock.MagicMock()
+    psql.run_sql.return_value = [(table,) for table in tables]
+    psql.transaction.return_value.__enter__.return_value = psql
+    return psql
+
+
+def test_get_partitions():
+    psql = partition_psql(
+        ['tbl', 'tbl_20140702', 'tbl_20140701', 'tbl_x_20140701', 'tbl_2014']
+    )
+    with staticconf.testing.MockConfiguration({}):
+        assert get_partitions(psql, 'db', 'tbl') == [
+            (datetime(2014, 7, 1), 'tbl_20140701'),
+            (datetime(2014, 7, 2), 'tbl_20140702'),
+        ]
+
+
+@pytest.mark.parametrize("tables, expected_sql", [
+    (['tbl', 'tbl_20140708', 'tbl_20140709'], [
+        'create table tbl_20140710 (like tbl)',
+        'copy',
+        'drop view if exists tbl_all',
+        'create view tbl_all as select * from tbl union all '
+        'select * from tbl_20140708 union all select * from tbl_20140709 '
+        'union all select * from tbl_20140710',
+    ]),
+    (['tbl', 'tbl_20140707', 'tbl_20140708', 'tbl_20140710'], [
+        'drop view if exists tbl_all',
+        'drop table tbl_20140710',
+        'create table tbl_20140710 (like tbl)',
+        'copy',
+        'drop view if exists tbl_all',
+        'create view tbl_all as select * from tbl union all '
+        'select * from tbl_20140708 union all select * from tbl_20140710',
+        'drop table tbl_20140707',
+    ]),
+])
+def test_copy_table_partition(tables, expected_sql):
+    psql = partition_psql(tables)
+    executed = []
+
+    def run_sql(query, *args, **kwargs):
+        executed.append(query)
+        return [(table,) for table in tables]
+
+    def copy_table(psql, db, ddate, log_tuple, ttl_days, logstream,
+                   **kwargs):
+        assert log_tuple == ('s3://bucket/tbl', 'tbl_20140710')
+        assert ttl_days is None
+        executed.append('copy')
+        return True
+
+    psql.run_sql.side_effect = run_sql
+    with staticconf.testing.MockConfiguration({}):
+        with mock.patch('sherlock.batch.s3_to_redshift.copy_table',
+                        side_effect=copy_table):
+            assert copy_table_partition(
+                psql, 'db', '2014/07/10', ('s3://bucket/tbl', 'tbl'), 2,
+                MockLogger()
+            ) is True
+    # the first query lists the tables
+    assert executed[1:] == expected_sql
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import mock
+import pytest
+import simplejson
+
+from sherlock.common import json_decoder
+from sherlock.common.json_decoder import get_json_decoder
+
+
+LINES = [
+    '{"search": {"request_id": "a\\\\\\"b", "city": "K\\u00f6ln", '
+    '"blob": {"x": [1, 2.5, null, 0.1, 1e-7]}}, "n": -1.5e-3}',
+    '[1, "2", true]',
+    '{}',
+]
+
+
+@pytest.mark.parametrize("name", ['simplejson', 'ujson'])
+@pytest.mark.parametrize("line", LINES)
+def test_decode(name, line):
+    if name == 'ujson':
+        pytest.importorskip('ujson')
+    assert get_json_decoder(name).decode(line) == simplejson.loads(line)
+
+
+@pytest.mark.parametrize("name", ['simplejson', 'ujson'])
+@pytest.mark.parametrize("line", ['{"a": ', '{"a": 1} x', '', "['a']"])
+def test_decode_error(name, line):
+    if name == 'ujson':
+        pytest.importorskip('ujson')
+    with pytest.raises(simplejson.JSONDecodeError):
+        get_json_decoder(name).decode(line)
+
+
+def test_ujson_decoder_falls_back_to_simplejson():
+    pytest.importorskip('ujson')
+    decoder = get_json_decoder('ujson')
+    assert decoder.decode('[18446744073709551616]') == [18446744073709551616]
+
+
+@pytest.mark.parametrize("line", ['{"a": 1,}', '[01]'])
+def test_simplejson_decoder_rejects_lines_ujson_accepts(line):
+    # why ujson is only used when asked for
+    with pytest.raises(simplejson.JSONDecodeError):
+        get_json_decoder().decode(line)
+
+
+def test_get_json_decoder():
+    assert type(get_json_decoder()) is json_decoder.JsonDecoder
+    for name in ['bad', 'auto']:
+        with pytest.raises(ValueError):
+            get_json_decoder(name)
+    with mock.patch.object(json_decoder, 'ujson', None):
+        with pytest.raises(ValueError):
+            get_json_decoder('ujson')
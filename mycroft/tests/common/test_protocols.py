@@ -27,3 +27,29 @@ def test_escape_value(input_value, expected_value, redshift_export_encoder):
 def test_write_row(redshift_export_encoder):
     output_map = {'a': 1, 'b': 'B', 'c': None}
     assert redshift_export_encoder.write(None, output_map) == '1|B|'
+
+
+def test_write_columns(redshift_export_encoder):
+    rows = [[1, 'B|b', None], [u'\xe9', 'x\ny', 2.5]]
+    columns = [list(column) for column in zip(*rows)]
+    expected = '\n'.join(
+        redshift_export_encoder.write(None, dict(zip('abc', row)))
+        for row in rows
+    )
+    assert redshift_export_encoder.write_columns(columns) == expected
+    assert redshift_export_encoder.write_columns([[], []]) == ''
+
+
+@pytest.mark.parametrize("delimiter, values, expected_value", [
+    ('|', [1, 'B', None], '1|B|'),
+    ('|', [u'\xe9|', 'a\\\r\n', True, 0.5], '\xc3\xa9\\||a\\\\\\r\\n|True|0.5'),
+    ('|', ['\x1e'], '\x1e'),
+    ('\\x1e', ['a|b', 'c\x1ed'], 'a|b\x1ec\\\x1ed'),
+    ('|', [], ''),
+])
+def test_write_row_sequence(delimiter, values, expected_value):
+    encoder = RedshiftExportProtocol(delimiter=delimiter)
+    assert encoder.write_row(values) == expected_value
+    output_map = dict(('c{0}'.format(i), v) for i, v in enumerate(values))
+    encoder.given_output_order = sorted(output_map)
+    assert encoder.write(None, output_map) == expected_value
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+import mock
+import pytest
+
+from sherlock.common.redshift_catalog import CREATE_SCHEMA_HASHES
+from sherlock.common.redshift_catalog import get_loaded_schema_hash
+from sherlock.common.redshift_catalog import get_schema_hash
+from sherlock.common.redshift_catalog import get_schema_table_defs
+from sherlock.common.redshift_catalog import get_tables_key
+from sherlock.common.redshift_catalog import invalidate_table_defs
+from sherlock.common.redshift_catalog import record_loaded_schema_hash
+from sherlock.common.redshift_catalog import DELETE_SCHEMA_HASH
+from sherlock.common.redshift_catalog import INSERT_SCHEMA_HASH
+from sherlock.common.redshift_catalog import QUERY_SCHEMA_HASH
+from sherlock.common.redshift_catalog import QUERY_SCHEMA_TABLE_DEFS
+
+
+TABLE_DEF_ROWS = [
+    ('skma', 'tbl_a', 'time', 'timestamp without time zone',
+     'none', False, 1, True),
+    ('skma', 'tbl_b', 'id', 'integer', 'lzo', True, 0, True),
+    ('skma', 'tbl_a', 'name', 'character varying(10)', 'lzo', False, 0, False),
+]
+
+
+@pytest.yield_fixture
+def psql():
+    psql = mock.Mock(host='host', port=1234)
+    psql.run_sql.return_value = TABLE_DEF_ROWS
+    yield psql
+    invalidate_table_defs(psql, 'db', 'skma')
+
+
+def test_get_schema_table_defs(psql):
+    table_defs = get_schema_table_defs(psql, 'db', 'skma', 'v1')
+    assert table_defs == {
+        'tbl_a': [TABLE_DEF_ROWS[0], TABLE_DEF_ROWS[2]],
+        'tbl_b': [TABLE_DEF_ROWS[1]],
+    }
+    assert psql.run_sql.call_count == 1
+    assert psql.run_sql.call_args[0][0] == QUERY_SCHEMA_TABLE_DEFS
+    assert psql.run_sql.call_args[1]['schema'] == 'skma'
+
+    assert get_schema_table_defs(psql, 'db', 'skma', 'v1') is table_defs
+    assert get_schema_table_defs(psql, 'db', 'skma') is table_defs
+    assert psql.run_sql.call_count == 1
+
+    get_schema_table_defs(psql, 'db', 'skma', 'v2')
+    assert psql.run_sql.call_count == 2
+    invalidate_table_defs(psql, 'db', 'skma')
+    get_schema_table_defs(psql, 'db', 'skma', 'v2')
+    assert psql.run_sql.call_count == 3
+
+
+def test_get_schema_table_defs_per_cluster(psql):
+    other_psql = mock.Mock(host='other_host', port=1234)
+    other_psql.run_sql.return_value = []
+    get_schema_table_defs(psql, 'db', 'skma')
+    assert get_schema_table_defs(other_psql, 'db', 'skma') == {}
+    invalidate_table_defs(other_psql, 'db', 'skma')
+
+
+@pytest.mark.parametrize("rows, expected_hash", [
+    ([], None),
+    ([('abc',)], 'abc'),
+])
+def test_get_loaded_schema_hash(psql, rows, expected_hash):
+    psql.run_sql.return_value = rows
+    assert get_loaded_schema_hash(psql, 'db', 'skma', 'key') == expected_hash
+    assert psql.run_sql.call_args[0][0] == QUERY_SCHEMA_HASH
+    assert psql.run_sql.call_args[1]['params'] == \
+        {'schemaname': 'skma', 'tables_key': 'key'}
+
+
+def test_schema_hashes_table_created_once():
+    psql = mock.MagicMock(host='created_once', port=1234)
+    psql.run_sql.return_value = []
+    txn = psql.transaction.return_value.__enter__.return_value
+    get_loaded_schema_hash(psql, 'db', 'skma', 'key_a')
+    record_loaded_schema_hash(psql, 'db', 'skma', 'key_b', 'abc')
+    get_loaded_schema_hash(psql, 'db', 'skma', 'key_b')
+    queries = [c[0][0] for c in psql.run_sql.call_args_list]
+    assert queries == [CREATE_SCHEMA_HASHES, QUERY_SCHEMA_HASH, QUERY_SCHEMA_HASH]
+    # the hash of one yaml's tables leaves the others alone
+    assert [c[0][0] for c in txn.run_sql.call_args_list] == \
+        [DELETE_SCHEMA_HASH, INSERT_SCHEMA_HASH]
+    assert txn.run_sql.call_args[1]['params'] == \
+        {'schemaname': 'skma', 'tables_key': 'key_b', 'schema_hash': 'abc'}
+
+    # another database is another table
+    get_loaded_schema_hash(psql, 'db2', 'skma', 'key_a')
+    assert psql.run_sql.call_args_list[-2][0][0] == CREATE_SCHEMA_HASHES
+
+
+def test_get_tables_key():
+    assert get_tables_key(['tbl_a', 'tbl_b']) == get_tables_key(['tbl_b', 'tbl_a'])
+    assert get_tables_key(['tbl_a', 'tbl_b']) != get_tables_key(['tbl_a'])
+
+
+def test_get_schema_hash():
+    assert get_schema_hash('schema/db.yaml') == \
+        get_schema_hash('schema/db.yaml')
+    assert get_schema_hash('schema/db.yaml') != \
+        get_schema_hash('tests/data/s3_to_r_test_schema.yaml')
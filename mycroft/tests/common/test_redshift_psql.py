@@ -72,3 +72,110 @@ def test_get_namespaced_tablename_arg(input_schema, expected_out):
         schemaname=input_schema
     )
     assert output_under_test == expected_out
+
+
+def make_connection():
+    conn = mock.MagicMock()
+    conn.closed = 0
+    conn.cursor.return_value.statusmessage = 'SELECT 1'
+    return conn
+
+
+@pytest.yield_fixture
+def pooled_pgsql(pgsql):
+    from sherlock.common.redshift_psql import REDSHIFT_POOL
+    REDSHIFT_POOL.close_all()
+    with mock.patch.object(pgsql, 'log_stream'), \
+            mock.patch.object(pgsql, 'get_connection', autospec=True) as connect:
+        connect.side_effect = lambda database: make_connection()
+        yield pgsql, connect
+    REDSHIFT_POOL.close_all()
+
+
+def executed(conn):
+    return [c[0][0] for c in conn.cursor.return_value.execute.call_args_list]
+
+
+def test_run_sql_reuses_connection(pooled_pgsql):
+    pgsql, connect = pooled_pgsql
+    pgsql.run_sql('select 1', 'db', 'msg')
+    pgsql.run_sql('vacuum', 'db', 'msg', need_commit=False)
+    pgsql.run_sql('select 2', 'db', 'msg')
+    assert connect.call_count == 1
+    pgsql.run_sql('select 1', 'other_db', 'msg')
+    assert connect.call_count == 2
+
+
+def test_run_sql_caches_search_path(pooled_pgsql):
+    from sherlock.common.redshift_psql import ADD_SCHEMA_PATH
+    from sherlock.common.redshift_psql import RESET_SCHEMA_PATH
+    pgsql, connect = pooled_pgsql
+    pgsql.run_sql('select 1', 'db', 'msg', schema='testy')
+    pgsql.run_sql('select 2', 'db', 'msg', schema='testy')
+    pgsql.run_sql('select 3', 'db', 'msg')
+    conn = pgsql.acquire_connection('db').conn
+    assert executed(conn) == [
+        ADD_SCHEMA_PATH, 'select 1', 'select 2', RESET_SCHEMA_PATH, 'select 3'
+    ]
+
+
+def test_run_sql_discards_failed_connection(pooled_pgsql):
+    from sherlock.common.redshift_psql import REDSHIFT_POOL
+    pgsql, connect = pooled_pgsql
+    pgsql.run_sql('select 1', 'db', 'msg')
+    failed = pgsql.acquire_connection('db')
+    failed.conn.cursor.return_value.execute.side_effect = ValueError('oops')
+    REDSHIFT_POOL.release(failed)
+    with pytest.raises(ValueError):
+        pgsql.run_sql('select 2', 'db', 'msg')
+    assert failed.conn.close.call_count == 1
+    pgsql.run_sql('select 3', 'db', 'msg')
+    assert connect.call_count == 2
+
+
+def test_idle_connection_health_check(pooled_pgsql):
+    import psycopg2
+    from sherlock.common.redshift_psql import HEALTH_CHECK
+    from sherlock.common.redshift_psql import REDSHIFT_POOL
+    pgsql, connect = pooled_pgsql
+    pgsql.run_sql('select 1', 'db', 'msg')
+    pooled = pgsql.acquire_connection('db')
+    REDSHIFT_POOL.release(pooled)
+    pooled.last_used -= 60
+    assert pgsql.acquire_connection('db') is pooled
+    assert executed(pooled.conn)[-1] == HEALTH_CHECK
+    REDSHIFT_POOL.release(pooled)
+
+    pooled.last_used -= 60
+    pooled.conn.cursor.return_value.execute.side_effect = \
+        psycopg2.OperationalError('server closed the connection')
+    assert pgsql.acquire_connection('db') is not pooled
+    assert pooled.conn.close.call_count == 1
+    assert connect.call_count == 2
+
+
+def test_transaction(pooled_pgsql):
+    from sherlock.common.redshift_psql import REDSHIFT_POOL
+    pgsql, connect = pooled_pgsql
+    with pgsql.transaction('db') as txn:
+        txn.run_sql('delete 1', 'db', 'msg')
+        txn.run_sql('copy 2', 'db', 'msg', schema='testy')
+        with pytest.raises(ValueError):
+            txn.run_sql('vacuum', 'db', 'msg', need_commit=False)
+        with pytest.raises(ValueError):
+            txn.run_sql('select 3', 'other_db', 'msg')
+    conn = txn.pooled.conn
+    assert connect.call_count == 1
+    assert conn.autocommit is False
+    assert executed(conn)[0] == 'delete 1'
+    assert executed(conn)[-1] == 'copy 2'
+    assert conn.__exit__.call_args[0][0] is None
+    assert pgsql.acquire_connection('db') is txn.pooled
+
+    REDSHIFT_POOL.release(txn.pooled)
+    with pytest.raises(ValueError):
+        with pgsql.transaction('db') as txn:
+            txn.run_sql('delete 1', 'db', 'msg')
+            raise ValueError('copy failed')
+    assert conn.__exit__.call_args[0][0] is ValueError
+    assert conn.close.call_count == 1
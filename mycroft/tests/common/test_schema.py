@@ -232,3 +232,106 @@ test_get_deep_params = "x, path_list, default_value, expected_value"
 ])
 def test_get_deep(x, path_list, default_value, expected_value):
     assert schema.get_deep(x, path_list, default_value) == expected_value
+
+
+def create_plan_table(source_type, columns):
+    source = 'search.results' if source_type == schema.SourceType.LIST \
+        else 'search'
+    return schema.Table(
+        source=source,
+        source_type=source_type,
+        columns=[schema.Column.create(source=source,
+                                      source_type=source_type,
+                                      **column)
+                 for column in columns]
+    )
+
+
+PLAN_COLUMNS = [
+    {'log_key': 'index', 'sql_attr': 'smallint not null'},
+    {'log_key': 'business_id', 'sql_attr': 'int8'},
+    {'log_key': 'missing'},
+    {'log_key': 'name', 'sql_attr': 'varchar(3)'},
+    {'log_key': 'blob', 'is_json': True},
+    {'log_key': 'start_time', 'sql_attr': 'TIMESTAMP not null'},
+    {'log_key': 'session_info.agent', 'is_foreign': True},
+    {'name': 'derived', 'is_derived': True},
+    {'name': 'primary_key', 'is_noop': True},
+]
+
+
+@pytest.mark.parametrize("source_type, name_to_object", [
+    (schema.SourceType.LIST,
+     {'search': {'results': [
+         {'business_id': 1, 'name': 'abcd', 'blob': {'a': 1},
+          'start_time': 1},
+         None,
+         {'business_id': 2, 'name': 'ab', 'start_time': 2}]},
+      'session_info': {'agent': 'iOS'}}),
+    (schema.SourceType.LIST, {'search': {'results': []}}),
+    (schema.SourceType.DICT,
+     {'search': {'business_id': 1, 'name': 'abcd', 'blob': [1, 2],
+                 'start_time': 3},
+      'session_info': None}),
+    (schema.SourceType.DICT, {'search': FakeLogLine.create()}),
+])
+def test_extraction_plan_matches_value_iterator(source_type, name_to_object):
+    columns = [column for column in PLAN_COLUMNS
+               if source_type == schema.SourceType.LIST or
+               column.get('log_key') != 'index']
+
+    def derive_metric(name_to_object, metric_name, context):
+        return (metric_name, context['index'])
+
+    table = create_plan_table(source_type, columns)
+    expected = list(table.value_iterator(name_to_object, derive_metric))
+    expected_truncations = dict(table.truncated_columns)
+    table.truncated_columns = {}
+
+    plan = table.compile()
+    rows = list(plan.row_iterator(name_to_object, derive_metric))
+
+    assert [dict(zip(plan.output_order, row)) for row in rows] == expected
+    assert table.truncated_columns == expected_truncations
+    assert 'primary_key' not in plan.output_order
+
+
+def test_extraction_plan_missing_mandatory_value():
+    table = create_plan_table(schema.SourceType.LIST,
+                              [{'log_key': 'a.b', 'is_mandatory': True}])
+    name_to_object = {'search': {'results': [{'a': {}}]}}
+    with pytest.raises(schema.RequiredFieldMissingException) as expected:
+        list(table.value_iterator(name_to_object))
+    with pytest.raises(schema.RequiredFieldMissingException) as compiled:
+        list(table.compile().row_iterator(name_to_object))
+    assert str(compiled.value) == str(expected.value)
+
+
+def test_extraction_plan_error():
+    table = schema.Table.create({'src': 'search', 'src_type': 'dict'}, [])
+    table.source_type = 'bad type'
+    with pytest.raises(ValueError):
+        table.compile()
+
+
+def test_extraction_plan_extract_columns():
+    table = create_plan_table(schema.SourceType.LIST, PLAN_COLUMNS)
+
+    def derive_metric(name_to_object, metric_name, context):
+        return context['index']
+
+    documents = [
+        {'search': {'results': [{'business_id': 1, 'name': 'abcd'}]}},
+        {'search': {'results': []}},
+        {'search': {'results': [{'business_id': 2}, {'start_time': 3}]}},
+    ]
+    plan = table.compile()
+    rows = [row for document in documents
+            for row in plan.row_iterator(document, derive_metric)]
+    truncated_columns = dict(table.truncated_columns)
+    table.truncated_columns = {}
+
+    columns = plan.extract_columns(documents, derive_metric)
+    assert len(columns) == len(plan.output_order)
+    assert [list(row) for row in zip(*columns)] == rows
+    assert table.truncated_columns == truncated_columns
@@ -3,7 +3,12 @@ from datetime import datetime
 from datetime import timedelta
 import mock
 import pytest
+import staticconf.testing
+from boto.dynamodb2.exceptions import ItemNotFound
 
+from sherlock.common.redshift_status import DELETE_LOADED_RANGE
+from sherlock.common.redshift_status import INSERT_LOADED_RANGE
+from sherlock.common.redshift_status import READ_LOADED_RANGE
 from sherlock.common.redshift_status import RedshiftStatusTable
 from sherlock.common.redshift_status import VERSIONS_COL_SIZE
 from sherlock.common.dynamodb_status import DynamoDbStatusTable
@@ -99,3 +104,112 @@ def test_dynamodb_status_method(method_name, input_args, expected_output):
     method = getattr(st, method_name)
     result = method(*input_args)
     assert result == expected_output
+
+
+class FakeRangesTable(object):
+
+    """ Keeps items by their (cluster_db, tablename) key like the loaded
+    ranges table
+    """
+
+    def __init__(self):
+        self.items = {}
+
+    def get_item(self, consistent=False, **kwargs):
+        try:
+            return dict(self.items[(kwargs['cluster_db'], kwargs['tablename'])])
+        except KeyError:
+            raise ItemNotFound
+
+    def put_item(self, data, overwrite=False):
+        self.items[(data['cluster_db'], data['tablename'])] = dict(data)
+        return True
+
+
+CLUSTER = ('host', 5439)
+
+
+def test_dynamodb_loaded_range():
+    table = FakeRangesTable()
+    st = DynamoDbStatusTable(None, cluster=CLUSTER, ranges_table=table)
+    assert st.get_loaded_range('db', 'tbl') is None
+
+    st.set_loaded_range('db', 'tbl', datetime(2014, 7, 1),
+                        datetime(2014, 7, 2, 10))
+    st.set_loaded_range('db', 'tbl2', datetime(2014, 6, 1),
+                        datetime(2014, 6, 2))
+    item = table.items[('host:5439:db', 'tbl')]
+    assert (item['min_date'], item['max_date']) == ('2014-07-01', '2014-07-02')
+    # ranges are by day
+    assert st.get_loaded_range('db', 'tbl') == \
+        (datetime(2014, 7, 1), datetime(2014, 7, 2))
+    assert st.get_loaded_range('db', 'tbl2') == \
+        (datetime(2014, 6, 1), datetime(2014, 6, 2))
+    assert st.get_loaded_range('other_db', 'tbl') is None
+
+    st.set_loaded_range('db', 'tbl', datetime(2014, 7, 3),
+                        datetime(2014, 7, 9))
+    assert st.get_loaded_range('db', 'tbl') == \
+        (datetime(2014, 7, 3), datetime(2014, 7, 9))
+
+
+def test_dynamodb_loaded_range_per_cluster():
+    table = FakeRangesTable()
+    st_a = DynamoDbStatusTable(None, cluster=('host_a', 5439), ranges_table=table)
+    st_b = DynamoDbStatusTable(None, cluster=('host_b', 5439), ranges_table=table)
+    st_c = DynamoDbStatusTable(None, cluster=('host_a', 5440), ranges_table=table)
+    # the same database and table, loaded into different clusters
+    st_a.set_loaded_range('dev', 'skma.tbl', datetime(2014, 7, 1),
+                          datetime(2014, 7, 10))
+    st_b.set_loaded_range('dev', 'skma.tbl', datetime(2014, 7, 5),
+                          datetime(2014, 7, 20))
+    assert st_a.get_loaded_range('dev', 'skma.tbl') == \
+        (datetime(2014, 7, 1), datetime(2014, 7, 10))
+    assert st_b.get_loaded_range('dev', 'skma.tbl') == \
+        (datetime(2014, 7, 5), datetime(2014, 7, 20))
+    assert st_c.get_loaded_range('dev', 'skma.tbl') is None
+
+
+@pytest.mark.parametrize("config, cluster", [
+    ({}, CLUSTER),
+    ({'aws_config': {'loaded_ranges_table': 'ranges', 'region': 'r'}}, None),
+])
+def test_dynamodb_loaded_range_untracked(config, cluster):
+    with staticconf.testing.MockConfiguration(config):
+        st = DynamoDbStatusTable(None, cluster=cluster)
+        with mock.patch('boto.dynamodb2.connect_to_region') as connect:
+            st.set_loaded_range('db', 'tbl', datetime(2014, 7, 1),
+                                datetime(2014, 7, 2))
+            assert st.get_loaded_range('db', 'tbl') is None
+        assert not connect.called
+
+
+@pytest.mark.parametrize("query_results, expected_range", [
+    ([], None),
+    ([(datetime(2014, 7, 1), datetime(2014, 7, 2))],
+     (datetime(2014, 7, 1), datetime(2014, 7, 2))),
+])
+def test_rs_get_loaded_range(query_results, expected_range):
+    psql = mock.Mock()
+    psql.run_sql.return_value = query_results
+    st = RedshiftStatusTable(psql)
+    assert st.get_loaded_range('db', 'tbl') == expected_range
+    assert psql.run_sql.call_args[0][0] == READ_LOADED_RANGE
+    assert psql.run_sql.call_args[1]['params'] == {'tablename': 'tbl'}
+    st.get_loaded_range('db', 'tbl')
+    # the table is created once
+    assert psql.run_sql.call_count == 3
+
+
+def test_rs_set_loaded_range():
+    psql = mock.MagicMock()
+    txn = psql.transaction.return_value.__enter__.return_value
+    st = RedshiftStatusTable(psql)
+    st.set_loaded_range('db', 'tbl', datetime(2014, 7, 1),
+                        datetime(2014, 7, 2))
+    assert [c[0][0] for c in txn.run_sql.call_args_list] == \
+        [DELETE_LOADED_RANGE, INSERT_LOADED_RANGE]
+    params = txn.run_sql.call_args[1]['params']
+    assert params['tablename'] == 'tbl'
+    assert params['min_date'] == datetime(2014, 7, 1)
+    assert params['max_date'] == datetime(2014, 7, 2)
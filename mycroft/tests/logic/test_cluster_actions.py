@@ -1,11 +1,17 @@
 # -*- coding: utf-8 -*-
+import time
+
+import mock
 import pytest
 import simplejson
+import staticconf.testing
 from simplejson import JSONDecodeError
 
 from mycroft.logic.cluster_actions import _parse_clusters
+from mycroft.logic.cluster_actions import invalidate_clusters
 from mycroft.logic.cluster_actions import list_all_clusters
 from mycroft.logic.cluster_actions import list_cluster_by_name
+from mycroft.logic.cluster_actions import list_cluster_by_name_cached
 from mycroft.logic.cluster_actions import post_cluster
 
 from tests.data.redshift_cluster import REDSHIFT_CLUSTER_INPUT_DICT
@@ -94,3 +100,50 @@ class TestClusterActions(object):
     def test_post_no_kwargs(self):
         with pytest.raises(JSONDecodeError):
             post_cluster(None, "")
+
+
+class TestClusterCache(object):
+
+    @pytest.yield_fixture
+    def redshift_clusters(self):
+        cluster = TstRedshiftClusters().create_fake_redshift_cluster(
+            dict(BASE_DICT, **REDSHIFT_CLUSTER_INPUT_DICT)
+        )
+        redshift_clusters = mock.Mock()
+        redshift_clusters.get.return_value = cluster
+        invalidate_clusters()
+        with staticconf.testing.MockConfiguration({'cluster_cache_ttl_sec': 300}):
+            yield redshift_clusters
+        invalidate_clusters()
+
+    @property
+    def redshift_id(self):
+        return REDSHIFT_CLUSTER_INPUT_DICT['redshift_id']
+
+    def test_list_cluster_by_name_cached(self, redshift_clusters):
+        cluster = list_cluster_by_name_cached(redshift_clusters, self.redshift_id)
+        assert cluster['host'] == REDSHIFT_CLUSTER_INPUT_DICT['host']
+        cluster['host'] = 'changed by caller'
+        assert list_cluster_by_name_cached(redshift_clusters, self.redshift_id)['host'] == \
+            REDSHIFT_CLUSTER_INPUT_DICT['host']
+        redshift_clusters.get.assert_called_once_with(redshift_id=self.redshift_id)
+
+    def test_list_cluster_by_name_cached_ttl(self, redshift_clusters):
+        list_cluster_by_name_cached(redshift_clusters, self.redshift_id)
+        with mock.patch('mycroft.logic.cluster_actions.time.time',
+                        return_value=time.time() + 301):
+            list_cluster_by_name_cached(redshift_clusters, self.redshift_id)
+        assert redshift_clusters.get.call_count == 2
+
+    def test_list_cluster_by_name_cached_missing_cluster(self, redshift_clusters):
+        redshift_clusters.get.side_effect = KeyError()
+        for _ in range(2):
+            with pytest.raises(KeyError):
+                list_cluster_by_name_cached(redshift_clusters, self.redshift_id)
+        assert redshift_clusters.get.call_count == 2
+
+    def test_post_cluster_invalidates_cache(self, redshift_clusters):
+        list_cluster_by_name_cached(redshift_clusters, self.redshift_id)
+        post_cluster(redshift_clusters, simplejson.dumps(REDSHIFT_CLUSTER_INPUT_DICT))
+        list_cluster_by_name_cached(redshift_clusters, self.redshift_id)
+        assert redshift_clusters.get.call_count == 2
@@ -11,6 +11,8 @@ from mycroft.logic.job_actions import _parse_jobs
 from mycroft.logic.job_actions import list_all_jobs
 from mycroft.logic.job_actions import list_jobs_by_name
 from mycroft.logic.job_actions import list_jobs_by_name_version
+from mycroft.logic.job_actions import list_jobs_page
+from mycroft.logic.pagination import encode_page_token
 from mycroft.logic.job_actions import post_job
 from mycroft.logic.job_actions import put_job
 from mycroft.logic.job_actions import ACTION_TO_REQUIRED_ARGS
@@ -51,7 +53,7 @@ class TestJobActions(object):
 
     def post_job(self, scheduled_jobs, et_scanner_queue, input_string):
         with mock.patch('mycroft.models.aws_connections.TableConnection.get_connection'):
-            with mock.patch('mycroft.logic.job_actions.list_cluster_by_name'):
+            with mock.patch('mycroft.logic.job_actions.list_cluster_by_name_cached'):
                 result = post_job(scheduled_jobs, et_scanner_queue, input_string)
                 return result
 
@@ -103,6 +105,45 @@ class TestJobActions(object):
     def test_list_all_jobs(self, scheduled_jobs):
         assert len(list_all_jobs(scheduled_jobs)['jobs']) == len(SAMPLE_SCHEDULED_JOBS)
 
+    def test_list_jobs_page(self, scheduled_jobs):
+        hash_keys = []
+        page_token = None
+        while True:
+            result = list_jobs_page(scheduled_jobs, limit='2', page_token=page_token,
+                                    fields='uuid,redshift_id')
+            assert len(result['jobs']) <= 2
+            assert all(set(job) == set(['uuid', 'redshift_id']) for job in result['jobs'])
+            hash_keys.extend(job['redshift_id'] for job in result['jobs'])
+            page_token = result['next_page_token']
+            if page_token is None:
+                break
+        assert sorted(hash_keys) == sorted(job['redshift_id'] for job in SAMPLE_SCHEDULED_JOBS)
+
+    def test_list_jobs_page_filtered(self, scheduled_jobs):
+        result = list_jobs_page(scheduled_jobs, redshift_id='id_2', from_date='2014-07-15')
+        assert [job['redshift_id'] for job in result['jobs']] == ['id_2']
+        assert result['next_page_token'] is None
+
+    def test_list_jobs_page_filters(self):
+        scheduled_jobs = mock.Mock()
+        scheduled_jobs.get_jobs_page.return_value = ([], {'hash_key': 'hk1'})
+        result = list_jobs_page(scheduled_jobs, et_status='running', redshift_id='rs1',
+                                from_date='2014-07-01', to_date='2014-07-31')
+        assert result == {'jobs': [], 'next_page_token': encode_page_token({'hash_key': 'hk1'})}
+        scheduled_jobs.get_jobs_page.assert_called_once_with(
+            100, page_key=None, attributes=None, et_status='running',
+            redshift_id__eq='rs1', start_date__between=('2014-07-01', '2014-07-31'))
+
+    @pytest.mark.parametrize("kwargs", [
+        {'limit': '0'},
+        {'page_token': 'x'},
+        {'fields': 'color'},
+        {'from_date': '2014-7-1x'},
+    ])
+    def test_list_jobs_page_bad_input(self, kwargs):
+        with pytest.raises(ValueError):
+            list_jobs_page(None, **kwargs)
+
     def test__create_hash_key(self):
         result = _create_hash_key(SCHEDULED_JOB_INPUT_DICT)
         assert result == 'rs1:user_test:third:2014-08-15:None'
@@ -131,11 +172,17 @@ class TestJobActions(object):
         result = self.post_job(scheduled_jobs, et_scanner_queue, input_string)
         assert 'post_accepted' in result
         assert result['post_accepted']['result'] is True
-        assert et_scanner_queue._published_msg == {'message': 'dummy'}
+        assert et_scanner_queue._published_msg == {
+            'message': 'job post request',
+            'hash_key': _create_hash_key(get_json_happy_dict),
+        }
+        # stamped so a scanner job index reads the new job back
+        job = scheduled_jobs.get(hash_key=_create_hash_key(get_json_happy_dict))
+        assert job.get(et_status_last_updated_at=None)['et_status_last_updated_at'] is not None
 
         with mock.patch('mycroft.models.aws_connections.TableConnection.get_connection'):
             with mock.patch(
-                'mycroft.logic.job_actions.list_cluster_by_name',
+                'mycroft.logic.job_actions.list_cluster_by_name_cached',
                 side_effect=ItemNotFound()
             ):
                 with pytest.raises(ItemNotFound):
@@ -147,7 +194,7 @@ class TestJobActions(object):
         result = self.post_job(scheduled_jobs, et_scanner_queue, input_string)
         assert 'post_accepted' in result
         assert result['post_accepted']['result'] is True
-        assert et_scanner_queue._published_msg == {'message': 'dummy'}
+        assert et_scanner_queue._published_msg['message'] == 'job post request'
         with pytest.raises(ValueError):
             self.post_job(scheduled_jobs, et_scanner_queue, input_string)
 
@@ -196,7 +243,10 @@ class TestJobActions(object):
         result = put_job(scheduled_jobs, et_scanner_queue, input_string)
         assert 'put_accepted' in result
         assert result['put_accepted'] is True
-        assert et_scanner_queue._published_msg == {'message': 'job put request'}
+        assert et_scanner_queue._published_msg == {
+            'message': 'job put request',
+            'hash_key': _create_hash_key(new_happy_dict),
+        }
 
     @pytest.mark.parametrize("job_status", JOBS_ETL_STATUSES_FINAL)
     def test_put_delete_job_ok(self, scheduled_jobs, get_json_happy_dict, job_status):
@@ -222,7 +272,10 @@ class TestJobActions(object):
         result = put_job(scheduled_jobs, et_scanner_queue, input_string)
         assert 'put_accepted' in result
         assert result['put_accepted'] is True
-        assert et_scanner_queue._published_msg == {'message': 'job put request'}
+        assert et_scanner_queue._published_msg == {
+            'message': 'job put request',
+            'hash_key': _create_hash_key(new_happy_dict),
+        }
 
     def test_put_delete_job_fail(self, scheduled_jobs, get_json_happy_dict):
         # post a new job
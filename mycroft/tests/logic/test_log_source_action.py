@@ -1,11 +1,23 @@
 # -*- coding: utf-8 -*-
+from BaseHTTPServer import BaseHTTPRequestHandler
+from BaseHTTPServer import HTTPServer
 from contextlib import nested
+from SocketServer import ThreadingMixIn
+import threading
+import time
+
 import mock
 import pytest
+import simplejson
+import staticconf.testing
 
 from requests import Response
 from requests.exceptions import HTTPError
+from requests.exceptions import Timeout
 
+from mycroft.logic.log_source_action import clear_log_meta_data_cache
+from mycroft.logic.log_source_action import get_log_meta_data
+from mycroft.logic.log_source_action import prefetch_log_meta_data
 from mycroft.logic.log_source_action import search_log_source_by_keyword
 
 
@@ -39,3 +51,111 @@ class TestLogSourceAction(object):
 
         with pytest.raises(HTTPError):
             search_log_source_by_keyword(request_body)
+
+
+class FakeLogFinder(ThreadingMixIn, HTTPServer):
+    """ A local stand-in for the log finder buckets end point, answering
+    /<bucket>/<log_name> after delay_sec
+    """
+    daemon_threads = True
+
+    def __init__(self, delay_sec=0):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), FakeLogFinderHandler)
+        self.delay_sec = delay_sec
+        self.lock = threading.Lock()
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    @property
+    def end_point(self):
+        return 'http://127.0.0.1:{0}'.format(self.server_address[1])
+
+
+class FakeLogFinderHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(self.path)
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        time.sleep(server.delay_sec)
+        with server.lock:
+            server.in_flight -= 1
+        body = simplejson.dumps({'log': {'name': self.path, 'max_complete_date': '2015-03-15'}})
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestLogMetaData(object):
+
+    @pytest.yield_fixture
+    def log_finder(self, request):
+        server = FakeLogFinder(delay_sec=getattr(request, 'param', 0))
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        server.config = {
+            'disable_logfinder_service': False,
+            'log_finder_buckets_end_point': server.end_point,
+            'log_finder_timeout_sec': 5,
+            'log_finder_cache_ttl_sec': 300,
+            'log_finder_prefetch_threads': 2,
+        }
+        clear_log_meta_data_cache()
+        with staticconf.testing.MockConfiguration(server.config):
+            yield server
+        clear_log_meta_data_cache()
+        server.shutdown()
+        server.server_close()
+
+    def test_get_log_meta_data_is_cached(self, log_finder):
+        first = get_log_meta_data('bucket', 'log')
+        assert first['log']['name'] == '/bucket/log'
+        assert get_log_meta_data('bucket', 'log') == first
+        assert log_finder.requests == ['/bucket/log']
+
+    def test_get_log_meta_data_ttl(self, log_finder):
+        get_log_meta_data('bucket', 'log')
+        with mock.patch('mycroft.logic.log_source_action.time.time',
+                        return_value=time.time() + 301):
+            get_log_meta_data('bucket', 'log')
+        assert log_finder.requests == ['/bucket/log'] * 2
+
+    @pytest.mark.parametrize('log_finder', [0.2], indirect=True)
+    def test_get_log_meta_data_coalesces_requests(self, log_finder):
+        results = []
+
+        def get():
+            results.append(get_log_meta_data('bucket', 'log'))
+
+        threads = [threading.Thread(target=get) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(results) == 5
+        assert log_finder.requests == ['/bucket/log']
+
+    @pytest.mark.parametrize('log_finder', [1], indirect=True)
+    def test_get_log_meta_data_timeout(self, log_finder):
+        config = dict(log_finder.config, log_finder_timeout_sec=0.1)
+        with staticconf.testing.MockConfiguration(config):
+            with pytest.raises(Timeout):
+                get_log_meta_data('bucket', 'log')
+
+    @pytest.mark.parametrize('log_finder', [0.1], indirect=True)
+    def test_prefetch_log_meta_data(self, log_finder):
+        keys = [('bucket', 'log{0}'.format(i)) for i in range(5)]
+        prefetch_log_meta_data(keys + keys)
+        assert sorted(log_finder.requests) == ['/bucket/log{0}'.format(i) for i in range(5)]
+        assert log_finder.max_in_flight == 2
+        for bucket_name, log_name in keys:
+            get_log_meta_data(bucket_name, log_name)
+        assert len(log_finder.requests) == 5
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+from decimal import Decimal
+
+import pytest
+
+from mycroft.logic.pagination import DEFAULT_PAGE_LIMIT
+from mycroft.logic.pagination import MAX_PAGE_LIMIT
+from mycroft.logic.pagination import decode_page_token
+from mycroft.logic.pagination import encode_page_token
+from mycroft.logic.pagination import get_page_params
+from mycroft.logic.pagination import parse_date
+from mycroft.logic.pagination import parse_fields
+from mycroft.logic.pagination import parse_limit
+
+
+@pytest.mark.parametrize("page_key", [
+    {'hash_key': 'rs1:ad_click:initial:2014-07-01:None'},
+    {'hash_key': '1a', 'job_id': '7a024c54', 'data_date': '2014-07-01'},
+    {'hash_key': 'x', 'count': Decimal('3')},
+])
+def test_page_token_round_trip(page_key):
+    token = encode_page_token(page_key)
+    assert '=' not in token
+    assert decode_page_token(token) == page_key
+
+
+def test_page_token_of_last_page():
+    assert encode_page_token(None) is None
+    assert decode_page_token(None) is None
+    assert decode_page_token('') is None
+
+
+@pytest.mark.parametrize("page_token", [
+    '!!!',
+    'bm90IGpzb24',          # not json
+    'WyJoYXNoX2tleSJd',     # a list
+    'e30',                  # an empty dict
+    'eyJhIjogbnVsbH0',      # a null value
+    u'\xe9',
+])
+def test_decode_bad_page_token(page_token):
+    with pytest.raises(ValueError) as e:
+        decode_page_token(page_token)
+    assert e.exconly() == 'ValueError: invalid page_token'
+
+
+def test_parse_limit():
+    assert parse_limit(None) == DEFAULT_PAGE_LIMIT
+    assert parse_limit('1') == 1
+    assert parse_limit(str(MAX_PAGE_LIMIT)) == MAX_PAGE_LIMIT
+
+
+@pytest.mark.parametrize("limit", ['0', '-1', str(MAX_PAGE_LIMIT + 1), 'x', '1.5'])
+def test_parse_bad_limit(limit):
+    with pytest.raises(ValueError):
+        parse_limit(limit)
+
+
+def test_parse_fields():
+    assert parse_fields(None, ['a', 'b']) is None
+    assert parse_fields('b, a,b', ['a', 'b']) == ['a', 'b']
+
+
+@pytest.mark.parametrize("fields", ['', ',', 'a,c'])
+def test_parse_bad_fields(fields):
+    with pytest.raises(ValueError):
+        parse_fields(fields, ['a', 'b'])
+
+
+def test_parse_date():
+    assert parse_date(None, 'from_date') is None
+    assert parse_date('2014-07-01', 'from_date') == '2014-07-01'
+    with pytest.raises(ValueError) as e:
+        parse_date('07/01/2014', 'from_date')
+    assert e.exconly() == 'ValueError: invalid from_date 07/01/2014'
+
+
+def test_get_page_params():
+    assert get_page_params({u'limit': u'2'}, frozenset(['limit'])) == {'limit': u'2'}
+    with pytest.raises(ValueError):
+        get_page_params({'color': 'black'}, frozenset(['limit']))
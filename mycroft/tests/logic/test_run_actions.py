@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import mock
 import pytest
 
 from boto.dynamodb2.fields import HashKey
@@ -11,6 +12,7 @@ from mycroft.models.etl_records import ETLRecords
 
 from mycroft.logic.run_actions import _parse_runs
 from mycroft.logic.run_actions import list_runs_by_job_id
+from mycroft.logic.run_actions import list_runs_page
 
 from tests.models.test_abstract_records import dynamodb_connection  # noqa
 from tests.models.test_abstract_records import NAME_TO_SCHEMA
@@ -72,3 +74,35 @@ class TestRunActions(object):
         with pytest.raises(ValueError) as e:
             list_runs_by_job_id(job_id, None)
         assert e.exconly().startswith("ValueError: invalid job_id")
+
+    def test_list_runs_page(self, etl_records):
+        first = list_runs_page(SAMPLE_JOB_ID, etl_records, limit='1', fields='data_date')
+        assert first['runs'] == [{'data_date': '2014-07-01'}]
+        second = list_runs_page(SAMPLE_JOB_ID, etl_records, limit='1', fields='data_date',
+                                page_token=first['next_page_token'])
+        assert second['runs'] == [{'data_date': '2014-07-02'}]
+
+    def test_list_runs_page_filtered(self, etl_records):
+        result = list_runs_page(SAMPLE_JOB_ID, etl_records, etl_status='et_started',
+                                from_date='2014-07-01', to_date='2014-07-02')
+        assert [run['hash_key'] for run in result['runs']] == ['2a']
+        assert result['next_page_token'] is None
+
+    def test_list_runs_page_filters(self):
+        etl_records = mock.Mock()
+        etl_records.get_runs_page.return_value = ([], None)
+        result = list_runs_page(SAMPLE_JOB_ID, etl_records, limit='5', to_date='2014-07-02')
+        assert result == {'runs': [], 'next_page_token': None}
+        etl_records.get_runs_page.assert_called_once_with(
+            SAMPLE_JOB_ID, 5, page_key=None, attributes=None,
+            from_date=None, to_date='2014-07-02', etl_status=None)
+
+    @pytest.mark.parametrize("job_id, kwargs", [
+        ('y', {}),
+        (SAMPLE_JOB_ID, {'limit': 'x'}),
+        (SAMPLE_JOB_ID, {'fields': 'color'}),
+        (SAMPLE_JOB_ID, {'to_date': 'tomorrow'}),
+    ])
+    def test_list_runs_page_bad_input(self, job_id, kwargs):
+        with pytest.raises(ValueError):
+            list_runs_page(job_id, None, **kwargs)
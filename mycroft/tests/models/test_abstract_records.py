@@ -7,15 +7,24 @@ import contextlib
 import shlex
 import subprocess
 import socket
+import threading
+import time
 
 import avro.schema
+import mock
+from boto.dynamodb2.exceptions import ConditionalCheckFailedException
+from boto.dynamodb2.exceptions import ValidationException
 from boto.dynamodb2.fields import HashKey, RangeKey
 from boto.dynamodb2.layer1 import DynamoDBConnection
 from boto.dynamodb2.table import Table
 from boto.dynamodb2.types import STRING
 import pytest
+import staticconf.testing
 
+from mycroft.models.abstract_records import ConditionFailedError
+from mycroft.models.abstract_records import MAX_PAGE_SIZE
 from mycroft.models.abstract_records import PrimaryKeyError
+from mycroft.models.abstract_records import Records
 from mycroft.models.etl_records import ETLRecords
 from mycroft.models.scheduled_jobs import ScheduledJobs
 
@@ -261,6 +270,46 @@ class TestRecords(object):
         with pytest.raises(ValueError):
             records_bundle.records._records.query_by_index(index=None, a='1', b='2', c='3')
 
+    def test_batch_get(self, records_bundle):
+        records = records_bundle.records._records
+        assert records.put(**records_bundle.sample_record_not_in_db)
+        keys = [records_bundle.sample_record_in_db, records_bundle.sample_record_not_in_db]
+        missing_key = dict(records_bundle.sample_record_in_db, hash_key='missing')
+        result = records.batch_get(keys + [missing_key, keys[0]])
+        simple_dicts = [record.get(**keys[0]) for record in result]
+        assert sorted(simple_dicts) == sorted(keys)
+
+    def test_get_with_attributes(self, records_bundle):
+        records = records_bundle.records._records
+        key = records_bundle.sample_record_in_db
+        other_key = next(name for name in records._known_keys if name not in key)
+        record = records.get(attributes=[], **key)
+        assert record.get(**key) == key
+        with pytest.raises(ValueError):
+            record.get(**{other_key: None})
+        assert records.get(attributes=[other_key], **key).get(**{other_key: None})
+
+    def test_get_with_unknown_attributes(self, records_bundle):
+        with pytest.raises(ValueError):
+            records_bundle.records._records.get(
+                attributes=[UNKNOWN_KWARG], **records_bundle.sample_record_in_db
+            )
+
+    def test_identity_map(self, records_bundle):
+        records = records_bundle.records._records
+        key = records_bundle.sample_record_in_db
+        assert records.get(**key) is not records.get(**key)
+        with records.identity_map():
+            record = records.get(**key)
+            assert records.get(**key) is record
+            assert records.batch_get([key]) == [record]
+            assert record.delete('user', 'reason')
+            with pytest.raises(KeyError):
+                records.get(**key)
+            assert records.batch_get([key]) == []
+        with pytest.raises(KeyError):
+            records.get(**key)
+
     def test_iterator_with_one_element(self, records_bundle):
         all_records = [record for record in records_bundle.records]
         simple_dicts = [record.get(**records_bundle.sample_record_in_db) for record in all_records]
@@ -283,6 +332,245 @@ class TestRecords(object):
         assert simple_dicts == []
 
 
+class FakeItem(dict):
+
+    def get(self, key, default=None):
+        return super(FakeItem, self).get(key, default)
+
+    def mark_clean(self):
+        pass
+
+
+class TestRecordsReads(object):
+    """ read counting tests, against a mock table """
+
+    @pytest.fixture
+    def records(self):
+        table = mock.MagicMock()
+        table.get_item.side_effect = lambda consistent, attributes, **kwargs: FakeItem(kwargs)
+        table.batch_get.side_effect = lambda keys, consistent, attributes: [
+            FakeItem(key) for key in keys
+        ]
+        return Records(table, get_avro_schema(avro_map['scheduled_jobs']))
+
+    def test_get_projection_includes_keys(self, records):
+        record = records.get(attributes=['et_status'], hash_key='1')
+        records._persistence_object.get_item.assert_called_once_with(
+            consistent=True, attributes=('et_status', 'hash_key'), hash_key='1'
+        )
+        assert record.get(et_status='x') == {'et_status': 'x'}
+        with pytest.raises(ValueError):
+            record.get(s3_path=None)
+
+    def test_identity_map_reads_once_per_thread(self, records):
+        table = records._persistence_object
+        with records.identity_map():
+            record = records.get(hash_key='1')
+            with records.identity_map():
+                assert records.get(hash_key='1') is record
+                assert records.get(attributes=['et_status'], hash_key='1') is record
+            assert records.batch_get([{'hash_key': '1'}, {'hash_key': '2'}])[0] is record
+            assert records.get(hash_key='2') is not None
+            table.batch_get.assert_called_once_with(
+                keys=[{'hash_key': '2'}], consistent=True, attributes=None
+            )
+            assert table.get_item.call_count == 1
+        assert records.get(hash_key='1') is not record
+        assert table.get_item.call_count == 2
+
+    def test_identity_map_cleared_by_put(self, records):
+        with records.identity_map():
+            record = records.get(hash_key='1')
+            records.put(hash_key='3')
+            assert records.get(hash_key='1') is not record
+
+    def test_batch_get_dedups_keys(self, records):
+        result = records.batch_get([{'hash_key': '1'}, {'hash_key': '1'}])
+        assert len(result) == 1
+
+    def test_batch_put(self, records):
+        batch = records._persistence_object.batch_write.return_value.__enter__.return_value
+        with records.identity_map():
+            record = records.get(hash_key='1')
+            records.batch_put([{'hash_key': '1'}, {'hash_key': '2', 'et_status': 'null'}])
+            assert records.get(hash_key='1') is not record
+        assert batch.put_item.call_args_list == [
+            mock.call(data={'hash_key': '1'}),
+            mock.call(data={'hash_key': '2', 'et_status': 'null'}),
+        ]
+        with pytest.raises(ValueError):
+            records.batch_put([{'hash_key': '3', 'color': 'black'}])
+
+    def test_update_if_is_one_conditional_write(self, records):
+        table = records._persistence_object
+        table.table_name = 'ScheduledJobs'
+        with records.identity_map():
+            record = records.get(hash_key='1')
+            assert records.update_if(
+                {'hash_key': '1'}, 'et_status', ['null', 'success'],
+                et_status='scheduled', et_num_error_retries=None
+            )
+            assert record.get(et_status=None) == {'et_status': 'scheduled'}
+        table.connection.update_item.assert_called_once_with(
+            'ScheduledJobs',
+            {'hash_key': {'S': '1'}},
+            update_expression='SET #n0 = :v0 REMOVE #n1',
+            condition_expression='attribute_exists(#n2) AND #n3 IN (:v1, :v2)',
+            expression_attribute_names={
+                '#n0': 'et_status', '#n1': 'et_num_error_retries',
+                '#n2': 'hash_key', '#n3': 'et_status',
+            },
+            expression_attribute_values={
+                ':v0': {'S': 'scheduled'}, ':v1': {'S': 'null'}, ':v2': {'S': 'success'},
+            },
+        )
+
+    def test_update_if_fails(self, records):
+        table = records._persistence_object
+        table.connection.update_item.side_effect = ConditionalCheckFailedException(400, 'x')
+        with pytest.raises(ConditionFailedError):
+            records.update_if({'hash_key': '1'}, None, None, et_status='scheduled')
+
+
+class TestRecordsParallelScan(object):
+
+    @pytest.fixture
+    def records(self):
+        table = mock.MagicMock()
+
+        def scan(segment, total_segments, **kwargs):
+            if segment is None:
+                return [FakeItem(hash_key=str(i)) for i in range(6)]
+            assert total_segments == 3
+            return [FakeItem(hash_key=str(i)) for i in range(segment, 6, total_segments)]
+
+        table.scan.side_effect = scan
+        return Records(table, get_avro_schema(avro_map['scheduled_jobs']))
+
+    def hash_keys(self, records):
+        return sorted(record.get(hash_key=None)['hash_key'] for record in records)
+
+    def test_scan_reads_segments_in_parallel(self, records):
+        result = records.scan(total_segments=3, max_page_size=10, et_status__eq='null')
+        assert self.hash_keys(result) == [str(i) for i in range(6)]
+        assert sorted(c[1]['segment'] for c in records._persistence_object.scan.call_args_list) \
+            == [0, 1, 2]
+        assert all(
+            c[1]['max_page_size'] == 10 and c[1]['et_status__eq'] == 'null'
+            for c in records._persistence_object.scan.call_args_list
+        )
+
+    def test_scan_options_from_config(self, records):
+        with staticconf.testing.MockConfiguration(
+            {'aws_config': {'scan_segments': 3, 'scan_page_size': 20}}
+        ):
+            assert self.hash_keys(records) == [str(i) for i in range(6)]
+        assert records._persistence_object.scan.call_count == 3
+
+    def test_scan_single_segment(self, records):
+        with staticconf.testing.MockConfiguration({}):
+            assert self.hash_keys(records.scan(total_segments=1)) == [str(i) for i in range(6)]
+        records._persistence_object.scan.assert_called_once_with(
+            limit=None, segment=None, total_segments=None, max_page_size=MAX_PAGE_SIZE,
+            attributes=None, conditional_operator=None
+        )
+
+    def test_scan_raises_segment_error(self, records):
+        scan = records._persistence_object.scan.side_effect
+
+        def fail_segment_1(segment, **kwargs):
+            if segment == 1:
+                raise IOError("test")
+            return scan(segment, **kwargs)
+
+        records._persistence_object.scan.side_effect = fail_segment_1
+        with pytest.raises(IOError):
+            list(records.scan(total_segments=3))
+
+    def test_scan_stops_when_closed(self, records):
+        def endless(segment, **kwargs):
+            while True:
+                yield FakeItem(hash_key=str(segment))
+
+        records._persistence_object.scan.side_effect = endless
+        num_threads = threading.active_count()
+        result = records.scan(total_segments=2)
+        assert next(result).get(hash_key=None)['hash_key'] in ('0', '1')
+        result.close()
+        for _ in range(50):
+            if threading.active_count() == num_threads:
+                break
+            time.sleep(0.1)
+        assert threading.active_count() == num_threads
+
+
+class TestRecordsPages(object):
+
+    @pytest.fixture
+    def records(self):
+        table = mock.MagicMock()
+        items = [FakeItem(hash_key=str(i)) for i in range(5)]
+
+        def read_page(limit, exclusive_start_key, **kwargs):
+            # pages of at most 2 items, of which a filter drops the odd ones
+            start = 0 if exclusive_start_key is None else \
+                int(exclusive_start_key['hash_key']) + 1
+            page = items[start:start + min(limit or 2, 2)]
+            last_key = None
+            if start + len(page) < len(items):
+                last_key = {'hash_key': page[-1]['hash_key']}
+            return {
+                'results': [item for item in page if int(item['hash_key']) % 2 == 0],
+                'last_key': last_key,
+            }
+
+        table._scan.side_effect = read_page
+        table._query.side_effect = read_page
+        return Records(table, get_avro_schema(avro_map['scheduled_jobs']))
+
+    def hash_keys(self, records):
+        return [record.get(hash_key=None)['hash_key'] for record in records]
+
+    def test_scan_page_fills_page(self, records):
+        page, last_key = records.scan_page(2, et_status__eq='null')
+        assert self.hash_keys(page) == ['0', '2']
+        assert last_key == {'hash_key': '2'}
+        assert records._persistence_object._scan.call_count == 2
+        assert records._persistence_object._scan.call_args[1]['et_status__eq'] == 'null'
+
+        page, last_key = records.scan_page(2, start_key=last_key)
+        assert self.hash_keys(page) == ['4']
+        assert last_key is None
+
+    def test_scan_page_without_limit(self, records):
+        page, last_key = records.scan_page(None)
+        assert self.hash_keys(page) == ['0', '2', '4']
+        assert last_key is None
+
+    def test_scan_page_with_unknown_filter(self, records):
+        with pytest.raises(ValueError):
+            records.scan_page(2, color__eq='black')
+
+    def test_query_page_with_attributes(self, records):
+        page, last_key = records.query_page(
+            1, index='ETStatusIndex', attributes=['et_status'],
+            query_filter={'redshift_id__eq': 'rs1'}, et_status__eq='null')
+        assert len(page) == 1
+        assert page[0].get(et_status=None) == {'et_status': None}
+        assert last_key == {'hash_key': '0'}
+        records._persistence_object._query.assert_called_once_with(
+            limit=1, index='ETStatusIndex', consistent=False, exclusive_start_key=None,
+            select='SPECIFIC_ATTRIBUTES', attributes_to_get=('et_status',),
+            query_filter={'redshift_id__eq': 'rs1'}, et_status__eq='null')
+        with pytest.raises(ValueError):
+            page[0].get(s3_path=None)
+
+    def test_query_page_with_bad_start_key(self, records):
+        records._persistence_object._query.side_effect = ValidationException(400, 'bad key')
+        with pytest.raises(ValueError):
+            records.query_page(1, start_key={'color': 'black'}, et_status__eq='null')
+
+
 @contextlib.contextmanager
 def ensure_original_record(records, **kwargs):
     '''
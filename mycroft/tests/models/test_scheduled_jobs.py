@@ -8,7 +8,13 @@ from boto.dynamodb2.table import Table
 import pytest
 
 from mycroft.models.aws_connections import get_avro_schema
+from mycroft.models.scheduled_jobs import JOBS_ETL_STATUS_COMPLETE
+from mycroft.models.scheduled_jobs import JOBS_ETL_STATUS_EMPTY
+from mycroft.models.scheduled_jobs import JOBS_ETL_STATUS_PREDECESSORS
 from mycroft.models.scheduled_jobs import JOBS_ETL_STATUS_RUNNING
+from mycroft.models.scheduled_jobs import JOBS_ETL_STATUS_SCHEDULED
+from mycroft.models.scheduled_jobs import JOBS_ETL_STATUS_TRANSITION_TABLE
+from mycroft.models.scheduled_jobs import ScheduledJobInvalidStatusUpdate
 from mycroft.models.scheduled_jobs import ScheduledJobs
 from tests.data.scheduled_job import SAMPLE_LOG_NAME_RANGER
 from tests.data.scheduled_job import SAMPLE_LOG_SCHEMA_VERSION_1
@@ -103,6 +109,18 @@ class TestScheduledJobs(object):
         ])
         assert len(jobs) == 2
 
+    def test_get_jobs_with_et_status_updated_after(self, scheduled_jobs):
+        job = scheduled_jobs.get(hash_key=SAMPLE_RECORD_ET_STATUS_RUNNING_1['hash_key'])
+        assert job.update(et_status=JOBS_ETL_STATUS_RUNNING,
+                          et_status_last_updated_at='2014-08-01 10:00:00.000000')
+        jobs = scheduled_jobs.get_jobs_with_et_status_updated_after(
+            '2014-08-01 09:59:59.999999')
+        assert [j.get(hash_key=None)['hash_key'] for j in jobs] == \
+            [SAMPLE_RECORD_ET_STATUS_RUNNING_1['hash_key']]
+        jobs = scheduled_jobs.get_jobs_with_et_status_updated_after(
+            '2014-08-01 10:00:00.000000')
+        assert list(jobs) == []
+
     def test_get_jobs_with_log_name(self, scheduled_jobs):
         # query by a value
         # make sure it includes only the value we are looking for
@@ -126,3 +144,40 @@ class TestScheduledJobs(object):
         assert jobs[0].get(log_name=None, log_schema_version=None) == {
             'log_name': SAMPLE_LOG_NAME_RANGER,
             'log_schema_version': SAMPLE_LOG_SCHEMA_VERSION_1}
+
+    def test_status_predecessors_match_transition_table(self):
+        for cur_status, new_statuses in JOBS_ETL_STATUS_TRANSITION_TABLE.iteritems():
+            for new_status in new_statuses:
+                assert cur_status in JOBS_ETL_STATUS_PREDECESSORS[new_status]
+        assert sum(len(p) for p in JOBS_ETL_STATUS_PREDECESSORS.values()) == \
+            sum(len(n) for n in JOBS_ETL_STATUS_TRANSITION_TABLE.values())
+
+    def test_update_status_is_conditional(self, scheduled_jobs):
+        hash_key = SAMPLE_RECORD_ET_STATUS_RUNNING_1['hash_key']
+        job = scheduled_jobs.get(hash_key=hash_key)
+        stale_job = scheduled_jobs.get(hash_key=hash_key)
+        assert job.update(et_status=JOBS_ETL_STATUS_EMPTY)
+        assert job.update(et_status=JOBS_ETL_STATUS_SCHEDULED)
+        assert job.get(et_status=None)['et_status'] == JOBS_ETL_STATUS_SCHEDULED
+        # running -> complete is valid, but the job is scheduled by now
+        with pytest.raises(ScheduledJobInvalidStatusUpdate):
+            stale_job.update(et_status=JOBS_ETL_STATUS_COMPLETE)
+        with pytest.raises(ScheduledJobInvalidStatusUpdate):
+            job.update(et_status=JOBS_ETL_STATUS_SCHEDULED)
+        stored = scheduled_jobs.get(hash_key=hash_key)
+        assert stored.get(et_status=None)['et_status'] == JOBS_ETL_STATUS_SCHEDULED
+
+    def test_update_by_hash_key(self, scheduled_jobs):
+        hash_key = SAMPLE_RECORD_ET_STATUS_RUNNING_1['hash_key']
+        assert scheduled_jobs.update(hash_key, et_status=JOBS_ETL_STATUS_RUNNING,
+                                     et_last_successful_date='2014-09-01')
+        job = scheduled_jobs.get(hash_key=hash_key)
+        assert job.get(et_last_successful_date=None)['et_last_successful_date'] == \
+            '2014-09-01'
+        assert scheduled_jobs.update(hash_key, et_last_successful_date=None)
+        job = scheduled_jobs.get(hash_key=hash_key)
+        assert job.get(et_last_successful_date=None)['et_last_successful_date'] is None
+        with pytest.raises(ScheduledJobInvalidStatusUpdate):
+            scheduled_jobs.update(hash_key, et_status=JOBS_ETL_STATUS_SCHEDULED)
+        with pytest.raises(KeyError):
+            scheduled_jobs.update('gone', et_status=JOBS_ETL_STATUS_RUNNING)
@@ -95,3 +95,21 @@ def test_jobs_update_job(request_method, parm):
                 list_action.return_value = {}
                 actual_return_code, _ = jobs_update_job(dr)
             assert actual_return_code == expected_return_code
+
+
+@pytest.mark.parametrize("params, expected_return_code", [
+    ({'limit': '2', 'et_status': 'running'}, 200),
+    ({'color': 'black'}, 404),
+])
+def test_jobs_paged(params, expected_return_code):
+    dr = dummy_request()
+    dr.params = params
+    with patch('mycroft.models.aws_connections.TableConnection.get_connection'):
+        with patch('mycroft.views.jobs.list_all_jobs') as list_all_jobs:
+            with patch('mycroft.views.jobs.list_jobs_page') as list_jobs_page:
+                list_jobs_page.return_value = {'jobs': [], 'next_page_token': None}
+                actual_return_code, _ = jobs(dr)
+        assert not list_all_jobs.called
+    assert actual_return_code == expected_return_code
+    if expected_return_code == 200:
+        assert list_jobs_page.call_args[1] == params
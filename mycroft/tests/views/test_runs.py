@@ -21,3 +21,23 @@ def test_runs_filtered(err_type, expected_return_code):
                 list_runs.returns = {}
             actual_return_code, _ = runs_filtered(dr)
         assert actual_return_code == expected_return_code
+
+
+@pytest.mark.parametrize("params, expected_return_code", [
+    ({'page_token': 'eyJoYXNoX2tleSI6ICIxYSJ9', 'fields': 'data_date'}, 200),
+    ({'redshift_id': 'rs1'}, 404),
+])
+def test_runs_filtered_paged(params, expected_return_code):
+    dr = dummy_request()
+    dr.matchdict['job_id'] = 'abc'
+    dr.params = params
+    with patch('mycroft.models.aws_connections.TableConnection.get_connection'):
+        with patch('mycroft.views.runs.list_runs_by_job_id') as list_runs:
+            with patch('mycroft.views.runs.list_runs_page') as list_runs_page:
+                list_runs_page.return_value = {'runs': [], 'next_page_token': None}
+                actual_return_code, _ = runs_filtered(dr)
+        assert not list_runs.called
+    assert actual_return_code == expected_return_code
+    if expected_return_code == 200:
+        assert list_runs_page.call_args[0][0] == 'abc'
+        assert list_runs_page.call_args[1] == params